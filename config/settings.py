@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Полнотекстовый и триграммный поиск (core/search.py)
 
     # --- Third-party Apps (Сторонние библиотеки) ---
     'widget_tweaks',        # Улучшение рендеринга полей форм
@@ -67,6 +68,8 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # Whitenoise: Раздача статики (важно для Docker/Prod)
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Замеры времени запросов, SQL, кэша и рендера (core/performance.py)
+    'core.middleware.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,7 +88,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.performance.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -159,6 +162,9 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Файлы фоновых задач (PDF-отчеты, логины учеников) — закрытые, отдаются только владельцу
+JOB_FILES_ROOT = BASE_DIR / 'job_files'
+
 # =============================================================================
 # 9. НАСТРОЙКИ БИБЛИОТЕК И ИНСТРУМЕНТОВ
 # =============================================================================
@@ -185,7 +191,7 @@ if DEBUG:
     # Локальный кэш для разработки (быстрый, не требует Redis)
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'BACKEND': 'core.performance.InstrumentedLocMemCache',
             'LOCATION': 'unique-snowflake',
         }
     }
@@ -193,7 +199,7 @@ else:
     # Redis для продакшена
     CACHES = {
         "default": {
-            "BACKEND": "django_redis.cache.RedisCache",
+            "BACKEND": "core.performance.InstrumentedRedisCache",
             "LOCATION": os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
             "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"}
         }
@@ -262,6 +268,15 @@ LOGGING = {
             'filename': LOGS_DIR / 'questions.log',
             'formatter': 'verbose',
         },
+        'slow_requests_file': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOGS_DIR / 'slow_requests.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'verbose',
+        },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
@@ -279,6 +294,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'performance_logger': {
+            'handlers': ['slow_requests_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'django': {
             'handlers': ['console'],
             'level': 'INFO',
@@ -287,6 +307,12 @@ LOGGING = {
     },
 }
 
+# Замеры производительности (core/middleware.py)
+PERF_MONITORING_ENABLED = os.environ.get('PERF_MONITORING_ENABLED', 'True').lower() == 'true'
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 1000))  # порог «медленного» запроса
+PERF_SLOW_TOP_QUERIES = 5  # сколько самых долгих SQL писать в лог
+PERF_WINDOW = 500  # замеров на view для расчета перцентилей
+
 # =============================================================================
 # 11. БЕЗОПАСНОСТЬ (PRODUCTION SECURITY)
 # =============================================================================
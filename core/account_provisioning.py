@@ -0,0 +1,166 @@
+# D:\GAT\core\account_provisioning.py
+
+"""
+Пакетное создание аккаунтов учеников (класс, параллель или вся школа).
+
+Раньше логин подбирался циклом `while User.objects.filter(username=...).exists()`
+на каждого ученика, а пользователь и профиль сохранялись по одному. Теперь:
+
+- логины всей пачки подбираются в памяти по одному запросу ко всем занятым
+  логинам вида `<основа><число>` (allocate_usernames);
+- хеши паролей (PBKDF2 — самая долгая часть) считаются в пуле процессов
+  (hash_passwords), мелкие пачки — в текущем процессе;
+- пользователи и профили создаются двумя bulk_create, сброшенные пароли
+  записываются одним bulk_update.
+
+Используется фоновой задачей accounts_pdf (core/export_jobs.py) и командой
+provision_student_accounts.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from accounts.models import UserProfile
+
+PASSWORD_LENGTH = 8
+# Меньше этого числа паролей пул процессов не окупает свой запуск
+POOL_MIN_PASSWORDS = 50
+BULK_BATCH_SIZE = 1000
+
+
+def username_base(student):
+    """Основа логина: латинские имя и фамилия (или ID ученика) без лишних символов."""
+    first_name = student.first_name_en or ''
+    last_name = student.last_name_en or ''
+    base = f"{first_name}{last_name}" if first_name or last_name else student.student_id
+    return ''.join(e for e in base if e.isalnum()).lower() or 'student'
+
+
+def allocate_usernames(students):
+    """
+    Уникальные логины для списка учеников (в том же порядке): основа, затем
+    основа1, основа2, ... Занятые логины читаются одним запросом, совпадения
+    внутри пачки тоже учитываются.
+    """
+    bases = [username_base(student) for student in students]
+    if not bases:
+        return []
+    pattern = '^(' + '|'.join(re.escape(base) for base in sorted(set(bases))) + r')[0-9]*$'
+    taken = set(User.objects.filter(username__regex=pattern).values_list('username', flat=True))
+
+    next_suffix = {}
+    usernames = []
+    for base in bases:
+        username, counter = base, next_suffix.get(base, 1)
+        if base in next_suffix or username in taken:
+            username = f"{base}{counter}"
+            while username in taken:
+                counter += 1
+                username = f"{base}{counter}"
+            counter += 1
+        next_suffix[base] = counter
+        taken.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def _init_hash_worker():
+    # Дочерний процесс (spawn на Windows) должен сам загрузить настройки Django
+    import django
+    django.setup()
+
+
+def _hash_worker_count(total):
+    workers = getattr(settings, 'ACCOUNT_HASH_WORKERS', None) or os.cpu_count() or 1
+    return min(workers, total)
+
+
+def hash_passwords(passwords, progress=None, workers=None):
+    """
+    Хеши make_password для списка паролей (в том же порядке), с вызовом
+    progress(done, total). Пул процессов — от POOL_MIN_PASSWORDS паролей и
+    больше одного процессора (или ACCOUNT_HASH_WORKERS в настройках).
+    """
+    total = len(passwords)
+    workers = workers or _hash_worker_count(total)
+    if workers <= 1 or total < POOL_MIN_PASSWORDS:
+        hashes = []
+        for done, password in enumerate(passwords, start=1):
+            hashes.append(make_password(password))
+            if progress:
+                progress(done, total)
+        return hashes
+
+    hashes = []
+    chunksize = max(1, total // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        for done, password_hash in enumerate(pool.map(make_password, passwords, chunksize=chunksize), start=1):
+            hashes.append(password_hash)
+            if progress:
+                progress(done, total)
+    return hashes
+
+
+def provision_student_accounts(students, action, progress=None):
+    """
+    Создает аккаунты ученикам без них и (для action='reset_and_export') сбрасывает пароли остальным.
+    Хеши паролей считаются до транзакции, с вызовом progress(done, total);
+    запись в БД — одной транзакцией.
+    Возвращает (credentials, created_count, reset_count); credentials отсортированы по ФИО,
+    каждая запись — {'full_name', 'username', 'password', 'school_class_id'}.
+    """
+    students_with_accounts = list(students.filter(user_profile__isnull=False).select_related('user_profile__user'))
+    students_to_create = list(students.filter(user_profile__isnull=True))
+    to_reset = students_with_accounts if action == 'reset_and_export' else []
+
+    to_hash = to_reset + students_to_create
+    plain = [get_random_string(length=PASSWORD_LENGTH) for _ in to_hash]
+    hashes = hash_passwords(plain, progress=progress)
+    passwords = {student.pk: pair for student, pair in zip(to_hash, zip(plain, hashes))}
+
+    credentials_list = []
+    with transaction.atomic():
+        reset_users = []
+        for student in students_with_accounts:
+            user = student.user_profile.user
+            password_to_show = '(пароль установлен)'
+            if student.pk in passwords:
+                password_to_show, user.password = passwords[student.pk]
+                reset_users.append(user)
+            credentials_list.append({
+                'full_name': student.full_name_ru,
+                'username': user.username,
+                'password': password_to_show,
+                'school_class_id': student.school_class_id,
+            })
+        User.objects.bulk_update(reset_users, ['password'], batch_size=BULK_BATCH_SIZE)
+
+        # bulk_create не вызывает post_save, поэтому профили создаются здесь же
+        new_users = [
+            User(username=username, password=passwords[student.pk][1],
+                 first_name=student.first_name_ru, last_name=student.last_name_ru)
+            for student, username in zip(students_to_create, allocate_usernames(students_to_create))
+        ]
+        User.objects.bulk_create(new_users, batch_size=BULK_BATCH_SIZE)
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, role=UserProfile.Role.STUDENT, student=student)
+             for student, user in zip(students_to_create, new_users)],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        for student, user in zip(students_to_create, new_users):
+            credentials_list.append({
+                'full_name': student.full_name_ru,
+                'username': user.username,
+                'password': passwords[student.pk][0],
+                'school_class_id': student.school_class_id,
+            })
+
+    credentials_list.sort(key=lambda x: x['full_name'])
+    return credentials_list, len(students_to_create), len(to_reset)
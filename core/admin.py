@@ -8,8 +8,9 @@ from .models import (
     AcademicYear, Quarter, School, SchoolClass, Subject,
     GatTest, Student, StudentResult, TeacherNote, QuestionCount,
     QuestionTopic, BankQuestion, BankAnswerOption, StudentAnswer,
-    DifficultyRule, Notification, University, Faculty
+    DifficultyRule, Notification, University, Faculty, BackgroundJob, BookletVariant
 )
+from .booklet_variants import key_letters
 
 # ==========================================================
 # --- INLINE МОДЕЛИ ---
@@ -257,6 +258,23 @@ class GatTestAdmin(admin.ModelAdmin):
         return format_html('<br>'.join(status)) if status else '—'
     shuffle_status.short_description = 'Перемешивание'
 
+@admin.register(BookletVariant)
+class BookletVariantAdmin(admin.ModelAdmin):
+    """Админка для вариантов буклетов (создаются командой generate_booklet_variants)."""
+    list_display = ('gat_test', 'name', 'seed', 'questions_total', 'answer_key_letters')
+    list_filter = ('gat_test__school',)
+    search_fields = ('gat_test__name',)
+    list_select_related = ('gat_test',)
+    readonly_fields = ('gat_test', 'name', 'seed', 'question_ids', 'option_orders', 'answer_key', 'created_at', 'updated_at')
+
+    @admin.display(description='Вопросов')
+    def questions_total(self, obj):
+        return len(obj.question_ids)
+
+    @admin.display(description='Ключ')
+    def answer_key_letters(self, obj):
+        return ' '.join(f"{n}{key_letters(mask)}" for n, mask in enumerate(obj.answer_key[:20], 1))
+
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     """Админка для Учеников."""
@@ -371,4 +389,11 @@ class FacultyAdmin(admin.ModelAdmin):
     def required_subjects_count(self, obj):
         return obj._subjects_count
     required_subjects_count.short_description = 'Требуемых предметов'
-    required_subjects_count.admin_order_field = '_subjects_count'
\ No newline at end of file
+    required_subjects_count.admin_order_field = '_subjects_count'
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'title', 'status', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('title', 'created_by__username')
+    readonly_fields = ('started_at', 'finished_at', 'error')
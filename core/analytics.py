@@ -0,0 +1,250 @@
+# D:\GAT\core\analytics.py
+
+"""
+Векторизованная аналитика для углубленного анализа.
+
+Данные выбранных результатов загружаются один раз в pandas:
+- result frame — (результат × предмет) с метками ученика, класса, школы,
+  четверти; верные/отвеченные считаются по матрицам ответов тестов
+  (TestAnswerMatrix) сгруппированной редукцией по колонкам предмета;
+- question frame — (школа или класс × предмет × номер вопроса) из агрегатов
+  QuestionResultRollup одним SQL-запросом.
+Тепловая карта, рейтинги, проблемные вопросы и ученики в зоне риска
+считаются групповыми суммами по этим таблицам и возвращаются в тех же
+структурах, что строили прежние функции на словарях (core/views/deep_analysis.py).
+"""
+
+import numpy as np
+import pandas as pd
+from django.db.models import Sum
+
+from .answer_matrix import AnswerMatrix, rebuild_answer_matrix
+from .models import GatTest, Student, TestAnswerMatrix
+
+RESULT_COLUMNS = ['result_id', 'student_id', 'gat_test_id', 'quarter_id', 'class_id', 'school_id']
+QUESTION_COLUMNS = ['entity_id', 'entity_name', 'subject_id', 'question_number', 'correct', 'answered']
+
+
+def _percent(correct, total):
+    """Процент с округлением до 0.1 (как в прежних функциях; 0 при total = 0)."""
+    return round((correct / total) * 100, 1) if total > 0 else 0
+
+
+def _load_matrices(test_ids):
+    """{gat_test_id: AnswerMatrix}; недостающие матрицы строятся на месте."""
+    matrices = {stored.gat_test_id: AnswerMatrix(stored) for stored in TestAnswerMatrix.objects.filter(gat_test_id__in=test_ids)}
+    for gat_test in GatTest.objects.filter(pk__in=set(test_ids) - set(matrices)):
+        stored = rebuild_answer_matrix(gat_test)
+        if stored is not None:
+            matrices[gat_test.pk] = AnswerMatrix(stored)
+    return matrices
+
+
+def load_result_frame(results_qs):
+    """
+    DataFrame (результат × предмет): RESULT_COLUMNS + subject_id, correct, answered.
+    Только предметы, на которые у результата есть ответы. Строки идут в порядке
+    results_qs, внутри результата — по subject_id.
+    """
+    meta = pd.DataFrame.from_records(
+        list(results_qs.values_list(
+            'id', 'student_id', 'gat_test_id', 'gat_test__quarter_id',
+            'student__school_class_id', 'student__school_class__school_id',
+        )),
+        columns=RESULT_COLUMNS,
+    )
+    empty = pd.DataFrame(columns=RESULT_COLUMNS + ['subject_id', 'correct', 'answered', 'position'])
+    if meta.empty:
+        return empty
+    meta['position'] = np.arange(len(meta))
+
+    parts = []
+    matrices = _load_matrices(meta['gat_test_id'].unique().tolist())
+    for gat_test_id, test_meta in meta.groupby('gat_test_id', sort=False):
+        matrix = matrices.get(gat_test_id)
+        if matrix is None or not matrix.subject_index:
+            continue
+        rows = pd.Index(matrix.result_ids).get_indexer(test_meta['result_id'].to_numpy())
+        found = rows >= 0
+        if not found.any():
+            continue
+        rows, test_meta = rows[found], test_meta[found]
+
+        subject_ids = sorted(matrix.subject_index)
+        starts = [matrix.subject_index[s_id][0] for s_id in subject_ids]
+        correct = np.add.reduceat(matrix.correct[rows], starts, axis=1, dtype=np.int32)
+        answered = np.add.reduceat(matrix.answered[rows], starts, axis=1, dtype=np.int32)
+
+        part = test_meta.loc[test_meta.index.repeat(len(subject_ids))].reset_index(drop=True)
+        part['subject_id'] = np.tile(subject_ids, len(test_meta))
+        part['correct'] = correct.reshape(-1)
+        part['answered'] = answered.reshape(-1)
+        parts.append(part[part['answered'] > 0])
+
+    if not parts:
+        return empty
+    frame = pd.concat(parts, ignore_index=True)
+    return frame.sort_values(['position', 'subject_id'], kind='stable').reset_index(drop=True)
+
+
+def load_question_frame(question_rollups_qs, compare_by='school'):
+    """
+    DataFrame QUESTION_COLUMNS: суммы верных/отвеченных по (школа или класс, предмет, вопрос).
+    Сущности упорядочены по имени (затем по id), вопросы — по номеру как строке.
+    """
+    if compare_by == 'class':
+        entity_fields = ('school_class_id', 'school_class__name')
+    else:
+        entity_fields = ('school_class__school_id', 'school_class__school__name')
+    rows = question_rollups_qs.values_list(*entity_fields, 'subject_id', 'question_number').annotate(
+        correct_sum=Sum('correct'), answered_sum=Sum('answered')
+    ).order_by(entity_fields[1], entity_fields[0], 'subject_id', 'question_number')
+    frame = pd.DataFrame.from_records(list(rows), columns=QUESTION_COLUMNS)
+    frame['correct'] = frame['correct'].astype(np.int64)
+    frame['answered'] = frame['answered'].astype(np.int64)
+    return frame
+
+
+def summary_charts(question_frame, unique_subject_names, subject_id_to_name_map):
+    """
+    Данные для графиков «Общая успеваемость» (среднее по всем) и
+    «Сравнение по предметам» (по каждой школе/классу + линия среднего).
+    """
+    frame = question_frame.assign(subject=question_frame['subject_id'].map(subject_id_to_name_map))
+    by_subject = frame.groupby('subject')[['correct', 'answered']].sum()
+    overall = [
+        _percent(int(by_subject.at[name, 'correct']), int(by_subject.at[name, 'answered'])) if name in by_subject.index else 0
+        for name in unique_subject_names
+    ]
+
+    by_entity = frame.groupby(['entity_id', 'subject'], sort=False)[['correct', 'answered']].sum()
+    comparison = []
+    for entity_id, entity_name in _entities(frame):
+        data_points = []
+        for name in unique_subject_names:
+            key = (entity_id, name)
+            data_points.append(
+                _percent(int(by_entity.at[key, 'correct']), int(by_entity.at[key, 'answered'])) if key in by_entity.index else 0
+            )
+        comparison.append({'label': entity_name, 'data': data_points})
+    comparison.append({
+        'label': 'Среднее', 'data': overall,
+        'type': 'line', 'borderDash': [5, 5], 'borderWidth': 2, 'pointRadius': 0,
+        'datalabels': {'display': False}
+    })
+
+    return (
+        {'labels': unique_subject_names, 'datasets': [{'label': 'Среднее по всем', 'data': overall}]},
+        {'labels': unique_subject_names, 'datasets': comparison},
+    )
+
+
+def _entities(frame):
+    """[(entity_id, entity_name)] в порядке первого появления."""
+    return list(frame[['entity_id', 'entity_name']].drop_duplicates().itertuples(index=False, name=None))
+
+
+def _by_entity_and_subject(question_frame, subject_id_to_name_map):
+    """
+    question frame с колонкой subject (имя предмета), упорядоченный как прежние словари:
+    сущности по порядку, внутри — предметы по имени, затем вопросы по номеру-строке.
+    """
+    frame = question_frame.assign(
+        subject=question_frame['subject_id'].map(subject_id_to_name_map),
+        entity_pos=pd.factorize(question_frame['entity_id'])[0],
+    ).dropna(subset=['subject'])
+    return frame.sort_values(['entity_pos', 'subject'], kind='stable')
+
+
+def heatmap_data_and_summary(question_frame, subject_id_to_name_map):
+    """Тепловая карта (предмет → вопросы × школы/классы) и сводка по ней: легкие/сложные вопросы, рейтинг."""
+    heatmap_data, heatmap_summary = {}, {}
+    frame = _by_entity_and_subject(question_frame, subject_id_to_name_map)
+    frame = frame.assign(q_int=pd.to_numeric(frame['question_number'], errors='coerce'))
+
+    for subject_name, subject_frame in frame.groupby('subject', sort=False):
+        schools = {}
+        for (_, entity_name), entity_frame in subject_frame.groupby(['entity_pos', 'entity_name'], sort=False):
+            schools[entity_name] = {
+                q_num: {'percentage': _percent(correct, total), 'correct': correct, 'total': total}
+                for q_num, correct, total in zip(
+                    entity_frame['question_number'], entity_frame['correct'].tolist(), entity_frame['answered'].tolist()
+                )
+            }
+
+        by_question = subject_frame.groupby(['q_int', 'question_number'])[['correct', 'answered']].sum()
+        questions = by_question.index.get_level_values('question_number').tolist()
+        question_avg_perf = [
+            {'q_num': q_num, 'percentage': _percent(correct, total)}
+            for q_num, correct, total in zip(questions, by_question['correct'].tolist(), by_question['answered'].tolist())
+        ]
+        sorted_by_perf = sorted(question_avg_perf, key=lambda x: x['percentage'], reverse=True)
+
+        by_entity = subject_frame.groupby(['entity_pos', 'entity_name'], sort=False)[['correct', 'answered']].sum()
+        entity_perf_list = [
+            {'school': entity_name, 'avg': _percent(correct, total)}
+            for (_, entity_name), correct, total in zip(
+                by_entity.index, by_entity['correct'].tolist(), by_entity['answered'].tolist()
+            )
+        ]
+        sorted_entities = sorted(entity_perf_list, key=lambda x: x['avg'], reverse=True)
+        difference = round(sorted_entities[0]['avg'] - sorted_entities[-1]['avg'], 1) if len(sorted_entities) > 1 else 0
+
+        heatmap_data[subject_name] = {'questions': questions, 'schools': schools}
+        heatmap_summary[subject_name] = {
+            'easiest': sorted_by_perf[:3],
+            'hardest': sorted_by_perf[-3:][::-1],
+            'ranking': sorted_entities,
+            'overall_avg': _percent(int(subject_frame['correct'].sum()), int(subject_frame['answered'].sum())),
+            'difference': difference,
+        }
+
+    return heatmap_data, heatmap_summary
+
+
+def find_problematic_questions(question_frame, subject_id_to_name_map, top_n=3):
+    """Топ N самых сложных вопросов (с наименьшим % верных) по каждому предмету."""
+    frame = _by_entity_and_subject(question_frame[question_frame['answered'] > 0], subject_id_to_name_map)
+    frame = frame.assign(p=[_percent(c, t) for c, t in zip(frame['correct'].tolist(), frame['answered'].tolist())])
+
+    top_problems = {}
+    for subject_name, subject_frame in frame.groupby('subject', sort=False):
+        hardest = subject_frame.sort_values('p', kind='stable').head(top_n)
+        top_problems[subject_name] = [
+            {'q': q_num, 'p': p, 'school': entity_name}
+            for q_num, p, entity_name in zip(hardest['question_number'], hardest['p'].tolist(), hardest['entity_name'])
+        ]
+    return top_problems
+
+
+def find_at_risk_students(result_frame, subject_id_to_name_map, threshold=40):
+    """Ученики, чей средний % верных по предмету (среднее по результатам) ниже порога."""
+    frame = result_frame[result_frame['subject_id'].isin(list(subject_id_to_name_map))]
+    if frame.empty:
+        return []
+    frame = frame.assign(pct=(frame['correct'].to_numpy() / frame['answered'].to_numpy()) * 100)
+    averages = frame.groupby(['student_id', 'subject_id'], sort=False)['pct'].agg(['sum', 'count'])
+    averages['avg'] = averages['sum'] / averages['count']
+    at_risk = averages[averages['avg'] < threshold]
+    if at_risk.empty:
+        return []
+
+    student_ids = at_risk.index.get_level_values('student_id').unique().tolist()
+    labels = {
+        student_id: (f"{last_name} {first_name} ({class_name})", class_name, school_name)
+        for student_id, last_name, first_name, class_name, school_name in Student.objects.filter(pk__in=student_ids).values_list(
+            'id', 'last_name_ru', 'first_name_ru', 'school_class__name', 'school_class__school__name'
+        )
+    }
+    result = []
+    for (student_id, subject_id), avg in zip(at_risk.index, at_risk['avg'].tolist()):
+        name, class_name, school_name = labels[student_id]
+        result.append({
+            'name': name,
+            'class': class_name,
+            'school': school_name,
+            'subject': subject_id_to_name_map[subject_id],
+            'score': round(avg, 1),
+        })
+    # При равном проценте — по школе, классу и ФИО (прежний порядок зависел от порядка строк из БД)
+    return sorted(result, key=lambda x: (x['score'], x['school'], x['class'], x['name'], x['subject']))
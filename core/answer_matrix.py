@@ -0,0 +1,171 @@
+# D:\GAT\core\answer_matrix.py
+
+"""
+Компактное хранилище ответов по GAT-тесту (TestAnswerMatrix).
+
+Матрица строится один раз при записи результатов, а аналитика читает
+готовые битовые массивы через AnswerMatrix, не разбирая JSON
+scores_by_subject каждого StudentResult.
+"""
+
+import numpy as np
+
+from .models import StudentResult, TestAnswerMatrix
+
+
+def _question_sort_key(q_num):
+    return (0, int(q_num), q_num) if str(q_num).isdigit() else (1, 0, str(q_num))
+
+
+def rebuild_answer_matrix(gat_test):
+    """
+    Пересобирает TestAnswerMatrix для теста из StudentResult.scores_by_subject.
+    Если результатов нет — удаляет матрицу. Возвращает объект матрицы или None.
+    """
+    rows = list(
+        StudentResult.objects.filter(gat_test=gat_test)
+        .order_by('student_id')
+        .values_list('id', 'student_id', 'scores_by_subject')
+    )
+    if not rows:
+        TestAnswerMatrix.objects.filter(gat_test=gat_test).delete()
+        return None
+
+    # 1. Индекс колонок: предметы по id, вопросы по номеру
+    questions_by_subject = {}
+    for _, _, scores in rows:
+        if not isinstance(scores, dict):
+            continue
+        for subject_id_str, answers in scores.items():
+            if isinstance(answers, dict) and str(subject_id_str).isdigit():
+                questions_by_subject.setdefault(int(subject_id_str), set()).update(answers.keys())
+
+    columns, subject_index, column_pos = [], {}, {}
+    for subject_id in sorted(questions_by_subject):
+        start = len(columns)
+        for q_num in sorted(questions_by_subject[subject_id], key=_question_sort_key):
+            column_pos[(subject_id, q_num)] = len(columns)
+            columns.append([subject_id, q_num])
+        subject_index[str(subject_id)] = [start, len(columns)]
+
+    # 2. Заполняем булевы матрицы
+    correct = np.zeros((len(rows), len(columns)), dtype=bool)
+    answered = np.zeros((len(rows), len(columns)), dtype=bool)
+    for row_idx, (_, _, scores) in enumerate(rows):
+        if not isinstance(scores, dict):
+            continue
+        for subject_id_str, answers in scores.items():
+            if not (isinstance(answers, dict) and str(subject_id_str).isdigit()):
+                continue
+            subject_id = int(subject_id_str)
+            for q_num, value in answers.items():
+                col = column_pos[(subject_id, q_num)]
+                answered[row_idx, col] = True
+                correct[row_idx, col] = value is True
+
+    matrix, _ = TestAnswerMatrix.objects.update_or_create(
+        gat_test=gat_test,
+        defaults={
+            'n_students': len(rows),
+            'n_questions': len(columns),
+            'result_ids': [r[0] for r in rows],
+            'student_ids': [r[1] for r in rows],
+            'columns': columns,
+            'subject_index': subject_index,
+            'correct_bits': np.packbits(correct, axis=1).tobytes(),
+            'answered_bits': np.packbits(answered, axis=1).tobytes(),
+        }
+    )
+    return matrix
+
+
+class AnswerMatrix:
+    """
+    NumPy-обертка над TestAnswerMatrix.
+    correct / answered — булевы массивы формы (n_students, n_questions).
+    """
+
+    def __init__(self, stored):
+        self.gat_test_id = stored.gat_test_id
+        self.student_ids = np.asarray(stored.student_ids, dtype=np.int64)
+        self.result_ids = np.asarray(stored.result_ids, dtype=np.int64)
+        self.columns = [(int(s_id), q_num) for s_id, q_num in stored.columns]
+        self.subject_index = {int(s_id): tuple(bounds) for s_id, bounds in stored.subject_index.items()}
+        shape = (stored.n_students, stored.n_questions)
+        self.correct = self._unpack(stored.correct_bits, shape)
+        self.answered = self._unpack(stored.answered_bits, shape)
+
+    @staticmethod
+    def _unpack(data, shape):
+        n_rows, n_cols = shape
+        if not n_rows or not n_cols:
+            return np.zeros(shape, dtype=bool)
+        packed = np.frombuffer(bytes(data), dtype=np.uint8).reshape(n_rows, -1)
+        return np.unpackbits(packed, axis=1, count=n_cols).astype(bool)
+
+    @classmethod
+    def for_test(cls, gat_test):
+        """Загружает матрицу теста или возвращает None, если она еще не построена."""
+        gat_test_id = getattr(gat_test, 'pk', gat_test)
+        stored = TestAnswerMatrix.objects.filter(gat_test_id=gat_test_id).first()
+        return cls(stored) if stored else None
+
+    @property
+    def subject_ids(self):
+        return list(self.subject_index.keys())
+
+    def row_of(self, student_id):
+        """Номер строки ученика или None."""
+        idx = np.searchsorted(self.student_ids, student_id)
+        if idx < len(self.student_ids) and self.student_ids[idx] == student_id:
+            return int(idx)
+        return None
+
+    def subject_slice(self, subject_id):
+        start, end = self.subject_index.get(int(subject_id), (0, 0))
+        return slice(start, end)
+
+    def per_student_correct(self):
+        """Массив общего числа верных ответов по каждому ученику."""
+        return self.correct.sum(axis=1)
+
+    def per_subject_correct(self):
+        """{subject_id: массив числа верных ответов по ученикам}."""
+        return {
+            subject_id: self.correct[:, self.subject_slice(subject_id)].sum(axis=1)
+            for subject_id in self.subject_index
+        }
+
+    def per_subject_answered(self):
+        """{subject_id: массив числа ответов (есть в JSON) по ученикам}."""
+        return {
+            subject_id: self.answered[:, self.subject_slice(subject_id)].sum(axis=1)
+            for subject_id in self.subject_index
+        }
+
+    def has_subject(self):
+        """{subject_id: булев массив — есть ли у ученика ответы по предмету}."""
+        return {subject_id: counts > 0 for subject_id, counts in self.per_subject_answered().items()}
+
+    def per_question_correct(self, rows=None):
+        """{(subject_id, номер): (верно, всего ответов)}; rows — необязательная маска/индексы учеников."""
+        correct = self.correct if rows is None else self.correct[rows]
+        answered = self.answered if rows is None else self.answered[rows]
+        correct_sum, answered_sum = correct.sum(axis=0), answered.sum(axis=0)
+        return {
+            column: (int(correct_sum[i]), int(answered_sum[i]))
+            for i, column in enumerate(self.columns)
+        }
+
+    def student_subject_scores(self):
+        """{student_id: {subject_id: верных}} — только предметы, по которым у ученика есть ответы."""
+        correct_by_subject = self.per_subject_correct()
+        present_by_subject = self.has_subject()
+        scores = {}
+        for row, student_id in enumerate(self.student_ids.tolist()):
+            scores[student_id] = {
+                subject_id: int(correct_by_subject[subject_id][row])
+                for subject_id in self.subject_index
+                if present_by_subject[subject_id][row]
+            }
+        return scores
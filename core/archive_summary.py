@@ -0,0 +1,90 @@
+# D:\GAT\core\archive_summary.py
+
+"""
+Сводка архива результатов (ArchiveSummary).
+
+Навигация по архиву (годы → четверти → школы → параллели) читает готовые
+счетчики вместо Count(distinct) по цепочке четверть → тест → результат →
+ученик, которая тяжелеет с каждым годом истории. Группа — (четверть, школа
+теста, параллель теста) и итог той же параллели за год (quarter=NULL).
+
+Группа теста пересчитывается двумя агрегатами при загрузке/удалении
+результатов (refresh_results_derived_data), при переносе или удалении
+теста и при удалении результатов мимо загрузчика — очистка данных, удаление
+учеников (signals.py). rebuild_archive_summary пересобирает всю таблицу
+двумя GROUP BY (команда rebuild_archive_summary).
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import ArchiveSummary, GatTest, StudentResult
+
+COUNTS = {
+    'test_count': Count('gat_test', distinct=True),
+    'student_count': Count('student', distinct=True),
+    'result_count': Count('id'),
+}
+
+
+def archive_group(gat_test):
+    """(год, четверть, школа, параллель) теста или None, если четверть не указана."""
+    if gat_test is None or not gat_test.quarter_id:
+        return None
+    return gat_test.quarter.year_id, gat_test.quarter_id, gat_test.school_id, gat_test.school_class_id
+
+
+def stored_archive_group(test_id):
+    """Группа теста по данным в БД (до сохранения изменений)."""
+    return archive_group(GatTest.objects.select_related('quarter').filter(pk=test_id).first())
+
+
+def _refresh_row(lookup, defaults, results):
+    counts = results.aggregate(**COUNTS)
+    if counts['result_count']:
+        ArchiveSummary.objects.update_or_create(**lookup, defaults={**defaults, **counts})
+    else:
+        ArchiveSummary.objects.filter(**lookup).delete()
+
+
+@transaction.atomic
+def refresh_archive_group(year_id, quarter_id, school_id, class_id):
+    """Пересчитывает строку четверти и годовую строку одной группы."""
+    results = StudentResult.objects.filter(gat_test__school_id=school_id, gat_test__school_class_id=class_id)
+    group = {'school_id': school_id, 'school_class_id': class_id}
+    _refresh_row(
+        {**group, 'quarter_id': quarter_id}, {'year_id': year_id},
+        results.filter(gat_test__quarter_id=quarter_id),
+    )
+    _refresh_row(
+        {**group, 'year_id': year_id, 'quarter__isnull': True}, {},
+        results.filter(gat_test__quarter__year_id=year_id),
+    )
+
+
+def refresh_archive_for_test(gat_test):
+    """Обновляет сводку группы теста (тест без четверти в архив не попадает)."""
+    group = archive_group(gat_test)
+    if group:
+        refresh_archive_group(*group)
+
+
+@transaction.atomic
+def rebuild_archive_summary():
+    """Пересобирает всю сводку. Возвращает число строк."""
+    results = StudentResult.objects.filter(gat_test__quarter__isnull=False).order_by()
+    year_key = {
+        'year_id': 'gat_test__quarter__year_id',
+        'school_id': 'gat_test__school_id',
+        'school_class_id': 'gat_test__school_class_id',
+    }
+    rows = []
+    for key in ({**year_key, 'quarter_id': 'gat_test__quarter_id'}, year_key):
+        for group in results.values(*key.values()).annotate(**COUNTS):
+            rows.append(ArchiveSummary(
+                **{field: group[path] for field, path in key.items()},
+                **{name: group[name] for name in COUNTS},
+            ))
+    ArchiveSummary.objects.all().delete()
+    ArchiveSummary.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
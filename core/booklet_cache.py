@@ -0,0 +1,127 @@
+# D:\GAT\core\booklet_cache.py
+
+"""
+Кэш готовых буклетов (DOCX и PDF), адресуемый по содержимому.
+
+Имя файла — хеш всего, что влияет на документ: вопросы теста и их тексты,
+question_order, порядок и тексты вариантов, картинки и их ширина, шапка
+и версия шаблона. Пока хеш не изменился, файл отдается с диска без сборки.
+Сам хеш запоминается в кэше Django и сбрасывается сигналами при изменении
+теста, состава вопросов, вопросов и вариантов (см. core/signals.py);
+старые файлы теста при этом удаляются. Буклет варианта (BookletVariant)
+получает хеш от хеша теста и перестановок варианта.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.template.loader import get_template
+
+from .models import BankAnswerOption, BankQuestion, GatTest, JobFileStorage
+
+# Увеличить при изменении кода сборки DOCX/PDF (шаблон PDF учитывается автоматически)
+BOOKLET_BUILDER_VERSION = 2
+BOOKLET_TEMPLATES = {'pdf': 'booklet/booklet_pdf.html'}
+FINGERPRINT_KEY = 'booklet_fp:{}:{}'
+FINGERPRINT_TIMEOUT = 60 * 60 * 24
+
+storage = JobFileStorage()
+
+
+def _booklet_dir(test_id):
+    return f'booklets/{test_id}'
+
+
+def _template_version(fmt):
+    template_name = BOOKLET_TEMPLATES.get(fmt)
+    if not template_name:
+        return ''
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def compute_booklet_fingerprint(test, fmt):
+    """Хеш входных данных буклета теста в формате fmt ('docx' или 'pdf')."""
+    test = GatTest.objects.select_related('school_class', 'quarter__year').get(pk=test.pk)
+    questions = list(
+        BankQuestion.objects.filter(gat_tests=test).order_by('id').values_list(
+            'id', 'subject_id', 'subject__name', 'text', 'question_image', 'image_width', 'updated_at'
+        )
+    )
+    options = list(
+        BankAnswerOption.objects.filter(question__gat_tests=test).order_by('question_id', 'order', 'id').values_list(
+            'question_id', 'id', 'text', 'option_image', 'order', 'updated_at'
+        )
+    )
+    payload = {
+        'builder': BOOKLET_BUILDER_VERSION,
+        'template': _template_version(fmt),
+        'format': fmt,
+        'header': [
+            test.school_class.name, test.test_number, str(test.test_date),
+            test.quarter.year.name if test.quarter and test.quarter.year else '',
+        ],
+        'order': test.question_order or [],
+        'questions': questions,
+        'options': options,
+    }
+    raw = json.dumps(payload, default=str, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def booklet_fingerprint(test, fmt):
+    """Хеш из кэша Django (или вычисленный и сохраненный)."""
+    key = FINGERPRINT_KEY.format(test.pk, fmt)
+    fingerprint = cache.get(key)
+    if fingerprint is None:
+        fingerprint = compute_booklet_fingerprint(test, fmt)
+        cache.set(key, fingerprint, FINGERPRINT_TIMEOUT)
+    return fingerprint
+
+
+def booklet_path(test, fmt, variant=None):
+    fingerprint = booklet_fingerprint(test, fmt)
+    if variant is not None:
+        raw = json.dumps([fingerprint, variant.name, variant.question_ids, variant.option_orders])
+        fingerprint = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return f'{_booklet_dir(test.pk)}/{fingerprint}.{fmt}'
+
+
+def get_cached_booklet(test, fmt, variant=None):
+    """Имя готового файла в хранилище или None, если буклет нужно собрать."""
+    name = booklet_path(test, fmt, variant)
+    return name if storage.exists(name) else None
+
+
+def _store(name, content):
+    saved_name = storage.save(name, ContentFile(content))
+    if saved_name != name:
+        # Параллельная сборка успела сохранить тот же файл раньше
+        storage.delete(saved_name)
+    return name
+
+
+def get_or_build_booklet(test, fmt, build, variant=None):
+    """
+    Возвращает (имя файла, собран_заново). build() -> bytes вызывается только при промахе.
+    Имя берется до сборки: если данные поменяются во время сборки, файл окажется
+    под старым хешем и отдаваться больше не будет.
+    """
+    name = booklet_path(test, fmt, variant)
+    if storage.exists(name):
+        return name, False
+    return _store(name, build()), True
+
+
+def invalidate_booklet_cache(test_ids):
+    """Сбрасывает хеши и удаляет файлы буклетов указанных тестов."""
+    for test_id in test_ids:
+        cache.delete_many([FINGERPRINT_KEY.format(test_id, fmt) for fmt in ('docx', 'pdf')])
+        directory = _booklet_dir(test_id)
+        if not storage.exists(directory):
+            continue
+        _, files = storage.listdir(directory)
+        for filename in files:
+            storage.delete(f'{directory}/{filename}')
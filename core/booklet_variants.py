@@ -0,0 +1,255 @@
+# D:\GAT\core\booklet_variants.py
+
+"""
+Варианты буклетов GAT-теста (A, B, C, ...).
+
+Вариант хранит только перестановки и ключ (модель BookletVariant):
+- question_ids — id вопросов в порядке варианта; вопросы перемешиваются внутри
+  блока предмета (если shuffle_questions), блоки предметов остаются на местах,
+  чтобы колонки бланка (МАТ_1, МАТ_2, ...) не менялись между вариантами;
+- option_orders — для каждого вопроса номера исходных вариантов ответа
+  (с 1, в порядке order, id) в порядке показа (если shuffle_options);
+- answer_key — битовая маска верных позиций показа (бит 0 — «A»).
+
+Перестановки детерминированы: random.Random(f'{seed}:{вариант}'), поэтому
+повторная генерация с тем же зерном дает те же варианты. Все варианты
+набора тестов строятся за один проход по заранее загруженным вопросам
+и сохраняются одним bulk_create. Буклет варианта собирается по запросу
+(apply_variant поверх обычного порядка буклета), а загрузчик результатов
+векторно возвращает ответы к исходной нумерации (answer_map, unpermute_answers).
+"""
+
+import random
+import string
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .booklet_cache import invalidate_booklet_cache
+from .models import BankAnswerOption, BankQuestion, BookletVariant, GatTest, StudentResult
+
+MAX_VARIANTS = len(string.ascii_uppercase)
+# Сколько букв ответа различает загрузчик (A–H)
+MAX_OPTIONS = 8
+ANSWER_LETTERS = string.ascii_uppercase[:MAX_OPTIONS]
+
+
+def variant_names(count):
+    """['A', 'B', ...] — не больше MAX_VARIANTS."""
+    if not 1 <= count <= MAX_VARIANTS:
+        raise ValueError(f"Количество вариантов должно быть от 1 до {MAX_VARIANTS}")
+    return list(string.ascii_uppercase[:count])
+
+
+def key_letters(mask):
+    """Маска верных позиций -> буквы: 0b101 -> 'AC'."""
+    return ''.join(letter for i, letter in enumerate(string.ascii_uppercase) if mask >> i & 1)
+
+
+def order_booklet_questions(test, questions):
+    """
+    Исходный порядок буклета: блоки предметов по первому вопросу в question_order
+    (затем по названию), внутри блока — по question_order. Каждому вопросу
+    проставляется fixed_options — варианты ответа в порядке (order, id).
+    """
+    order_map = {qid: idx for idx, qid in enumerate(test.question_order or [])}
+
+    questions_by_subject = defaultdict(list)
+    for q in questions:
+        questions_by_subject[q.subject].append(q)
+
+    subject_order_map = {
+        subject: min(order_map.get(q.id, 999999) for q in q_list)
+        for subject, q_list in questions_by_subject.items()
+    }
+    sorted_subjects = sorted(questions_by_subject, key=lambda s: (subject_order_map[s], s.name))
+
+    ordered = []
+    for subject in sorted_subjects:
+        subject_questions = questions_by_subject[subject]
+        subject_questions.sort(key=lambda q: order_map.get(q.id, 999999))
+        ordered.extend(subject_questions)
+    for q in ordered:
+        q.fixed_options = sorted(q.options.all(), key=lambda option: (option.order, option.id))
+    return ordered
+
+
+def booklet_questions(test):
+    """Вопросы теста в исходном порядке буклета (варианты ответа загружены заранее)."""
+    return order_booklet_questions(test, list(test.questions.select_related('subject').prefetch_related('options')))
+
+
+def apply_variant(questions, variant):
+    """
+    Вопросы в порядке варианта, fixed_options — в порядке показа варианта.
+    questions — результат booklet_questions; вопросы, которых уже нет в варианте, пропускаются.
+    """
+    by_id = {q.id: q for q in questions}
+    result = []
+    for question_id, option_order in zip(variant.question_ids, variant.option_orders):
+        q = by_id.get(question_id)
+        if q is None:
+            continue
+        base_options = q.fixed_options
+        q.fixed_options = [base_options[pos - 1] for pos in option_order if pos <= len(base_options)]
+        result.append(q)
+    return result
+
+
+def _build_variant(test, questions, name, seed):
+    """Перестановки одного варианта из исходного порядка буклета (без запросов к БД)."""
+    rng = random.Random(f'{seed}:{name}')
+    blocks = defaultdict(list)
+    for q in questions:
+        blocks[q.subject_id].append(q)
+
+    question_ids, option_orders, answer_key = [], [], []
+    for block in blocks.values():  # dict сохраняет порядок блоков буклета
+        block = list(block)
+        if test.shuffle_questions:
+            rng.shuffle(block)
+        for q in block:
+            positions = list(range(1, len(q.fixed_options) + 1))
+            if test.shuffle_options:
+                rng.shuffle(positions)
+            question_ids.append(q.id)
+            option_orders.append(positions)
+            answer_key.append(sum(1 << i for i, pos in enumerate(positions) if q.fixed_options[pos - 1].is_correct))
+    return BookletVariant(
+        gat_test=test, name=name, seed=seed,
+        question_ids=question_ids, option_orders=option_orders, answer_key=answer_key,
+    )
+
+
+@transaction.atomic
+def generate_variants_for_tests(tests, count, seed=None, force=False):
+    """
+    Создает count вариантов для каждого теста (старые варианты заменяются).
+    seed по умолчанию — id теста. Если по тесту уже загружены результаты с
+    вариантами, перестановки менять нельзя (иначе ответы не сопоставятся) —
+    ValueError, если не передан force. Возвращает {id теста: [BookletVariant]}.
+    """
+    names = variant_names(count)
+    test_ids = [test.pk for test in tests]
+    if not force:
+        locked = set(
+            StudentResult.objects.filter(gat_test_id__in=test_ids, booklet_variant__isnull=False)
+            .exclude(booklet_variant='').values_list('gat_test_id', flat=True).distinct()
+        )
+        if locked:
+            raise ValueError(f"По тестам {sorted(locked)} уже загружены результаты с вариантами буклетов")
+
+    tests = list(
+        GatTest.objects.filter(pk__in=test_ids).prefetch_related(
+            Prefetch('questions', queryset=BankQuestion.objects.select_related('subject').prefetch_related('options'))
+        )
+    )
+    variants = []
+    for test in tests:
+        questions = order_booklet_questions(test, list(test.questions.all()))
+        test_seed = test.pk if seed is None else seed
+        variants += [_build_variant(test, questions, name, test_seed) for name in names]
+
+    BookletVariant.objects.filter(gat_test_id__in=test_ids).delete()
+    BookletVariant.objects.bulk_create(variants)
+    invalidate_booklet_cache(test_ids)
+
+    by_test = defaultdict(list)
+    for variant in variants:
+        by_test[variant.gat_test_id].append(variant)
+    return dict(by_test)
+
+
+def generate_variants(test, count, seed=None, force=False):
+    """Варианты одного теста: [BookletVariant]."""
+    return generate_variants_for_tests([test], count, seed=seed, force=force).get(test.pk, [])
+
+
+# --- Загрузка результатов ---
+
+def answer_map(gat_test):
+    """
+    Таблица для загрузчика: (Variant, subject_id, q_pos) -> q_index, key, opt_0..opt_{MAX_OPTIONS-1}.
+    q_pos — номер вопроса в предмете на бланке варианта, q_index — исходный номер
+    (N-й по id вопрос предмета, как в results_import_service._question_frame),
+    key — маска верных позиций показа, opt_i — исходная позиция варианта ответа,
+    показанного i-м (0 — нет такого). Строки с Variant='' — тест без вариантов.
+    """
+    questions = list(BankQuestion.objects.filter(gat_tests=gat_test).order_by('id').values_list('id', 'subject_id'))
+    correct = defaultdict(list)
+    for question_id, is_correct in (
+        BankAnswerOption.objects.filter(question__gat_tests=gat_test)
+        .order_by('question_id', 'order', 'id').values_list('question_id', 'is_correct')
+    ):
+        correct[question_id].append(is_correct)
+
+    subject_of, q_index, counters = {}, {}, defaultdict(int)
+    for question_id, subject_id in questions:
+        counters[subject_id] += 1
+        subject_of[question_id] = subject_id
+        q_index[question_id] = counters[subject_id]
+
+    def row(variant, position, question_id, option_order):
+        flags = correct[question_id]
+        key = sum(1 << i for i, pos in enumerate(option_order) if pos <= len(flags) and flags[pos - 1])
+        opts = (list(option_order) + [0] * MAX_OPTIONS)[:MAX_OPTIONS]
+        return [variant, subject_of[question_id], position, q_index[question_id], key, *opts]
+
+    rows = [row('', q_index[qid], qid, range(1, len(correct[qid]) + 1)) for qid, _ in questions]
+    for variant in BookletVariant.objects.filter(gat_test=gat_test):
+        positions = defaultdict(int)
+        for question_id, option_order in zip(variant.question_ids, variant.option_orders):
+            if question_id not in subject_of:
+                continue
+            positions[subject_of[question_id]] += 1
+            rows.append(row(variant.name, positions[subject_of[question_id]], question_id, option_order))
+
+    columns = ['Variant', 'subject_id', 'q_pos', 'q_index', 'key'] + [f'opt_{i}' for i in range(MAX_OPTIONS)]
+    # Явные типы: пустая таблица иначе получит object и merge по int-колонкам упадет
+    return pd.DataFrame(rows, columns=columns).astype({column: 'int64' for column in columns[1:]})
+
+
+def unpermute_answers(answers_df, mapping):
+    """
+    Возвращает ответы к исходной нумерации (векторно, одним merge).
+    answers_df: Code, subject_id, q_num, is_correct, letter (0 — «A», -1 — не буква), Variant.
+    Ответы-буквы проверяются по ключу варианта; для них chosen_option_order —
+    исходная позиция выбранного варианта ответа. Неизвестный вариант
+    считается исходным порядком. Результат — те же колонки (q_num уже исходный)
+    плюс chosen_option_order.
+    """
+    known = set(mapping['Variant'])
+    rows = answers_df.assign(
+        Variant=answers_df['Variant'].where(answers_df['Variant'].isin(known), ''),
+        q_pos=pd.to_numeric(answers_df['q_num'], errors='coerce').fillna(0).astype(int),
+    )
+    rows = rows.merge(mapping, on=['Variant', 'subject_id', 'q_pos'], how='left', sort=False)
+    matched = rows['q_index'].notna().to_numpy()
+
+    letters = rows['letter'].to_numpy(dtype=int)
+    is_letter = matched & (letters >= 0)
+    keys = rows['key'].fillna(0).to_numpy(dtype=np.int64)
+    safe_letters = np.clip(letters, 0, MAX_OPTIONS - 1)
+    letter_correct = ((keys >> safe_letters) & 1).astype(bool)
+    is_correct = np.where(is_letter, letter_correct, rows['is_correct'].to_numpy(dtype=bool))
+
+    opts = rows[[f'opt_{i}' for i in range(MAX_OPTIONS)]].fillna(0).to_numpy(dtype=np.int64)
+    chosen = opts[np.arange(len(rows)), safe_letters]
+    chosen_option_order = np.where(
+        is_letter & (chosen > 0), chosen.astype(object),
+        np.where(~is_letter & is_correct, 1, None),  # старое правило: 1 для верного ответа
+    )
+
+    q_num = np.where(matched, rows['q_index'].fillna(0).astype(int).astype(str), rows['q_num'].astype(str))
+    return pd.DataFrame({
+        'Code': rows['Code'].to_numpy(),
+        'subject_id': rows['subject_id'].to_numpy(),
+        'q_num': q_num,
+        'is_correct': is_correct,
+        'letter': letters,
+        'Variant': rows['Variant'].to_numpy(),
+        'chosen_option_order': chosen_option_order,
+    })
@@ -0,0 +1,66 @@
+# D:\GAT\core\dashboard_cache.py
+
+"""
+Кэш снимков главной панели (KPI, рейтинги, предметы, лучшие/худшие ученики,
+распределение оценок, динамика).
+
+Снимок зависит только от набора доступных школ, вида рейтинга (школы или
+классы) и периода, поэтому пользователи с одинаковой областью доступа делят
+один снимок. Ключ содержит две версии:
+- версию данных результатов — меняется при загрузке и удалении результатов
+  (refresh_results_derived_data, а также очисткой данных и удалением
+  учеников), изменении, удалении и составе вопросов теста и изменении
+  QuestionCount;
+- общую версию областей доступа (core/permission_scope.py) — меняется при
+  изменении школ, классов, предметов и учеников.
+Сброс — смена версии; снимок строится при первом заходе или командой
+`manage.py warm_dashboard_cache`.
+"""
+
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+
+from .permission_scope import GLOBAL_VERSION_KEY, _version, get_permission_scope
+
+RESULTS_VERSION_KEY = 'dashboard:v:results'
+SNAPSHOT_KEY = 'dashboard:{}:{}:{}'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def ranks_schools(user):
+    """Админы и эксперты видят рейтинг школ, остальные — рейтинг классов."""
+    return user.is_staff or (hasattr(user, 'profile') and user.profile.role == 'EXPERT')
+
+
+def snapshot_key(user, start_date, end_date):
+    scope = get_permission_scope(user)
+    raw = json.dumps({
+        'schools': sorted(scope.school_ids),
+        'rank_schools': ranks_schools(user),
+        'period': [str(start_date) if start_date else None, str(end_date) if end_date else None],
+    })
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return SNAPSHOT_KEY.format(_version(RESULTS_VERSION_KEY), _version(GLOBAL_VERSION_KEY), digest)
+
+
+def get_dashboard_snapshot(user, start_date, end_date, build):
+    """
+    Возвращает (снимок, собран_заново). build() -> dict вызывается только при промахе.
+    Ключ берется до сборки: если результаты изменятся во время сборки, снимок
+    окажется под старой версией и отдаваться больше не будет.
+    """
+    key = snapshot_key(user, start_date, end_date)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot, False
+    snapshot = build()
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot, True
+
+
+def invalidate_dashboard_snapshots():
+    """Сбрасывает все снимки панели (изменились результаты)."""
+    cache.set(RESULTS_VERSION_KEY, uuid.uuid4().hex, None)
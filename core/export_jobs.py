@@ -0,0 +1,120 @@
+# D:\GAT\core\export_jobs.py
+
+"""
+Обработчики фоновых задач экспорта (см. core/jobs.py).
+
+Каждый обработчик повторяет то, что раньше делало представление в запросе,
+но берет параметры из job.params, а пользователя — из job.created_by,
+и возвращает (имя_файла, содержимое).
+"""
+
+from django.http import QueryDict
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils import timezone
+from weasyprint import HTML
+
+from .jobs import job_handler
+from .models import BookletVariant, GatTest, SchoolClass, Student
+
+
+def _render_pdf(template_name, context, base_url=None):
+    html_string = render_to_string(template_name, context)
+    return HTML(string=html_string, base_url=base_url).write_pdf()
+
+
+def _report_pdf(job, mode, template_name, title):
+    from .views.utils_reports import get_report_context
+
+    job.report_progress(10, 'Сбор данных отчета')
+    context = get_report_context(QueryDict(job.params.get('query', '')), job.created_by, mode=mode)
+    context['title'] = title
+    job.report_progress(50, 'Формирование PDF')
+    return _render_pdf(template_name, context, job.params.get('base_url'))
+
+
+@job_handler('monitoring_pdf')
+def monitoring_pdf_job(job):
+    return 'monitoring_report.pdf', _report_pdf(job, 'monitoring', 'monitoring/monitoring_pdf.html', 'Отчет по мониторингу')
+
+
+@job_handler('grading_pdf')
+def grading_pdf_job(job):
+    return 'grading_report.pdf', _report_pdf(job, 'grading', 'grading/grading_pdf.html', 'Отчет по оценкам')
+
+
+@job_handler('detailed_results_pdf')
+def detailed_results_pdf_job(job):
+    from .views.reports_detailed import get_detailed_results_data
+
+    test_number = job.params['test_number']
+    job.report_progress(10, 'Сбор результатов')
+    students_data, table_header, test_info = get_detailed_results_data(
+        test_number, QueryDict(job.params.get('query', '')), job.created_by
+    )
+    if not students_data:
+        raise ValueError("Нет данных для экспорта.")
+
+    context = {
+        'title': f'Детальный рейтинг GAT-{test_number}',
+        'students_data': students_data,
+        'table_header': table_header,
+        'test_info': test_info,
+        'export_date': timezone.localdate(),
+        'total_students': len(students_data)
+    }
+    job.report_progress(50, 'Формирование PDF')
+    filename = f"GAT-{test_number}_results_{test_info.test_date if test_info else ''}.pdf"
+    return filename, _render_pdf('results/detailed_results_pdf.html', context, job.params.get('base_url'))
+
+
+@job_handler('booklet_pdf')
+def booklet_pdf_job(job):
+    from .booklet_cache import get_or_build_booklet, storage
+    from .views.student_exams import booklet_filename, render_booklet_pdf
+
+    test = get_object_or_404(
+        GatTest.objects.prefetch_related('questions__options', 'questions__subject'),
+        pk=job.params['test_pk']
+    )
+    variant = None
+    if job.params.get('variant'):
+        variant = get_object_or_404(BookletVariant, gat_test=test, name=job.params['variant'])
+    job.report_progress(10, 'Формирование PDF')
+    # Сборка идет через кэш буклетов: следующие скачивания отдаются сразу
+    name, _ = get_or_build_booklet(test, 'pdf', lambda: render_booklet_pdf(test, variant), variant)
+    with storage.open(name, 'rb') as f:
+        return booklet_filename(test, 'pdf', variant), f.read()
+
+
+@job_handler('accounts_pdf')
+def accounts_pdf_job(job):
+    from .account_provisioning import provision_student_accounts
+
+    school_class = SchoolClass.objects.select_related('school').get(pk=job.params['class_id'])
+    if job.params.get('is_parallel'):
+        students = Student.objects.filter(school_class__parent=school_class)
+        filename = f'logins_parallel_{school_class.name}.pdf'
+    else:
+        students = Student.objects.filter(school_class=school_class)
+        filename = f'logins_{school_class.name}.pdf'
+
+    def progress(done, total):
+        if done % 10 == 0 or done == total:
+            job.report_progress(80 * done // max(total, 1), f'Аккаунты: {done} из {total}')
+
+    credentials, created_count, reset_count = provision_student_accounts(
+        students, job.params.get('action'), progress=progress
+    )
+    if not credentials:
+        raise ValueError("Нет учеников для экспорта.")
+
+    job.report_progress(85, 'Формирование PDF')
+    content = _render_pdf('students/logins_pdf.html', {'credentials': credentials, 'school_class': school_class})
+
+    message_parts = []
+    if created_count > 0: message_parts.append(f"Создано {created_count} новых аккаунтов")
+    if reset_count > 0: message_parts.append(f"сброшен пароль для {reset_count} существующих")
+    if message_parts:
+        job.report_progress(100, ", ".join(message_parts).capitalize() + ". PDF-файл с актуальными данными сгенерирован.")
+    return filename, content
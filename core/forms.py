@@ -516,10 +516,16 @@ class UploadFileForm(forms.Form):
 
 
 class StudentUploadForm(forms.Form):
-    file = forms.FileField(label="Выберите Excel-файл (.xlsx)", widget=forms.FileInput(attrs={'accept': '.xlsx'}))
+    file = forms.FileField(label="Выберите файл (.xlsx или .csv)", widget=forms.FileInput(attrs={'accept': '.xlsx,.csv'}))
+    school = forms.ModelChoiceField(
+        queryset=School.objects.order_by('name'), required=False, label="Школа",
+        empty_label="Из колонки «школа» в файле",
+        help_text="Классы ищутся в этой школе. Если не выбрана — по колонке «школа» (код или название), иначе по названию класса.",
+    )
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['file'].widget.attrs.update({'class': 'mt-1 block w-full text-sm text-gray-900 border border-gray-300 rounded-lg cursor-pointer bg-gray-50 focus:outline-none'})
+        self.fields['school'].widget.attrs.update({'class': 'mt-1 block w-full rounded-lg border-gray-300 shadow-sm'})
 
 
 class TeacherNoteForm(BaseForm):
@@ -755,4 +761,9 @@ class ImportQuestionForm(forms.Form):
     file = forms.FileField(
         label="Выберите файл",
         widget=forms.FileInput(attrs={'class': 'mt-1 block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100'})
-    )
\ No newline at end of file
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label="Только проверить файл (без загрузки)",
+        widget=forms.CheckboxInput(attrs={'class': checkbox_class})
+    )
@@ -0,0 +1,234 @@
+# D:\GAT\core\gat_generator.py
+
+"""
+Автоматическая сборка GAT-тестов из банка вопросов.
+
+Для каждой параллели и каждого предмета с QuestionCount берется
+number_of_questions вопросов:
+- по сложности — в пропорции DifficultyRule (или DEFAULT_TARGETS), методом
+  наибольших остатков, чтобы сумма сходилась точно;
+- по темам — равномерно: следующий вопрос берется из темы, из которой взято
+  меньше всего (ничьи — случайно), так что каждая тема получает свою долю;
+- без вопросов из последних recent_tests тестов той же параллели. Если
+  «свежих» вопросов не хватает, недостающее добирается сначала из других
+  уровней сложности, затем из недавно использованных — с предупреждением.
+
+Все данные читаются заранее несколькими запросами на весь набор параллелей
+(кандидаты — одним values_list), подбор идет в памяти, а тесты и связи с
+вопросами создаются bulk_create. Поэтому сборка тестов для всей сети
+занимает секунды, сколько бы ни было параллелей.
+"""
+
+import random
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .models import BankQuestion, DifficultyRule, GatTest, QuestionCount
+from .question_assembly import DEFAULT_TARGETS, DIFFICULTIES
+
+RECENT_TESTS = 2
+# Чем добирать нехватку уровня сложности: сначала ближайший уровень
+FALLBACK_ORDER = {'EASY': ['MEDIUM', 'HARD'], 'MEDIUM': ['EASY', 'HARD'], 'HARD': ['MEDIUM', 'EASY']}
+
+
+@dataclass
+class GeneratedTest:
+    """Подобранные вопросы для одной параллели."""
+    parallel_id: int
+    question_ids: list = field(default_factory=list)
+    by_subject: dict = field(default_factory=dict)
+    warnings: list = field(default_factory=list)
+
+
+def split_by_percent(total, percents):
+    """
+    Делит total по процентам {ключ: %} методом наибольших остатков.
+    split_by_percent(10, {'EASY': 40, 'MEDIUM': 40, 'HARD': 20}) -> {'EASY': 4, 'MEDIUM': 4, 'HARD': 2}
+    """
+    weight = sum(percents.values()) or 1
+    exact = {key: total * pct / weight for key, pct in percents.items()}
+    counts = {key: int(value) for key, value in exact.items()}
+    rest = total - sum(counts.values())
+    for key in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:rest]:
+        counts[key] += 1
+    return counts
+
+
+class CandidateIndex:
+    """
+    Вопросы банка набора параллелей в памяти:
+    (параллель, предмет) -> сложность -> тема -> [id вопросов].
+    """
+
+    def __init__(self, parallel_ids):
+        self.pool = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        rows = (
+            BankQuestion.objects.filter(school_class_id__in=parallel_ids).order_by('id')
+            .values_list('id', 'school_class_id', 'subject_id', 'topic_id', 'difficulty')
+        )
+        for question_id, parallel_id, subject_id, topic_id, difficulty in rows:
+            self.pool[(parallel_id, subject_id)][difficulty][topic_id].append(question_id)
+
+    def topics(self, parallel_id, subject_id):
+        return {topic for by_topic in self.pool[(parallel_id, subject_id)].values() for topic in by_topic}
+
+    def buckets(self, parallel_id, subject_id, difficulty, exclude):
+        """Копия кандидатов уровня по темам без исключенных id."""
+        by_topic = self.pool[(parallel_id, subject_id)].get(difficulty, {})
+        buckets = {}
+        for topic_id, ids in by_topic.items():
+            left = [qid for qid in ids if qid not in exclude]
+            if left:
+                buckets[topic_id] = left
+        return buckets
+
+
+def recent_question_ids(parallel_ids, recent_tests=RECENT_TESTS, exclude_test_ids=()):
+    """{параллель: set(id вопросов)} из последних recent_tests тестов каждой параллели."""
+    recent = defaultdict(set)
+    if recent_tests <= 0:
+        return recent
+    tests_by_parallel = defaultdict(list)
+    tests = (
+        GatTest.objects.filter(school_class_id__in=parallel_ids).exclude(pk__in=exclude_test_ids)
+        .order_by('-test_date', '-pk').values_list('pk', 'school_class_id')
+    )
+    for test_id, parallel_id in tests:
+        if len(tests_by_parallel[parallel_id]) < recent_tests:
+            tests_by_parallel[parallel_id].append(test_id)
+    parallel_of_test = {tid: pid for pid, tids in tests_by_parallel.items() for tid in tids}
+    links = GatTest.questions.through.objects.filter(gattest_id__in=parallel_of_test).values_list('gattest_id', 'bankquestion_id')
+    for test_id, question_id in links:
+        recent[parallel_of_test[test_id]].add(question_id)
+    return recent
+
+
+def _pick_spread(buckets, count, topic_counts, rng):
+    """Берет до count вопросов, каждый раз из наименее представленной темы."""
+    picked = []
+    while len(picked) < count and buckets:
+        least = min(topic_counts[topic_id] for topic_id in buckets)
+        topic_id = rng.choice(sorted(t for t in buckets if topic_counts[t] == least))
+        ids = buckets[topic_id]
+        picked.append(ids.pop(rng.randrange(len(ids))))
+        topic_counts[topic_id] += 1
+        if not ids:
+            del buckets[topic_id]
+    return picked
+
+
+def _pick_subject(index, parallel_id, subject_id, total, percents, recent, rng):
+    """Вопросы одного предмета: (id, предупреждения)."""
+    quotas = split_by_percent(total, {code: percents[key] for key, code in DIFFICULTIES})
+    topic_counts = dict.fromkeys(index.topics(parallel_id, subject_id), 0)
+    chosen, warnings = set(), []
+
+    def take(difficulty, count, exclude):
+        picked = _pick_spread(index.buckets(parallel_id, subject_id, difficulty, exclude | chosen), count, topic_counts, rng)
+        chosen.update(picked)
+        return picked
+
+    # 1. Точные квоты по сложности из «свежих» вопросов
+    ordered = []
+    shortages = {}
+    for _, difficulty in DIFFICULTIES:
+        picked = take(difficulty, quotas[difficulty], recent)
+        ordered += picked
+        shortages[difficulty] = quotas[difficulty] - len(picked)
+
+    # 2. Нехватку уровня добираем ближайшей сложностью
+    for difficulty, shortage in shortages.items():
+        for other in FALLBACK_ORDER[difficulty]:
+            if shortage <= 0:
+                break
+            picked = take(other, shortage, recent)
+            ordered += picked
+            shortage -= len(picked)
+        if shortage < shortages[difficulty]:
+            warnings.append(f"уровень {difficulty}: {shortages[difficulty] - shortage} вопросов другой сложности")
+
+    # 3. Последнее средство — недавно использованные вопросы (сначала нужной сложности)
+    if len(ordered) < total and recent:
+        reused = 0
+        for _, difficulty in DIFFICULTIES:
+            picked = take(difficulty, total - len(ordered), set())
+            ordered += picked
+            reused += len(picked)
+        if reused:
+            warnings.append(f"взято {reused} вопросов из недавних тестов")
+    if len(ordered) < total:
+        warnings.append(f"в банке только {len(ordered)} из {total} вопросов")
+    return ordered, warnings
+
+
+def plan_tests(parallel_ids, subject_ids=None, recent_tests=RECENT_TESTS, exclude_test_ids=(), seed=None):
+    """
+    Подбирает вопросы для каждой параллели: {параллель: GeneratedTest}.
+    subject_ids ограничивает предметы (например, предметы одного дня GAT).
+    """
+    rng = random.Random(seed)
+    parallel_ids = list(parallel_ids)
+    counts = QuestionCount.objects.filter(school_class_id__in=parallel_ids, number_of_questions__gt=0)
+    if subject_ids is not None:
+        counts = counts.filter(subject_id__in=subject_ids)
+    counts = list(counts.select_related('subject').order_by('school_class_id', 'subject__name'))
+    rules = {
+        (rule.school_class_id, rule.subject_id): {'easy': rule.easy_percent, 'medium': rule.medium_percent, 'hard': rule.hard_percent}
+        for rule in DifficultyRule.objects.filter(school_class_id__in=parallel_ids)
+    }
+    recent = recent_question_ids(parallel_ids, recent_tests, exclude_test_ids)
+    index = CandidateIndex(parallel_ids)
+
+    plans = {pid: GeneratedTest(parallel_id=pid) for pid in parallel_ids}
+    for count in counts:
+        plan = plans[count.school_class_id]
+        ids, warnings = _pick_subject(
+            index, count.school_class_id, count.subject_id, count.number_of_questions,
+            rules.get((count.school_class_id, count.subject_id), DEFAULT_TARGETS),
+            recent[count.school_class_id], rng,
+        )
+        plan.by_subject[count.subject_id] = ids
+        plan.question_ids += ids
+        plan.warnings += [f"{count.subject.name}: {warning}" for warning in warnings]
+    for plan in plans.values():
+        if not plan.by_subject:
+            plan.warnings.append("для параллели не настроено количество вопросов (QuestionCount)")
+    return plans
+
+
+@transaction.atomic
+def fill_test(test, recent_tests=RECENT_TESTS, seed=None):
+    """Заменяет вопросы существующего теста подобранными. Возвращает GeneratedTest."""
+    plan = plan_tests([test.school_class_id], recent_tests=recent_tests, exclude_test_ids=[test.pk], seed=seed)[test.school_class_id]
+    test.questions.set(plan.question_ids)
+    test.question_order = plan.question_ids
+    test.save(update_fields=['question_order'])
+    return plan
+
+
+@transaction.atomic
+def create_generated_tests(parallels, name_template, test_number, test_date, quarter=None, day=1,
+                           subject_ids=None, recent_tests=RECENT_TESTS, seed=None):
+    """
+    Создает по тесту на каждую параллель (SchoolClass без parent) с подобранными
+    вопросами. name_template форматируется полями parallel и school.
+    Возвращает [(GatTest, GeneratedTest)].
+    """
+    parallels = list(parallels)
+    plans = plan_tests([p.pk for p in parallels], subject_ids=subject_ids, recent_tests=recent_tests, seed=seed)
+    tests = GatTest.objects.bulk_create([
+        GatTest(
+            name=name_template.format(parallel=parallel.name, school=parallel.school.name),
+            school_id=parallel.school_id, school_class=parallel, test_number=test_number,
+            test_date=test_date, quarter=quarter, day=day,
+            question_order=plans[parallel.pk].question_ids,
+        )
+        for parallel in parallels
+    ])
+    GatTest.questions.through.objects.bulk_create([
+        GatTest.questions.through(gattest_id=test.pk, bankquestion_id=question_id)
+        for test in tests for question_id in plans[test.school_class_id].question_ids
+    ], batch_size=5000)
+    return [(test, plans[test.school_class_id]) for test in tests]
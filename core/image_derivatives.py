@@ -0,0 +1,246 @@
+# D:\GAT\core\image_derivatives.py
+
+"""
+Уменьшенные копии (производные) картинок вопросов и вариантов ответа.
+
+Оригиналы — часто многомегабайтные фото с телефона — хранятся как загружены,
+а страницы и документы берут производные:
+- 'thumb' — WebP до 320 px для списков и карточек банка вопросов;
+- 'web' — WebP до 1280 px для предпросмотра буклета и окна просмотра вопроса;
+- 'print' — для PDF (WeasyPrint) и DOCX: 300 dpi по ширине колонки буклета
+  с учетом image_width вопроса. JPEG для JPEG-оригиналов, PNG для остальных
+  (схемы, скриншоты, прозрачность): WebP не понимает python-docx.
+Перед уменьшением применяется поворот из EXIF; картинки меньше цели не увеличиваются.
+
+Имя файла — хеш имени оригинала, вида и целевого размера: новая картинка или
+новая ширина дают новый файл, а прежний просто перестает использоваться.
+Производные строит фоновая задача 'image_derivatives' после сохранения вопроса
+или варианта (core/signals.py) и после импорта (core/import_service.py), а для
+уже загруженных картинок — команда `manage.py build_image_derivatives`.
+Пока производной нет, страницы показывают оригинал, а сборка PDF/DOCX строит ее на месте.
+"""
+
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .jobs import enqueue_job, job_handler
+from .models import BankAnswerOption, BankQuestion
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'image_derivatives'
+# Увеличить при изменении параметров сжатия: все производные пересоберутся под новыми именами
+DERIVATIVE_VERSION = 1
+DERIVATIVES_DIR = 'derivatives'
+
+PRINT_DPI = 300
+# Ширина колонки буклета: A4 без полей 15 мм, две колонки с зазором 8 мм (booklet/booklet_pdf.html)
+BOOKLET_COLUMN_MM = 86
+# Картинка варианта: половина колонки; по высоте PDF ограничивает ее 50px (~13 мм), берем с запасом
+OPTION_PRINT_BOX_MM = (BOOKLET_COLUMN_MM / 2, 40)
+
+WEB_SIZES = {'thumb': (320, 320), 'web': (1280, 1280)}
+WEBP_QUALITY = {'thumb': 75, 'web': 82}
+JPEG_QUALITY = 88
+KINDS = ('thumb', 'web', 'print')
+
+
+def _mm_to_px(mm):
+    return round(mm / 25.4 * PRINT_DPI)
+
+
+def width_fraction(image_width):
+    """Доля ширины колонки из image_width ('45.5%', '300px'); по умолчанию 1."""
+    value = str(image_width or '').strip().lower()
+    try:
+        if value.endswith('%'):
+            fraction = float(value[:-1]) / 100
+        elif value.endswith('px'):
+            # CSS-пиксели (96 на дюйм) относительно ширины колонки
+            fraction = float(value[:-2]) / 96 * 25.4 / BOOKLET_COLUMN_MM
+        else:
+            return 1.0
+    except ValueError:
+        return 1.0
+    return min(max(fraction, 0.1), 1.0)
+
+
+def _target_size(kind, image_width=None, is_option=False):
+    if kind in WEB_SIZES:
+        return WEB_SIZES[kind]
+    if is_option:
+        return tuple(_mm_to_px(mm) for mm in OPTION_PRINT_BOX_MM)
+    width = _mm_to_px(BOOKLET_COLUMN_MM * width_fraction(image_width))
+    # По высоте PDF все равно ограничивает картинку, берем с запасом
+    return width, width * 2
+
+
+def _format(kind, source_name):
+    if kind != 'print':
+        return 'WEBP'
+    ext = posixpath.splitext(source_name)[1].lower()
+    return 'JPEG' if ext in ('.jpg', '.jpeg') else 'PNG'
+
+
+def derivative_name(field_file, kind, image_width=None, is_option=False):
+    """Имя производной в хранилище оригинала (существует она или нет)."""
+    width, height = _target_size(kind, image_width, is_option)
+    raw = f"{DERIVATIVE_VERSION}:{field_file.name}:{kind}:{width}x{height}"
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    ext = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}[_format(kind, field_file.name)]
+    return f"{DERIVATIVES_DIR}/{kind}/{digest[:2]}/{digest}.{ext}"
+
+
+def render_derivative(source, kind, size, fmt):
+    """Уменьшает картинку из файлового объекта source. Возвращает bytes в формате fmt."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS)
+        output = io.BytesIO()
+        if fmt == 'JPEG':
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # Прозрачность на белый фон, как на бумаге
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        elif fmt == 'PNG':
+            if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            image.save(output, 'PNG', optimize=True)
+        else:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+            image.save(output, 'WEBP', quality=WEBP_QUALITY[kind], method=6)
+        return output.getvalue()
+
+
+def build_derivative(field_file, kind, image_width=None, is_option=False, force=False):
+    """Строит производную, если ее еще нет. Возвращает (имя, построена_заново)."""
+    storage = field_file.storage
+    name = derivative_name(field_file, kind, image_width, is_option)
+    if storage.exists(name):
+        if not force:
+            return name, False
+        storage.delete(name)
+
+    size = _target_size(kind, image_width, is_option)
+    with storage.open(field_file.name, 'rb') as source:
+        content = render_derivative(source, kind, size, _format(kind, field_file.name))
+    saved_name = storage.save(name, ContentFile(content))
+    if saved_name != name:
+        # Параллельная сборка успела сохранить тот же файл раньше
+        storage.delete(saved_name)
+    return name, True
+
+
+def derivative_url(field_file, kind):
+    """URL производной 'thumb' или 'web', а пока ее нет — URL оригинала."""
+    if not field_file:
+        return ''
+    name = derivative_name(field_file, kind)
+    storage = field_file.storage
+    return storage.url(name) if storage.exists(name) else field_file.url
+
+
+def print_image_path(field_file, image_width=None, is_option=False):
+    """
+    Путь на диске к печатной производной для WeasyPrint и python-docx.
+    Строит ее при отсутствии; если картинку не удалось прочитать — путь оригинала.
+    """
+    try:
+        name, _ = build_derivative(field_file, 'print', image_width, is_option)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Не удалось построить печатную копию %s", field_file.name, exc_info=True)
+        return field_file.path
+    return field_file.storage.path(name)
+
+
+# --- ВОПРОСЫ И ВАРИАНТЫ ---
+
+def _instance_images(instance):
+    """[(файл, вид, image_width, это_вариант)] для всех производных картинки вопроса или варианта."""
+    if isinstance(instance, BankQuestion):
+        field_file, image_width, is_option = instance.question_image, instance.image_width, False
+    else:
+        field_file, image_width, is_option = instance.option_image, None, True
+    if not field_file:
+        return []
+    return [(field_file, kind, image_width, is_option) for kind in KINDS]
+
+
+def has_missing_derivatives(instance):
+    return any(
+        not field_file.storage.exists(derivative_name(field_file, kind, image_width, is_option))
+        for field_file, kind, image_width, is_option in _instance_images(instance)
+    )
+
+
+def build_instance_derivatives(instance, force=False):
+    """Строит все производные картинки вопроса или варианта. Возвращает число построенных."""
+    built = 0
+    for field_file, kind, image_width, is_option in _instance_images(instance):
+        _, is_new = build_derivative(field_file, kind, image_width, is_option, force=force)
+        built += is_new
+    return built
+
+
+def schedule_image_derivatives(question_ids=(), option_ids=()):
+    """Ставит построение производных в очередь после фиксации транзакции."""
+    params = {'question_ids': sorted(set(question_ids)), 'option_ids': sorted(set(option_ids))}
+    if not params['question_ids'] and not params['option_ids']:
+        return
+    count = len(params['question_ids']) + len(params['option_ids'])
+    transaction.on_commit(lambda: enqueue_job(JOB_KIND, params=params, title=f"Копии картинок: {count}"))
+
+
+def iter_image_instances(question_ids=None, option_ids=None):
+    """Вопросы и варианты с картинками (все или с указанными ID), без лишних полей."""
+    questions = BankQuestion.objects.exclude(question_image='').exclude(question_image__isnull=True)
+    options = BankAnswerOption.objects.exclude(option_image='').exclude(option_image__isnull=True)
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+    if option_ids is not None:
+        options = options.filter(pk__in=option_ids)
+    yield from questions.only('id', 'question_image', 'image_width').order_by('id').iterator()
+    yield from options.only('id', 'option_image').order_by('id').iterator()
+
+
+def build_derivatives_for(instances, force=False, progress=None):
+    """Строит производные для instances. Возвращает (построено файлов, картинок с ошибкой)."""
+    built, failed = 0, 0
+    for done, instance in enumerate(instances, 1):
+        try:
+            built += build_instance_derivatives(instance, force=force)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning("Не удалось построить копии картинки %r", instance, exc_info=True)
+            failed += 1
+        if progress:
+            progress(done)
+    return built, failed
+
+
+@job_handler(JOB_KIND)
+def image_derivatives_job(job):
+    question_ids, option_ids = job.params.get('question_ids', []), job.params.get('option_ids', [])
+    total = len(question_ids) + len(option_ids)
+
+    def progress(done):
+        if done % 20 == 0:
+            job.report_progress(100 * done // max(total, 1), f"Картинок: {done} из {total}")
+
+    built, failed = build_derivatives_for(iter_image_instances(question_ids, option_ids), progress=progress)
+    message = f"Построено копий: {built}"
+    if failed:
+        message += f", не удалось прочитать картинок: {failed}"
+    job.report_progress(100, message)
+    return None
@@ -1,166 +1,244 @@
+# D:\GAT\core\import_service.py
+
+"""
+Импорт вопросов в банк из Excel и Word.
+
+Импорт идет в три шага:
+1. Разбор файла в список вопросов (без обращений к БД):
+   {'label', 'text', 'image', 'options': [{'text', 'is_correct', 'image'}]},
+   где image — (sha256, bytes, расширение) или None.
+2. Проверка каждого вопроса; ошибки попадают в отчет с привязкой к вопросу
+   (строка Excel или начало текста вопроса в Word). При dry_run на этом
+   все заканчивается.
+3. Запись: одинаковые картинки (по хешу содержимого) сохраняются один раз,
+   файлы пишутся в пуле потоков, вопросы и варианты — двумя bulk_create.
+   Уменьшенные копии картинок строит фоновая задача (core/image_derivatives.py).
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-from docx import Document
-from django.db import transaction
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from docx import Document
+from docx.oxml.ns import qn
+
+from .image_derivatives import schedule_image_derivatives
 from .models import BankQuestion, BankAnswerOption
 
-def process_import(file, file_type, topic, user):
+IMAGE_WRITE_WORKERS = 8
+BULK_BATCH_SIZE = 500
+_BLIP = qn('a:blip')
+_EMBED = qn('r:embed')
+
+
+def process_import(file, file_type, topic, user, dry_run=False):
+    """
+    Возвращает (число вопросов, ошибки). При dry_run файл только проверяется:
+    число — сколько вопросов было бы загружено.
+    """
     if file_type == 'excel':
-        return _import_from_excel(file, topic, user)
+        parsed, errors = _parse_excel(file)
     elif file_type == 'word':
-        return _import_from_word(file, topic, user)
+        parsed, errors = _parse_word(file)
     else:
         return 0, ["Неподдерживаемый формат файла"]
 
-# --- 1. EXCEL (Без изменений) ---
-def _import_from_excel(file, topic, user):
+    valid = []
+    for question in parsed:
+        error = _validate_question(question)
+        if error:
+            errors.append(f"{question['label']}: {error}")
+        else:
+            valid.append(question)
+
+    if dry_run or not valid:
+        return len(valid), errors
+    return _save_questions(valid, topic, user), errors
+
+
+# --- 1. РАЗБОР ФАЙЛА ---
+
+def _parse_excel(file):
     try:
         df = pd.read_excel(file)
         df.columns = df.columns.str.strip().str.lower()
     except Exception as e:
-        return 0, [f"Ошибка чтения Excel: {e}"]
-
-    created_count = 0
-    errors = []
+        return [], [f"Ошибка чтения Excel: {e}"]
 
     col_q = next((c for c in df.columns if 'вопрос' in c or 'question' in c), None)
     col_correct = next((c for c in df.columns if 'правильный' in c or 'correct' in c), None)
     cols_wrong = [c for c in df.columns if 'option' in c or 'вариант' in c or 'неверн' in c or 'wrong' in c]
 
     if not col_q or not col_correct:
-        return 0, ["В файле нет колонок 'Вопрос' или 'Правильный ответ'."]
-
-    for index, row in df.iterrows():
-        try:
-            text = str(row[col_q]).strip()
-            correct_text = str(row[col_correct]).strip()
-            if not text or text == 'nan': continue
-
-            with transaction.atomic():
-                question = BankQuestion.objects.create(
-                    topic=topic, subject=topic.subject, school_class=topic.school_class,
-                    text=text, author=user, difficulty='MEDIUM'
-                )
-                BankAnswerOption.objects.create(question=question, text=correct_text, is_correct=True)
-                for col_w in cols_wrong:
-                    wrong_text = str(row[col_w]).strip()
-                    if wrong_text and wrong_text != 'nan' and wrong_text != correct_text:
-                         BankAnswerOption.objects.create(question=question, text=wrong_text, is_correct=False)
-            created_count += 1
-        except Exception as e:
-            errors.append(f"Ошибка в строке {index+2}: {e}")
-    return created_count, errors
-
-# --- 2. WORD (С картинками везде) ---
-
-def _extract_image_from_paragraph(paragraph, doc):
-    """Ищет картинку в параграфе."""
-    for run in paragraph.runs:
-        if 'drawing' in run.element.xml:
-            blips = run.element.findall('.//{http://schemas.openxmlformats.org/drawingml/2006/main}blip')
-            for blip in blips:
-                embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                if embed:
-                    image_part = doc.part.related_parts[embed]
-                    image_bytes = image_part._blob
-                    content_type = image_part.content_type
-                    ext = content_type.split('/')[-1] if '/' in content_type else 'jpg'
-                    filename = f"img.{ext}"
-                    return image_bytes, filename
-    return None, None
-
-def _import_from_word(file, topic, user):
+        return [], ["В файле нет колонок 'Вопрос' или 'Правильный ответ'."]
+
+    questions = []
+    frame = df[[col_q, col_correct, *cols_wrong]].astype(str).apply(lambda col: col.str.strip())
+    for index, row in enumerate(frame.itertuples(index=False, name=None)):
+        text, correct_text, wrong_texts = row[0], row[1], row[2:]
+        if not text or text == 'nan':
+            continue
+        options = [{'text': correct_text, 'is_correct': True, 'image': None}]
+        options += [
+            {'text': wrong_text, 'is_correct': False, 'image': None}
+            for wrong_text in wrong_texts
+            if wrong_text and wrong_text != 'nan' and wrong_text != correct_text
+        ]
+        questions.append({'label': f"Ошибка в строке {index + 2}", 'text': text, 'image': None, 'options': options})
+    return questions, []
+
+
+def _paragraph_image(paragraph, part, images):
+    """Первая картинка абзаца как (sha256, bytes, расширение); images — кэш по rId."""
+    for blip in paragraph._p.iter(_BLIP):
+        embed = blip.get(_EMBED)
+        if not embed:
+            continue
+        if embed not in images:
+            image_part = part.related_parts[embed]
+            content_type = image_part.content_type
+            ext = content_type.split('/')[-1] if '/' in content_type else 'jpg'
+            blob = image_part.blob
+            images[embed] = (hashlib.sha256(blob).hexdigest(), blob, ext)
+        return images[embed]
+    return None
+
+
+def _parse_word(file):
+    """
+    Абзац без маркера — текст вопроса (несколько абзацев подряд склеиваются),
+    абзац с '+' / '-' — правильный / неверный вариант. Картинка без текста
+    крепится к последнему варианту, а если вариантов еще нет — к вопросу.
+    """
     try:
         doc = Document(file)
     except Exception as e:
-        return 0, [f"Ошибка чтения Word: {e}"]
-
-    created_count = 0
-    errors = []
-    
-    # Данные текущего вопроса
-    current_q_text = None
-    current_q_image = None
-    current_opts = [] # Список словарей: {'text': str, 'is_correct': bool, 'image': (bytes, name)}
-
-    def save_q():
-        nonlocal current_q_text, current_q_image, current_opts, created_count
-        if current_q_text and len(current_opts) >= 2:
-            try:
-                with transaction.atomic():
-                    # 1. Сохраняем вопрос
-                    q = BankQuestion.objects.create(
-                        topic=topic, subject=topic.subject, school_class=topic.school_class,
-                        text=current_q_text, author=user
-                    )
-                    if current_q_image:
-                        q.question_image.save(current_q_image[1], ContentFile(current_q_image[0]), save=True)
-
-                    # 2. Сохраняем варианты ответов
-                    for opt in current_opts:
-                        option_obj = BankAnswerOption.objects.create(
-                            question=q, text=opt['text'], is_correct=opt['is_correct']
-                        )
-                        # Если у варианта есть картинка -> сохраняем её
-                        if opt['image']:
-                            option_obj.option_image.save(opt['image'][1], ContentFile(opt['image'][0]), save=True)
-                            
-                created_count += 1
-            except Exception as e:
-                errors.append(f"Ошибка вопроса '{current_q_text[:15]}...': {e}")
-        
-        # Очистка
-        current_q_text = None
-        current_q_image = None
-        current_opts = []
+        return [], [f"Ошибка чтения Word: {e}"]
+
+    questions = []
+    images = {}
+    current = None
+
+    def finish():
+        if current and current['text']:
+            current['label'] = f"Ошибка вопроса '{current['text'][:15]}...'"
+            questions.append(current)
 
     for para in doc.paragraphs:
         text = para.text.strip()
-        image_data = _extract_image_from_paragraph(para, doc) # (bytes, filename) или (None, None)
+        image = _paragraph_image(para, doc.part, images)
 
         # Пустая строка без картинки -> пропускаем
-        if not text and not image_data[0]:
+        if not text and not image:
             continue
 
+        if current is None:
+            current = {'text': None, 'image': None, 'options': []}
+
         # --- ЭТО ВАРИАНТ ОТВЕТА? (+/-) ---
         if text.startswith('+') or text.startswith('-'):
-            is_correct = text.startswith('+')
-            clean_text = text[1:].strip()
-            
-            # Добавляем новый вариант в список
-            current_opts.append({
-                'text': clean_text,
-                'is_correct': is_correct,
-                'image': image_data if image_data[0] else None # Если картинка на той же строке
-            })
+            current['options'].append({'text': text[1:].strip(), 'is_correct': text.startswith('+'), 'image': image})
 
         # --- ЭТО ВОПРОС? (Текст без маркеров) ---
         elif text:
-            # Если уже есть накопленные ответы -> значит начался НОВЫЙ вопрос -> сохраняем старый
-            if current_opts:
-                save_q()
-
-            if current_q_text:
-                # Если текст вопроса идет в несколько абзацев, склеиваем
-                current_q_text += "\n" + text
-            else:
-                current_q_text = text
-            
-            # Если в строке вопроса есть картинка
-            if image_data[0]:
-                current_q_image = image_data
+            # Уже есть варианты -> начался НОВЫЙ вопрос
+            if current['options']:
+                finish()
+                current = {'text': None, 'image': None, 'options': []}
+            current['text'] = f"{current['text']}\n{text}" if current['text'] else text
+            if image:
+                current['image'] = image
 
         # --- ЭТО ПРОСТО КАРТИНКА (БЕЗ ТЕКСТА) ---
-        elif image_data[0]:
-            # Куда её прикрепить?
-            
-            if current_opts:
-                # Если уже есть варианты ответов -> крепим к ПОСЛЕДНЕМУ варианту
-                # (Логика: текст ответа, а под ним картинка)
-                current_opts[-1]['image'] = image_data
-            else:
-                # Если вариантов еще нет -> крепим к ВОПРОСУ
-                current_q_image = image_data
-
-    save_q() # Сохраняем последний вопрос
-    return created_count, errors
\ No newline at end of file
+        elif current['options']:
+            current['options'][-1]['image'] = image
+        else:
+            current['image'] = image
+
+    finish()
+    return questions, []
+
+
+# --- 2. ПРОВЕРКА ---
+
+_OPTION_MAX_LENGTH = BankAnswerOption._meta.get_field('text').max_length
+
+
+def _validate_question(question):
+    """Текст ошибки или None (то, на чем раньше падало сохранение вопроса)."""
+    if len(question['options']) < 2:
+        return "меньше двух вариантов ответа."
+    for option in question['options']:
+        if len(option['text']) > _OPTION_MAX_LENGTH:
+            return f"вариант ответа длиннее {_OPTION_MAX_LENGTH} символов."
+    return None
+
+
+# --- 3. ЗАПИСЬ ---
+
+def _write_image(name, blob):
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(blob))
+
+
+def _store_images(questions):
+    """
+    Сохраняет каждую уникальную картинку один раз (имя файла — хеш содержимого,
+    файл с таким именем переиспользуется). Возвращает {(папка, sha256): имя файла}.
+    """
+    pending = {}
+    for question in questions:
+        items = [('question_images', question['image'])]
+        items += [('option_images', option['image']) for option in question['options']]
+        for folder, image in items:
+            if image:
+                digest, blob, ext = image
+                pending.setdefault((folder, digest), (f"{folder}/{digest}.{ext}", blob))
+    if not pending:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(IMAGE_WRITE_WORKERS, len(pending))) as pool:
+        names = pool.map(lambda item: _write_image(*item), pending.values())
+        return dict(zip(pending.keys(), names))
+
+
+def _save_questions(questions, topic, user):
+    stored = _store_images(questions)
+
+    def image_name(folder, image):
+        return stored[(folder, image[0])] if image else None
+
+    with transaction.atomic():
+        bank_questions = BankQuestion.objects.bulk_create(
+            [
+                BankQuestion(
+                    topic=topic, subject_id=topic.subject_id, school_class_id=topic.school_class_id,
+                    text=question['text'], author=user, difficulty='MEDIUM',
+                    question_image=image_name('question_images', question['image']),
+                )
+                for question in questions
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        options = BankAnswerOption.objects.bulk_create(
+            [
+                BankAnswerOption(
+                    question=bank_question, text=option['text'], is_correct=option['is_correct'], order=order,
+                    option_image=image_name('option_images', option['image']),
+                )
+                for question, bank_question in zip(questions, bank_questions)
+                for order, option in enumerate(question['options'])
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        # bulk_create не шлет post_save, поэтому копии картинок ставим в очередь сами
+        if stored:
+            schedule_image_derivatives(
+                question_ids=[bq.pk for bq in bank_questions if bq.question_image],
+                option_ids=[option.pk for option in options if option.option_image],
+            )
+    return len(bank_questions)
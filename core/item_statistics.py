@@ -0,0 +1,298 @@
+# D:\GAT\core\item_statistics.py
+
+"""
+Психометрические показатели вопросов и тестов по StudentAnswer.
+
+Для каждого теста ответы загружаются одним запросом в матрицы NumPy
+(результаты × вопросы), и все показатели считаются по колонкам сразу:
+- p-value — доля верных среди ответивших на вопрос;
+- индекс дискриминации — p в верхних 27% минус p в нижних 27% учеников
+  (по баллу за предмет вопроса);
+- точечно-бисериальная корреляция ответа с баллом за предмет без этого вопроса;
+- дистракторы — сколько учеников (всего / в верхней / в нижней группе) выбрали
+  каждый вариант;
+- KR-20 теста в целом и по каждому предмету.
+Результат хранится в ItemStatistic / TestStatistic, сводка по вопросу банка
+(взвешенная по числу ответивших) — в QuestionStatistic. Страницы только читают
+эти таблицы.
+
+Пересчет запускается фоновой задачей 'item_statistics' после загрузки или
+удаления результатов теста (см. refresh_results_derived_data) и командой
+`manage.py refresh_item_statistics`; пересчитывается только этот тест и
+сводки его вопросов.
+"""
+
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .jobs import enqueue_job, job_handler
+from .models import (
+    BackgroundJob, BankQuestion, GatTest, ItemStatistic, QuestionStatistic, StudentAnswer, StudentResult,
+    TestStatistic,
+)
+
+JOB_KIND = 'item_statistics'
+GROUP_SHARE = 0.27
+NO_CHOICE = 'none'
+
+
+def results_version(gat_test):
+    """Отпечаток результатов теста (число и время последнего изменения)."""
+    info = StudentResult.objects.filter(gat_test=gat_test).aggregate(n=Count('id'), last=Max('updated_at'))
+    return _version(info['n'], info['last'])
+
+
+def _version(count, last_updated):
+    raw = f"{count}:{last_updated.isoformat() if last_updated else ''}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _masked_correlation(x, y, mask):
+    """Корреляция Пирсона по колонкам с учетом маски (None, если дисперсия нулевая)."""
+    n = mask.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = (x * mask).sum(axis=0) / n
+        mean_y = (y * mask).sum(axis=0) / n
+        dx, dy = (x - mean_x) * mask, (y - mean_y) * mask
+        cov = (dx * dy).sum(axis=0)
+        denom = np.sqrt((dx * dx).sum(axis=0) * (dy * dy).sum(axis=0))
+        return np.where(denom > 0, cov / denom, np.nan)
+
+
+def _kr20(correct, total):
+    """KR-20 по матрице верных ответов (ученики × вопросы) и суммарному баллу."""
+    n_students, n_items = correct.shape
+    if n_students < 2 or n_items < 2:
+        return None
+    variance = total.var()
+    if variance <= 0:
+        return None
+    p = correct.mean(axis=0)
+    return float(n_items / (n_items - 1) * (1 - (p * (1 - p)).sum() / variance))
+
+
+def _nan_to_none(value, digits=4):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def compute_test_statistics(gat_test):
+    """
+    Считает показатели теста. Возвращает (items, test_stats):
+    items — список словарей для ItemStatistic, test_stats — словарь для TestStatistic.
+    Если ответов нет — (None, None).
+    """
+    answers = pd.DataFrame.from_records(
+        list(StudentAnswer.objects.filter(result__gat_test=gat_test).order_by().values_list(
+            'result_id', 'question_id', 'is_correct', 'chosen_option_order'
+        )),
+        columns=['result_id', 'question_id', 'is_correct', 'chosen'],
+    )
+    if answers.empty:
+        return None, None
+
+    r_codes, _ = pd.factorize(answers['result_id'])
+    q_codes, question_ids = pd.factorize(answers['question_id'])
+    n_results, n_items = r_codes.max() + 1, len(question_ids)
+
+    correct = np.zeros((n_results, n_items), dtype=np.float64)
+    answered = np.zeros((n_results, n_items), dtype=bool)
+    chosen = np.zeros((n_results, n_items), dtype=np.int32)
+    correct[r_codes, q_codes] = answers['is_correct'].to_numpy(dtype=bool)
+    answered[r_codes, q_codes] = True
+    chosen[r_codes, q_codes] = answers['chosen'].fillna(0).to_numpy(dtype=np.int32)
+
+    subject_by_question = dict(BankQuestion.objects.filter(pk__in=question_ids.tolist()).values_list('id', 'subject_id'))
+    subject_codes, subject_ids = pd.factorize(pd.Series([subject_by_question[q] for q in question_ids]))
+    one_hot = np.eye(len(subject_ids))[subject_codes]  # вопросы × предметы
+
+    # Балл за предмет и критерий для каждого вопроса (балл за его предмет)
+    subject_scores = correct @ one_hot  # ученики × предметы
+    criterion = subject_scores[:, subject_codes]
+    n_students = answered.sum(axis=0)
+    n_correct = correct.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_values = n_correct / n_students
+    point_biserial = _masked_correlation(correct, criterion - correct, answered)
+
+    # Верхние и нижние 27% по баллу за предмет (среди отвечавших на предмет)
+    in_upper = np.zeros((n_results, len(subject_ids)), dtype=bool)
+    in_lower = np.zeros((n_results, len(subject_ids)), dtype=bool)
+    took_subject = (answered.astype(np.int32) @ one_hot) > 0
+    for k in range(len(subject_ids)):
+        rows = np.flatnonzero(took_subject[:, k])
+        group = int(round(GROUP_SHARE * len(rows)))
+        if group < 1 or 2 * group > len(rows):
+            continue
+        order = rows[np.argsort(subject_scores[rows, k], kind='stable')]
+        in_lower[order[:group], k] = True
+        in_upper[order[-group:], k] = True
+    upper = in_upper[:, subject_codes] & answered
+    lower = in_lower[:, subject_codes] & answered
+    with np.errstate(invalid='ignore', divide='ignore'):
+        discrimination = (correct * upper).sum(axis=0) / upper.sum(axis=0) - (correct * lower).sum(axis=0) / lower.sum(axis=0)
+
+    # Дистракторы: по каждому варианту (0 — выбор неизвестен)
+    distractors = [dict() for _ in range(n_items)]
+    for option in np.unique(chosen[answered]).tolist():
+        picked = (chosen == option) & answered
+        counts, upper_counts, lower_counts = picked.sum(axis=0), (picked & upper).sum(axis=0), (picked & lower).sum(axis=0)
+        key = str(option) if option else NO_CHOICE
+        for j in np.flatnonzero(counts).tolist():
+            distractors[j][key] = {'n': int(counts[j]), 'upper': int(upper_counts[j]), 'lower': int(lower_counts[j])}
+
+    from .results_import_service import _question_frame  # импорт здесь: results_import_service -> services -> этот модуль
+    numbers = {row.question_id: str(row.q_index) for row in _question_frame(gat_test).itertuples()}
+    items = [
+        {
+            'question_id': int(question_id),
+            'subject_id': int(subject_by_question[question_id]),
+            'question_number': numbers.get(question_id, ''),
+            'n_students': int(n_students[j]),
+            'n_correct': int(n_correct[j]),
+            'p_value': _nan_to_none(p_values[j]),
+            'discrimination': _nan_to_none(discrimination[j]),
+            'point_biserial': _nan_to_none(point_biserial[j]),
+            'distractors': distractors[j],
+        }
+        for j, question_id in enumerate(question_ids.tolist())
+    ]
+
+    total = correct.sum(axis=1)
+    subject_kr20 = {}
+    for k, subject_id in enumerate(subject_ids.tolist()):
+        rows = took_subject[:, k]
+        kr20 = _kr20(correct[np.ix_(rows, subject_codes == k)], subject_scores[rows, k])
+        if kr20 is not None:
+            subject_kr20[str(subject_id)] = round(kr20, 4)
+    kr20 = _kr20(correct, total)
+    test_stats = {
+        'n_students': int(n_results),
+        'n_items': int(n_items),
+        'mean_score': round(float(total.mean()), 4),
+        'score_variance': round(float(total.var()), 4),
+        'kr20': None if kr20 is None else round(kr20, 4),
+        'subject_kr20': subject_kr20,
+    }
+    return items, test_stats
+
+
+def refresh_test_statistics(gat_test):
+    """Пересчитывает и сохраняет показатели теста и сводки его вопросов. Возвращает число вопросов."""
+    version = results_version(gat_test)
+    items, test_stats = compute_test_statistics(gat_test)
+
+    with transaction.atomic():
+        question_ids = set(ItemStatistic.objects.filter(gat_test=gat_test).values_list('question_id', flat=True))
+        ItemStatistic.objects.filter(gat_test=gat_test).delete()
+        if items is None:
+            TestStatistic.objects.filter(gat_test=gat_test).delete()
+        else:
+            ItemStatistic.objects.bulk_create([ItemStatistic(gat_test=gat_test, **item) for item in items])
+            TestStatistic.objects.update_or_create(
+                gat_test=gat_test, defaults={**test_stats, 'results_version': version}
+            )
+            question_ids.update(item['question_id'] for item in items)
+        refresh_question_statistics(question_ids)
+    return len(items or [])
+
+
+def _weighted(values, weights):
+    mask = ~np.isnan(values)
+    if not mask.any() or weights[mask].sum() == 0:
+        return None
+    return round(float(np.average(values[mask], weights=weights[mask])), 4)
+
+
+def refresh_question_statistics(question_ids):
+    """Пересобирает QuestionStatistic указанных вопросов из их ItemStatistic."""
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    rows = pd.DataFrame.from_records(
+        list(ItemStatistic.objects.filter(question_id__in=question_ids).values_list(
+            'question_id', 'n_students', 'n_correct', 'discrimination', 'point_biserial', 'distractors'
+        )),
+        columns=['question_id', 'n_students', 'n_correct', 'discrimination', 'point_biserial', 'distractors'],
+    )
+    stats = []
+    for question_id, group in rows.groupby('question_id'):
+        weights = group['n_students'].to_numpy(dtype=float)
+        distractors = defaultdict(lambda: {'n': 0, 'upper': 0, 'lower': 0})
+        for item in group['distractors']:
+            for option, counts in item.items():
+                for field, value in counts.items():
+                    distractors[option][field] += value
+        n_students, n_correct = int(group['n_students'].sum()), int(group['n_correct'].sum())
+        stats.append(QuestionStatistic(
+            question_id=question_id,
+            n_tests=len(group),
+            n_students=n_students,
+            n_correct=n_correct,
+            p_value=round(n_correct / n_students, 4) if n_students else None,
+            discrimination=_weighted(group['discrimination'].to_numpy(dtype=float), weights),
+            point_biserial=_weighted(group['point_biserial'].to_numpy(dtype=float), weights),
+            distractors=dict(distractors),
+        ))
+    QuestionStatistic.objects.filter(question_id__in=question_ids).delete()
+    QuestionStatistic.objects.bulk_create(stats)
+
+
+def stale_tests():
+    """Тесты, у которых показатели не считались или результаты изменились после расчета."""
+    computed = dict(TestStatistic.objects.values_list('gat_test_id', 'results_version'))
+    current = StudentResult.objects.order_by().values('gat_test_id').annotate(n=Count('id'), last=Max('updated_at'))
+    stale_ids = {row['gat_test_id'] for row in current if computed.get(row['gat_test_id']) != _version(row['n'], row['last'])}
+    # Результаты удалены, а показатели остались
+    stale_ids.update(set(computed) - {row['gat_test_id'] for row in current})
+    return GatTest.objects.filter(pk__in=stale_ids)
+
+
+def schedule_test_statistics(gat_test):
+    """Ставит пересчет теста в очередь фоновых задач (если он там еще не ждет)."""
+    pending = BackgroundJob.objects.filter(
+        kind=JOB_KIND, status=BackgroundJob.Status.PENDING, params__test_id=gat_test.pk
+    )
+    if not pending.exists():
+        enqueue_job(JOB_KIND, params={'test_id': gat_test.pk}, title=f"Статистика вопросов: {gat_test.name}")
+
+
+@job_handler(JOB_KIND)
+def item_statistics_job(job):
+    gat_test = GatTest.objects.filter(pk=job.params['test_id']).first()
+    if gat_test is None:
+        job.report_progress(100, "Тест удален")
+        return None
+    count = refresh_test_statistics(gat_test)
+    job.report_progress(100, f"Пересчитано вопросов: {count}")
+    return None
+
+
+def heatmap_item_statistics(tests_qs, subject_id_to_name_map):
+    """
+    {предмет: {номер вопроса: {'p', 'd', 'r', 'n'}}} для заголовков тепловой карты:
+    средние по выбранным тестам, взвешенные по числу ответивших (один SQL-запрос).
+    """
+    rows = (
+        ItemStatistic.objects.filter(gat_test__in=tests_qs, subject_id__in=list(subject_id_to_name_map))
+        .exclude(question_number='')
+        .values_list('subject_id', 'question_number', 'n_students', 'n_correct', 'discrimination', 'point_biserial')
+    )
+    frame = pd.DataFrame.from_records(
+        list(rows), columns=['subject_id', 'question_number', 'n', 'n_correct', 'd', 'r']
+    )
+    result = defaultdict(dict)
+    for (subject_id, q_num), group in frame.groupby(['subject_id', 'question_number']):
+        weights = group['n'].to_numpy(dtype=float)
+        n = int(weights.sum())
+        result[subject_id_to_name_map[subject_id]][q_num] = {
+            'p': round(int(group['n_correct'].sum()) / n, 2) if n else None,
+            'd': _weighted(group['d'].to_numpy(dtype=float), weights),
+            'r': _weighted(group['r'].to_numpy(dtype=float), weights),
+            'n': n,
+        }
+    return dict(result)
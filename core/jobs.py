@@ -0,0 +1,139 @@
+# D:\GAT\core\jobs.py
+
+"""
+Очередь фоновых задач в БД (без внешнего брокера).
+
+Представление ставит задачу через enqueue_job() и отдает страницу статуса;
+команда `manage.py run_jobs` забирает задачи через SELECT ... FOR UPDATE SKIP LOCKED
+(можно запускать несколько воркеров), вызывает обработчик и сохраняет файл.
+Обработчики регистрируются декоратором @job_handler('тип') и возвращают
+(имя_файла, bytes) или None, если задача не создает файл (пересчеты);
+прогресс сообщают через job.report_progress().
+"""
+
+import importlib
+import logging
+import traceback
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Задача в статусе RUNNING дольше этого срока считается брошенной (воркер упал)
+STALE_AFTER = timedelta(minutes=30)
+MAX_ATTEMPTS = 3
+# Модули, в которых объявлены обработчики (импортируются воркером)
+HANDLER_MODULES = ['core.export_jobs', 'core.item_statistics', 'core.image_derivatives']
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Регистрирует функцию handler(job) -> (filename, content) | None для задач типа kind."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    if kind not in JOB_HANDLERS:
+        for module in HANDLER_MODULES:
+            importlib.import_module(module)
+    return JOB_HANDLERS.get(kind)
+
+
+def enqueue_job(kind, user=None, params=None, title=''):
+    """Ставит задачу в очередь и возвращает BackgroundJob."""
+    return BackgroundJob.objects.create(
+        kind=kind, title=title[:255], params=params or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next_job():
+    """
+    Забирает следующую задачу (или брошенную RUNNING) и помечает ее как RUNNING.
+    Заблокированные другими воркерами строки пропускаются. Возвращает None, если очередь пуста.
+    """
+    stale_before = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        job = (
+            BackgroundJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=BackgroundJob.Status.PENDING)
+                | Q(status=BackgroundJob.Status.RUNNING, started_at__lt=stale_before)
+            )
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = BackgroundJob.Status.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.progress = 0
+        job.message = ''
+        job.save(update_fields=['status', 'started_at', 'attempts', 'progress', 'message'])
+    return job
+
+
+def run_job(job):
+    """Выполняет задачу и сохраняет результат или ошибку. Возвращает итоговый статус."""
+    handler = get_handler(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"Неизвестный тип задачи: {job.kind}")
+        if job.attempts > MAX_ATTEMPTS:
+            raise RuntimeError("Превышено число попыток выполнения")
+        result = handler(job)
+        if result is not None:
+            filename, content = result
+            job.result_filename = filename
+            job.result_file.save(filename, ContentFile(content), save=False)
+        job.status = BackgroundJob.Status.DONE
+        # Итоговое сообщение обработчик может выставить сам через report_progress(100, ...)
+        if job.progress < 100 or not job.message:
+            job.message = 'Готово'
+        job.progress = 100
+    except Exception as e:
+        logger.exception("Фоновая задача %s (%s) завершилась ошибкой", job.pk, job.kind)
+        job.status = BackgroundJob.Status.FAILED
+        job.message = str(e)[:255]
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    job.save()
+    return job.status
+
+
+def run_pending_jobs(limit=None):
+    """Выполняет задачи из очереди, пока она не опустеет (или до limit). Возвращает число выполненных."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def purge_finished_jobs(older_than):
+    """Удаляет завершенные задачи старше older_than (timedelta) вместе с файлами."""
+    jobs = BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.Status.DONE, BackgroundJob.Status.FAILED],
+        finished_at__lt=timezone.now() - older_than,
+    )
+    count = 0
+    for job in jobs.iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
@@ -0,0 +1,79 @@
+# D:\GAT\core\management\commands\benchmark_deep_analysis.py
+
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+
+from core.synthetic_data import BENCH_ADMIN
+from core.views.deep_analysis import DeepAnalysisForm, _resolve_analysis_scope, _run_analysis, _run_analysis_legacy
+
+from .benchmark_reports import _report_filters
+
+
+def _measure(func, scope, repeat):
+    times, queries, context = [], 0, None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            context = func(scope)
+            times.append(time.perf_counter() - start)
+        queries = len(ctx.captured_queries)
+    return statistics.median(times), queries, context
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает прежний (словари) и векторизованный расчет углубленного анализа "
+        "на одной выборке: время, число запросов и совпадение результатов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', help="GET-параметры фильтра (quarters=1&schools=2&...). По умолчанию — вся синтетическая сеть")
+        parser.add_argument('--user', default=BENCH_ADMIN, help="Пользователь, от имени которого строится анализ")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден (создайте сеть: generate_synthetic_data)")
+
+        if options['query']:
+            params = QueryDict(options['query'])
+        else:
+            params = QueryDict(mutable=True)
+            for key, values in _report_filters().items():
+                params.setlist(key, [str(v) for v in values])
+
+        form = DeepAnalysisForm(params, user=user)
+        if not form.is_valid():
+            raise CommandError(f"Фильтр не прошел проверку: {form.errors.as_text()}")
+
+        start = time.perf_counter()
+        scope = _resolve_analysis_scope(form, user)
+        if scope is None:
+            raise CommandError("По фильтру нет результатов")
+        self.stdout.write(
+            f"Выборка: {scope['results_qs'].count()} результатов, {len(scope['result_frame'])} строк результат×предмет "
+            f"(загрузка {time.perf_counter() - start:.2f}с), сравнение по: {scope['compare_by']}"
+        )
+
+        legacy_time, legacy_queries, legacy = _measure(_run_analysis_legacy, scope, options['repeat'])
+        new_time, new_queries, new = _measure(_run_analysis, scope, options['repeat'])
+        speedup = legacy_time / new_time if new_time else 0
+        self.stdout.write(f"  прежний расчет:        {legacy_time * 1000:9.1f} мс, {legacy_queries} запросов")
+        self.stdout.write(f"  векторизованный:       {new_time * 1000:9.1f} мс, {new_queries} запросов (x{speedup:.1f})")
+
+        # Порядок учеников с равным процентом в прежнем расчете не определен
+        for context in (legacy, new):
+            context['at_risk_students'] = sorted(context['at_risk_students'], key=lambda x: sorted(x.items()))
+        mismatched = [key for key in legacy if legacy[key] != new[key]]
+        if mismatched:
+            self.stdout.write(self.style.WARNING(f"Расхождения в блоках: {', '.join(mismatched)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Результаты совпадают."))
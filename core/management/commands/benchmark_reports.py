@@ -0,0 +1,210 @@
+# D:\GAT\core\management\commands\benchmark_reports.py
+
+import json
+import statistics
+import subprocess
+import time
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import GatTest, School, SchoolClass, Subject, Quarter
+from core.results_import_service import bulk_process_student_results_upload
+from core.synthetic_data import SYN_PREFIX, ensure_bench_users, flush_synthetic_network, generate_network
+
+from .benchmark_results_upload import build_results_workbook, measure_upload
+
+# Размеры синтетической сети: параметры generate_network
+SIZES = {
+    'small': {'schools': 1, 'students_per_section': 15, 'years': 1, 'subjects': 3, 'questions_per_subject': 15},
+    'medium': {'schools': 3, 'students_per_section': 25, 'years': 2, 'subjects': 4, 'questions_per_subject': 20},
+    'large': {'schools': 8, 'students_per_section': 30, 'years': 3, 'subjects': 6, 'questions_per_subject': 25},
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _report_filters():
+    """GET-параметры фильтров отчетов, охватывающие всю синтетическую сеть."""
+    schools = School.objects.filter(school_id__startswith=f'{SYN_PREFIX}-')
+    tests = GatTest.objects.filter(school__in=schools)
+    return {
+        'quarters': list(Quarter.objects.filter(gat_tests__in=tests).distinct().values_list('pk', flat=True)),
+        'schools': list(schools.values_list('pk', flat=True)),
+        'school_classes': list(
+            SchoolClass.objects.filter(school__in=schools, parent__isnull=True).values_list('pk', flat=True)
+        ),
+        'subjects': list(Subject.objects.filter(bank_questions__gat_tests__in=tests).distinct().values_list('pk', flat=True)),
+        'test_numbers': sorted(set(tests.values_list('test_number', flat=True))),
+    }
+
+
+def _scenarios():
+    """(название, url, пользователь: 'admin' | 'student')."""
+    filters = urlencode(_report_filters(), doseq=True)
+    biggest_test = (
+        GatTest.objects.filter(school__school_id__startswith=f'{SYN_PREFIX}-')
+        .annotate(n=Count('results')).order_by('-n', '-test_date').first()
+    )
+    scenarios = [
+        ('dashboard', reverse('core:dashboard'), 'admin'),
+        ('statistics', f"{reverse('core:statistics')}?{filters}", 'admin'),
+        ('deep_analysis', f"{reverse('core:deep_analysis')}?{filters}", 'admin'),
+        ('monitoring', f"{reverse('core:monitoring')}?{filters}", 'admin'),
+        ('student_dashboard', reverse('core:student_dashboard'), 'student'),
+    ]
+    if biggest_test:
+        url = reverse('core:detailed_results_list', args=[biggest_test.test_number])
+        scenarios.insert(4, ('detailed_results', f"{url}?test_id={biggest_test.pk}", 'admin'))
+    return scenarios, biggest_test
+
+
+def _measure(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        response = client.get(url)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise CommandError(f"{url}: HTTP {response.status_code}")
+    return elapsed, len(ctx.captured_queries)
+
+
+def benchmark_views(clients, repeat):
+    """Холодный прогон (после очистки кэша) и repeat теплых для каждого сценария."""
+    results = {}
+    scenarios, _ = _scenarios()
+    for name, url, who in scenarios:
+        client = clients[who]
+        cache.clear()
+        cold_time, cold_queries = _measure(client, url)
+        warm = [_measure(client, url) for _ in range(repeat)]
+        warm_times = [t for t, _ in warm]
+        results[name] = {
+            'url': url,
+            'cold_ms': round(cold_time * 1000, 1),
+            'cold_queries': cold_queries,
+            'warm_median_ms': round(statistics.median(warm_times) * 1000, 1) if warm else None,
+            'warm_min_ms': round(min(warm_times) * 1000, 1) if warm else None,
+            'warm_max_ms': round(max(warm_times) * 1000, 1) if warm else None,
+            'warm_queries': warm[-1][1] if warm else None,
+        }
+        reset_queries()
+    return results
+
+
+def benchmark_upload():
+    """Пакетная загрузка результатов для самого большого синтетического теста (с откатом)."""
+    _, gat_test = _scenarios()
+    if gat_test is None:
+        return None
+    students = gat_test.results.count()
+    payload = build_results_workbook(gat_test, students)
+    elapsed, queries, _ = measure_upload(bulk_process_student_results_upload, gat_test, payload)
+    return {'test_id': gat_test.pk, 'students': students, 'ms': round(elapsed * 1000, 1), 'queries': queries}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время и число SQL-запросов основных отчетов на синтетической сети разных размеров "
+        "и сохраняет результат в JSON (для сравнения до/после оптимизаций)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['small', 'medium'])
+        parser.add_argument('--no-generate', action='store_true', help="Не пересоздавать данные: замерить текущую синтетическую сеть")
+        parser.add_argument('--keep', action='store_true', help="Не удалять синтетическую сеть после замеров")
+        parser.add_argument('--repeat', type=int, default=3, help="Число теплых прогонов каждого отчета")
+        parser.add_argument('--skip-upload', action='store_true', help="Не замерять загрузку результатов")
+        parser.add_argument('--output', default='benchmark_reports.json', help="Файл JSON-отчета")
+        parser.add_argument('--compare', help="Предыдущий JSON-отчет для сравнения")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'git_revision': _git_revision(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'repeat': options['repeat'],
+            },
+            'sizes': {},
+        }
+        sizes = ['current'] if options['no_generate'] else options['sizes']
+
+        try:
+            for size in sizes:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"Размер: {size}"))
+                entry = {}
+                if not options['no_generate']:
+                    flush_synthetic_network()
+                    start = time.perf_counter()
+                    entry['dataset'] = generate_network(seed=options['seed'], log=self.stdout.write, **SIZES[size])
+                    entry['generate_seconds'] = round(time.perf_counter() - start, 2)
+
+                admin, student_user = ensure_bench_users()
+                clients = {'admin': Client(HTTP_HOST='localhost'), 'student': Client(HTTP_HOST='localhost')}
+                clients['admin'].force_login(admin)
+                clients['student'].force_login(student_user)
+
+                entry['views'] = benchmark_views(clients, options['repeat'])
+                for name, stats in entry['views'].items():
+                    self.stdout.write(
+                        f"  {name:<18} холодный {stats['cold_ms']:>8.1f} мс / {stats['cold_queries']:>4} запр. | "
+                        f"теплый {stats['warm_median_ms'] or 0:>8.1f} мс / {stats['warm_queries'] or 0:>4} запр."
+                    )
+                if not options['skip_upload']:
+                    entry['upload'] = benchmark_upload()
+                    if entry['upload']:
+                        upload = entry['upload']
+                        self.stdout.write(f"  {'upload':<18} {upload['students']} учеников: {upload['ms']:.1f} мс / {upload['queries']} запр.")
+                report['sizes'][size] = entry
+        finally:
+            if not options['no_generate'] and not options['keep']:
+                flush_synthetic_network()
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Отчет сохранен: {options['output']}"))
+
+        if options['compare']:
+            self._compare(options['compare'], report)
+
+    def _compare(self, path, report):
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Сравнение с {path} ({previous['meta'].get('git_revision')} → {report['meta'].get('git_revision')})"
+        ))
+        for size, entry in report['sizes'].items():
+            old_views = previous.get('sizes', {}).get(size, {}).get('views', {})
+            for name, stats in entry['views'].items():
+                old = old_views.get(name)
+                if not old or not old.get('warm_median_ms') or not stats.get('warm_median_ms'):
+                    continue
+                ratio = stats['warm_median_ms'] / old['warm_median_ms']
+                style = self.style.SUCCESS if ratio <= 1 else self.style.WARNING
+                self.stdout.write(style(
+                    f"  {size}/{name:<18} {old['warm_median_ms']:>8.1f} → {stats['warm_median_ms']:>8.1f} мс (x{ratio:.2f}), "
+                    f"запросов {old['warm_queries']} → {stats['warm_queries']}"
+                ))
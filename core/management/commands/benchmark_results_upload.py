@@ -0,0 +1,90 @@
+# D:\GAT\core\management\commands\benchmark_results_upload.py
+
+import io
+import random
+import time
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import GatTest, QuestionCount
+from core.services import process_student_results_upload
+from core.results_import_service import bulk_process_student_results_upload
+
+
+class _Rollback(Exception):
+    """Откатывает транзакцию после замера, чтобы не оставлять данных."""
+
+
+def build_results_workbook(gat_test, students, sections='АБВГ', seed=0):
+    """Синтетическая книга результатов в формате загрузчика (Code/Surname/Name/Section/АББР_N)."""
+    rng = random.Random(seed)
+    columns = {
+        'Code': [f"BENCH-{gat_test.pk}-{i:06d}" for i in range(students)],
+        'Surname': [f"Фамилия{i}" for i in range(students)],
+        'Name': [f"Имя{i}" for i in range(students)],
+        'Section': [rng.choice(sections) for _ in range(students)],
+    }
+    q_counts = {
+        qc.subject_id: qc.number_of_questions
+        for qc in QuestionCount.objects.filter(school_class=gat_test.school_class)
+    }
+    for subject in gat_test.subjects.exclude(abbreviation__isnull=True).exclude(abbreviation=''):
+        count = q_counts.get(subject.id) or gat_test.questions.filter(subject=subject).count()
+        for n in range(1, count + 1):
+            columns[f"{subject.abbreviation}_{n}"] = [rng.randint(0, 1) for _ in range(students)]
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        pd.DataFrame(columns).to_excel(writer, index=False, sheet_name='Sheet1')
+    return output.getvalue()
+
+
+def measure_upload(func, gat_test, payload):
+    """Запускает загрузчик в откатываемой транзакции. Возвращает (секунды, запросы, отчет)."""
+    upload = SimpleUploadedFile("benchmark.xlsx", payload)
+    report = None
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                _, report = func(gat_test, upload)
+                elapsed = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+    return elapsed, len(ctx.captured_queries), report
+
+
+class Command(BaseCommand):
+    help = "Сравнивает скорость старой (построчной) и пакетной загрузки результатов GAT."
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_id', type=int, help="ID GAT-теста, для которого генерируется файл")
+        parser.add_argument('--students', type=int, nargs='+', default=[100, 500, 2000])
+        parser.add_argument('--skip-legacy', action='store_true', help="Не запускать старый загрузчик (он очень медленный)")
+
+    def handle(self, *args, **options):
+        try:
+            gat_test = GatTest.objects.select_related('school', 'school_class').get(pk=options['test_id'])
+        except GatTest.DoesNotExist:
+            raise CommandError(f"GAT-тест {options['test_id']} не найден")
+
+        self.stdout.write(f"Тест: {gat_test} (вопросов: {gat_test.questions.count()})")
+        for students in options['students']:
+            payload = build_results_workbook(gat_test, students)
+
+            bulk_time, bulk_queries, bulk_report = measure_upload(bulk_process_student_results_upload, gat_test, payload)
+            line = f"{students:>6} учеников | bulk: {bulk_time:7.2f}с, {bulk_queries} запросов"
+
+            if not options['skip_legacy']:
+                legacy_time, legacy_queries, legacy_report = measure_upload(process_student_results_upload, gat_test, payload)
+                speedup = legacy_time / bulk_time if bulk_time else 0
+                line += f" | legacy: {legacy_time:7.2f}с, {legacy_queries} запросов | ускорение x{speedup:.1f}"
+                if legacy_report != bulk_report:
+                    self.stdout.write(self.style.WARNING(f"Отчеты различаются: {legacy_report} != {bulk_report}"))
+
+            self.stdout.write(line)
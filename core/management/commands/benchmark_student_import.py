@@ -0,0 +1,95 @@
+# D:\GAT\core\management\commands\benchmark_student_import.py
+
+import io
+import random
+import time
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import School, SchoolClass
+from core.services import process_student_upload
+from core.student_import_service import bulk_process_student_upload
+
+
+class _Rollback(Exception):
+    """Откатывает транзакцию после замера, чтобы не оставлять данных."""
+
+
+def build_roster(rows, class_names, fmt='xlsx', seed=0):
+    """Синтетический список учеников в формате загрузчика. Возвращает (имя файла, bytes)."""
+    rng = random.Random(seed)
+    frame = pd.DataFrame({
+        'student_id': [f"BENCH-ST-{i:06d}" for i in range(rows)],
+        'класс': [rng.choice(class_names) for _ in range(rows)],
+        'фамилия_рус': [f" Фамилия{i} " for i in range(rows)],
+        'имя_рус': [f"Имя{i}" for i in range(rows)],
+        'фамилия_тадж': [f"Насаб{i}" for i in range(rows)],
+        'имя_тадж': [f"Ном{i}" for i in range(rows)],
+        'surname': [f"Surname{i}" for i in range(rows)],
+        'name': [f"Name{i}" for i in range(rows)],
+    })
+    output = io.BytesIO()
+    if fmt == 'csv':
+        frame.to_csv(output, index=False, encoding='utf-8-sig')
+    else:
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            frame.to_excel(writer, index=False)
+    return f"roster.{fmt}", output.getvalue()
+
+
+def measure(func, filename, payload, **kwargs):
+    """Запускает загрузчик в откатываемой транзакции. Возвращает (секунды, запросы, отчет)."""
+    report = None
+    # Журнал запросов ограничен 9000 записями; после старого загрузчика он переполнен
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                report = func(SimpleUploadedFile(filename, payload), **kwargs)
+                elapsed = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+    return elapsed, len(ctx.captured_queries), report
+
+
+class Command(BaseCommand):
+    help = "Сравнивает скорость построчной и пакетной загрузки списков учеников (1k/10k/50k строк)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+        parser.add_argument('--legacy-max', type=int, default=10000,
+                            help="Старый загрузчик запускать только до этого числа строк (он очень медленный)")
+
+    def handle(self, *args, **options):
+        # Классы одной школы; названия уникальны в пределах сети, чтобы старый загрузчик
+        # (поиск класса только по названию) находил те же классы
+        with transaction.atomic():
+            school, _ = School.objects.get_or_create(school_id='BENCH-IMPORT', defaults={'name': 'Бенчмарк импорта'})
+            class_names = [f"BI-{grade}{section}" for grade in range(5, 12) for section in 'АБВ']
+            for name in class_names:
+                SchoolClass.objects.get_or_create(school=school, name=name)
+
+        try:
+            for rows in options['rows']:
+                filename, payload = build_roster(rows, class_names, options['format'])
+                bulk_time, bulk_queries, bulk_report = measure(bulk_process_student_upload, filename, payload, school=school)
+                line = f"{rows:>7} строк ({options['format']}) | bulk: {bulk_time:7.2f}с, {bulk_queries} запросов"
+
+                if rows <= options['legacy_max'] and options['format'] == 'xlsx':
+                    legacy_time, legacy_queries, legacy_report = measure(process_student_upload, filename, payload)
+                    line += (
+                        f" | legacy: {legacy_time:7.2f}с, {legacy_queries} запросов"
+                        f" | ускорение x{legacy_time / bulk_time:.1f}"
+                    )
+                    if legacy_report != bulk_report:
+                        self.stdout.write(self.style.WARNING(f"Отчеты различаются: {legacy_report} != {bulk_report}"))
+                self.stdout.write(line)
+        finally:
+            school.delete()
@@ -0,0 +1,30 @@
+# D:\GAT\core\management\commands\build_answer_matrices.py
+
+from django.core.management.base import BaseCommand
+
+from core.answer_matrix import rebuild_answer_matrix
+from core.models import GatTest
+
+
+class Command(BaseCommand):
+    help = "Заполняет (или пересобирает) матрицы ответов TestAnswerMatrix для GAT-тестов с результатами."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов (по умолчанию — все)")
+        parser.add_argument('--missing-only', action='store_true', help="Только тесты, у которых матрицы еще нет")
+
+    def handle(self, *args, **options):
+        tests = GatTest.objects.filter(results__isnull=False).distinct().order_by('id')
+        if options['test_ids']:
+            tests = tests.filter(id__in=options['test_ids'])
+        if options['missing_only']:
+            tests = tests.filter(answer_matrix__isnull=True)
+
+        built = 0
+        for gat_test in tests.iterator():
+            matrix = rebuild_answer_matrix(gat_test)
+            if matrix:
+                built += 1
+                self.stdout.write(f"  {gat_test.name}: {matrix.n_students}×{matrix.n_questions}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово. Построено матриц: {built}"))
@@ -0,0 +1,31 @@
+# D:\GAT\core\management\commands\build_image_derivatives.py
+
+from django.core.management.base import BaseCommand
+
+from core.image_derivatives import build_derivatives_for, iter_image_instances
+from core.models import BankAnswerOption
+
+
+class Command(BaseCommand):
+    help = "Строит уменьшенные копии (миниатюра, веб, печать) картинок вопросов и вариантов ответа."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--question', type=int, nargs='*', dest='question_ids', help="ID вопросов (вместе с их вариантами)")
+        parser.add_argument('--force', action='store_true', help="Пересобрать копии, даже если они уже есть")
+
+    def handle(self, *args, **options):
+        question_ids = options['question_ids']
+        option_ids = None
+        if question_ids:
+            option_ids = list(BankAnswerOption.objects.filter(question_id__in=question_ids).values_list('id', flat=True))
+
+        def progress(done):
+            if done % 100 == 0:
+                self.stdout.write(f"  обработано картинок: {done}")
+
+        built, failed = build_derivatives_for(
+            iter_image_instances(question_ids, option_ids), force=options['force'], progress=progress
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Не удалось прочитать картинок: {failed} (подробности в логе)"))
+        self.stdout.write(self.style.SUCCESS(f"Готово. Построено копий: {built}"))
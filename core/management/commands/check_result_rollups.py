@@ -0,0 +1,43 @@
+# D:\GAT\core\management\commands\check_result_rollups.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import GatTest
+from core.rollups import find_rollup_mismatches, rebuild_result_rollups
+
+
+class Command(BaseCommand):
+    help = "Сверяет агрегаты результатов (SubjectResultRollup/QuestionResultRollup) с сырыми данными StudentResult."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов (по умолчанию — все)")
+        parser.add_argument('--fix', action='store_true', help="Пересобрать агрегаты тестов с расхождениями")
+        parser.add_argument('--verbose-diff', action='store_true', help="Печатать каждое расхождение")
+
+    def handle(self, *args, **options):
+        # Включаем и тесты, у которых результатов уже нет, но агрегаты остались
+        tests = GatTest.objects.filter(
+            Q(results__isnull=False) | Q(subject_rollups__isnull=False)
+        ).distinct().order_by('id')
+        if options['test_ids']:
+            tests = tests.filter(id__in=options['test_ids'])
+
+        checked, broken = 0, 0
+        for gat_test in tests.iterator():
+            checked += 1
+            mismatches = find_rollup_mismatches(gat_test)
+            if not mismatches:
+                continue
+
+            broken += 1
+            self.stdout.write(self.style.WARNING(f"  {gat_test.name} (ID {gat_test.pk}): расхождений {len(mismatches)}"))
+            if options['verbose_diff']:
+                for line in mismatches:
+                    self.stdout.write(f"    {line}")
+            if options['fix']:
+                rebuild_result_rollups(gat_test)
+                self.stdout.write("    агрегаты пересобраны")
+
+        style = self.style.SUCCESS if not broken else self.style.ERROR
+        self.stdout.write(style(f"Проверено тестов: {checked}, с расхождениями: {broken}"))
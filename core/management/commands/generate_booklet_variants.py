@@ -0,0 +1,49 @@
+# D:\GAT\core\management\commands\generate_booklet_variants.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.booklet_variants import MAX_VARIANTS, generate_variants_for_tests
+from core.models import GatTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает варианты буклетов (A, B, ...) для тестов: перестановки вопросов и "
+        "вариантов ответа по настройкам перемешивания теста и ключи ответов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов")
+        parser.add_argument('--date-from', help="Тесты с датой не раньше (ГГГГ-ММ-ДД)")
+        parser.add_argument('--date-to', help="Тесты с датой не позже (ГГГГ-ММ-ДД)")
+        parser.add_argument('--count', type=int, default=4, help=f"Сколько вариантов (1–{MAX_VARIANTS}, по умолчанию 4)")
+        parser.add_argument('--seed', type=int, default=None, help="Зерно перестановок (по умолчанию — ID теста)")
+        parser.add_argument('--force', action='store_true', help="Пересоздать, даже если уже загружены результаты по вариантам")
+
+    def handle(self, *args, **options):
+        tests = GatTest.objects.all()
+        if options['test_ids']:
+            tests = tests.filter(pk__in=options['test_ids'])
+        if options['date_from']:
+            tests = tests.filter(test_date__gte=options['date_from'])
+        if options['date_to']:
+            tests = tests.filter(test_date__lte=options['date_to'])
+        if not (options['test_ids'] or options['date_from'] or options['date_to']):
+            raise CommandError("Укажите --test или период (--date-from/--date-to)")
+        tests = list(tests.order_by('test_date', 'pk'))
+
+        started = time.monotonic()
+        try:
+            created = generate_variants_for_tests(tests, options['count'], seed=options['seed'], force=options['force'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for test in tests:
+            if not (test.shuffle_questions or test.shuffle_options):
+                self.stdout.write(self.style.WARNING(f"  {test.name}: перемешивание выключено, варианты совпадают"))
+        total = sum(len(variants) for variants in created.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово. Тестов: {len(tests)}, вариантов: {total} за {time.monotonic() - started:.1f} с"
+        ))
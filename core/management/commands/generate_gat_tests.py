@@ -0,0 +1,66 @@
+# D:\GAT\core\management\commands\generate_gat_tests.py
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.gat_generator import RECENT_TESTS, create_generated_tests, plan_tests
+from core.models import Quarter, SchoolClass
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает GAT-тесты для всех параллелей школ (или всей сети) по QuestionCount и "
+        "DifficultyRule: равномерно по темам, без вопросов из недавних тестов параллели."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, nargs='*', dest='school_ids', help="ID школ (по умолчанию — вся сеть)")
+        parser.add_argument('--parallel', nargs='*', dest='parallels', help="Названия параллелей, например 5 6 7")
+        parser.add_argument('--test-number', type=int, required=True, choices=[1, 2, 3, 4])
+        parser.add_argument('--date', required=True, help="Дата проведения, ГГГГ-ММ-ДД")
+        parser.add_argument('--day', type=int, default=1, choices=[1, 2])
+        parser.add_argument('--subject', type=int, nargs='*', dest='subject_ids', help="Только эти предметы (ID)")
+        parser.add_argument('--name', default='GAT-{number} {parallel} кл. ({school})', help="Шаблон названия: {number}, {parallel}, {school}")
+        parser.add_argument('--recent', type=int, default=RECENT_TESTS, help=f"Не повторять вопросы N последних тестов параллели (по умолчанию {RECENT_TESTS})")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help="Только подобрать вопросы и показать предупреждения")
+
+    def handle(self, *args, **options):
+        try:
+            test_date = datetime.date.fromisoformat(options['date'])
+        except ValueError:
+            raise CommandError("Дата должна быть в формате ГГГГ-ММ-ДД")
+        quarter = Quarter.objects.filter(start_date__lte=test_date, end_date__gte=test_date).first()
+
+        parallels = SchoolClass.objects.filter(parent__isnull=True).select_related('school').order_by('school__name', 'name')
+        if options['school_ids']:
+            parallels = parallels.filter(school_id__in=options['school_ids'])
+        if options['parallels']:
+            parallels = parallels.filter(name__in=options['parallels'])
+        parallels = list(parallels)
+        if not parallels:
+            raise CommandError("Не найдено ни одной параллели")
+
+        started = time.monotonic()
+        common = {'subject_ids': options['subject_ids'], 'recent_tests': options['recent'], 'seed': options['seed']}
+        if options['dry_run']:
+            plans = plan_tests([p.pk for p in parallels], **common)
+            pairs = [(parallel, plans[parallel.pk]) for parallel in parallels]
+        else:
+            name_template = options['name'].replace('{number}', str(options['test_number']))
+            created = create_generated_tests(
+                parallels, name_template, options['test_number'], test_date,
+                quarter=quarter, day=options['day'], **common,
+            )
+            by_parallel = {test.school_class_id: plan for test, plan in created}
+            pairs = [(parallel, by_parallel[parallel.pk]) for parallel in parallels]
+
+        for parallel, plan in pairs:
+            self.stdout.write(f"  {parallel.school.name}, {parallel.name} кл.: {len(plan.question_ids)} вопросов")
+            for warning in plan.warnings:
+                self.stdout.write(self.style.WARNING(f"    {warning}"))
+
+        verb = "Подобрано (без сохранения)" if options['dry_run'] else "Создано тестов"
+        self.stdout.write(self.style.SUCCESS(f"Готово. {verb}: {len(pairs)} за {time.monotonic() - started:.1f} с"))
@@ -0,0 +1,42 @@
+# D:\GAT\core\management\commands\generate_synthetic_data.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.synthetic_data import ensure_bench_users, flush_synthetic_network, generate_network
+
+
+class Command(BaseCommand):
+    help = "Генерирует синтетическую сеть школ с учениками, тестами и результатами (для замеров производительности)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=3)
+        parser.add_argument('--parallels', type=int, nargs='+', default=[5, 6, 7, 8, 9, 10, 11])
+        parser.add_argument('--sections', default='АБВ', help="Буквы классов в параллели (по умолчанию АБВ)")
+        parser.add_argument('--students-per-section', type=int, default=25)
+        parser.add_argument('--years', type=int, default=2, help="Учебных лет (по 4 четверти, в каждой — GAT)")
+        parser.add_argument('--subjects', type=int, default=4)
+        parser.add_argument('--questions', type=int, default=20, help="Вопросов на предмет в тесте")
+        parser.add_argument('--no-answers', action='store_true', help="Не создавать StudentAnswer (только StudentResult)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--flush', action='store_true', help="Сначала удалить ранее сгенерированные данные")
+        parser.add_argument('--flush-only', action='store_true', help="Только удалить синтетические данные")
+
+    def handle(self, *args, **options):
+        if options['flush'] or options['flush_only']:
+            deleted = flush_synthetic_network()
+            self.stdout.write(f"Удалено объектов синтетической сети: {deleted}")
+            if options['flush_only']:
+                return
+
+        start = time.perf_counter()
+        stats = generate_network(
+            schools=options['schools'], parallels=options['parallels'], sections=options['sections'],
+            students_per_section=options['students_per_section'], years=options['years'],
+            subjects=options['subjects'], questions_per_subject=options['questions'],
+            with_answers=not options['no_answers'], seed=options['seed'], log=self.stdout.write,
+        )
+        ensure_bench_users()
+        summary = ", ".join(f"{key}: {value}" for key, value in stats.items())
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - start:.1f}с. {summary}"))
@@ -0,0 +1,70 @@
+# D:\GAT\core\management\commands\provision_student_accounts.py
+
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from core.account_provisioning import provision_student_accounts
+from core.export_jobs import _render_pdf
+from core.models import School, SchoolClass, Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает аккаунты ученикам школы (или отдельных классов/параллелей) одной пачкой "
+        "и сохраняет PDF с логинами по каждому классу."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', help="Код (school_id) или ID школы")
+        parser.add_argument('--class', type=int, nargs='*', dest='class_ids', default=[],
+                            help="ID классов; для параллели берутся все ее классы")
+        parser.add_argument('--action', choices=['create', 'reset_and_export'], default='create',
+                            help="reset_and_export — также сбросить пароли существующим аккаунтам")
+        parser.add_argument('--output-dir', default='logins', help="Папка для PDF-файлов")
+        parser.add_argument('--no-pdf', action='store_true', help="Только создать аккаунты")
+
+    def handle(self, *args, **options):
+        if not options['school'] and not options['class_ids']:
+            raise CommandError("Укажите --school или --class.")
+
+        students = Student.objects.all()
+        if options['school']:
+            lookup = Q(school_id=options['school'])
+            if options['school'].isdigit():
+                lookup |= Q(pk=int(options['school']))
+            school = School.objects.filter(lookup).first()
+            if school is None:
+                raise CommandError(f"Школа '{options['school']}' не найдена.")
+            students = students.filter(school_class__school=school)
+        if options['class_ids']:
+            students = students.filter(
+                Q(school_class_id__in=options['class_ids']) | Q(school_class__parent_id__in=options['class_ids'])
+            )
+
+        started = time.perf_counter()
+        credentials, created_count, reset_count = provision_student_accounts(students, options['action'])
+        self.stdout.write(
+            f"Аккаунтов создано: {created_count}, паролей сброшено: {reset_count} "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+        if options['no_pdf'] or not credentials:
+            return
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        by_class = {}
+        for cred in credentials:
+            by_class.setdefault(cred['school_class_id'], []).append(cred)
+        classes = SchoolClass.objects.select_related('school').in_bulk(list(by_class))
+        for class_id, class_credentials in by_class.items():
+            school_class = classes[class_id]
+            path = output_dir / f'logins_{school_class.school.school_id}_{school_class.name}.pdf'
+            path.write_bytes(_render_pdf(
+                'students/logins_pdf.html', {'credentials': class_credentials, 'school_class': school_class}
+            ))
+            self.stdout.write(f"  {path}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово. PDF-файлов: {len(by_class)}"))
@@ -0,0 +1,13 @@
+# D:\GAT\core\management\commands\rebuild_archive_summary.py
+
+from django.core.management.base import BaseCommand
+
+from core.archive_summary import rebuild_archive_summary
+
+
+class Command(BaseCommand):
+    help = "Пересобирает сводку архива результатов (год/четверть/школа/параллель) целиком."
+
+    def handle(self, *args, **options):
+        rows = rebuild_archive_summary()
+        self.stdout.write(self.style.SUCCESS(f"Готово. Строк сводки: {rows}"))
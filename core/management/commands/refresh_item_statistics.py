@@ -0,0 +1,38 @@
+# D:\GAT\core\management\commands\refresh_item_statistics.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.item_statistics import refresh_test_statistics, stale_tests
+from core.models import GatTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает психометрические показатели вопросов (p, дискриминация, точечно-бисериальная "
+        "корреляция, дистракторы) и KR-20 тестов. По умолчанию — только тесты, чьи результаты изменились."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов")
+        parser.add_argument('--all', action='store_true', help="Все тесты с результатами")
+
+    def handle(self, *args, **options):
+        if options['test_ids']:
+            tests = GatTest.objects.filter(id__in=options['test_ids'])
+        elif options['all']:
+            tests = GatTest.objects.filter(results__isnull=False).distinct()
+        else:
+            tests = stale_tests()
+
+        started = time.perf_counter()
+        refreshed = 0
+        for gat_test in tests.order_by('id'):
+            count = refresh_test_statistics(gat_test)
+            refreshed += 1
+            self.stdout.write(f"  {gat_test.name}: вопросов {count}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово. Пересчитано тестов: {refreshed} за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,26 @@
+# D:\GAT\core\management\commands\refresh_results_derived.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import GatTest
+from core.services import refresh_results_derived_data
+
+
+class Command(BaseCommand):
+    help = "Пересобирает все производные данные результатов (матрица ответов, агрегаты, ранги) для GAT-тестов."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов (по умолчанию — все с результатами)")
+
+    def handle(self, *args, **options):
+        tests = GatTest.objects.filter(results__isnull=False).distinct().order_by('id')
+        if options['test_ids']:
+            tests = GatTest.objects.filter(id__in=options['test_ids']).order_by('id')
+
+        refreshed = 0
+        for gat_test in tests.iterator():
+            refresh_results_derived_data(gat_test)
+            refreshed += 1
+            self.stdout.write(f"  {gat_test.name} (ID {gat_test.pk})")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово. Обновлено тестов: {refreshed}"))
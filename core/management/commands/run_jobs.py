@@ -0,0 +1,51 @@
+# D:\GAT\core\management\commands\run_jobs.py
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, purge_finished_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых задач (PDF и тяжелые экспорты): забирает задачи из очереди в БД и выполняет их."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Выполнить задачи, стоящие в очереди, и выйти")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Пауза между опросами пустой очереди, сек.")
+        parser.add_argument('--purge-days', type=int, default=7, help="Удалять завершенные задачи и их файлы старше N дней (0 — не удалять)")
+
+    def handle(self, *args, **options):
+        purge_every = 60 * 60
+        last_purge = 0
+        processed = 0
+
+        self.stdout.write("Воркер фоновых задач запущен.")
+        try:
+            while True:
+                if options['purge_days'] and time.monotonic() - last_purge > purge_every:
+                    purged = purge_finished_jobs(timedelta(days=options['purge_days']))
+                    if purged:
+                        self.stdout.write(f"  удалено старых задач: {purged}")
+                    last_purge = time.monotonic()
+
+                if not options['once']:
+                    # Долгоживущий процесс: закрываем упавшие/устаревшие соединения, как после запроса
+                    close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                status = run_job(job)
+                processed += 1
+                style = self.style.SUCCESS if status == 'DONE' else self.style.ERROR
+                self.stdout.write(style(f"  #{job.pk} {job.kind}: {status} {job.message}"))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f"Выполнено задач: {processed}")
@@ -0,0 +1,39 @@
+# D:\GAT\core\management\commands\warm_booklet_cache.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.booklet_cache import get_or_build_booklet
+from core.models import GatTest
+from core.views.student_exams import build_booklet_docx, render_booklet_pdf
+
+BUILDERS = {'docx': build_booklet_docx, 'pdf': render_booklet_pdf}
+
+
+class Command(BaseCommand):
+    help = "Заранее собирает буклеты (DOCX/PDF) предстоящих тестов в кэш буклетов."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14, help="Тесты с датой в ближайшие N дней (по умолчанию 14)")
+        parser.add_argument('--test', type=int, nargs='*', dest='test_ids', help="ID тестов (вместо отбора по дате)")
+        parser.add_argument('--format', nargs='*', choices=sorted(BUILDERS), default=sorted(BUILDERS), dest='formats')
+
+    def handle(self, *args, **options):
+        if options['test_ids']:
+            tests = GatTest.objects.filter(id__in=options['test_ids'])
+        else:
+            today = timezone.localdate()
+            tests = GatTest.objects.filter(test_date__range=(today, today + datetime.timedelta(days=options['days'])))
+        tests = tests.filter(questions__isnull=False).distinct().select_related('school_class').order_by('test_date', 'id')
+
+        built, cached = 0, 0
+        for test in tests:
+            for fmt in options['formats']:
+                _, is_new = get_or_build_booklet(test, fmt, lambda: BUILDERS[fmt](test))
+                built += is_new
+                cached += not is_new
+                self.stdout.write(f"  {test.name} (ID {test.pk}) {fmt}: {'собран' if is_new else 'уже в кэше'}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово. Собрано: {built}, уже было в кэше: {cached}"))
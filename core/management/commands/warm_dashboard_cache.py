@@ -0,0 +1,42 @@
+# D:\GAT\core\management\commands\warm_dashboard_cache.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.dashboard_cache import get_dashboard_snapshot, snapshot_key
+from core.views.dashboard import build_dashboard_snapshot, resolve_period
+
+PERIODS = ['year', 'quarter', 'all']
+
+
+class Command(BaseCommand):
+    help = "Заранее строит снимки главной панели для всех пользователей (один снимок на область доступа и период)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', nargs='*', choices=PERIODS, default=PERIODS, dest='periods')
+        parser.add_argument('--user', nargs='*', dest='usernames', help="Только для этих пользователей")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True).filter(Q(is_superuser=True) | Q(profile__isnull=False))
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        # Ученики видят свою панель (student_dashboard), главную панель не открывают
+        users = users.exclude(profile__role='STUDENT').select_related('profile').order_by('id')
+
+        periods = [resolve_period(period) for period in options['periods']]
+        seen, built = set(), 0
+        for user in users:
+            for period, start_date, end_date in periods:
+                key = snapshot_key(user, start_date, end_date)
+                if key in seen:
+                    continue
+                seen.add(key)
+                _, is_new = get_dashboard_snapshot(
+                    user, start_date, end_date, lambda: build_dashboard_snapshot(user, start_date, end_date)
+                )
+                built += is_new
+                if is_new:
+                    self.stdout.write(f"  {user.username}, {period}: собран")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово. Снимков: {len(seen)}, собрано заново: {built}"))
@@ -0,0 +1,69 @@
+# D:\GAT\core\middleware.py
+
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .performance import query_timer, record_view_metrics, start_request_metrics, stop_request_metrics, SQL_MAX_LENGTH
+
+logger = logging.getLogger('performance_logger')
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет каждый запрос: общее время, число и время SQL-запросов,
+    попадания в кэш, время рендера шаблонов. Медленные запросы (дольше
+    PERF_SLOW_REQUEST_MS) пишутся в logs/slow_requests.log вместе с самыми
+    долгими SQL-запросами; перцентили по view видны на странице
+    «Производительность» в панели управления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.PERF_MONITORING_ENABLED
+        self.skip_prefixes = tuple(p for p in (settings.STATIC_URL, settings.MEDIA_URL) if p)
+
+    def __call__(self, request):
+        if not self.enabled or request.path.startswith(self.skip_prefixes):
+            return self.get_response(request)
+
+        metrics, token = start_request_metrics(settings.PERF_SLOW_TOP_QUERIES)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(query_timer))
+                response = self.get_response(request)
+            metrics.finish()
+        finally:
+            stop_request_metrics(token)
+
+        match = request.resolver_match
+        if match is None:
+            return response
+
+        is_slow = metrics.total * 1000 >= settings.PERF_SLOW_REQUEST_MS
+        record_view_metrics(match.view_name, metrics, is_slow)
+        if is_slow:
+            self._log_slow_request(request, match.view_name, response, metrics)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = (
+                f'total;dur={metrics.total * 1000:.1f}, db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} SQL", '
+                f'render;dur={metrics.render_time * 1000:.1f}'
+            )
+        return response
+
+    def _log_slow_request(self, request, view_name, response, metrics):
+        user = getattr(request, 'user', None)
+        lines = [
+            f"{request.method} {request.get_full_path()} [{view_name}] -> {response.status_code}: "
+            f"{metrics.total * 1000:.0f} мс, SQL {metrics.db_queries} за {metrics.db_time * 1000:.0f} мс, "
+            f"рендер {metrics.render_time * 1000:.0f} мс, кэш {metrics.cache_hits}/{metrics.cache_hits + metrics.cache_misses}, "
+            f"пользователь {user.pk if user is not None and user.is_authenticated else '-'}"
+        ]
+        for n, (duration, sql) in enumerate(metrics.slowest_queries(), 1):
+            lines.append(f"    {n}. {duration * 1000:.1f} мс: {sql[:SQL_MAX_LENGTH]}")
+        logger.warning("\n".join(lines))
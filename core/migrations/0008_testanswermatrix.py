@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_bankquestion_image_width'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestAnswerMatrix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('n_students', models.PositiveIntegerField(default=0, verbose_name='Кол-во учеников')),
+                ('n_questions', models.PositiveIntegerField(default=0, verbose_name='Кол-во вопросов')),
+                ('student_ids', models.JSONField(default=list, verbose_name='ID учеников (строки матрицы)')),
+                ('result_ids', models.JSONField(default=list, verbose_name='ID результатов (строки матрицы)')),
+                ('columns', models.JSONField(default=list, verbose_name='Колонки [subject_id, номер вопроса]')),
+                ('subject_index', models.JSONField(default=dict, verbose_name='Диапазоны колонок по предметам')),
+                ('correct_bits', models.BinaryField(default=bytes, verbose_name='Биты верных ответов')),
+                ('answered_bits', models.BinaryField(default=bytes, verbose_name='Биты наличия ответа')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='Дата сборки')),
+                ('gat_test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='answer_matrix', to='core.gattest', verbose_name='GAT тест')),
+            ],
+            options={
+                'verbose_name': 'Матрица ответов теста',
+                'verbose_name_plural': 'Матрицы ответов тестов',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_testanswermatrix'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionResultRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_number', models.CharField(max_length=20, verbose_name='Номер вопроса')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('answered', models.PositiveIntegerField(default=0, verbose_name='Всего ответов')),
+                ('gat_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_rollups', to='core.gattest', verbose_name='GAT тест')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_rollups', to='core.schoolclass', verbose_name='Класс')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_rollups', to='core.subject', verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Сводка по вопросу',
+                'verbose_name_plural': 'Сводки по вопросам',
+                'constraints': [models.UniqueConstraint(fields=('gat_test', 'school_class', 'subject', 'question_number'), name='unique_question_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubjectResultRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('students', models.PositiveIntegerField(default=0, verbose_name='Учеников с результатом')),
+                ('participants', models.PositiveIntegerField(default=0, verbose_name='Учеников с ответами по предмету')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('answered', models.PositiveIntegerField(default=0, verbose_name='Всего ответов')),
+                ('question_count', models.PositiveIntegerField(default=0, verbose_name='Вопросов по QuestionCount')),
+                ('grade_histogram', models.JSONField(default=dict, verbose_name='Распределение оценок')),
+                ('gat_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_rollups', to='core.gattest', verbose_name='GAT тест')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_rollups', to='core.schoolclass', verbose_name='Класс')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_rollups', to='core.subject', verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Сводка по предмету',
+                'verbose_name_plural': 'Сводки по предметам',
+                'constraints': [models.UniqueConstraint(fields=('gat_test', 'school_class', 'subject'), name='unique_subject_rollup')],
+            },
+        ),
+    ]
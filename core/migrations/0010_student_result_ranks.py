@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_result_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentresult',
+            name='class_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место в классе'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='class_total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Учеников в классе'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='parallel_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место в параллели'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='parallel_total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Учеников в параллели'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='school_rank',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Место в школе'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='school_total',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Учеников в школе'),
+        ),
+    ]
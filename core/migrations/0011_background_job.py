@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:00
+
+import core.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_student_result_ranks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Тип задачи')),
+                ('title', models.CharField(blank=True, max_length=255, verbose_name='Название')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('PENDING', 'В очереди'), ('RUNNING', 'Выполняется'), ('DONE', 'Готово'), ('FAILED', 'Ошибка')], db_index=True, default='PENDING', max_length=10, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %')),
+                ('message', models.CharField(blank=True, max_length=255, verbose_name='Сообщение')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('result_file', models.FileField(blank=True, storage=core.models.JobFileStorage(), upload_to='%Y/%m/', verbose_name='Файл результата')),
+                ('result_filename', models.CharField(blank=True, max_length=255, verbose_name='Имя файла для скачивания')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='background_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Создал')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_backgr_status_e66a68_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_background_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('n_tests', models.PositiveIntegerField(default=0, verbose_name='Тестов')),
+                ('n_students', models.PositiveIntegerField(default=0, verbose_name='Ответивших')),
+                ('n_correct', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('p_value', models.FloatField(blank=True, null=True, verbose_name='Трудность (p)')),
+                ('discrimination', models.FloatField(blank=True, null=True, verbose_name='Индекс дискриминации')),
+                ('point_biserial', models.FloatField(blank=True, null=True, verbose_name='Точечно-бисериальная корреляция')),
+                ('distractors', models.JSONField(default=dict, verbose_name='Анализ дистракторов')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчета')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistic', to='core.bankquestion', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Статистика вопроса',
+                'verbose_name_plural': 'Статистика вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TestStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('n_students', models.PositiveIntegerField(default=0, verbose_name='Учеников')),
+                ('n_items', models.PositiveIntegerField(default=0, verbose_name='Вопросов')),
+                ('mean_score', models.FloatField(blank=True, null=True, verbose_name='Средний балл')),
+                ('score_variance', models.FloatField(blank=True, null=True, verbose_name='Дисперсия балла')),
+                ('kr20', models.FloatField(blank=True, null=True, verbose_name='KR-20')),
+                ('subject_kr20', models.JSONField(default=dict, verbose_name='KR-20 по предметам')),
+                ('results_version', models.CharField(blank=True, max_length=64, verbose_name='Версия результатов')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчета')),
+                ('gat_test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistic', to='core.gattest', verbose_name='GAT тест')),
+            ],
+            options={
+                'verbose_name': 'Надежность теста',
+                'verbose_name_plural': 'Надежность тестов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_number', models.CharField(max_length=20, verbose_name='Номер вопроса в предмете')),
+                ('n_students', models.PositiveIntegerField(default=0, verbose_name='Ответивших')),
+                ('n_correct', models.PositiveIntegerField(default=0, verbose_name='Верных ответов')),
+                ('p_value', models.FloatField(blank=True, null=True, verbose_name='Трудность (p)')),
+                ('discrimination', models.FloatField(blank=True, null=True, verbose_name='Индекс дискриминации')),
+                ('point_biserial', models.FloatField(blank=True, null=True, verbose_name='Точечно-бисериальная корреляция')),
+                ('distractors', models.JSONField(default=dict, verbose_name='Анализ дистракторов')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчета')),
+                ('gat_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_statistics', to='core.gattest', verbose_name='GAT тест')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_statistics', to='core.bankquestion', verbose_name='Вопрос')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_statistics', to='core.subject', verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Статистика вопроса в тесте',
+                'verbose_name_plural': 'Статистика вопросов в тестах',
+                'constraints': [models.UniqueConstraint(fields=('gat_test', 'question'), name='unique_item_statistic')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:23
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+# Триграммные индексы нужны для поиска по подстроке и с опечатками. pg_trgm входит в
+# contrib PostgreSQL, но может отсутствовать на сервере — тогда поиск работает
+# только по полнотекстовым индексам (см. core/search.py).
+TRIGRAM_INDEXES = [
+    ('student_search_trgm', 'core_student', 'search_document'),
+    ('gattest_name_trgm', 'core_gattest', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in TRIGRAM_INDEXES:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name, _, _ in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_item_statistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankquestion',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('text', config='russian', weight='A'), '||', django.contrib.postgres.search.SearchVector('tags', config='russian', weight='B'), django.contrib.postgres.search.SearchConfig('russian')), '||', django.contrib.postgres.search.SearchVector('text', 'tags', config='simple', weight='C'), django.contrib.postgres.search.SearchConfig('russian')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='gattest',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('name', config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='search_document',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('last_name_ru', models.Value(' '), 'first_name_ru', models.Value(' '), 'last_name_tj', models.Value(' '), 'first_name_tj', models.Value(' '), 'last_name_en', models.Value(' '), 'first_name_en', models.Value(' '), 'student_id', output_field=models.TextField())), output_field=models.TextField()),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('last_name_ru', 'first_name_ru', 'last_name_tj', 'first_name_tj', 'last_name_en', 'first_name_en', django.db.models.functions.text.Replace('student_id', models.Value('-'), models.Value(' ')), config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='bankquestion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='bankquestion_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='gattest',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='gattest_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='student_search_gin'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bankquestion',
+            index=models.Index(fields=['school_class', 'subject', 'id'], name='bankquestion_assembly_idx'),
+        ),
+    ]
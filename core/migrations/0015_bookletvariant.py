@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_bankquestion_assembly_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookletVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('name', models.CharField(max_length=2, verbose_name='Вариант')),
+                ('seed', models.BigIntegerField(default=0, verbose_name='Зерно перестановки')),
+                ('question_ids', models.JSONField(default=list, verbose_name='Порядок вопросов')),
+                ('option_orders', models.JSONField(default=list, verbose_name='Порядок вариантов ответа')),
+                ('answer_key', models.JSONField(default=list, verbose_name='Ключ ответов')),
+                ('gat_test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booklet_variants', to='core.gattest', verbose_name='GAT тест')),
+            ],
+            options={
+                'verbose_name': 'Вариант буклета',
+                'verbose_name_plural': 'Варианты буклетов',
+                'ordering': ['gat_test', 'name'],
+                'constraints': [models.UniqueConstraint(fields=('gat_test', 'name'), name='unique_variant_per_test')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_archive_summary(apps, schema_editor):
+    """Первичное заполнение сводки (как core.archive_summary.rebuild_archive_summary)."""
+    StudentResult = apps.get_model('core', 'StudentResult')
+    ArchiveSummary = apps.get_model('core', 'ArchiveSummary')
+    results = StudentResult.objects.filter(gat_test__quarter__isnull=False).order_by()
+    year_key = {
+        'year_id': 'gat_test__quarter__year_id',
+        'school_id': 'gat_test__school_id',
+        'school_class_id': 'gat_test__school_class_id',
+    }
+    rows = []
+    for key in ({**year_key, 'quarter_id': 'gat_test__quarter_id'}, year_key):
+        groups = results.values(*key.values()).annotate(
+            test_count=Count('gat_test', distinct=True),
+            student_count=Count('student', distinct=True),
+            result_count=Count('id'),
+        )
+        for group in groups:
+            rows.append(ArchiveSummary(
+                **{field: group[path] for field, path in key.items()},
+                test_count=group['test_count'], student_count=group['student_count'], result_count=group['result_count'],
+            ))
+    ArchiveSummary.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_bookletvariant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_count', models.PositiveIntegerField(default=0, verbose_name='Тестов с результатами')),
+                ('student_count', models.PositiveIntegerField(default=0, verbose_name='Учеников')),
+                ('result_count', models.PositiveIntegerField(default=0, verbose_name='Результатов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('quarter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archive_summaries', to='core.quarter', verbose_name='Четверть')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_summaries', to='core.school', verbose_name='Школа')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_summaries', to='core.schoolclass', verbose_name='Параллель')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_summaries', to='core.academicyear', verbose_name='Учебный год')),
+            ],
+            options={
+                'verbose_name': 'Сводка архива',
+                'verbose_name_plural': 'Сводки архива',
+                'indexes': [
+                    models.Index(fields=['year', 'quarter', 'school'], name='archive_year_quarter_idx'),
+                    models.Index(fields=['quarter', 'school'], name='archive_quarter_school_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(condition=models.Q(('quarter__isnull', False)), fields=('quarter', 'school', 'school_class'), name='unique_archive_quarter_summary'),
+                    models.UniqueConstraint(condition=models.Q(('quarter__isnull', True)), fields=('year', 'school', 'school_class'), name='unique_archive_year_summary'),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_archive_summary, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,17 @@
 # D:\GAT\core\models.py (ОБНОВЛЕННАЯ ВЕРСИЯ)
 
+import os
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Concat, Lower, Replace
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.files.storage import FileSystemStorage
 from django.core.exceptions import ValidationError
 from django.db.models import Q, F, UniqueConstraint
 from django.utils import timezone
+from django.utils.deconstruct import deconstructible
 
 # =============================================================================
 # --- БАЗОВЫЕ И ВСПОМОГАТЕЛЬНЫЕ МОДЕЛИ ---
@@ -183,11 +190,24 @@ class BankQuestion(BaseModel):
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='MEDIUM', verbose_name="Сложность")
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_bank_questions', verbose_name="Автор")
     tags = models.CharField(max_length=255, blank=True, verbose_name="Теги для поиска")
+    # Полнотекстовый индекс (core/search.py): русская морфология + словоформы как есть (таджикский, английский)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('text', config='russian', weight='A') + SearchVector('tags', config='russian', weight='B')
+            + SearchVector('text', 'tags', config='simple', weight='C')
+        ),
+        output_field=SearchVectorField(), db_persist=True,
+    )
 
     class Meta:
         ordering = ['topic', 'created_at']
         verbose_name = "Вопрос из Банка"
         verbose_name_plural = "Вопросы из Банка"
+        indexes = [
+            GinIndex(fields=['search_vector'], name='bankquestion_search_gin'),
+            # Keyset-страницы доступных вопросов при сборке теста (core/question_assembly.py)
+            models.Index(fields=['school_class', 'subject', 'id'], name='bankquestion_assembly_idx'),
+        ]
 
     def __str__(self):
         return f"Вопрос ({self.subject.abbreviation or self.subject.name}, {self.school_class.name} кл.): {self.text[:50]}..."
@@ -316,11 +336,15 @@ class GatTest(BaseModel):
     # Настройки для генерации Буклетов
     shuffle_questions = models.BooleanField(default=False, verbose_name="Перемешивать вопросы?")
     shuffle_options = models.BooleanField(default=False, verbose_name="Перемешивать варианты?")
+    search_vector = models.GeneratedField(
+        expression=SearchVector('name', config='simple'), output_field=SearchVectorField(), db_persist=True,
+    )
 
     class Meta:
         ordering = ['-test_date', 'test_number', 'day']
         verbose_name = "GAT Тест"
         verbose_name_plural = "GAT Тесты"
+        indexes = [GinIndex(fields=['search_vector'], name='gattest_search_gin')]
 
     def __str__(self):
         return self.name
@@ -337,6 +361,32 @@ class GatTest(BaseModel):
         """Автоматическое получение предметов из выбранных вопросов"""
         return Subject.objects.filter(bank_questions__in=self.questions.all()).distinct()
 
+class BookletVariant(BaseModel):
+    """
+    Вариант буклета теста (A, B, ...): только перестановки и ключ ответов
+    (core/booklet_variants.py). Буклет варианта собирается из них по запросу,
+    загрузчик результатов по ним возвращает ответы к исходной нумерации.
+    """
+    gat_test = models.ForeignKey(GatTest, on_delete=models.CASCADE, related_name='booklet_variants', verbose_name="GAT тест")
+    name = models.CharField(max_length=2, verbose_name="Вариант")
+    seed = models.BigIntegerField(default=0, verbose_name="Зерно перестановки")
+    # id вопросов в порядке варианта
+    question_ids = models.JSONField(default=list, verbose_name="Порядок вопросов")
+    # Для каждого вопроса варианта — номера (с 1) исходных вариантов ответа в порядке показа
+    option_orders = models.JSONField(default=list, verbose_name="Порядок вариантов ответа")
+    # Для каждого вопроса варианта — битовая маска верных позиций (бит 0 — «A»)
+    answer_key = models.JSONField(default=list, verbose_name="Ключ ответов")
+
+    class Meta:
+        ordering = ['gat_test', 'name']
+        verbose_name = "Вариант буклета"
+        verbose_name_plural = "Варианты буклетов"
+        constraints = [UniqueConstraint(fields=['gat_test', 'name'], name='unique_variant_per_test')]
+
+    def __str__(self):
+        return f"{self.gat_test.name}, вариант {self.name}"
+
+
 # =============================================================================
 # --- МОДЕЛИ УЧЕНИКОВ И ИХ РЕЗУЛЬТАТОВ ---
 # =============================================================================
@@ -353,12 +403,34 @@ class Student(BaseModel):
     first_name_tj = models.CharField(max_length=100, verbose_name='Ном (точ.)', blank=True)
     last_name_en = models.CharField(max_length=100, verbose_name='Surname (eng.)', blank=True)
     first_name_en = models.CharField(max_length=100, verbose_name='Name (eng.)', blank=True)
+    # Для поиска (core/search.py): ФИО на всех языках и ID одной строкой (триграммы) и tsvector (префиксы слов)
+    search_document = models.GeneratedField(
+        expression=Lower(Concat(
+            'last_name_ru', models.Value(' '), 'first_name_ru', models.Value(' '),
+            'last_name_tj', models.Value(' '), 'first_name_tj', models.Value(' '),
+            'last_name_en', models.Value(' '), 'first_name_en', models.Value(' '), 'student_id',
+            output_field=models.TextField(),
+        )),
+        output_field=models.TextField(), db_persist=True,
+    )
+    search_vector = models.GeneratedField(
+        expression=SearchVector(
+            'last_name_ru', 'first_name_ru', 'last_name_tj', 'first_name_tj', 'last_name_en', 'first_name_en',
+            # 'S-1001' иначе разбирается как 's' и число '-1001'
+            Replace('student_id', models.Value('-'), models.Value(' ')),
+            config='simple',
+        ),
+        output_field=SearchVectorField(), db_persist=True,
+    )
 
     class Meta:
         ordering = ['school_class', 'last_name_ru', 'first_name_ru']
         verbose_name = "Ученик"
         verbose_name_plural = "Ученики"
-        indexes = [models.Index(fields=['student_id'])]
+        indexes = [
+            models.Index(fields=['student_id']),
+            GinIndex(fields=['search_vector'], name='student_search_gin'),
+        ]
 
     def __str__(self):
         return f"{self.last_name_ru} {self.first_name_ru} ({self.school_class.name})"
@@ -384,6 +456,14 @@ class StudentResult(BaseModel):
     scores_by_subject = models.JSONField(default=dict, blank=True, verbose_name="Баллы по предметам")
     booklet_variant = models.CharField(max_length=2, blank=True, null=True, verbose_name="Вариант Буклета")
 
+    # Ранги по total_score (1, 2, 2, 4...) и размеры групп; пересчитываются core/ranks.py
+    class_rank = models.PositiveIntegerField(null=True, blank=True, verbose_name="Место в классе")
+    class_total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Учеников в классе")
+    school_rank = models.PositiveIntegerField(null=True, blank=True, verbose_name="Место в школе")
+    school_total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Учеников в школе")
+    parallel_rank = models.PositiveIntegerField(null=True, blank=True, verbose_name="Место в параллели")
+    parallel_total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Учеников в параллели")
+
     class Meta:
         ordering = ['-gat_test__test_date', '-total_score']
         verbose_name = "Результат ученика"
@@ -502,4 +582,261 @@ class QuestionCount(BaseModel):
         ]
 
     def __str__(self):
-        return f"{self.subject.name} в классе {self.school_class.name}"
\ No newline at end of file
+        return f"{self.subject.name} в классе {self.school_class.name}"
+# =============================================================================
+# --- ПРОИЗВОДНЫЕ ДАННЫЕ ДЛЯ АНАЛИТИКИ ---
+# =============================================================================
+
+class TestAnswerMatrix(models.Model):
+    """
+    Компактное представление ответов по GAT-тесту: битовая матрица
+    (ученики × вопросы), упакованная np.packbits, плюс индекс колонок по предметам.
+    Пересобирается вместе с StudentResult.scores_by_subject (см. core/answer_matrix.py).
+    """
+    gat_test = models.OneToOneField(GatTest, on_delete=models.CASCADE, related_name='answer_matrix', verbose_name="GAT тест")
+    n_students = models.PositiveIntegerField(default=0, verbose_name="Кол-во учеников")
+    n_questions = models.PositiveIntegerField(default=0, verbose_name="Кол-во вопросов")
+    student_ids = models.JSONField(default=list, verbose_name="ID учеников (строки матрицы)")
+    result_ids = models.JSONField(default=list, verbose_name="ID результатов (строки матрицы)")
+    columns = models.JSONField(default=list, verbose_name="Колонки [subject_id, номер вопроса]")
+    subject_index = models.JSONField(default=dict, verbose_name="Диапазоны колонок по предметам")
+    correct_bits = models.BinaryField(default=bytes, verbose_name="Биты верных ответов")
+    answered_bits = models.BinaryField(default=bytes, verbose_name="Биты наличия ответа")
+    built_at = models.DateTimeField(auto_now=True, verbose_name="Дата сборки")
+
+    class Meta:
+        verbose_name = "Матрица ответов теста"
+        verbose_name_plural = "Матрицы ответов тестов"
+
+    def __str__(self):
+        return f"Матрица ответов: {self.gat_test_id} ({self.n_students}×{self.n_questions})"
+
+
+class SubjectResultRollup(models.Model):
+    """
+    Агрегат результатов по (тест, класс ученика, предмет).
+    possible = question_count × students; grade_histogram — {оценка: кол-во учеников}.
+    Пересобирается целиком по тесту при загрузке/удалении результатов (core/rollups.py).
+    """
+    gat_test = models.ForeignKey(GatTest, on_delete=models.CASCADE, related_name='subject_rollups', verbose_name="GAT тест")
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, related_name='subject_rollups', verbose_name="Класс")
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='subject_rollups', verbose_name="Предмет")
+    students = models.PositiveIntegerField(default=0, verbose_name="Учеников с результатом")
+    participants = models.PositiveIntegerField(default=0, verbose_name="Учеников с ответами по предмету")
+    correct = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    answered = models.PositiveIntegerField(default=0, verbose_name="Всего ответов")
+    question_count = models.PositiveIntegerField(default=0, verbose_name="Вопросов по QuestionCount")
+    grade_histogram = models.JSONField(default=dict, verbose_name="Распределение оценок")
+
+    class Meta:
+        verbose_name = "Сводка по предмету"
+        verbose_name_plural = "Сводки по предметам"
+        constraints = [
+            UniqueConstraint(fields=['gat_test', 'school_class', 'subject'], name='unique_subject_rollup')
+        ]
+
+    def __str__(self):
+        return f"{self.gat_test_id}/{self.school_class_id}/{self.subject_id}: {self.correct}/{self.possible}"
+
+    @property
+    def possible(self):
+        return self.question_count * self.students
+
+
+class QuestionResultRollup(models.Model):
+    """Агрегат ответов по (тест, класс ученика, предмет, номер вопроса)."""
+    gat_test = models.ForeignKey(GatTest, on_delete=models.CASCADE, related_name='question_rollups', verbose_name="GAT тест")
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, related_name='question_rollups', verbose_name="Класс")
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='question_rollups', verbose_name="Предмет")
+    question_number = models.CharField(max_length=20, verbose_name="Номер вопроса")
+    correct = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    answered = models.PositiveIntegerField(default=0, verbose_name="Всего ответов")
+
+    class Meta:
+        verbose_name = "Сводка по вопросу"
+        verbose_name_plural = "Сводки по вопросам"
+        constraints = [
+            UniqueConstraint(fields=['gat_test', 'school_class', 'subject', 'question_number'], name='unique_question_rollup')
+        ]
+
+    def __str__(self):
+        return f"{self.gat_test_id}/{self.school_class_id}/{self.subject_id}#{self.question_number}: {self.correct}/{self.answered}"
+
+
+# =============================================================================
+# --- СВОДКА АРХИВА РЕЗУЛЬТАТОВ (core/archive_summary.py) ---
+# =============================================================================
+
+class ArchiveSummary(models.Model):
+    """
+    Готовые счетчики архива по (год, четверть, школа теста, параллель теста).
+    Строка с quarter=NULL — итог параллели за год (ученики считаются без
+    повторов по четвертям). Обновляется по группе теста при загрузке/удалении
+    результатов и при переносе теста в другую четверть/школу/параллель.
+    """
+    year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='archive_summaries', verbose_name="Учебный год")
+    quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE, null=True, blank=True, related_name='archive_summaries', verbose_name="Четверть")
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='archive_summaries', verbose_name="Школа")
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, related_name='archive_summaries', verbose_name="Параллель")
+    test_count = models.PositiveIntegerField(default=0, verbose_name="Тестов с результатами")
+    student_count = models.PositiveIntegerField(default=0, verbose_name="Учеников")
+    result_count = models.PositiveIntegerField(default=0, verbose_name="Результатов")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Сводка архива"
+        verbose_name_plural = "Сводки архива"
+        constraints = [
+            UniqueConstraint(
+                fields=['quarter', 'school', 'school_class'], condition=Q(quarter__isnull=False),
+                name='unique_archive_quarter_summary'
+            ),
+            UniqueConstraint(
+                fields=['year', 'school', 'school_class'], condition=Q(quarter__isnull=True),
+                name='unique_archive_year_summary'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'quarter', 'school'], name='archive_year_quarter_idx'),
+            models.Index(fields=['quarter', 'school'], name='archive_quarter_school_idx'),
+        ]
+
+    def __str__(self):
+        period = self.quarter_id or f"год {self.year_id}"
+        return f"{period}/{self.school_id}/{self.school_class_id}: {self.result_count}"
+
+
+# =============================================================================
+# --- ПСИХОМЕТРИЯ ВОПРОСОВ И ТЕСТОВ (core/item_statistics.py) ---
+# =============================================================================
+
+class ItemStatistic(models.Model):
+    """
+    Статистика вопроса в конкретном тесте по StudentAnswer.
+    p_value — доля верных среди ответивших; discrimination — разность долей верных
+    в верхних и нижних 27% по баллу за предмет; point_biserial — корреляция
+    ответа с баллом за предмет без этого вопроса; distractors —
+    {вариант: {"n", "upper", "lower"}}, ключ "none" — выбор неизвестен.
+    """
+    gat_test = models.ForeignKey(GatTest, on_delete=models.CASCADE, related_name='item_statistics', verbose_name="GAT тест")
+    question = models.ForeignKey(BankQuestion, on_delete=models.CASCADE, related_name='item_statistics', verbose_name="Вопрос")
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='item_statistics', verbose_name="Предмет")
+    question_number = models.CharField(max_length=20, verbose_name="Номер вопроса в предмете")
+    n_students = models.PositiveIntegerField(default=0, verbose_name="Ответивших")
+    n_correct = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    p_value = models.FloatField(null=True, blank=True, verbose_name="Трудность (p)")
+    discrimination = models.FloatField(null=True, blank=True, verbose_name="Индекс дискриминации")
+    point_biserial = models.FloatField(null=True, blank=True, verbose_name="Точечно-бисериальная корреляция")
+    distractors = models.JSONField(default=dict, verbose_name="Анализ дистракторов")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчета")
+
+    class Meta:
+        verbose_name = "Статистика вопроса в тесте"
+        verbose_name_plural = "Статистика вопросов в тестах"
+        constraints = [
+            UniqueConstraint(fields=['gat_test', 'question'], name='unique_item_statistic')
+        ]
+
+    def __str__(self):
+        return f"{self.gat_test_id}/{self.question_id}: p={self.p_value}"
+
+
+class QuestionStatistic(models.Model):
+    """Сводная статистика вопроса банка по всем тестам (взвешенная по числу ответивших)."""
+    question = models.OneToOneField(BankQuestion, on_delete=models.CASCADE, related_name='statistic', verbose_name="Вопрос")
+    n_tests = models.PositiveIntegerField(default=0, verbose_name="Тестов")
+    n_students = models.PositiveIntegerField(default=0, verbose_name="Ответивших")
+    n_correct = models.PositiveIntegerField(default=0, verbose_name="Верных ответов")
+    p_value = models.FloatField(null=True, blank=True, verbose_name="Трудность (p)")
+    discrimination = models.FloatField(null=True, blank=True, verbose_name="Индекс дискриминации")
+    point_biserial = models.FloatField(null=True, blank=True, verbose_name="Точечно-бисериальная корреляция")
+    distractors = models.JSONField(default=dict, verbose_name="Анализ дистракторов")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчета")
+
+    class Meta:
+        verbose_name = "Статистика вопроса"
+        verbose_name_plural = "Статистика вопросов"
+
+    def __str__(self):
+        return f"{self.question_id}: p={self.p_value}, D={self.discrimination}"
+
+
+class TestStatistic(models.Model):
+    """Надежность теста (KR-20) в целом и по предметам; results_version — состояние результатов на момент расчета."""
+    gat_test = models.OneToOneField(GatTest, on_delete=models.CASCADE, related_name='statistic', verbose_name="GAT тест")
+    n_students = models.PositiveIntegerField(default=0, verbose_name="Учеников")
+    n_items = models.PositiveIntegerField(default=0, verbose_name="Вопросов")
+    mean_score = models.FloatField(null=True, blank=True, verbose_name="Средний балл")
+    score_variance = models.FloatField(null=True, blank=True, verbose_name="Дисперсия балла")
+    kr20 = models.FloatField(null=True, blank=True, verbose_name="KR-20")
+    subject_kr20 = models.JSONField(default=dict, verbose_name="KR-20 по предметам")
+    results_version = models.CharField(max_length=64, blank=True, verbose_name="Версия результатов")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчета")
+
+    class Meta:
+        verbose_name = "Надежность теста"
+        verbose_name_plural = "Надежность тестов"
+
+    def __str__(self):
+        return f"{self.gat_test_id}: KR-20={self.kr20}"
+
+
+# =============================================================================
+# --- ФОНОВЫЕ ЗАДАЧИ (PDF И ТЯЖЕЛЫЕ ЭКСПОРТЫ) ---
+# =============================================================================
+
+@deconstructible
+class JobFileStorage(FileSystemStorage):
+    """Закрытое хранилище файлов задач (не раздается как MEDIA, только через проверку владельца)."""
+
+    @property
+    def base_location(self):
+        return str(getattr(settings, 'JOB_FILES_ROOT', settings.BASE_DIR / 'job_files'))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+class BackgroundJob(models.Model):
+    """Задача очереди в БД: выполняется командой `manage.py run_jobs`."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'В очереди'
+        RUNNING = 'RUNNING', 'Выполняется'
+        DONE = 'DONE', 'Готово'
+        FAILED = 'FAILED', 'Ошибка'
+
+    kind = models.CharField(max_length=50, verbose_name="Тип задачи")
+    title = models.CharField(max_length=255, blank=True, verbose_name="Название")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True, verbose_name="Статус")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Прогресс, %")
+    message = models.CharField(max_length=255, blank=True, verbose_name="Сообщение")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    result_file = models.FileField(upload_to='%Y/%m/', storage=JobFileStorage(), blank=True, verbose_name="Файл результата")
+    result_filename = models.CharField(max_length=255, blank=True, verbose_name="Имя файла для скачивания")
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='background_jobs', verbose_name="Создал")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.title or self.kind} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in (self.Status.PENDING, self.Status.RUNNING)
+
+    def report_progress(self, progress, message=''):
+        """Обновляет прогресс одним UPDATE (вызывается обработчиком по ходу работы)."""
+        self.progress = max(0, min(100, int(progress)))
+        self.message = message[:255]
+        BackgroundJob.objects.filter(pk=self.pk).update(progress=self.progress, message=self.message)
@@ -0,0 +1,192 @@
+# D:\GAT\core\pagination.py
+
+"""
+Keyset-пагинация и оценка количества строк для длинных списков.
+
+OFFSET-страница N заставляет базу прочитать и выбросить все предыдущие
+строки, а точный COUNT(*) — пройти всю выборку. Здесь следующая страница
+начинается «после последней показанной строки»: курсор хранит значения
+полей сортировки этой строки, и запрос получает условие
+(a > x) OR (a = x AND b > y) ... по тем же полям, что и ORDER BY, с pk в
+конце для однозначности. Такой запрос идет по индексу сортировки, сколько
+бы страниц ни было пролистано. NULL учитываются по правилам PostgreSQL
+(ASC — NULLS LAST, DESC — NULLS FIRST, если не задано явно).
+
+Количество: для больших выборок — оценка планировщика (EXPLAIN), точный
+COUNT только если оценка меньше EXACT_COUNT_BELOW.
+
+Используется HtmxListView (keyset_page_size) и списками учеников;
+фрагмент «Показать еще» / бесконечной прокрутки — components/load_more.html.
+"""
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+from dataclasses import dataclass
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+
+PAGE_SIZE = 50
+EXACT_COUNT_BELOW = 10000
+KEY_PREFIX = 'keyset_'
+
+
+@dataclass
+class KeysetPage:
+    """Страница списка: строки, курсор следующей страницы и номер первой строки (с 0)."""
+    object_list: list
+    next_cursor: str = None
+    start_index: int = 0
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.start_index == 0
+
+
+@dataclass
+class CountEstimate:
+    """Количество строк; is_exact=False — оценка планировщика."""
+    value: int
+    is_exact: bool = True
+
+    def __str__(self):
+        return str(self.value) if self.is_exact else f"≈ {self.value}"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()  # с микросекундами, иначе строки с одинаковой миллисекундой потеряются
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Значение {value!r} нельзя сохранить в курсоре")
+
+
+def encode_cursor(values, start_index):
+    payload = json.dumps({'k': values, 'n': start_index}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(значения ключа, номер первой строки) или None для пустого/испорченного курсора."""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, start_index = payload['k'], int(payload['n'])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    return (values, start_index) if isinstance(values, list) else None
+
+
+def ordering_of(queryset):
+    """Сортировка queryset как [OrderBy] с pk в конце (если его еще нет)."""
+    query = queryset.query
+    if query.order_by:
+        items = query.order_by
+    elif query.default_ordering:
+        items = queryset.model._meta.ordering
+    else:
+        items = []
+
+    pk_names = {'pk', queryset.model._meta.pk.name}
+    ordering, has_pk = [], False
+    for item in items:
+        if isinstance(item, str):
+            if item == '?':
+                raise ValueError("Случайную сортировку нельзя листать по курсору")
+            name = item.lstrip('-')
+            has_pk |= name in pk_names
+            ordering.append(OrderBy(F(name), descending=item.startswith('-')))
+        else:
+            item = item if isinstance(item, OrderBy) else item.asc()
+            has_pk |= isinstance(item.expression, F) and item.expression.name in pk_names
+            ordering.append(item)
+    if not has_pk:
+        ordering.append(OrderBy(F('pk')))
+    return ordering
+
+
+def _nulls_last(order):
+    if order.nulls_last:
+        return True
+    if order.nulls_first:
+        return False
+    return not order.descending
+
+
+def _beyond(name, order, value):
+    """Строки строго дальше value по одному полю сортировки (или None — таких нет)."""
+    if value is None:
+        return None if _nulls_last(order) else Q(**{f'{name}__isnull': False})
+    strict = Q(**{f'{name}__{"lt" if order.descending else "gt"}': value})
+    return strict | Q(**{f'{name}__isnull': True}) if _nulls_last(order) else strict
+
+
+def _after(ordering, values):
+    conditions, equal = [], []
+    for index, (order, value) in enumerate(zip(ordering, values)):
+        name = f'{KEY_PREFIX}{index}'
+        beyond = _beyond(name, order, value)
+        if beyond is not None:
+            conditions.append(reduce(and_, equal + [beyond]))
+        equal.append(Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value}))
+    return reduce(or_, conditions) if conditions else Q(pk__in=[])
+
+
+def keyset_paginate(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    Страница queryset после курсора (см. KeysetPage).
+    Берется page_size + 1 строк, чтобы узнать, есть ли продолжение, без COUNT.
+    """
+    ordering = ordering_of(queryset)
+    keyed = queryset.annotate(**{
+        f'{KEY_PREFIX}{index}': order.expression for index, order in enumerate(ordering)
+    }).order_by(*ordering)
+
+    start_index = 0
+    decoded = decode_cursor(cursor)
+    if decoded and len(decoded[0]) == len(ordering):
+        values, start_index = decoded
+        keyed = keyed.filter(_after(ordering, values))
+
+    rows = list(keyed[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [getattr(last, f'{KEY_PREFIX}{index}') for index in range(len(ordering))],
+            start_index + page_size,
+        )
+    return KeysetPage(object_list=rows, next_cursor=next_cursor, start_index=start_index)
+
+
+def estimate_count(queryset, exact_below=EXACT_COUNT_BELOW):
+    """
+    CountEstimate для queryset: оценка планировщика PostgreSQL, а если она
+    меньше exact_below (или база не PostgreSQL) — точный COUNT.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return CountEstimate(queryset.count())
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < exact_below:
+        return CountEstimate(queryset.count())
+    return CountEstimate(estimate, is_exact=False)
@@ -0,0 +1,226 @@
+# D:\GAT\core\performance.py
+
+"""
+Замеры производительности запросов.
+
+На время запроса (см. core/middleware.py) в contextvar лежит RequestMetrics:
+в него пишут обертка выполнения SQL, кэш-бэкенды с подсчетом попаданий
+(InstrumentedLocMemCache / InstrumentedRedisCache) и шаблонный бэкенд
+InstrumentedDjangoTemplates (время рендера верхнеуровневых шаблонов).
+
+По каждому view в общем кэше хранится скользящее окно последних
+PERF_WINDOW замеров, из которого считаются перцентили для страницы
+«Производительность». Обновление окна не атомарно: при одновременных
+запросах отдельные замеры могут потеряться, для статистики это допустимо.
+"""
+
+import contextvars
+import heapq
+import itertools
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+STATS_KEY = 'perf:view:{}'
+VIEWS_KEY = 'perf:views'
+STATS_TIMEOUT = 60 * 60 * 24 * 7
+SQL_MAX_LENGTH = 2000
+PERCENTILES = (50, 90, 95, 99)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_missing = object()
+
+
+class RequestMetrics:
+    """Метрики одного запроса. Время — в секундах."""
+
+    def __init__(self, top_queries=5):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_time = 0.0
+        self._render_depth = 0
+        self._top_queries = top_queries
+        self._slowest = []
+        self._seq = itertools.count()
+
+    def record_query(self, sql, duration):
+        self.db_queries += 1
+        self.db_time += duration
+        if self._top_queries:
+            item = (duration, next(self._seq), sql)
+            if len(self._slowest) < self._top_queries:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def slowest_queries(self):
+        """[(секунды, sql)] по убыванию времени."""
+        return [(duration, sql) for duration, _, sql in sorted(self._slowest, reverse=True)]
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+
+def start_request_metrics(top_queries=5):
+    metrics = RequestMetrics(top_queries)
+    return metrics, _current.set(metrics)
+
+
+def stop_request_metrics(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def query_timer(execute, sql, params, many, context):
+    """Обертка для connection.execute_wrapper()."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+# --- Кэш с подсчетом попаданий ---
+
+class CacheMetricsMixin:
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _missing, version=version, **kwargs)
+        metrics = _current.get()
+        if value is _missing:
+            if metrics is not None:
+                metrics.cache_misses += 1
+            return default
+        if metrics is not None:
+            metrics.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, **kwargs)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:  # django_redis нужен только в продакшене
+    RedisCache = None
+else:
+    class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+        pass
+
+
+# --- Шаблоны с замером времени рендера ---
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенные render_to_string (из тегов и т.п.) уже входят во внешний рендер
+        metrics._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._render_depth -= 1
+            if metrics._render_depth == 0:
+                metrics.render_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- Скользящая статистика по view ---
+
+def record_view_metrics(view_name, metrics, is_slow):
+    """Добавляет замер в окно view (последние PERF_WINDOW запросов)."""
+    key = STATS_KEY.format(view_name)
+    stats = cache.get(key) or {'count': 0, 'slow': 0, 'cache_hits': 0, 'cache_misses': 0, 'samples': []}
+    stats['count'] += 1
+    stats['slow'] += int(is_slow)
+    stats['cache_hits'] += metrics.cache_hits
+    stats['cache_misses'] += metrics.cache_misses
+    stats['samples'].append((
+        round(metrics.total * 1000, 1), round(metrics.db_time * 1000, 1),
+        metrics.db_queries, round(metrics.render_time * 1000, 1),
+    ))
+    del stats['samples'][:-settings.PERF_WINDOW]
+    cache.set(key, stats, STATS_TIMEOUT)
+
+    views = cache.get(VIEWS_KEY) or set()
+    if view_name not in views:
+        views.add(view_name)
+        cache.set(VIEWS_KEY, views, STATS_TIMEOUT)
+
+
+def percentile(sorted_values, pct):
+    """Перцентиль по методу ближайшего ранга (значения уже отсортированы)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def get_view_stats():
+    """Сводка по всем view, отсортированная по p95 (самые медленные сверху)."""
+    rows = []
+    names = cache.get(VIEWS_KEY) or set()
+    all_stats = cache.get_many([STATS_KEY.format(name) for name in names])
+    for name in names:
+        stats = all_stats.get(STATS_KEY.format(name))
+        if not stats or not stats['samples']:
+            continue
+        samples = stats['samples']
+        totals = sorted(s[0] for s in samples)
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        row = {
+            'view': name,
+            'count': stats['count'],
+            'window': len(samples),
+            'slow': stats['slow'],
+            'max': totals[-1],
+            'avg_db_ms': round(sum(s[1] for s in samples) / len(samples), 1),
+            'avg_queries': round(sum(s[2] for s in samples) / len(samples), 1),
+            'avg_render_ms': round(sum(s[3] for s in samples) / len(samples), 1),
+            'cache_hit_ratio': round(100 * stats['cache_hits'] / lookups) if lookups else None,
+        }
+        for pct in PERCENTILES:
+            row[f'p{pct}'] = percentile(totals, pct)
+        rows.append(row)
+    rows.sort(key=lambda row: row['p95'], reverse=True)
+    return rows
+
+
+def reset_view_stats():
+    names = cache.get(VIEWS_KEY) or set()
+    cache.delete_many([STATS_KEY.format(name) for name in names] + [VIEWS_KEY])
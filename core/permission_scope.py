@@ -0,0 +1,157 @@
+# D:\GAT\core\permission_scope.py
+
+"""
+Область доступа пользователя (школы, классы, предметы, ученики) в виде наборов ID.
+
+Область считается один раз, хранится в общем кэше и на время запроса —
+на объекте user. Ключ кэша содержит две версии: общую (меняется при
+изменении школ, классов, предметов, учеников) и версию пользователя
+(меняется при изменении его профиля и M2M-привязок), поэтому сброс —
+это просто смена версии, без поиска старых ключей.
+"""
+
+import uuid
+from django.core.cache import cache
+
+from accounts.models import UserProfile
+from .models import School, Subject, SchoolClass, Student
+
+SCOPE_CACHE_TIMEOUT = 60 * 60
+GLOBAL_VERSION_KEY = 'perm_scope:v:global'
+USER_VERSION_KEY = 'perm_scope:v:user:{}'
+SCOPE_KEY = 'perm_scope:{}:{}:{}'
+
+# Роли, которые видят все школы (и все классы/учеников в них)
+ALL_SCHOOLS_ROLES = [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.EXPERT]
+ALL_CLASSES_ROLES = [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.DIRECTOR, UserProfile.Role.EXPERT]
+ALL_SUBJECTS_ROLES = [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.DIRECTOR]
+OWN_SUBJECTS_ROLES = [UserProfile.Role.EXPERT, UserProfile.Role.TEACHER, UserProfile.Role.HOMEROOM_TEACHER]
+
+
+class PermissionScope:
+    """
+    Наборы ID, доступные пользователю:
+    school_ids, class_ids, subject_ids — frozenset;
+    student_class_ids — классы, ученики которых доступны (None, если доступ только к себе);
+    own_student_id — ID ученика для роли «Ученик».
+    """
+
+    def __init__(self, school_ids=(), class_ids=(), subject_ids=(), student_class_ids=None, own_student_id=None):
+        self.school_ids = frozenset(school_ids)
+        self.class_ids = frozenset(class_ids)
+        self.subject_ids = frozenset(subject_ids)
+        self.student_class_ids = frozenset(student_class_ids) if student_class_ids is not None else None
+        self.own_student_id = own_student_id
+        self._student_ids = None
+
+    @property
+    def student_ids(self):
+        """ID доступных учеников. Считается лениво и только на время запроса (состав классов меняется часто)."""
+        if self._student_ids is None:
+            if self.student_class_ids is not None:
+                self._student_ids = frozenset(
+                    Student.objects.filter(school_class_id__in=self.student_class_ids).values_list('id', flat=True)
+                )
+            else:
+                self._student_ids = frozenset([self.own_student_id] if self.own_student_id else [])
+        return self._student_ids
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_student_ids'] = None
+        return state
+
+
+def _compute_scope(user):
+    """Считает область доступа по тем же правилам, что и get_accessible_* в views/permissions.py."""
+    profile = getattr(user, 'profile', None)
+    all_school_ids = lambda: School.objects.values_list('id', flat=True)
+    all_subject_ids = lambda: Subject.objects.values_list('id', flat=True)
+
+    if not profile:
+        if user.is_superuser:
+            classes = list(SchoolClass.objects.values_list('id', flat=True))
+            return PermissionScope(all_school_ids(), classes, all_subject_ids(), student_class_ids=classes)
+        return PermissionScope()
+
+    role = profile.role
+    student = profile.student if role == UserProfile.Role.STUDENT else None
+    student_class = student.school_class if student else None
+
+    # --- Школы ---
+    if user.is_superuser or role in ALL_SCHOOLS_ROLES:
+        school_ids = list(all_school_ids())
+    elif role == UserProfile.Role.DIRECTOR:
+        school_ids = list(profile.schools.values_list('id', flat=True))
+    elif role in [UserProfile.Role.TEACHER, UserProfile.Role.HOMEROOM_TEACHER] and profile.school_id:
+        school_ids = [profile.school_id]
+    elif student_class:
+        school_ids = [student_class.school_id]
+    else:
+        school_ids = []
+
+    # --- Предметы ---
+    if user.is_superuser or role in ALL_SUBJECTS_ROLES or role == UserProfile.Role.STUDENT:
+        subject_ids = all_subject_ids()
+    elif role in OWN_SUBJECTS_ROLES:
+        subject_ids = profile.subjects.values_list('id', flat=True)
+    else:
+        subject_ids = []
+
+    # --- Классы и ученики ---
+    student_class_ids, own_student_id = None, None
+    if user.is_superuser or role in ALL_CLASSES_ROLES:
+        class_ids = list(SchoolClass.objects.filter(school_id__in=school_ids).values_list('id', flat=True))
+        student_class_ids = class_ids
+    elif role == UserProfile.Role.HOMEROOM_TEACHER and profile.homeroom_class_id:
+        homeroom_class = profile.homeroom_class
+        class_ids = [homeroom_class.pk] + ([homeroom_class.parent_id] if homeroom_class.parent_id else [])
+        student_class_ids = [homeroom_class.pk]
+    elif role == UserProfile.Role.TEACHER and profile.school_id:
+        class_ids = list(SchoolClass.objects.filter(school_id=profile.school_id).values_list('id', flat=True))
+        student_class_ids = class_ids
+    elif student_class:
+        class_ids = [student_class.pk]
+    else:
+        class_ids = []
+    if student and role == UserProfile.Role.STUDENT:
+        own_student_id = student.pk
+
+    return PermissionScope(school_ids, class_ids, subject_ids, student_class_ids, own_student_id)
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_permission_scope(user):
+    """Возвращает PermissionScope пользователя (из памяти запроса, общего кэша или БД)."""
+    if not user.is_authenticated:
+        return PermissionScope()
+
+    scope = getattr(user, '_permission_scope', None)
+    if scope is not None:
+        return scope
+
+    key = SCOPE_KEY.format(user.pk, _version(GLOBAL_VERSION_KEY), _version(USER_VERSION_KEY.format(user.pk)))
+    scope = cache.get(key)
+    if scope is None:
+        scope = _compute_scope(user)
+        cache.set(key, scope, SCOPE_CACHE_TIMEOUT)
+    user._permission_scope = scope
+    return scope
+
+
+def invalidate_permission_scopes():
+    """Сбрасывает области доступа всех пользователей (изменились школы/классы/предметы/ученики)."""
+    cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_user_scope(user_id):
+    """Сбрасывает область доступа одного пользователя (изменился его профиль или привязки)."""
+    cache.set(USER_VERSION_KEY.format(user_id), uuid.uuid4().hex, None)
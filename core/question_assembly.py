@@ -0,0 +1,138 @@
+# D:\GAT\core\question_assembly.py
+
+"""
+Сборка GAT-теста из банка вопросов (правая колонка страницы редактирования теста).
+
+- Баланс сложности и счетчики по предметам выбранных вопросов считаются одним
+  GROUP BY (предмет, сложность) плюс один запрос целевых процентов DifficultyRule.
+- Доступные вопросы параллели отдаются страницами с keyset-пагинацией по
+  (subject_id, id) — индекс bankquestion_assembly_idx — с фильтрами по предмету,
+  теме, сложности и тексту (полнотекстовый индекс, core/search.py). Уже выбранные
+  вопросы исключаются подзапросом, поэтому страница не зависит от размера банка.
+"""
+
+from django.db.models import Count, Q
+
+from .models import BankQuestion, DifficultyRule, QuestionTopic
+from .search import prefix_query
+
+PAGE_SIZE = 30
+DIFFICULTIES = [('easy', 'EASY'), ('medium', 'MEDIUM'), ('hard', 'HARD')]
+# Стандарт, если для предметов теста нет правила сложности
+DEFAULT_TARGETS = {'easy': 40, 'medium': 40, 'hard': 20}
+
+
+def assembly_stats(test):
+    """
+    Сводка выбранных вопросов: {'total', 'subject_counts': {предмет: n},
+    'difficulty_stats': {'easy': {'count', 'percent', 'target'}, ...}}.
+    """
+    rows = (
+        test.questions.order_by()
+        .values('subject_id', 'subject__name', 'difficulty')
+        .annotate(n=Count('id'))
+    )
+    by_difficulty = {code: 0 for _, code in DIFFICULTIES}
+    subject_counts, subject_ids = {}, set()
+    for row in rows:
+        by_difficulty[row['difficulty']] = by_difficulty.get(row['difficulty'], 0) + row['n']
+        subject_counts[row['subject__name']] = subject_counts.get(row['subject__name'], 0) + row['n']
+        subject_ids.add(row['subject_id'])
+    total = sum(subject_counts.values())
+
+    # Правило берем первое из найденных для предметов теста (как и раньше)
+    rule = None
+    if subject_ids:
+        rule = (
+            DifficultyRule.objects.filter(school_class_id=test.school_class_id, subject_id__in=subject_ids)
+            .order_by('pk').first()
+        )
+    targets = (
+        {'easy': rule.easy_percent, 'medium': rule.medium_percent, 'hard': rule.hard_percent}
+        if rule else DEFAULT_TARGETS
+    )
+
+    difficulty_stats = {}
+    for key, code in DIFFICULTIES:
+        count = by_difficulty.get(code, 0)
+        difficulty_stats[key] = {
+            'count': count,
+            'percent': round(count / total * 100) if total else 0,
+            'target': targets[key],
+        }
+    return {
+        'total': total,
+        'subject_counts': dict(sorted(subject_counts.items())),
+        'difficulty_stats': difficulty_stats,
+    }
+
+
+def clean_filters(params):
+    """Фильтры из GET-параметров: пустые и некорректные значения отбрасываются."""
+    filters = {}
+    for name in ('subject', 'topic'):
+        value = (params.get(name) or '').strip()
+        if value.isdigit():
+            filters[name] = int(value)
+    difficulty = params.get('difficulty')
+    if difficulty in {code for _, code in DIFFICULTIES}:
+        filters['difficulty'] = difficulty
+    text = (params.get('q') or '').strip()
+    if text:
+        filters['q'] = text
+    return filters
+
+
+def filter_choices(test):
+    """Темы параллели теста для фильтров (предметы — из тех же тем)."""
+    topics = list(
+        QuestionTopic.objects.filter(school_class_id=test.school_class_id)
+        .select_related('subject').order_by('subject__name', 'name')
+    )
+    subjects = list({topic.subject_id: topic.subject for topic in topics}.values())
+    return {'filter_subjects': subjects, 'filter_topics': topics, 'difficulty_choices': BankQuestion.DIFFICULTY_CHOICES}
+
+
+def parse_cursor(value):
+    """Курсор 'subject_id-id' последней показанной строки или None."""
+    parts = (value or '').split('-')
+    if len(parts) == 2 and all(part.isdigit() for part in parts):
+        return int(parts[0]), int(parts[1])
+    return None
+
+
+def available_questions(test, filters):
+    """Вопросы параллели теста, которых еще нет в тесте, с фильтрами, в порядке (subject_id, id)."""
+    qs = BankQuestion.objects.filter(school_class_id=test.school_class_id).exclude(
+        pk__in=test.questions.values('pk')
+    )
+    if 'subject' in filters:
+        qs = qs.filter(subject_id=filters['subject'])
+    if 'topic' in filters:
+        qs = qs.filter(topic_id=filters['topic'])
+    if 'difficulty' in filters:
+        qs = qs.filter(difficulty=filters['difficulty'])
+    if 'q' in filters:
+        russian, simple = prefix_query(filters['q'], config='russian'), prefix_query(filters['q'])
+        if simple is None:
+            return qs.none()
+        qs = qs.filter(search_vector=russian | simple)
+    return qs.order_by('subject_id', 'id')
+
+
+def available_questions_page(test, filters, after=None, limit=PAGE_SIZE):
+    """
+    Страница доступных вопросов после курсора: (вопросы, курсор следующей страницы или None).
+    Берется limit + 1 строк, чтобы узнать, есть ли продолжение, без COUNT.
+    """
+    qs = available_questions(test, filters)
+    if after:
+        subject_id, question_id = after
+        qs = qs.filter(Q(subject_id__gt=subject_id) | Q(subject_id=subject_id, id__gt=question_id))
+    page = list(qs.select_related('subject', 'topic', 'statistic')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = f'{last.subject_id}-{last.pk}'
+    return page, next_cursor
@@ -0,0 +1,63 @@
+# D:\GAT\core\ranks.py
+
+"""
+Ранги учеников по GAT-тесту (денормализованные поля StudentResult).
+
+Место в классе, школе и параллели (все участники теста) считается одним
+запросом с оконными функциями при изменении результатов теста, поэтому
+страницы ученика читают ранги прямо из своих StudentResult.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import Rank
+
+from .models import StudentResult
+
+RANK_FIELDS = ['class_rank', 'class_total', 'school_rank', 'school_total', 'parallel_rank', 'parallel_total']
+
+
+def _ranked(partition_by=None):
+    order_by = F('total_score').desc()
+    partition = [F(partition_by)] if partition_by else None
+    return (
+        Window(expression=Rank(), partition_by=partition, order_by=order_by),
+        Window(expression=Count('id'), partition_by=partition),
+    )
+
+
+@transaction.atomic
+def rebuild_result_ranks(gat_test):
+    """Пересчитывает ранги всех результатов теста. Возвращает количество обновленных строк."""
+    class_rank, class_total = _ranked('student__school_class_id')
+    school_rank, school_total = _ranked('student__school_class__school_id')
+    parallel_rank, parallel_total = _ranked()
+
+    rows = (
+        StudentResult.objects.filter(gat_test=gat_test)
+        .order_by()
+        .annotate(
+            new_class_rank=class_rank, new_class_total=class_total,
+            new_school_rank=school_rank, new_school_total=school_total,
+            new_parallel_rank=parallel_rank, new_parallel_total=parallel_total,
+        )
+        .values_list('id', *[f'new_{field}' for field in RANK_FIELDS])
+    )
+
+    results = [
+        StudentResult(id=row[0], **dict(zip(RANK_FIELDS, row[1:])))
+        for row in rows
+    ]
+    StudentResult.objects.bulk_update(results, RANK_FIELDS, batch_size=1000)
+    return len(results)
+
+
+def ensure_result_ranks(results):
+    """
+    Досчитывает ранги тестов, для которых они еще не посчитаны (старые данные).
+    Возвращает True, если что-то было пересчитано и результаты нужно перечитать.
+    """
+    stale_tests = {r.gat_test for r in results if r.parallel_rank is None}
+    for gat_test in stale_tests:
+        rebuild_result_ranks(gat_test)
+    return bool(stale_tests)
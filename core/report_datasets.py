@@ -0,0 +1,156 @@
+# D:\GAT\core\report_datasets.py
+
+"""
+Данные отчетов по одному тесту: заголовок таблицы, баллы учеников по
+предметам, ответы и позиции в рейтинге. Ими пользуются детальный рейтинг,
+отчет класса, сравнение тестов и общий рейтинг параллели.
+
+Набор строится один раз (предметы теста, QuestionCount параллели и один
+проход по scores_by_subject) и хранится в общем кэше компактно:
+- subjects — [[id предмета, число вопросов]] в порядке названий предметов;
+- rows — [[id результата, id ученика, общий балл, {id предмета: [верных, ответов]},
+  {id предмета: строка ответов}]] в порядке рейтинга; строка ответов — по
+  символу на вопрос 1..N: '1' верно, '0' неверно, '-' нет ответа.
+Ключ содержит версию теста (загрузка/удаление результатов, в том числе
+очисткой данных и удалением учеников, вопросы, параллель теста) и общую версию (QuestionCount) — сброс это смена версии,
+см. signals.py. Ученики и предметы читаются по id при каждом показе, поэтому
+их переименование сброса не требует.
+"""
+
+import uuid
+from functools import cached_property
+
+from django.core.cache import cache
+
+from .models import QuestionCount, Student, StudentResult, Subject
+from .permission_scope import _version
+
+GLOBAL_VERSION_KEY = 'report_dataset:v:global'
+TEST_VERSION_KEY = 'report_dataset:v:test:{}'
+DATASET_KEY = 'report_dataset:{}:{}:{}'
+DATASET_TIMEOUT = 60 * 60 * 24
+
+
+def _answer_line(answers, count):
+    return ''.join(
+        '1' if answers.get(str(q)) is True else '0' if answers.get(str(q)) is False else '-'
+        for q in range(1, count + 1)
+    )
+
+
+def build_report_dataset(gat_test):
+    """Считает набор теста по БД (см. формат в описании модуля)."""
+    parallel = gat_test.school_class
+    parallel_id = parallel.parent_id or parallel.pk
+    counts = dict(
+        QuestionCount.objects.filter(school_class_id=parallel_id).values_list('subject_id', 'number_of_questions')
+    )
+    subjects = [
+        [subject_id, counts.get(subject_id, 0)]
+        for subject_id in gat_test.subjects.order_by('name').values_list('id', flat=True)
+    ]
+
+    rows = []
+    results = (
+        StudentResult.objects.filter(gat_test=gat_test).order_by('-total_score', 'id')
+        .values_list('id', 'student_id', 'total_score', 'scores_by_subject')
+    )
+    for result_id, student_id, total_score, scores in results:
+        subject_scores, answer_lines = {}, {}
+        if isinstance(scores, dict):
+            for subject_id_str, answers in scores.items():
+                if not (isinstance(answers, dict) and str(subject_id_str).isdigit()):
+                    continue
+                subject_id = int(subject_id_str)
+                subject_scores[subject_id] = [sum(1 for v in answers.values() if v is True), len(answers)]
+        for subject_id, count in subjects:
+            answers = scores.get(str(subject_id)) if isinstance(scores, dict) else None
+            if isinstance(answers, dict):
+                answer_lines[subject_id] = _answer_line(answers, count)
+        rows.append([result_id, student_id, total_score, subject_scores, answer_lines])
+    return {'subjects': subjects, 'rows': rows}
+
+
+def dataset_key(test_id):
+    return DATASET_KEY.format(test_id, _version(TEST_VERSION_KEY.format(test_id)), _version(GLOBAL_VERSION_KEY))
+
+
+def get_report_dataset(gat_test):
+    """Набор теста из кэша; при промахе строится и сохраняется (ключ берется до сборки)."""
+    key = dataset_key(gat_test.pk)
+    dataset = cache.get(key)
+    if dataset is None:
+        dataset = build_report_dataset(gat_test)
+        cache.set(key, dataset, DATASET_TIMEOUT)
+    return dataset
+
+
+def invalidate_report_datasets(test_ids=None):
+    """Сбрасывает наборы указанных тестов (None — всех)."""
+    if test_ids is None:
+        cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, None)
+        return
+    cache.set_many({TEST_VERSION_KEY.format(test_id): uuid.uuid4().hex for test_id in test_ids}, None)
+
+
+class ReportResult:
+    """Результат в строке отчета: pk и ответы в виде scores_by_subject (вопросы заголовка)."""
+
+    def __init__(self, pk, answer_lines):
+        self.pk = self.id = pk
+        self.answer_lines = answer_lines
+
+    @cached_property
+    def scores_by_subject(self):
+        return {
+            str(subject_id): {str(q): mark == '1' for q, mark in enumerate(line, 1) if mark != '-'}
+            for subject_id, line in self.answer_lines.items()
+        }
+
+
+def report_table_header(gat_test, dataset=None):
+    """Заголовок таблицы: предметы теста и число вопросов по QuestionCount параллели."""
+    if not gat_test:
+        return []
+    dataset = dataset or get_report_dataset(gat_test)
+    parallel = gat_test.school_class.parent or gat_test.school_class
+    subjects = Subject.objects.in_bulk([subject_id for subject_id, _ in dataset['subjects']])
+    return [
+        {
+            'subject': subjects[subject_id],
+            'questions': range(1, count + 1),
+            'questions_count': count,
+            'school_class': parallel,
+        }
+        for subject_id, count in dataset['subjects'] if subject_id in subjects
+    ]
+
+
+def report_data_for_test(gat_test, students=None):
+    """
+    (students_data, table_header) для шаблонов отчетов. students — queryset
+    учеников, которыми ограничить строки (позиции остаются позициями во всем тесте).
+    Строка: student, result (ReportResult), total_score, subject_scores, position.
+    """
+    if not gat_test:
+        return [], []
+    dataset = get_report_dataset(gat_test)
+    students = students if students is not None else Student.objects.all()
+    student_map = students.select_related('school_class__school').in_bulk([row[1] for row in dataset['rows']])
+
+    students_data = []
+    for position, (result_id, student_id, total_score, subject_scores, answer_lines) in enumerate(dataset['rows'], 1):
+        student = student_map.get(student_id)
+        if student is None:
+            continue
+        students_data.append({
+            'student': student,
+            'result': ReportResult(result_id, answer_lines),
+            'total_score': total_score,
+            'subject_scores': {
+                subject_id: {'score': correct, 'correct_answers': correct, 'total_questions': answered}
+                for subject_id, (correct, answered) in subject_scores.items()
+            },
+            'position': position,
+        })
+    return students_data, report_table_header(gat_test, dataset)
@@ -0,0 +1,332 @@
+# D:\GAT\core\results_import_service.py
+
+"""
+Пакетная (set-based) загрузка результатов GAT.
+
+В отличие от services.process_student_results_upload, который делает по
+несколько запросов на каждую строку и каждый ответ, здесь вся книга сначала
+разбирается в pandas-таблицы, классы и ученики находятся одним запросом,
+результаты записываются bulk_create(update_conflicts=True), а ответы —
+через COPY во временную таблицу и слияние (на PostgreSQL).
+
+Необязательная колонка Variant — вариант буклета ученика (core/booklet_variants.py):
+номера вопросов бланка варианта возвращаются к исходной нумерации, а ответы-буквы
+(A, B, ...) проверяются по ключу варианта.
+"""
+
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Student, SchoolClass, StudentResult, Subject, BankQuestion, StudentAnswer
+)
+from .services import refresh_results_derived_data
+from .booklet_variants import ANSWER_LETTERS, answer_map, unpermute_answers
+from .permission_scope import invalidate_permission_scopes
+
+REQUIRED_COLUMNS = {'Code', 'Surname', 'Name', 'Section'}
+BATCH_SIZE = 2000
+
+
+def _answer_columns(columns, subject_abbr_map):
+    """
+    Возвращает список (имя_колонки, subject_id, номер_вопроса) для колонок
+    вида 'МАТ_1'. Правила разбора совпадают со старым загрузчиком.
+    """
+    answer_cols = []
+    for col_name in columns:
+        if '_' not in col_name or col_name in REQUIRED_COLUMNS:
+            continue
+        parts = col_name.split('_')
+        if len(parts) < 2 or not parts[1].isdigit():
+            continue
+        subject_id = subject_abbr_map.get(parts[0].upper())
+        if subject_id is not None:
+            answer_cols.append((col_name, subject_id, parts[1]))
+    return answer_cols
+
+
+def _correct_mask(series):
+    """Векторный аналог `int(value) == 1` из старого загрузчика."""
+    numeric = pd.to_numeric(series, errors='coerce')
+    return (np.trunc(numeric) == 1).fillna(False).to_numpy(dtype=bool)
+
+
+def _letter_index(series):
+    """Номер буквы ответа ('A' -> 0, 'b' -> 1) или -1, если в ячейке не буква."""
+    letters = series.astype(str).str.strip().str.upper()
+    return letters.map({letter: i for i, letter in enumerate(ANSWER_LETTERS)}).fillna(-1).to_numpy(dtype=int)
+
+
+def _variant_column(df):
+    """Колонка Variant (вариант буклета) в верхнем регистре, '' если ее нет."""
+    if 'Variant' not in df.columns:
+        return np.full(len(df), '', dtype=object)
+    return df['Variant'].fillna('').astype(str).str.strip().str.upper().to_numpy(dtype=object)
+
+
+def parse_results_workbook(excel_sheets, subject_abbr_map):
+    """
+    Превращает книгу Excel ({лист: DataFrame}) в две таблицы:
+    - students: по строке на каждую обработанную строку (Code, Surname, Name, Section, Variant);
+    - answers: длинная таблица (Code, subject_id, q_num, is_correct, letter, Variant).
+    Возвращает (students_df, answers_df, errors).
+    """
+    student_frames, answer_frames, errors = [], [], []
+
+    for sheet_name, df in excel_sheets.items():
+        df.columns = [str(col).strip() for col in df.columns]
+        if not REQUIRED_COLUMNS.issubset(df.columns):
+            errors.append(f"На листе '{sheet_name}' отсутствуют обязательные колонки: {', '.join(REQUIRED_COLUMNS - set(df.columns))}")
+            continue
+
+        df = df[df['Code'].notna()]
+        if df.empty:
+            continue
+
+        students = pd.DataFrame({
+            'Code': df['Code'].to_numpy(),
+            'Surname': df['Surname'].astype(str).str.strip().to_numpy(),
+            'Name': df['Name'].astype(str).str.strip().to_numpy(),
+            'Section': df['Section'].astype(str).str.strip().to_numpy(),
+            'Variant': _variant_column(df),
+        })
+        student_frames.append(students)
+
+        for col_name, subject_id, q_num in _answer_columns(df.columns, subject_abbr_map):
+            answer_frames.append(pd.DataFrame({
+                'Code': students['Code'].to_numpy(),
+                'subject_id': subject_id,
+                'q_num': q_num,
+                'is_correct': _correct_mask(df[col_name]),
+                'letter': _letter_index(df[col_name]),
+                'Variant': students['Variant'].to_numpy(),
+            }))
+
+    students_df = pd.concat(student_frames, ignore_index=True) if student_frames else pd.DataFrame(columns=['Code', 'Surname', 'Name', 'Section', 'Variant'])
+    answers_df = pd.concat(answer_frames, ignore_index=True) if answer_frames else pd.DataFrame(columns=['Code', 'subject_id', 'q_num', 'is_correct', 'letter', 'Variant'])
+    return students_df, answers_df, errors
+
+
+def _resolve_classes(gat_test, parent_class, sections):
+    """Находит/создает подклассы параллели одним запросом на чтение и одним на запись."""
+    class_names = {f"{parent_class.name}{section}" for section in sections}
+    existing = {
+        cls.name: cls
+        for cls in SchoolClass.objects.filter(school=gat_test.school, name__in=class_names)
+    }
+    missing = [
+        SchoolClass(name=name, school=gat_test.school, parent=parent_class)
+        for name in class_names if name not in existing
+    ]
+    if missing:
+        SchoolClass.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update({
+            cls.name: cls
+            for cls in SchoolClass.objects.filter(school=gat_test.school, name__in=[c.name for c in missing])
+        })
+    return existing
+
+
+def _question_frame(gat_test):
+    """Таблица (subject_id, q_index, question_id): N-й по id вопрос предмета в тесте."""
+    questions = pd.DataFrame(
+        list(BankQuestion.objects.filter(gat_tests=gat_test).order_by('id').values_list('id', 'subject_id')),
+        columns=['question_id', 'subject_id']
+    )
+    questions['q_index'] = questions.groupby('subject_id').cumcount() + 1
+    return questions
+
+
+def _answer_rows(answers_df, questions_df, student_pk_map, result_pk_map):
+    """
+    Сопоставляет ответы с вопросами и результатами (векторно, через merge).
+    Возвращает DataFrame (result_id, question_id, is_correct, chosen_option_order).
+    """
+    if answers_df.empty or questions_df.empty:
+        return pd.DataFrame(columns=['result_id', 'question_id', 'is_correct', 'chosen_option_order'])
+
+    rows = answers_df.assign(q_index=answers_df['q_num'].astype(int))
+    rows = rows.merge(questions_df, on=['subject_id', 'q_index'], how='inner', sort=False)
+    rows['result_id'] = rows['Code'].map(student_pk_map).map(result_pk_map)
+    if 'chosen_option_order' not in rows.columns:
+        # Упрощенная логика (как раньше): 1 для верного ответа, иначе пусто
+        rows['chosen_option_order'] = np.where(rows['is_correct'], 1, None)
+    # Один и тот же вопрос может прийти под разными номерами ('1' и '01')
+    rows = rows.drop_duplicates(subset=['result_id', 'question_id'], keep='last')
+    return rows[['result_id', 'question_id', 'is_correct', 'chosen_option_order']]
+
+
+def _upsert_answers(answer_rows, now):
+    """
+    Записывает ответы одним upsert'ом.
+    На PostgreSQL (psycopg 3) — COPY во временную таблицу и INSERT ... ON CONFLICT,
+    на остальных СУБД — bulk_create(update_conflicts=True).
+    """
+    if answer_rows.empty:
+        return
+
+    with connection.cursor() as cursor:
+        raw_cursor = getattr(cursor, 'cursor', None)
+        if connection.vendor == 'postgresql' and hasattr(raw_cursor, 'copy'):
+            table = StudentAnswer._meta.db_table
+            cursor.execute("DROP TABLE IF EXISTS gat_answer_stage")
+            cursor.execute(
+                "CREATE TEMP TABLE gat_answer_stage ("
+                "result_id bigint, question_id bigint, is_correct boolean, chosen_option_order integer"
+                ") ON COMMIT DROP"
+            )
+            with raw_cursor.copy(
+                "COPY gat_answer_stage (result_id, question_id, is_correct, chosen_option_order) FROM STDIN"
+            ) as copy:
+                for row in answer_rows.itertuples(index=False):
+                    copy.write_row((int(row.result_id), int(row.question_id), bool(row.is_correct), row.chosen_option_order))
+            cursor.execute(
+                f"INSERT INTO {table} (created_at, updated_at, result_id, question_id, is_correct, chosen_option_order) "
+                "SELECT %s, %s, result_id, question_id, is_correct, chosen_option_order FROM gat_answer_stage "
+                "ON CONFLICT (result_id, question_id) DO UPDATE SET "
+                "is_correct = EXCLUDED.is_correct, "
+                "chosen_option_order = EXCLUDED.chosen_option_order, "
+                "updated_at = EXCLUDED.updated_at",
+                [now, now]
+            )
+            cursor.execute("DROP TABLE gat_answer_stage")
+            return
+
+    StudentAnswer.objects.bulk_create(
+        [
+            StudentAnswer(
+                result_id=int(row.result_id),
+                question_id=int(row.question_id),
+                is_correct=bool(row.is_correct),
+                chosen_option_order=row.chosen_option_order,
+                updated_at=now,
+            )
+            for row in answer_rows.itertuples(index=False)
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['result', 'question'],
+        update_fields=['is_correct', 'chosen_option_order', 'updated_at'],
+    )
+
+
+@transaction.atomic
+def bulk_process_student_results_upload(gat_test, excel_file):
+    """
+    Пакетная версия services.process_student_results_upload.
+    Возвращает тот же кортеж (success, report) с тем же набором ключей отчета.
+    """
+    try:
+        excel_sheets = pd.read_excel(excel_file, sheet_name=None, dtype={'Code': str})
+    except Exception as e:
+        return False, f"Критическая ошибка чтения Excel-файла: {e}"
+
+    parent_class = gat_test.school_class
+    if not parent_class or parent_class.parent is not None:
+        return False, "GAT-тест должен быть привязан к классу-параллели."
+
+    subject_abbr_map = {
+        abbr.upper(): s_id
+        for s_id, abbr in Subject.objects.exclude(abbreviation__isnull=True).exclude(abbreviation='').values_list('id', 'abbreviation')
+    }
+
+    students_df, answers_df, errors = parse_results_workbook(excel_sheets, subject_abbr_map)
+    processed_rows = len(students_df)
+
+    if not processed_rows:
+        return True, {
+            "processed_rows": 0, "created_students": 0, "updated_students": 0,
+            "total_unique_students": 0, "errors": errors
+        }
+
+    # --- 1. Классы ---
+    classes_by_name = _resolve_classes(gat_test, parent_class, students_df['Section'].unique())
+
+    # --- 2. Ученики (как и раньше, побеждает последняя строка) ---
+    codes = students_df['Code'].tolist()
+    existing_codes = set(Student.objects.filter(student_id__in=set(codes)).values_list('student_id', flat=True))
+
+    created_students, updated_students = 0, 0
+    seen = set(existing_codes)
+    for code in codes:
+        if code in seen:
+            updated_students += 1
+        else:
+            created_students += 1
+            seen.add(code)
+
+    latest_rows = students_df.drop_duplicates(subset='Code', keep='last')
+    now = timezone.now()
+    Student.objects.bulk_create(
+        [
+            Student(
+                student_id=row.Code,
+                school_class=classes_by_name[f"{parent_class.name}{row.Section}"],
+                last_name_ru=row.Surname,
+                first_name_ru=row.Name,
+                status='ACTIVE',
+                updated_at=now,
+            )
+            for row in latest_rows.itertuples(index=False)
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['student_id'],
+        update_fields=['school_class', 'last_name_ru', 'first_name_ru', 'status', 'updated_at'],
+    )
+    student_pk_map = dict(Student.objects.filter(student_id__in=set(codes)).values_list('student_id', 'pk'))
+    # bulk_create не вызывает сигналы: классы учеников могли измениться
+    invalidate_permission_scopes()
+
+    # --- 3. Ответы: последняя запись для (ученик, предмет, вопрос) побеждает ---
+    answers_df = answers_df.drop_duplicates(subset=['Code', 'subject_id', 'q_num'], keep='last')
+    # Номера бланка варианта -> исходные номера, буквы -> верно/неверно по ключу
+    if not answers_df.empty:
+        answers_df = unpermute_answers(answers_df, answer_map(gat_test))
+
+    scores_by_code = defaultdict(lambda: defaultdict(dict))
+    for code, subject_id, q_num, is_correct in answers_df[['Code', 'subject_id', 'q_num', 'is_correct']].itertuples(index=False):
+        scores_by_code[code][str(subject_id)][q_num] = bool(is_correct)
+
+    totals = answers_df.groupby('Code', sort=False)['is_correct'].sum()
+
+    results = [
+        StudentResult(
+            student_id=student_pk_map[code],
+            gat_test=gat_test,
+            total_score=int(totals.get(code, 0)),
+            scores_by_subject={k: v for k, v in scores_by_code[code].items()},
+            booklet_variant=variant[:2] or None,
+            updated_at=now,
+        )
+        for code, variant in zip(latest_rows['Code'], latest_rows['Variant'])
+    ]
+    StudentResult.objects.bulk_create(
+        results,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['student', 'gat_test'],
+        update_fields=['total_score', 'scores_by_subject', 'booklet_variant', 'updated_at'],
+    )
+    result_pk_map = dict(
+        StudentResult.objects.filter(gat_test=gat_test, student_id__in=student_pk_map.values()).values_list('student_id', 'pk')
+    )
+
+    # --- 4. StudentAnswer для вопросов, которые есть в тесте ---
+    answer_rows = _answer_rows(answers_df, _question_frame(gat_test), student_pk_map, result_pk_map)
+    _upsert_answers(answer_rows, now)
+
+    refresh_results_derived_data(gat_test)
+
+    report = {
+        "processed_rows": processed_rows,
+        "created_students": created_students,
+        "updated_students": updated_students,
+        "total_unique_students": len(latest_rows),
+        "errors": errors
+    }
+    return True, report
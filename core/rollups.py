@@ -0,0 +1,204 @@
+# D:\GAT\core\rollups.py
+
+"""
+Агрегаты результатов (SubjectResultRollup / QuestionResultRollup).
+
+Статистика, дашборд и углубленный анализ читают готовые суммы по
+(тест, класс, предмет[, вопрос]) вместо обхода scores_by_subject всех учеников.
+Агрегаты пересобираются по одному тесту — тому, чьи результаты изменились.
+"""
+
+import numpy as np
+from collections import defaultdict
+from django.db import transaction
+
+from .models import (
+    StudentResult, SchoolClass, QuestionCount,
+    SubjectResultRollup, QuestionResultRollup
+)
+from .answer_matrix import AnswerMatrix
+from . import utils
+
+# Нижние границы процентов для оценок 2..10 (см. utils.calculate_grade_from_percentage)
+GRADE_THRESHOLDS = np.array([11, 21, 31, 41, 51, 61, 71, 81, 91])
+
+
+def compute_result_rollups(gat_test):
+    """
+    Считает агрегаты теста по «сырым» данным (StudentResult.scores_by_subject).
+    Возвращает (subject_stats, question_stats):
+    - subject_stats: {(class_id, subject_id): {students, participants, correct, answered, question_count, grade_histogram}}
+    - question_stats: {(class_id, subject_id, номер): {correct, answered}}
+    """
+    rows = list(
+        StudentResult.objects.filter(gat_test=gat_test)
+        .values_list('student__school_class_id', 'scores_by_subject')
+    )
+
+    # Разбор JSON: верные/всего по каждому предмету ученика
+    students_by_class = defaultdict(int)
+    per_student = []
+    subject_ids = set()
+    question_stats = defaultdict(lambda: {'correct': 0, 'answered': 0})
+    for class_id, scores in rows:
+        students_by_class[class_id] += 1
+        student_scores = {}
+        if isinstance(scores, dict):
+            for subject_id_str, answers in scores.items():
+                if not (isinstance(answers, dict) and str(subject_id_str).isdigit()):
+                    continue
+                subject_id = int(subject_id_str)
+                subject_ids.add(subject_id)
+                correct = 0
+                for q_num, value in answers.items():
+                    stats = question_stats[(class_id, subject_id, str(q_num))]
+                    stats['answered'] += 1
+                    if value is True:
+                        stats['correct'] += 1
+                        correct += 1
+                student_scores[subject_id] = (correct, len(answers))
+        per_student.append((class_id, student_scores))
+
+    # Количество вопросов берется по параллели класса ученика
+    parallel_by_class = {
+        cls_id: parent_id or cls_id
+        for cls_id, parent_id in SchoolClass.objects.filter(id__in=students_by_class.keys()).values_list('id', 'parent_id')
+    }
+    q_counts = {
+        (qc_class_id, subject_id): count
+        for qc_class_id, subject_id, count in QuestionCount.objects.filter(
+            school_class_id__in=set(parallel_by_class.values()), subject_id__in=subject_ids
+        ).values_list('school_class_id', 'subject_id', 'number_of_questions')
+    }
+
+    subject_stats = {}
+    for class_id, students in students_by_class.items():
+        for subject_id in subject_ids:
+            subject_stats[(class_id, subject_id)] = {
+                'students': students, 'participants': 0, 'correct': 0, 'answered': 0,
+                'question_count': q_counts.get((parallel_by_class.get(class_id), subject_id), 0),
+                'grade_histogram': defaultdict(int),
+            }
+
+    # Как и в статистике: ученик без ответов по предмету получает 0 верных
+    for class_id, student_scores in per_student:
+        for subject_id in subject_ids:
+            stats = subject_stats[(class_id, subject_id)]
+            correct, answered = student_scores.get(subject_id, (0, 0))
+            if subject_id in student_scores:
+                stats['participants'] += 1
+            stats['correct'] += correct
+            stats['answered'] += answered
+            if stats['question_count'] > 0:
+                grade = utils.calculate_grade_from_percentage((correct / stats['question_count']) * 100)
+                stats['grade_histogram'][str(grade)] += 1
+
+    for stats in subject_stats.values():
+        stats['grade_histogram'] = dict(stats['grade_histogram'])
+    return subject_stats, dict(question_stats)
+
+
+@transaction.atomic
+def rebuild_result_rollups(gat_test):
+    """Пересобирает агрегаты одного теста. Возвращает (кол-во строк по предметам, по вопросам)."""
+    subject_stats, question_stats = compute_result_rollups(gat_test)
+
+    SubjectResultRollup.objects.filter(gat_test=gat_test).delete()
+    QuestionResultRollup.objects.filter(gat_test=gat_test).delete()
+
+    SubjectResultRollup.objects.bulk_create([
+        SubjectResultRollup(gat_test=gat_test, school_class_id=class_id, subject_id=subject_id, **stats)
+        for (class_id, subject_id), stats in subject_stats.items()
+    ], batch_size=1000)
+    QuestionResultRollup.objects.bulk_create([
+        QuestionResultRollup(
+            gat_test=gat_test, school_class_id=class_id, subject_id=subject_id,
+            question_number=q_num, **stats
+        )
+        for (class_id, subject_id, q_num), stats in question_stats.items()
+    ], batch_size=2000)
+    return len(subject_stats), len(question_stats)
+
+
+def find_rollup_mismatches(gat_test):
+    """
+    Сравнивает сохраненные агрегаты теста с пересчетом по сырым данным.
+    Возвращает список строк с описанием расхождений (пустой — все совпадает).
+    """
+    expected_subjects, expected_questions = compute_result_rollups(gat_test)
+    fields = ['students', 'participants', 'correct', 'answered', 'question_count', 'grade_histogram']
+    stored_subjects = {
+        (row['school_class_id'], row['subject_id']): {f: row[f] for f in fields}
+        for row in SubjectResultRollup.objects.filter(gat_test=gat_test).values('school_class_id', 'subject_id', *fields)
+    }
+    stored_questions = {
+        (row['school_class_id'], row['subject_id'], row['question_number']): {'correct': row['correct'], 'answered': row['answered']}
+        for row in QuestionResultRollup.objects.filter(gat_test=gat_test).values(
+            'school_class_id', 'subject_id', 'question_number', 'correct', 'answered'
+        )
+    }
+
+    mismatches = []
+    for label, expected, stored in (
+        ('предмет', expected_subjects, stored_subjects),
+        ('вопрос', expected_questions, stored_questions),
+    ):
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key) != stored.get(key):
+                mismatches.append(f"{label} {key}: ожидается {expected.get(key)}, сохранено {stored.get(key)}")
+    return mismatches
+
+
+def grade_counts(histogram):
+    """{'10': 3, ...} из JSON → {10: 3, ...}."""
+    return {int(grade): count for grade, count in (histogram or {}).items()}
+
+
+def overall_grade_distribution(result_rows, subject_ids):
+    """
+    Распределение итоговых оценок учеников по выбранным предметам теста.
+    result_rows — итерируемое (gat_test_id, student_id, parallel_id) отфильтрованных результатов.
+    Баллы берутся из матриц ответов тестов. Возвращает ({оценка: кол-во}, верных, возможных).
+    """
+    rows_by_test = defaultdict(list)
+    for gat_test_id, student_id, parallel_id in result_rows:
+        rows_by_test[gat_test_id].append((student_id, parallel_id))
+    if not rows_by_test:
+        return {}, 0, 0
+
+    parallel_ids = {p_id for rows in rows_by_test.values() for _, p_id in rows}
+    q_counts = {
+        (class_id, subject_id): count
+        for class_id, subject_id, count in QuestionCount.objects.filter(
+            school_class_id__in=parallel_ids, subject_id__in=subject_ids
+        ).values_list('school_class_id', 'subject_id', 'number_of_questions')
+    }
+
+    grades = defaultdict(int)
+    total_correct, total_possible = 0, 0
+    for gat_test_id, rows in rows_by_test.items():
+        matrix = AnswerMatrix.for_test(gat_test_id)
+        if matrix is None:
+            continue
+        located = [(matrix.row_of(student_id), p_id) for student_id, p_id in rows]
+        located = [(row, p_id) for row, p_id in located if row is not None]
+        student_rows = np.array([row for row, _ in located], dtype=np.int64)
+        parallels = [p_id for _, p_id in located]
+        test_subjects = [sid for sid in subject_ids if sid in matrix.subject_index]
+        if not len(student_rows) or not test_subjects:
+            continue
+
+        correct = np.zeros(len(student_rows), dtype=np.int64)
+        possible = np.zeros(len(student_rows), dtype=np.int64)
+        for subject_id in test_subjects:
+            correct += matrix.correct[student_rows, matrix.subject_slice(subject_id)].sum(axis=1)
+            possible += np.array([q_counts.get((p_id, subject_id), 0) for p_id in parallels], dtype=np.int64)
+
+        has_possible = possible > 0
+        percentages = correct[has_possible] / possible[has_possible] * 100
+        for grade, count in zip(*np.unique(np.digitize(percentages, GRADE_THRESHOLDS) + 1, return_counts=True)):
+            grades[int(grade)] += int(count)
+        total_correct += int(correct[has_possible].sum())
+        total_possible += int(possible[has_possible].sum())
+
+    return dict(grades), total_correct, total_possible
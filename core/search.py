@@ -0,0 +1,127 @@
+# D:\GAT\core\search.py
+
+"""
+Поиск по ученикам, GAT-тестам и банку вопросов на индексах PostgreSQL.
+
+- Полнотекстовый поиск: tsvector-колонки (GeneratedField) с GIN-индексами.
+  Имена индексируются конфигурацией 'simple' (русский, таджикский и английский
+  без морфологии), текст и теги вопросов — 'russian' (русская морфология,
+  английские слова — английский стеммер) плюс 'simple' для таджикских словоформ.
+  Каждое слово запроса ищется как префикс (`слово:*`), поэтому поиск работает
+  по мере набора.
+- Триграммы (pg_trgm, если расширение установлено): поиск по подстроке внутри
+  слова, с опечатками (оператор %>) и ранжирование по похожести для учеников и тестов.
+
+Права доступа накладываются в том же SQL-запросе (ID из области доступа
+пользователя, core/permission_scope.py). Функции возвращают QuerySet,
+упорядоченный по релевантности (аннотация rank).
+"""
+
+import re
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q, Value
+
+from .models import BankQuestion, GatTest, Student
+from .permission_scope import get_permission_scope
+
+MIN_QUERY_LENGTH = 2
+MAX_TERMS = 8
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def query_terms(text):
+    """Слова запроса в нижнем регистре (буквы и цифры любого алфавита)."""
+    return _WORD_RE.findall((text or '').lower())[:MAX_TERMS]
+
+
+def prefix_query(text, config='simple'):
+    """SearchQuery «все слова, каждое как префикс» или None, если искать нечего."""
+    terms = query_terms(text)
+    if not terms or len(''.join(terms)) < MIN_QUERY_LENGTH:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=config)
+
+
+@lru_cache(maxsize=None)
+def _trigram_available(alias):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def trigram_available():
+    """Установлено ли pg_trgm (проверяется один раз на процесс)."""
+    return _trigram_available(connection.alias)
+
+
+def search_students(user, text):
+    """Ученики, доступные пользователю, по ФИО (рус./тадж./англ.) и ID ученика."""
+    query = prefix_query(text)
+    if query is None:
+        return Student.objects.none()
+
+    scope = get_permission_scope(user)
+    if scope.student_class_ids is not None:
+        qs = Student.objects.filter(school_class_id__in=scope.student_class_ids)
+    elif scope.own_student_id:
+        qs = Student.objects.filter(pk=scope.own_student_id)
+    else:
+        return Student.objects.none()
+
+    condition = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+    if trigram_available():
+        phrase = ' '.join(query_terms(text))
+        condition |= Q(search_document__contains=phrase) | Q(search_document__trigram_word_similar=phrase)
+        rank = rank + TrigramWordSimilarity(Value(phrase), 'search_document')
+    return (
+        qs.filter(condition)
+        .annotate(rank=rank)
+        .select_related('school_class')
+        .order_by('-rank', 'last_name_ru', 'first_name_ru', 'pk')
+    )
+
+
+def search_gat_tests(user, text):
+    """GAT-тесты доступных пользователю школ по названию."""
+    query = prefix_query(text)
+    if query is None:
+        return GatTest.objects.none()
+
+    condition = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+    if trigram_available():
+        phrase = ' '.join(query_terms(text))
+        condition |= Q(name__trigram_word_similar=phrase)
+        rank = rank + TrigramWordSimilarity(Value(phrase), 'name')
+    return (
+        GatTest.objects.filter(school_id__in=get_permission_scope(user).school_ids)
+        .filter(condition)
+        .annotate(rank=rank)
+        .select_related('school')
+        .order_by('-rank', '-test_date', 'pk')
+    )
+
+
+def search_questions(user, text, queryset=None):
+    """
+    Вопросы банка по тексту и тегам, ранжированные по релевантности (совпадения
+    в тексте весят больше, чем в тегах). Пользователь без прав суперпользователя
+    видит только вопросы своих предметов. queryset — дополнительные фильтры (тема и т.п.).
+    """
+    russian, simple = prefix_query(text, config='russian'), prefix_query(text)
+    qs = BankQuestion.objects.all() if queryset is None else queryset
+    if simple is None:
+        return qs.none()
+    if not user.is_superuser:
+        qs = qs.filter(subject_id__in=get_permission_scope(user).subject_ids)
+
+    query = russian | simple
+    return (
+        qs.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-created_at', 'pk')
+    )
@@ -9,6 +9,44 @@ from .models import (
     Student, SchoolClass, GatTest, StudentResult, Subject, 
     BankQuestion, StudentAnswer, QuestionCount
 )
+from .answer_matrix import rebuild_answer_matrix
+from .rollups import rebuild_result_rollups
+from .ranks import rebuild_result_ranks
+from .item_statistics import schedule_test_statistics
+from .dashboard_cache import invalidate_dashboard_snapshots
+from .archive_summary import refresh_archive_for_test
+from .report_datasets import invalidate_report_datasets
+
+
+def refresh_results_derived_data(gat_test):
+    """
+    Пересобирает производные данные теста после загрузки или удаления результатов.
+    Вызывается загрузчиками результатов и view удаления.
+    """
+    rebuild_answer_matrix(gat_test)
+    rebuild_result_rollups(gat_test)
+    rebuild_result_ranks(gat_test)
+    refresh_archive_for_test(gat_test)
+    invalidate_report_datasets([gat_test.pk])
+    invalidate_dashboard_snapshots()
+    # Психометрика считается дольше — в фоновой задаче
+    schedule_test_statistics(gat_test)
+
+
+def result_test_ids(results):
+    """id тестов, к которым относятся результаты queryset (собрать до удаления)."""
+    return set(results.order_by().values_list('gat_test_id', flat=True).distinct())
+
+
+def refresh_tests_after_results_delete(test_ids):
+    """
+    Обновляет производные данные тестов, результаты которых удалены мимо
+    загрузчика: очистка данных (data_cleanup_view) и удаление учеников
+    (каскад). Удаление идет обычным bulk-путем Django, без сигналов на строку.
+    Удаленные вместе с результатами тесты пропускаются.
+    """
+    for gat_test in GatTest.objects.filter(pk__in=test_ids).select_related('quarter'):
+        refresh_results_derived_data(gat_test)
 
 def extract_test_date_from_excel(file):
     """
@@ -284,6 +322,8 @@ def process_student_results_upload(gat_test, excel_file):
                 }
             )
 
+    refresh_results_derived_data(gat_test)
+
     report = {
         "processed_rows": processed_rows,
         "created_students": created_students,
@@ -353,46 +393,3 @@ def get_available_questions_for_test(gat_test, subject=None, topic=None, difficu
         questions = questions.filter(difficulty=difficulty)
     
     return questions.select_related('subject', 'topic')
-
-def generate_test_variant(gat_test, variant_name='A'):
-    """
-    Генерирует вариант теста с перемешанными вопросами и вариантами ответов.
-    """
-    questions = list(gat_test.questions.all())
-    
-    # Перемешиваем вопросы, если нужно
-    if gat_test.shuffle_questions:
-        import random
-        random.shuffle(questions)
-    
-    variant_data = {
-        'variant_name': variant_name,
-        'test_name': gat_test.name,
-        'questions': []
-    }
-    
-    for question in questions:
-        question_data = {
-            'id': question.id,
-            'text': question.text,
-            'subject': question.subject.name,
-            'options': []
-        }
-        
-        options = list(question.options.all())
-        
-        # Перемешиваем варианты ответов, если нужно
-        if gat_test.shuffle_options:
-            import random
-            random.shuffle(options)
-        
-        for i, option in enumerate(options, 1):
-            question_data['options'].append({
-                'order': i,
-                'text': option.text,
-                'is_correct': option.is_correct
-            })
-        
-        variant_data['questions'].append(question_data)
-    
-    return variant_data
\ No newline at end of file
@@ -1,8 +1,15 @@
 # D:\GAT\core\signals.py
 
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import BankQuestion, StudentResult
+from accounts.models import UserProfile
+from .models import BankQuestion, BankAnswerOption, GatTest, StudentResult, School, SchoolClass, Subject, Student, QuestionCount
+from .permission_scope import invalidate_permission_scopes, invalidate_user_scope
+from .booklet_cache import invalidate_booklet_cache
+from .dashboard_cache import invalidate_dashboard_snapshots
+from .archive_summary import archive_group, refresh_archive_group, stored_archive_group
+from .report_datasets import invalidate_report_datasets
+from .image_derivatives import has_missing_derivatives, schedule_image_derivatives
 
 # Пример будущих сигналов:
 # @receiver(post_save, sender=BankQuestion)
@@ -15,4 +22,209 @@ from .models import BankQuestion, StudentResult
 # @receiver(pre_delete, sender=StudentResult)
 # def cleanup_student_answers(sender, instance, **kwargs):
 #     """Очищает ответы ученика при удалении результата"""
-#     instance.answers.all().delete()
\ No newline at end of file
+#     instance.answers.all().delete()
+
+# =============================================================================
+# --- СБРОС ЗАКЭШИРОВАННЫХ ОБЛАСТЕЙ ДОСТУПА (core/permission_scope.py) ---
+# =============================================================================
+
+
+@receiver([post_save, post_delete], sender=School)
+@receiver([post_save, post_delete], sender=SchoolClass)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Student)
+def reset_all_permission_scopes(sender, **kwargs):
+    """Школы, классы, предметы или ученики изменились — меняем общую версию."""
+    invalidate_permission_scopes()
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def reset_profile_permission_scope(sender, instance, **kwargs):
+    """Роль, школа, класс или привязка ученика в профиле изменились."""
+    invalidate_user_scope(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserProfile.schools.through)
+@receiver(m2m_changed, sender=UserProfile.subjects.through)
+def reset_profile_m2m_permission_scope(sender, instance, action, reverse, pk_set, **kwargs):
+    """Доступ к школам (Директор) или предметам (Эксперт/Учитель) изменился."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_user_scope(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_user_scope(user_id)
+    else:
+        # post_clear с обратной стороны: затронутые профили неизвестны
+        invalidate_permission_scopes()
+
+
+# =============================================================================
+# --- СБРОС СНИМКОВ ГЛАВНОЙ ПАНЕЛИ (core/dashboard_cache.py) ---
+# =============================================================================
+# Загрузка и удаление результатов сбрасывают снимки в refresh_results_derived_data
+
+
+@receiver(post_delete, sender=GatTest)
+@receiver([post_save, post_delete], sender=QuestionCount)
+def reset_dashboard_snapshots(sender, **kwargs):
+    """Тест удален вместе с результатами или изменилось число вопросов (распределение оценок)."""
+    invalidate_dashboard_snapshots()
+
+
+@receiver(post_save, sender=GatTest)
+def reset_dashboard_on_test_change(sender, instance, created, **kwargs):
+    """Дата, четверть или параллель теста изменились — результаты попали в другой период."""
+    if not created:
+        invalidate_dashboard_snapshots()
+
+
+@receiver(m2m_changed, sender=GatTest.questions.through)
+def reset_dashboard_on_questions_change(sender, action, **kwargs):
+    """Состав вопросов изменился — другой максимальный балл в распределении оценок."""
+    if action.startswith('post_'):
+        invalidate_dashboard_snapshots()
+
+
+# =============================================================================
+# --- СВОДКА АРХИВА (core/archive_summary.py) ---
+# =============================================================================
+# Загрузка и удаление результатов обновляют сводку в refresh_results_derived_data,
+# очистка данных и удаление учеников — в refresh_tests_after_results_delete (services.py)
+
+ARCHIVE_FIELDS = {'quarter', 'school', 'school_class'}
+
+
+@receiver(pre_save, sender=GatTest)
+def remember_archive_group(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежнюю группу архива, если тест могут перенести."""
+    instance.__dict__.pop('_archive_group', None)
+    if instance._state.adding or (update_fields and not ARCHIVE_FIELDS & set(update_fields)):
+        return
+    instance._archive_group = stored_archive_group(instance.pk)
+
+
+@receiver(post_save, sender=GatTest)
+def move_test_in_archive(sender, instance, created, **kwargs):
+    """Тест перенесен в другую четверть, школу или параллель — пересчитываем обе группы."""
+    if created or not hasattr(instance, '_archive_group'):
+        return
+    old_group, new_group = instance.__dict__.pop('_archive_group'), archive_group(instance)
+    if old_group != new_group:
+        for group in {old_group, new_group} - {None}:
+            refresh_archive_group(*group)
+
+
+@receiver(post_delete, sender=GatTest)
+def remove_test_from_archive(sender, instance, **kwargs):
+    """Тест удален вместе с результатами."""
+    group = archive_group(instance)
+    if group:
+        refresh_archive_group(*group)
+
+
+# =============================================================================
+# --- СБРОС КЭША БУКЛЕТОВ (core/booklet_cache.py) ---
+# =============================================================================
+
+
+def _tests_with_question(question_id):
+    return GatTest.questions.through.objects.filter(bankquestion_id=question_id).values_list('gattest_id', flat=True)
+
+
+@receiver(post_save, sender=GatTest)
+def reset_test_booklets(sender, instance, created, **kwargs):
+    """Порядок вопросов (save_booklet_order), шапка или дата теста изменились."""
+    if not created:
+        invalidate_booklet_cache([instance.pk])
+
+
+@receiver(m2m_changed, sender=GatTest.questions.through)
+def reset_booklets_on_questions_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Вопрос добавлен в тест или убран из него (add/remove_question_to/from_test)."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_booklet_cache([instance.pk])
+    elif pk_set:
+        invalidate_booklet_cache(pk_set)
+    else:
+        # post_clear со стороны вопроса: затронутые тесты уже не узнать
+        invalidate_booklet_cache(GatTest.objects.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=BankQuestion)
+@receiver(post_save, sender=BankQuestion)
+def reset_question_booklets(sender, instance, **kwargs):
+    """Текст, картинка или ширина картинки вопроса изменились (или вопрос удаляется)."""
+    invalidate_booklet_cache(list(_tests_with_question(instance.pk)))
+
+
+@receiver([post_save, post_delete], sender=BankAnswerOption)
+def reset_option_booklets(sender, instance, **kwargs):
+    """Вариант ответа изменен, добавлен или удален."""
+    invalidate_booklet_cache(list(_tests_with_question(instance.question_id)))
+
+
+# =============================================================================
+# --- СБРОС ДАННЫХ ОТЧЕТОВ ПО ТЕСТАМ (core/report_datasets.py) ---
+# =============================================================================
+# Загрузка и удаление результатов сбрасывают данные теста в refresh_results_derived_data
+
+
+@receiver(post_save, sender=GatTest)
+def reset_test_report_dataset(sender, instance, created, **kwargs):
+    """Параллель теста могла измениться (другие QuestionCount в заголовке)."""
+    if not created:
+        invalidate_report_datasets([instance.pk])
+
+
+@receiver(m2m_changed, sender=GatTest.questions.through)
+def reset_report_datasets_on_questions_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав вопросов теста (а с ним и предметы в заголовке) изменился."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_report_datasets([instance.pk])
+    elif pk_set:
+        invalidate_report_datasets(pk_set)
+    else:
+        invalidate_report_datasets()
+
+
+@receiver(post_save, sender=BankQuestion)
+def reset_question_report_datasets(sender, instance, created, **kwargs):
+    """Предмет вопроса мог измениться."""
+    if not created:
+        invalidate_report_datasets(list(_tests_with_question(instance.pk)))
+
+
+@receiver(pre_delete, sender=BankQuestion)
+def reset_deleted_question_report_datasets(sender, instance, **kwargs):
+    invalidate_report_datasets(list(_tests_with_question(instance.pk)))
+
+
+@receiver([post_save, post_delete], sender=QuestionCount)
+def reset_all_report_datasets(sender, **kwargs):
+    """Число вопросов по предмету (колонки таблицы) изменилось."""
+    invalidate_report_datasets()
+
+
+# =============================================================================
+# --- КОПИИ КАРТИНОК (core/image_derivatives.py) ---
+# =============================================================================
+
+
+@receiver(post_save, sender=BankQuestion)
+def build_question_image_derivatives(sender, instance, **kwargs):
+    """Новая картинка вопроса или новая ширина (save_question_image_width) — строим копии в фоне."""
+    if instance.question_image and has_missing_derivatives(instance):
+        schedule_image_derivatives(question_ids=[instance.pk])
+
+
+@receiver(post_save, sender=BankAnswerOption)
+def build_option_image_derivatives(sender, instance, **kwargs):
+    """Новая картинка варианта ответа — строим копии в фоне."""
+    if instance.option_image and has_missing_derivatives(instance):
+        schedule_image_derivatives(option_ids=[instance.pk])
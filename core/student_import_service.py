@@ -0,0 +1,287 @@
+# D:\GAT\core\student_import_service.py
+
+"""
+Пакетная загрузка списков учеников (Excel или CSV).
+
+В отличие от services.process_student_upload (iterrows и update_or_create на
+каждую строку), файл читается кусками по CHUNK_SIZE строк (CSV — средствами
+pandas, xlsx — потоково через openpyxl), имена нормализуются векторными
+строковыми операциями, классы находятся по (школа, название) одним запросом
+на кусок, а ученики записываются одним INSERT ... ON CONFLICT на пачку
+из BATCH_SIZE строк (на PostgreSQL — через COPY). Отчет — тот же: created / updated / skipped / errors
+с номерами строк файла.
+
+Школа берется из колонки 'школа' (код или название школы) или из параметра
+school; без школы класс ищется по названию и должен быть однозначным.
+"""
+
+import csv
+
+import pandas as pd
+from django.db import connection, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import School, SchoolClass, Student
+from .permission_scope import invalidate_permission_scopes
+
+REQUIRED_COLUMNS = {'student_id', 'класс', 'фамилия_рус', 'имя_рус'}
+# Колонка файла -> поле Student
+NAME_COLUMNS = {
+    'фамилия_рус': 'last_name_ru',
+    'имя_рус': 'first_name_ru',
+    'фамилия_тадж': 'last_name_tj',
+    'имя_тадж': 'first_name_tj',
+    'surname': 'last_name_en',
+    'name': 'first_name_en',
+}
+SCHOOL_COLUMN = 'школа'
+CHUNK_SIZE = 10000
+BATCH_SIZE = 5000
+UPDATE_FIELDS = ['school_class', 'status', *NAME_COLUMNS.values(), 'updated_at']
+
+
+def _is_csv(upload):
+    return str(getattr(upload, 'name', '')).lower().endswith('.csv')
+
+
+def _csv_delimiter(upload):
+    sample = upload.read(4096)
+    upload.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode('utf-8-sig', errors='ignore')
+    try:
+        return csv.Sniffer().sniff(sample.splitlines()[0], delimiters=',;\t').delimiter
+    except (csv.Error, IndexError):
+        return ','
+
+
+def _normalize_header(columns):
+    return [str(col).strip().lower() for col in columns]
+
+
+def read_roster_chunks(upload, chunk_size=CHUNK_SIZE):
+    """Итератор DataFrame по chunk_size строк; все значения — строки или NaN, колонки в нижнем регистре."""
+    upload.seek(0)
+    if _is_csv(upload):
+        reader = pd.read_csv(
+            upload, sep=_csv_delimiter(upload), dtype=str, encoding='utf-8-sig', chunksize=chunk_size
+        )
+        for chunk in reader:
+            chunk.columns = _normalize_header(chunk.columns)
+            yield chunk
+        return
+
+    workbook = load_workbook(upload, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = _normalize_header(header)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield _frame(batch, header)
+                batch = []
+        if batch:
+            yield _frame(batch, header)
+    finally:
+        workbook.close()
+
+
+def _frame(rows, header):
+    frame = pd.DataFrame(rows, columns=header, dtype=object)
+    # Как read_excel(dtype=str): пустые ячейки — NaN, остальное — строки
+    return frame.apply(lambda col: col.where(col.isna(), col.astype(str)))
+
+
+class _ClassResolver:
+    """Кэш классов по (школа, название); недостающие названия догружаются одним запросом на кусок."""
+
+    def __init__(self, school=None):
+        self.school = school
+        self.loaded_names = set()
+        self.by_school = {}      # (school_id, name) -> class_id
+        self.by_name = {}        # name -> set(class_id)
+        self.schools = {}        # код или название школы (нижний регистр) -> school_id
+        if school is None:
+            for pk, code, name in School.objects.values_list('pk', 'school_id', 'name'):
+                self.schools[str(code).strip().lower()] = pk
+                self.schools.setdefault(str(name).strip().lower(), pk)
+
+    def load(self, names):
+        missing = set(names) - self.loaded_names
+        if not missing:
+            return
+        classes = SchoolClass.objects.filter(name__in=missing)
+        if self.school is not None:
+            classes = classes.filter(school=self.school)
+        for pk, name, school_id in classes.values_list('pk', 'name', 'school_id'):
+            self.by_school[(school_id, name)] = pk
+            self.by_name.setdefault(name, set()).add(pk)
+        self.loaded_names |= missing
+
+    def resolve(self, class_names, school_values, raw_names):
+        """Возвращает (Series class_id или None, Series с текстом ошибки или None)."""
+        self.load(class_names.unique())
+        if self.school is not None:
+            school_ids = pd.Series(self.school.pk, index=class_names.index)
+        elif school_values is not None:
+            school_ids = school_values.str.strip().str.lower().map(self.schools)
+        else:
+            school_ids = pd.Series(float('nan'), index=class_names.index)
+
+        by_school = pd.Series(
+            [self.by_school.get((school_id, name)) if pd.notna(school_id) else None
+             for school_id, name in zip(school_ids.tolist(), class_names.tolist())],
+            index=class_names.index, dtype=object,
+        )
+        # Школа не указана: класс должен быть единственным с таким названием
+        unique_by_name = class_names.map(lambda name: next(iter(self.by_name[name])) if len(self.by_name.get(name, ())) == 1 else None)
+        ambiguous = class_names.map(lambda name: len(self.by_name.get(name, ())) > 1)
+        no_school = school_ids.isna()
+        class_ids = by_school.where(~no_school, unique_by_name)
+
+        errors = pd.Series(None, index=class_names.index, dtype=object)
+        if school_values is not None and self.school is None:
+            unknown_school = no_school & school_values.notna()
+            errors[unknown_school] = "Школа '" + school_values[unknown_school].astype(str) + "' не найдена."
+        errors[class_ids.isna() & errors.isna() & no_school & ambiguous] = (
+            "Класс '" + raw_names + "' есть в нескольких школах, укажите школу."
+        )
+        errors[class_ids.isna() & errors.isna()] = "Класс '" + raw_names + "' не найден."
+        return class_ids, errors
+
+
+def _length_errors(frame):
+    """Векторная проверка длины полей (то, на чем раньше падало сохранение строки)."""
+    errors = pd.Series(None, index=frame.index, dtype=object)
+    for field_name in ['student_id', *NAME_COLUMNS.values()]:
+        max_length = Student._meta.get_field(field_name).max_length
+        too_long = frame[field_name].str.len() > max_length
+        errors[too_long & errors.isna()] = (
+            "Ошибка сохранения студента ID " + frame['student_id'] + f". Поле {field_name} длиннее {max_length} символов."
+        )
+    return errors
+
+
+def _upsert(rows, existing_ids):
+    """Записывает пачку учеников одним upsert'ом. Возвращает (created, updated)."""
+    seen = set(existing_ids)
+    created = updated = 0
+    for student_id in rows['student_id'].tolist():
+        if student_id in seen:
+            updated += 1
+        else:
+            created += 1
+            seen.add(student_id)
+
+    # В одном INSERT ... ON CONFLICT строка не может обновляться дважды — оставляем последнюю
+    rows = rows.drop_duplicates(subset='student_id', keep='last')
+    _write_students(rows)
+    return created, updated
+
+
+def _write_students(rows):
+    """
+    INSERT ... ON CONFLICT (student_id) DO UPDATE для пачки учеников.
+    На PostgreSQL (psycopg 3) — через COPY во временную таблицу (как ответы в
+    results_import_service), на остальных СУБД — bulk_create(update_conflicts=True).
+    """
+    name_fields = list(NAME_COLUMNS.values())
+    with connection.cursor() as cursor:
+        raw_cursor = getattr(cursor, 'cursor', None)
+        if connection.vendor == 'postgresql' and hasattr(raw_cursor, 'copy'):
+            table, now = Student._meta.db_table, timezone.now()
+            stage_columns = ['student_id', 'school_class_id', *name_fields]
+            cursor.execute("DROP TABLE IF EXISTS gat_student_stage")
+            cursor.execute(
+                "CREATE TEMP TABLE gat_student_stage (student_id text, school_class_id bigint, "
+                + ", ".join(f"{field} text" for field in name_fields) + ") ON COMMIT DROP"
+            )
+            with raw_cursor.copy(f"COPY gat_student_stage ({', '.join(stage_columns)}) FROM STDIN") as copy:
+                for row in rows[['student_id', 'class_id', *name_fields]].itertuples(index=False, name=None):
+                    copy.write_row(row)
+            cursor.execute(
+                f"INSERT INTO {table} (created_at, updated_at, status, {', '.join(stage_columns)}) "
+                f"SELECT %s, %s, 'ACTIVE', {', '.join(stage_columns)} FROM gat_student_stage "
+                "ON CONFLICT (student_id) DO UPDATE SET "
+                + ", ".join(f"{column} = EXCLUDED.{column}" for column in ['school_class_id', 'status', *name_fields, 'updated_at']),
+                [now, now]
+            )
+            cursor.execute("DROP TABLE gat_student_stage")
+            return
+
+    Student.objects.bulk_create(
+        [
+            Student(student_id=row.student_id, school_class_id=int(row.class_id), status='ACTIVE',
+                    **{field: getattr(row, field) for field in name_fields})
+            for row in rows.itertuples(index=False)
+        ],
+        update_conflicts=True,
+        unique_fields=['student_id'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+@transaction.atomic
+def bulk_process_student_upload(upload, school=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """
+    Пакетная версия services.process_student_upload (плюс CSV и привязка классов к школе).
+    Возвращает тот же словарь {'created', 'updated', 'skipped', 'errors'}
+    или {'errors': [...]} при ошибке чтения файла / заголовка.
+    """
+    created_count, updated_count, skipped_count, errors = 0, 0, 0, []
+    resolver = _ClassResolver(school)
+    offset = 0
+    chunks = read_roster_chunks(upload, chunk_size)
+
+    try:
+        for chunk in chunks:
+            if offset == 0 and not REQUIRED_COLUMNS.issubset(chunk.columns):
+                missing = REQUIRED_COLUMNS - set(chunk.columns)
+                return {'errors': [f"Отсутствуют обязательные колонки: {', '.join(missing)}"]}
+            # Номер строки в файле: заголовок — строка 1
+            chunk.index = pd.RangeIndex(offset + 2, offset + 2 + len(chunk))
+            offset += len(chunk)
+
+            present = chunk['student_id'].notna() & chunk['класс'].notna()
+            skipped_count += int((~present).sum())
+            chunk = chunk[present]
+            if chunk.empty:
+                continue
+
+            frame = pd.DataFrame({'student_id': chunk['student_id'].str.strip()}, index=chunk.index)
+            for column, field_name in NAME_COLUMNS.items():
+                frame[field_name] = chunk[column].fillna('').str.strip() if column in chunk.columns else ''
+            class_names = chunk['класс'].str.strip()
+            frame['class_id'], class_errors = resolver.resolve(
+                class_names, chunk[SCHOOL_COLUMN] if SCHOOL_COLUMN in chunk.columns else None, chunk['класс']
+            )
+
+            row_errors = class_errors.where(class_errors.notna(), _length_errors(frame))
+            failed = row_errors.notna()
+            errors.extend(f"Строка {line}: {message}" for line, message in row_errors[failed].items())
+            frame = frame[~failed]
+
+            for start in range(0, len(frame), batch_size):
+                batch = frame.iloc[start:start + batch_size]
+                existing = Student.objects.filter(student_id__in=batch['student_id'].unique().tolist()).values_list('student_id', flat=True)
+                created, updated = _upsert(batch, existing)
+                created_count += created
+                updated_count += updated
+    except Exception as e:
+        if offset == 0:
+            return {'errors': [f"Ошибка чтения файла: {e}"]}
+        raise
+
+    if created_count or updated_count:
+        invalidate_permission_scopes()
+    return {
+        "created": created_count,
+        "updated": updated_count,
+        "skipped": skipped_count,
+        "errors": errors
+    }
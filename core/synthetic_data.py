@@ -0,0 +1,268 @@
+# D:\GAT\core\synthetic_data.py
+
+"""
+Генератор синтетической сети школ для замеров производительности.
+
+Создает школы, параллели и классы, учебные годы с четвертями, банк вопросов,
+GAT-тесты, учеников и полные результаты (StudentResult + StudentAnswer).
+Ответы моделируются по «способности» ученика и сложности вопроса, поэтому
+распределения баллов и оценок похожи на настоящие. Все данные помечены
+префиксом SYN (ID школ и учеников) и удаляются flush_synthetic_network().
+"""
+
+import datetime
+import random
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    AcademicYear, Quarter, School, SchoolClass, Subject, QuestionTopic, BankQuestion,
+    BankAnswerOption, QuestionCount, GatTest, Student, StudentResult
+)
+from .results_import_service import _question_frame, _upsert_answers
+from .services import refresh_results_derived_data
+from .permission_scope import invalidate_permission_scopes
+
+SYN_PREFIX = 'SYN'
+BENCH_ADMIN = 'syn_bench_admin'
+BENCH_STUDENT = 'syn_bench_student'
+BATCH_SIZE = 2000
+
+SUBJECTS = [
+    ('Математика', 'MAT'), ('Русский язык', 'RUS'), ('Английский язык', 'ENG'), ('Физика', 'PHY'),
+    ('Химия', 'CHE'), ('Биология', 'BIO'), ('История', 'HIS'), ('География', 'GEO'),
+]
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Каримов', 'Рахимов', 'Саидов', 'Назаров', 'Юсупов', 'Шарипов', 'Алиев']
+FIRST_NAMES = ['Алишер', 'Фаридун', 'Сино', 'Мехрона', 'Нигина', 'Далер', 'Зарина', 'Рустам', 'Парвина', 'Тимур']
+QUARTER_MONTHS = [(9, 1, 10, 31), (11, 8, 12, 28), (1, 12, 3, 20), (4, 1, 5, 25)]
+DIFFICULTY_OFFSETS = {'EASY': -1.0, 'MEDIUM': 0.0, 'HARD': 1.0}
+
+
+def _years(count):
+    """Учебные годы, заканчивающиеся текущим (или ближайшим прошедшим)."""
+    today = timezone.localdate()
+    last_start = today.year if today.month >= 9 else today.year - 1
+    years = []
+    for start in range(last_start - count + 1, last_start + 1):
+        year, _ = AcademicYear.objects.get_or_create(
+            name=f"{start}-{start + 1}",
+            defaults={'start_date': datetime.date(start, 9, 1), 'end_date': datetime.date(start + 1, 5, 31)}
+        )
+        quarters = []
+        for idx, (m1, d1, m2, d2) in enumerate(QUARTER_MONTHS, 1):
+            y1 = start if m1 >= 9 else start + 1
+            y2 = start if m2 >= 9 else start + 1
+            quarter, _ = Quarter.objects.get_or_create(
+                name=f"{idx} четверть", year=year,
+                defaults={'start_date': datetime.date(y1, m1, d1), 'end_date': datetime.date(y2, m2, d2)}
+            )
+            quarters.append(quarter)
+        years.append((year, quarters))
+    return years
+
+
+def _subjects(count):
+    subjects = []
+    for name, abbreviation in SUBJECTS[:count]:
+        subject, _ = Subject.objects.get_or_create(name=name, defaults={'abbreviation': abbreviation})
+        if not subject.abbreviation:
+            subject.abbreviation = abbreviation
+            subject.save(update_fields=['abbreviation'])
+        subjects.append(subject)
+    return subjects
+
+
+def _simulate_answers(rng, abilities, difficulties):
+    """Матрица верных ответов (ученики × вопросы) по логистической модели."""
+    logits = abilities[:, None] - difficulties[None, :]
+    return rng.random(logits.shape) < 1 / (1 + np.exp(-logits))
+
+
+def generate_network(schools=3, parallels=(5, 6, 7, 8, 9, 10, 11), sections='АБВ', students_per_section=25,
+                     years=2, subjects=4, questions_per_subject=20, with_answers=True, seed=0, log=None):
+    """
+    Создает синтетическую сеть. Возвращает словарь с количеством созданных объектов.
+    В каждой четверти каждого года у каждой параллели проходит один GAT (номер = номер четверти).
+    """
+    log = log or (lambda message: None)
+    rng = np.random.default_rng(seed)
+    py_rng = random.Random(seed)
+    now = timezone.now()
+
+    years_data = _years(years)
+    subject_objs = _subjects(subjects)
+    first_school = School.objects.filter(school_id__startswith=f'{SYN_PREFIX}-').count()
+
+    # --- Школы, параллели и классы ---
+    with transaction.atomic():
+        school_objs = School.objects.bulk_create([
+            School(school_id=f'{SYN_PREFIX}-{n:03d}', name=f'Синтетическая школа №{n}', city='Душанбе')
+            for n in range(first_school + 1, first_school + schools + 1)
+        ])
+        parallel_objs = SchoolClass.objects.bulk_create([
+            SchoolClass(school=school, name=str(p)) for school in school_objs for p in parallels
+        ])
+        section_objs = SchoolClass.objects.bulk_create([
+            SchoolClass(school=parallel.school, parent=parallel, name=f'{parallel.name}{s}')
+            for parallel in parallel_objs for s in sections
+        ])
+    sections_by_parallel = defaultdict(list)
+    for section in section_objs:
+        sections_by_parallel[section.parent_id].append(section)
+    log(f"Школ: {len(school_objs)}, параллелей: {len(parallel_objs)}, классов: {len(section_objs)}")
+
+    # --- Банк вопросов (по 1.5 × нужного на предмет в каждой параллели) и QuestionCount ---
+    pool_size = questions_per_subject * 3 // 2
+    with transaction.atomic():
+        topics = QuestionTopic.objects.bulk_create([
+            QuestionTopic(name=f'{SYN_PREFIX} {subject.name}', subject=subject, school_class=parallel)
+            for parallel in parallel_objs for subject in subject_objs
+        ])
+        questions = BankQuestion.objects.bulk_create([
+            BankQuestion(
+                topic=topic, subject_id=topic.subject_id, school_class_id=topic.school_class_id,
+                text=f'{topic.subject.name}: синтетический вопрос {n}',
+                difficulty=py_rng.choices(['EASY', 'MEDIUM', 'HARD'], weights=[4, 4, 2])[0],
+            )
+            for topic in topics for n in range(1, pool_size + 1)
+        ], batch_size=BATCH_SIZE)
+        BankAnswerOption.objects.bulk_create([
+            BankAnswerOption(question=question, text=f'Вариант {order}', order=order, is_correct=(order == 1))
+            for question in questions for order in range(1, 5)
+        ], batch_size=BATCH_SIZE)
+        QuestionCount.objects.bulk_create([
+            QuestionCount(school_class=parallel, subject=subject, number_of_questions=questions_per_subject)
+            for parallel in parallel_objs for subject in subject_objs
+        ])
+    pool = defaultdict(list)
+    for question in questions:
+        pool[(question.school_class_id, question.subject_id)].append(question)
+    log(f"Вопросов в банке: {len(questions)}")
+
+    # --- Ученики ---
+    with transaction.atomic():
+        students = Student.objects.bulk_create([
+            Student(
+                student_id=f'{SYN_PREFIX}-{section.school.school_id[4:]}-{section.name}-{k:03d}',
+                school_class=section,
+                last_name_ru=py_rng.choice(LAST_NAMES), first_name_ru=py_rng.choice(FIRST_NAMES),
+                last_name_en=f'Student{k}', first_name_en='Syn',
+            )
+            for section in section_objs for k in range(1, students_per_section + 1)
+        ], batch_size=BATCH_SIZE)
+    invalidate_permission_scopes()
+    abilities = dict(zip([s.pk for s in students], rng.normal(0.3, 1.0, len(students))))
+    students_by_parallel = defaultdict(list)
+    parallel_of_section = {section.pk: section.parent_id for section in section_objs}
+    for student in students:
+        students_by_parallel[parallel_of_section[student.school_class_id]].append(student)
+    log(f"Учеников: {len(students)}")
+
+    # --- GAT-тесты и результаты ---
+    tests_count, results_count, answers_count = 0, 0, 0
+    for year, quarters in years_data:
+        for test_number, quarter in enumerate(quarters, 1):
+            test_date = quarter.end_date - datetime.timedelta(days=7)
+            for parallel in parallel_objs:
+                with transaction.atomic():
+                    test_questions = []
+                    for subject in subject_objs:
+                        test_questions.extend(py_rng.sample(pool[(parallel.pk, subject.pk)], questions_per_subject))
+                    gat_test = GatTest.objects.create(
+                        name=f'GAT-{test_number} {parallel.name} кл. ({parallel.school.name}, {year.name})',
+                        school=parallel.school, school_class=parallel, test_number=test_number,
+                        test_date=test_date, quarter=quarter,
+                        question_order=[q.pk for q in test_questions],
+                    )
+                    GatTest.questions.through.objects.bulk_create([
+                        GatTest.questions.through(gattest_id=gat_test.pk, bankquestion_id=q.pk) for q in test_questions
+                    ])
+
+                    # Номер вопроса в предмете — N-й по id (как в загрузчике результатов)
+                    questions_df = _question_frame(gat_test)
+                    difficulty_by_q = {q.pk: DIFFICULTY_OFFSETS[q.difficulty] for q in test_questions}
+                    questions_df['difficulty'] = questions_df['question_id'].map(difficulty_by_q)
+
+                    test_students = students_by_parallel[parallel.pk]
+                    ability = np.array([abilities[s.pk] for s in test_students])
+                    correct = _simulate_answers(rng, ability, questions_df['difficulty'].to_numpy())
+
+                    results = []
+                    for row, student in enumerate(test_students):
+                        scores = defaultdict(dict)
+                        for col, (subject_id, q_index) in enumerate(zip(questions_df['subject_id'], questions_df['q_index'])):
+                            scores[str(subject_id)][str(q_index)] = bool(correct[row, col])
+                        results.append(StudentResult(
+                            student=student, gat_test=gat_test,
+                            total_score=int(correct[row].sum()), scores_by_subject=dict(scores),
+                        ))
+                    results = StudentResult.objects.bulk_create(results, batch_size=BATCH_SIZE)
+
+                    if with_answers:
+                        result_ids = np.repeat([r.pk for r in results], len(questions_df))
+                        answer_rows = pd.DataFrame({
+                            'result_id': result_ids,
+                            'question_id': np.tile(questions_df['question_id'].to_numpy(), len(results)),
+                            'is_correct': correct.reshape(-1),
+                        })
+                        answer_rows['chosen_option_order'] = np.where(answer_rows['is_correct'], 1, None)
+                        _upsert_answers(answer_rows, now)
+                        answers_count += len(answer_rows)
+
+                refresh_results_derived_data(gat_test)
+                tests_count += 1
+                results_count += len(results)
+        log(f"  {year.name}: тестов {tests_count}, результатов {results_count}")
+
+    return {
+        'schools': len(school_objs),
+        'classes': len(section_objs),
+        'students': len(students),
+        'questions': len(questions),
+        'tests': tests_count,
+        'results': results_count,
+        'answers': answers_count,
+    }
+
+
+def ensure_bench_users():
+    """Пользователи для замеров: Генеральный директор и ученик синтетической сети."""
+    from accounts.models import UserProfile
+
+    admin, created = User.objects.get_or_create(username=BENCH_ADMIN, defaults={'is_staff': True, 'is_superuser': True})
+    if created:
+        admin.set_unusable_password()
+        admin.save()
+    admin.profile.role = UserProfile.Role.GENERAL_DIRECTOR
+    admin.profile.save()
+
+    student_user, created = User.objects.get_or_create(username=BENCH_STUDENT)
+    if created:
+        student_user.set_unusable_password()
+        student_user.save()
+    student = (
+        Student.objects.filter(student_id__startswith=f'{SYN_PREFIX}-', results__isnull=False)
+        .order_by('id').first()
+    )
+    student_user.profile.role = UserProfile.Role.STUDENT
+    student_user.profile.student = student
+    student_user.profile.save()
+    return admin, student_user
+
+
+@transaction.atomic
+def flush_synthetic_network():
+    """Удаляет все синтетические данные (школы SYN-*, их учеников, вопросы и тесты)."""
+    schools = School.objects.filter(school_id__startswith=f'{SYN_PREFIX}-')
+    User.objects.filter(username__in=[BENCH_ADMIN, BENCH_STUDENT]).delete()
+    StudentResult.objects.filter(gat_test__school__in=schools).delete()
+    Student.objects.filter(school_class__school__in=schools).delete()
+    BankQuestion.objects.filter(school_class__school__in=schools).delete()
+    deleted, _ = schools.delete()
+    invalidate_permission_scopes()
+    return deleted
@@ -2,6 +2,8 @@
 
 from django import template
 
+from core.image_derivatives import derivative_url
+
 register = template.Library()
 
 @register.filter(name='get_item')
@@ -29,4 +31,10 @@ def format_difficulty(value):
         return 'Средний'
     elif value == 'HARD':
         return 'Сложный'
-    return value 
\ No newline at end of file
+    return value
+
+
+@register.filter(name='image_variant')
+def image_variant(image, kind='web'):
+    """ URL уменьшенной копии картинки ('thumb' или 'web'), пока ее нет — оригинала """
+    return derivative_url(image, kind)
@@ -1,18 +1,55 @@
 # D:\GAT\core\tests.py (ОБНОВЛЕННАЯ ВЕРСИЯ ДЛЯ ЦЕНТРА ВОПРОСОВ)
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from django.http import QueryDict
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
 import pandas as pd
+from openpyxl import load_workbook
 import io
 import datetime
+import shutil
+import tempfile
+from unittest import mock
 
 from .models import (
     AcademicYear, Quarter, School, SchoolClass, Subject,
     GatTest, Student, StudentResult, StudentAnswer,
-    QuestionTopic, BankQuestion, BankAnswerOption, QuestionCount
+    QuestionTopic, BankQuestion, BankAnswerOption, QuestionCount, DifficultyRule,
+    SubjectResultRollup, QuestionResultRollup, BackgroundJob,
+    ItemStatistic, QuestionStatistic, TestStatistic, BookletVariant, ArchiveSummary
 )
-from .services import process_student_results_upload, validate_question_counts
+from .services import process_student_results_upload, validate_question_counts, refresh_results_derived_data, process_student_upload
+from .results_import_service import bulk_process_student_results_upload
+from .answer_matrix import AnswerMatrix, rebuild_answer_matrix
+from .rollups import find_rollup_mismatches
+from .ranks import rebuild_result_ranks
+from .xlsx_export import streaming_xlsx_response
+from .archive_summary import rebuild_archive_summary
+from .pagination import decode_cursor, estimate_count, keyset_paginate
+from .report_datasets import build_report_dataset, report_data_for_test
+from .booklet_variants import answer_map, generate_variants, unpermute_answers
+from .booklet_cache import get_or_build_booklet, storage as booklet_storage
+from .synthetic_data import generate_network, flush_synthetic_network, ensure_bench_users
+from .performance import get_view_stats
+from .jobs import run_pending_jobs
+from .item_statistics import stale_tests
+from .trends import rollup_trend_chart, result_trend_chart
+from .dashboard_cache import get_dashboard_snapshot
+from .search import search_students, search_questions
+from .student_import_service import bulk_process_student_upload
+from .account_provisioning import allocate_usernames, hash_passwords, provision_student_accounts
+from .import_service import process_import
+from .gat_generator import create_generated_tests, plan_tests, split_by_percent
+from .question_assembly import assembly_stats, available_questions_page, parse_cursor
+from .image_derivatives import derivative_name, derivative_url, has_missing_derivatives, print_image_path
+from .views.deep_analysis import DeepAnalysisForm, _resolve_analysis_scope, _run_analysis, _run_analysis_legacy
+from .views.permissions import get_accessible_schools, get_accessible_classes
+from accounts.models import UserProfile
 
 class ServicesTestCase(TestCase):
 
@@ -238,6 +275,99 @@ class ServicesTestCase(TestCase):
         phys1_answer = sidorov_answers.get(question=self.phys_question1)
         self.assertFalse(phys1_answer.is_correct)
 
+    def test_bulk_upload_matches_legacy_upload(self):
+        """
+        Проверяет, что пакетный загрузчик дает тот же отчет и те же данные,
+        что и построчный, а повторная загрузка обновляет записи.
+        """
+        success, legacy_report = process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        self.assertTrue(success)
+        legacy_scores = dict(StudentResult.objects.values_list('student__student_id', 'scores_by_subject'))
+        legacy_answers = set(StudentAnswer.objects.values_list('result__student__student_id', 'question_id', 'is_correct'))
+        StudentResult.objects.all().delete()
+        Student.objects.all().delete()
+
+        success, report = bulk_process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        self.assertTrue(success)
+        self.assertEqual(report, legacy_report)
+        self.assertEqual(dict(StudentResult.objects.values_list('student__student_id', 'scores_by_subject')), legacy_scores)
+        self.assertEqual(
+            set(StudentAnswer.objects.values_list('result__student__student_id', 'question_id', 'is_correct')),
+            legacy_answers
+        )
+        self.assertEqual(StudentResult.objects.get(student__student_id='S-1003').total_score, 2)
+
+        # Повторная загрузка: все ученики уже существуют
+        success, report = bulk_process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        self.assertEqual(report['created_students'], 0)
+        self.assertEqual(report['updated_students'], 3)
+        self.assertEqual(StudentResult.objects.count(), 3)
+        self.assertEqual(StudentAnswer.objects.count(), 9)
+
+    def test_answer_matrix_matches_scores_json(self):
+        """
+        Проверяет, что матрица ответов строится при загрузке и дает те же
+        баллы, что и scores_by_subject, а после удаления результатов исчезает.
+        """
+        bulk_process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        matrix = AnswerMatrix.for_test(self.gat_test)
+        self.assertIsNotNone(matrix)
+        self.assertEqual(matrix.correct.shape, (3, 3))
+
+        sidorov = Student.objects.get(student_id='S-1003')
+        row = matrix.row_of(sidorov.pk)
+        self.assertEqual(int(matrix.per_student_correct()[row]), 2)
+        self.assertEqual(
+            matrix.student_subject_scores()[sidorov.pk],
+            {self.math.id: 2, self.phys.id: 0}
+        )
+        self.assertEqual(matrix.per_question_correct()[(self.math.id, '1')], (2, 3))
+
+        StudentResult.objects.filter(gat_test=self.gat_test).delete()
+        rebuild_answer_matrix(self.gat_test)
+        self.assertIsNone(AnswerMatrix.for_test(self.gat_test))
+
+    def test_result_rollups_follow_results(self):
+        """
+        Проверяет агрегаты по (тест, класс, предмет[, вопрос]) после загрузки
+        и их пересборку после удаления результата.
+        """
+        bulk_process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        class_a = SchoolClass.objects.get(name='10А')
+        class_b = SchoolClass.objects.get(name='10Б')
+
+        math_a = SubjectResultRollup.objects.get(gat_test=self.gat_test, school_class=class_a, subject=self.math)
+        self.assertEqual((math_a.students, math_a.correct, math_a.answered, math_a.possible), (2, 2, 4, 4))
+        self.assertEqual(math_a.grade_histogram, {'5': 2})  # у обоих 1 из 2
+        phys_b = SubjectResultRollup.objects.get(gat_test=self.gat_test, school_class=class_b, subject=self.phys)
+        self.assertEqual(phys_b.grade_histogram, {'1': 1})
+        q1_a = QuestionResultRollup.objects.get(gat_test=self.gat_test, school_class=class_a, subject=self.math, question_number='1')
+        self.assertEqual((q1_a.correct, q1_a.answered), (1, 2))
+        self.assertEqual(find_rollup_mismatches(self.gat_test), [])
+
+        StudentResult.objects.get(student__student_id='S-1003').delete()
+        self.assertNotEqual(find_rollup_mismatches(self.gat_test), [])
+        refresh_results_derived_data(self.gat_test)
+        self.assertFalse(SubjectResultRollup.objects.filter(school_class=class_b).exists())
+        self.assertEqual(find_rollup_mismatches(self.gat_test), [])
+
+    def test_result_ranks_use_competition_ranking(self):
+        """
+        Проверяет ранги в классе, школе и параллели (одинаковый балл — одинаковое место).
+        """
+        bulk_process_student_results_upload(self.gat_test, self.create_test_excel_file())
+        for student_id, score in (('S-1001', 5), ('S-1002', 3), ('S-1003', 3)):
+            StudentResult.objects.filter(student__student_id=student_id).update(total_score=score)
+        rebuild_result_ranks(self.gat_test)
+
+        ranks = {
+            r.student.student_id: (r.class_rank, r.class_total, r.school_rank, r.school_total, r.parallel_rank, r.parallel_total)
+            for r in StudentResult.objects.select_related('student')
+        }
+        self.assertEqual(ranks['S-1001'], (1, 2, 1, 3, 1, 3))
+        self.assertEqual(ranks['S-1002'], (2, 2, 2, 3, 2, 3))
+        self.assertEqual(ranks['S-1003'], (1, 1, 2, 3, 2, 3))
+
     def test_validate_question_counts(self):
         """
         Проверяет функцию валидации количества вопросов.
@@ -475,4 +605,1164 @@ class ModelRelationshipsTestCase(TestCase):
         
         # Проверяем обратную связь
         self.assertEqual(question1.gat_tests.count(), 1)
-        self.assertEqual(question1.gat_tests.first(), gat_test)
\ No newline at end of file
+        self.assertEqual(question1.gat_tests.first(), gat_test)
+
+class PermissionScopeTestCase(TestCase):
+    """
+    Тестирует кэширование области доступа и ее сброс при изменении прав.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.school1 = School.objects.create(school_id="SCH-A", name="Школа А")
+        self.school2 = School.objects.create(school_id="SCH-B", name="Школа Б")
+        self.class1 = SchoolClass.objects.create(name="5", school=self.school1)
+        self.director = User.objects.create_user(username='director', password='pass12345')
+        self.director.profile.role = UserProfile.Role.DIRECTOR
+        self.director.profile.save()
+
+    def fresh_user(self):
+        """Новый объект пользователя — как в новом запросе."""
+        return User.objects.select_related('profile').get(pk=self.director.pk)
+
+    def test_scope_is_cached_and_invalidated_on_access_change(self):
+        self.assertEqual(list(get_accessible_schools(self.fresh_user())), [])
+
+        # Во втором «запросе» область берется из кэша; для пустого набора ID
+        # Django не обращается к БД вовсе
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_accessible_schools(user).count(), 0)
+
+        # Выдача доступа (как в toggle_school_access_api) сбрасывает версию пользователя
+        self.director.profile.schools.add(self.school1)
+        user = self.fresh_user()
+        self.assertEqual(list(get_accessible_schools(user)), [self.school1])
+        self.assertEqual(set(get_accessible_classes(user)), {self.class1})
+
+        # Новый класс в школе меняет общую версию
+        class2 = SchoolClass.objects.create(name="6", school=self.school1)
+        self.assertEqual(set(get_accessible_classes(self.fresh_user())), {self.class1, class2})
+
+
+class BackgroundJobTestCase(TestCase):
+    """
+    Тестирует очередь фоновых задач: постановку из представления, воркер и скачивание.
+    """
+
+    def setUp(self):
+        self.job_files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_files, ignore_errors=True)
+        school = School.objects.create(school_id="SCH-J", name="Школа")
+        self.school_class = SchoolClass.objects.create(name="7A", school=school)
+        self.student = Student.objects.create(
+            student_id="JOB-001", school_class=self.school_class,
+            last_name_ru="Иванов", first_name_ru="Иван", first_name_en="Ivan", last_name_en="Ivanov",
+        )
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+
+    def test_accounts_export_runs_in_worker(self):
+        self.client.force_login(self.admin)
+        with override_settings(JOB_FILES_ROOT=self.job_files):
+            response = self.client.post(
+                reverse('core:class_create_export_accounts', args=[self.school_class.pk]),
+                {'action': 'export_only'}
+            )
+            job = BackgroundJob.objects.get()
+            self.assertRedirects(response, reverse('core:job_detail', args=[job.pk]))
+            # Запрос только ставит задачу — аккаунт создает воркер
+            self.assertEqual(job.status, BackgroundJob.Status.PENDING)
+            self.assertFalse(UserProfile.objects.filter(student=self.student).exists())
+
+            call_command('run_jobs', '--once', '--purge-days=0', stdout=io.StringIO())
+
+            job.refresh_from_db()
+            self.assertEqual(job.status, BackgroundJob.Status.DONE, job.error)
+            self.assertEqual(job.progress, 100)
+            self.assertTrue(UserProfile.objects.filter(student=self.student, user__username='ivanivanov').exists())
+
+            status = self.client.get(reverse('core:job_status', args=[job.pk])).json()
+            self.assertEqual(status['download_url'], reverse('core:job_download', args=[job.pk]))
+            response = self.client.get(status['download_url'])
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('logins_7A.pdf', response['Content-Disposition'])
+
+            # Чужую задачу не видно
+            self.client.force_login(User.objects.create_user(username='other', password='pass12345'))
+            self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+
+class BookletCacheTestCase(TestCase):
+    """
+    Тестирует кэш буклетов: повторная выдача без сборки и сброс при изменениях.
+    """
+
+    def setUp(self):
+        cache.clear()
+        job_files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, job_files, ignore_errors=True)
+        settings_override = override_settings(JOB_FILES_ROOT=job_files)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        school = School.objects.create(school_id="SCH-BK", name="Школа")
+        base_class = SchoolClass.objects.create(name="9", school=school)
+        subject = Subject.objects.create(name="Физика", abbreviation="ФИЗ")
+        topic = QuestionTopic.objects.create(name="Механика", subject=subject, school_class=base_class)
+        self.question = BankQuestion.objects.create(topic=topic, text="Сила тяжести?")
+        self.option = BankAnswerOption.objects.create(question=self.question, text="mg", is_correct=True)
+        self.test = GatTest.objects.create(
+            name="Буклет", test_number=1, test_date=datetime.date.today(),
+            school=school, school_class=base_class
+        )
+        self.test.questions.add(self.question)
+
+    def get_docx(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return b'docx-content'
+        name, _ = get_or_build_booklet(self.test, 'docx', build)
+        return name, len(builds)
+
+    def test_booklet_is_reused_until_inputs_change(self):
+        name, builds = self.get_docx()
+        self.assertEqual(builds, 1)
+        self.assertEqual(self.get_docx(), (name, 0))
+
+        # Правка варианта ответа меняет хеш и удаляет старый файл
+        self.option.text = "m*g"
+        self.option.save()
+        self.assertFalse(booklet_storage.exists(name))
+        new_name, builds = self.get_docx()
+        self.assertNotEqual(new_name, name)
+        self.assertEqual(builds, 1)
+
+        # Сохранение порядка вопросов (save_booklet_order) тоже сбрасывает кэш
+        self.test.question_order = [self.question.pk]
+        self.test.save()
+        self.assertEqual(self.get_docx()[1], 1)
+
+        # Как и удаление вопроса из теста
+        self.test.questions.remove(self.question)
+        self.assertEqual(self.get_docx()[1], 1)
+
+
+class BookletVariantTestCase(TestCase):
+    """
+    Тестирует варианты буклетов (core/booklet_variants.py): детерминированные
+    перестановки, ключи ответов и возврат ответов к исходной нумерации при загрузке.
+    """
+
+    def setUp(self):
+        school = School.objects.create(school_id="SCH-V", name="Школа В")
+        parallel = SchoolClass.objects.create(name="10", school=school)
+        self.math = Subject.objects.create(name="Математика", abbreviation="МАТ")
+        topic = QuestionTopic.objects.create(name="Алгебра", subject=self.math, school_class=parallel)
+        self.test = GatTest.objects.create(
+            name="GAT-1 варианты", test_number=1, test_date=datetime.date.today(), school=school,
+            school_class=parallel, shuffle_questions=True, shuffle_options=True,
+        )
+        for n in range(1, 6):
+            question = BankQuestion.objects.create(topic=topic, text=f"Вопрос {n}")
+            BankAnswerOption.objects.bulk_create([
+                BankAnswerOption(question=question, text=f"{n}.{order}", order=order, is_correct=(order == 1))
+                for order in range(1, 5)
+            ])
+            self.test.questions.add(question)
+
+    def test_variants_are_seeded_and_keys_follow_permutations(self):
+        variants = generate_variants(self.test, 3)
+        self.assertEqual([v.name for v in variants], ['A', 'B', 'C'])
+        for variant in variants:
+            self.assertEqual(sorted(variant.question_ids), sorted(self.test.questions.values_list('id', flat=True)))
+            # Верный ответ — исходный вариант №1, ключ указывает на его позицию показа
+            self.assertEqual(variant.answer_key, [1 << order.index(1) for order in variant.option_orders])
+
+        again = generate_variants(self.test, 3)
+        self.assertEqual([v.question_ids for v in again], [v.question_ids for v in variants])
+        self.assertEqual(BookletVariant.objects.filter(gat_test=self.test).count(), 3)
+
+    def test_unpermute_maps_letters_to_original_questions(self):
+        variant = generate_variants(self.test, 2)[1]
+        base_numbers = {qid: n for n, qid in enumerate(sorted(variant.question_ids), 1)}
+        letters = ['ABCD'[order.index(1)] for order in variant.option_orders]
+        answers = pd.DataFrame({
+            'Code': 'S-1', 'subject_id': self.math.pk,
+            'q_num': [str(n) for n in range(1, 6)],
+            'is_correct': False,
+            'letter': ['ABCD'.index(letter) for letter in letters],
+            'Variant': 'B',
+        })
+        rows = unpermute_answers(answers, answer_map(self.test))
+        self.assertTrue(rows['is_correct'].all())
+        self.assertEqual(list(rows['q_num']), [str(base_numbers[qid]) for qid in variant.question_ids])
+        self.assertEqual(list(rows['chosen_option_order']), [1] * 5)
+
+    def test_results_upload_with_variant_column(self):
+        variant = generate_variants(self.test, 2)[1]
+        wrong = ['ABCD'[(order.index(1) + 1) % 4] for order in variant.option_orders]
+        right = ['ABCD'[order.index(1)] for order in variant.option_orders]
+        frame = pd.DataFrame({
+            'Code': ['S-1', 'S-2'], 'Surname': ['Иванов', 'Петров'], 'Name': ['Иван', 'Петр'],
+            'Section': ['А', 'А'], 'Variant': ['B', 'b'],
+            **{f'МАТ_{n}': [right[n - 1], wrong[n - 1] if n > 2 else right[n - 1]] for n in range(1, 6)},
+        })
+        output = io.BytesIO()
+        frame.to_excel(output, index=False)
+        success, report = bulk_process_student_results_upload(self.test, SimpleUploadedFile('variant.xlsx', output.getvalue()))
+        self.assertTrue(success, report)
+
+        results = {r.student.student_id: r for r in StudentResult.objects.filter(gat_test=self.test).select_related('student')}
+        self.assertEqual((results['S-1'].total_score, results['S-2'].total_score), (5, 2))
+        self.assertEqual(results['S-1'].booklet_variant, 'B')
+        # Первые два вопроса бланка варианта B — это исходные вопросы с такими id
+        first_two = set(variant.question_ids[:2])
+        correct_ids = set(StudentAnswer.objects.filter(result=results['S-2'], is_correct=True).values_list('question_id', flat=True))
+        self.assertEqual(correct_ids, first_two)
+        with self.assertRaises(ValueError):
+            generate_variants(self.test, 2)
+
+
+class XlsxExportTestCase(TestCase):
+    """
+    Тестирует потоковую выгрузку XLSX (core/xlsx_export.py).
+    """
+
+    def test_streaming_response_contains_all_rows(self):
+        header1, header2 = ["№", "ФИО", "Балл"], ["", "", "(из 10)"]
+        rows = ([i, f"Ученик {i}", i % 10] for i in range(1, 1001))
+
+        response = streaming_xlsx_response('report.xlsx', 'Отчет', [header1, header2], rows, merge_header_columns=[1, 2])
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+
+        sheet = load_workbook(io.BytesIO(content)).active
+        values = list(sheet.values)
+        self.assertEqual(len(values), 1002)
+        self.assertEqual(values[0], ("№", "ФИО", "Балл"))
+        self.assertEqual(values[-1], (1000, "Ученик 1000", 0))
+        self.assertEqual({str(r) for r in sheet.merged_cells.ranges}, {"A1:A2", "B1:B2"})
+        # Ширина оценивается по заголовкам и первым строкам
+        self.assertEqual(sheet.column_dimensions['B'].width, len("Ученик 200") + 2)
+
+
+class SyntheticDataTestCase(TestCase):
+    """
+    Тестирует генератор синтетической сети (core/synthetic_data.py).
+    """
+
+    def test_generate_and_flush_network(self):
+        stats = generate_network(
+            schools=1, parallels=(5,), sections='АБ', students_per_section=4,
+            years=1, subjects=2, questions_per_subject=5,
+        )
+        self.assertEqual(stats['students'], 8)
+        self.assertEqual(stats['tests'], 4)
+        self.assertEqual(stats['results'], 32)
+        self.assertEqual(stats['answers'], 32 * 10)
+        self.assertEqual(StudentAnswer.objects.count(), 32 * 10)
+
+        for gat_test in GatTest.objects.all():
+            self.assertEqual(gat_test.questions.count(), 10)
+            self.assertEqual(find_rollup_mismatches(gat_test), [])
+            result = gat_test.results.first()
+            answered = sum(sum(answers.values()) for answers in result.scores_by_subject.values())
+            self.assertEqual(result.total_score, answered)
+
+        flush_synthetic_network()
+        self.assertFalse(School.objects.filter(school_id__startswith='SYN-').exists())
+        self.assertFalse(StudentResult.objects.exists())
+        self.assertFalse(BankQuestion.objects.exists())
+
+
+class PerformanceMiddlewareTestCase(TestCase):
+    """
+    Тестирует замеры запросов (core/middleware.py, core/performance.py).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='perf_staff', password='password', is_staff=True)
+        self.client.login(username='perf_staff', password='password')
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_request_metrics_and_slow_log(self):
+        with self.assertLogs('performance_logger', 'WARNING') as logs:
+            response = self.client.get(reverse('core:management'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('[core:management] -> 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+        self.client.get(reverse('core:management'))
+        stats = {row['view']: row for row in get_view_stats()}
+        self.assertEqual(stats['core:management']['count'], 2)
+        self.assertEqual(stats['core:management']['slow'], 2)
+        self.assertGreater(stats['core:management']['avg_queries'], 0)
+        self.assertGreater(stats['core:management']['avg_render_ms'], 0)
+
+        response = self.client.get(reverse('core:performance'))
+        self.assertContains(response, 'core:management')
+
+    def test_performance_page_is_staff_only(self):
+        User.objects.create_user(username='perf_user', password='password')
+        self.client.login(username='perf_user', password='password')
+        response = self.client.get(reverse('core:performance'))
+        self.assertEqual(response.status_code, 302)
+
+
+class DeepAnalysisEngineTestCase(TestCase):
+    """
+    Тестирует векторизованный расчет углубленного анализа (core/analytics.py)
+    против прежней реализации на словарях.
+    """
+
+    def test_vectorized_analysis_matches_legacy(self):
+        generate_network(
+            schools=2, parallels=(5,), sections='АБ', students_per_section=6,
+            years=1, subjects=2, questions_per_subject=5, seed=3,
+        )
+        admin, _ = ensure_bench_users()
+        params = {
+            'quarters': list(Quarter.objects.filter(gat_tests__isnull=False).distinct().values_list('pk', flat=True)),
+            'schools': list(School.objects.values_list('pk', flat=True)),
+            'school_classes': list(SchoolClass.objects.filter(parent__isnull=True).values_list('pk', flat=True)),
+            'subjects': list(Subject.objects.values_list('pk', flat=True)),
+            'test_numbers': ['1', '2', '3', '4'],
+        }
+        query = QueryDict(mutable=True)
+        for key, values in params.items():
+            query.setlist(key, [str(v) for v in values])
+        form = DeepAnalysisForm(query, user=admin)
+        self.assertTrue(form.is_valid(), form.errors)
+        scope = _resolve_analysis_scope(form, admin)
+        self.assertEqual(scope['compare_by'], 'school')
+
+        legacy, new = _run_analysis_legacy(scope), _run_analysis(scope)
+        self.assertTrue(new['heatmap_data'])
+        self.assertTrue(new['at_risk_students'])
+        for context in (legacy, new):
+            context['at_risk_students'] = sorted(context['at_risk_students'], key=lambda x: sorted(x.items()))
+        self.assertEqual(new, legacy)
+
+        self.client.force_login(admin)
+        response = self.client.get(reverse('core:deep_analysis'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['has_results'])
+
+
+class TrendChartTestCase(TestCase):
+    """
+    Тестирует динамику по четвертям (core/trends.py): один запрос на график.
+    """
+
+    def test_rollup_and_json_trends_agree(self):
+        generate_network(
+            schools=1, parallels=(5,), sections='А', students_per_section=5,
+            years=1, subjects=2, questions_per_subject=4, seed=5,
+        )
+        with self.assertNumQueries(1):
+            from_rollups = rollup_trend_chart(SubjectResultRollup.objects.all())
+        with self.assertNumQueries(1):
+            from_answers = result_trend_chart(StudentResult.objects.all())
+
+        self.assertIsNotNone(from_rollups)
+        self.assertGreaterEqual(len(from_rollups['labels']), 2)
+        self.assertEqual(len(from_rollups['datasets']), 2)
+        key = lambda chart: sorted((ds['label'], ds['data']) for ds in chart['datasets'])
+        self.assertEqual(from_answers['labels'], from_rollups['labels'])
+        self.assertEqual(key(from_answers), key(from_rollups))
+
+        # Одна четверть — графика нет
+        first_test = GatTest.objects.order_by('test_date').first()
+        self.assertIsNone(result_trend_chart(StudentResult.objects.filter(gat_test=first_test)))
+
+
+class DashboardSnapshotTestCase(TestCase):
+    """
+    Тестирует кэш снимков главной панели (core/dashboard_cache.py).
+    """
+
+    def setUp(self):
+        cache.clear()
+        generate_network(
+            schools=1, parallels=(6,), sections='А', students_per_section=4,
+            years=1, subjects=2, questions_per_subject=3, seed=11,
+        )
+        self.admin, _ = ensure_bench_users()
+
+    def snapshot(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {'student_count': StudentResult.objects.values('student_id').distinct().count()}
+        user = User.objects.select_related('profile').get(pk=self.admin.pk)
+        snapshot, _ = get_dashboard_snapshot(user, None, None, build)
+        return snapshot, len(builds)
+
+    def test_snapshot_is_reused_until_results_change(self):
+        snapshot, builds = self.snapshot()
+        self.assertEqual(builds, 1)
+        self.assertEqual(self.snapshot(), (snapshot, 0))
+
+        # Загрузка/удаление результатов меняет версию данных
+        refresh_results_derived_data(GatTest.objects.first())
+        self.assertEqual(self.snapshot()[1], 1)
+
+        # Изменение числа вопросов (распределение оценок) — тоже
+        QuestionCount.objects.update_or_create(
+            school_class=SchoolClass.objects.filter(parent__isnull=True).first(), subject=Subject.objects.first(),
+            defaults={'number_of_questions': 5},
+        )
+        self.assertEqual(self.snapshot()[1], 1)
+
+        # Перенос теста в другой период
+        gat_test = GatTest.objects.first()
+        gat_test.test_date += datetime.timedelta(days=1)
+        gat_test.save()
+        self.assertEqual(self.snapshot()[1], 1)
+
+        # Изменение состава вопросов (максимальный балл)
+        gat_test.questions.remove(gat_test.questions.first())
+        self.assertEqual(self.snapshot()[1], 1)
+
+    def test_dashboard_served_from_warmed_snapshot(self):
+        call_command('warm_dashboard_cache', period=['all'], stdout=io.StringIO())
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('core:dashboard'), {'period': 'all'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['student_count'], 4)
+        self.assertTrue(response.context['top_students'])
+
+        # Снимок уже собран командой: повторная сборка не нужна
+        out = io.StringIO()
+        call_command('warm_dashboard_cache', period=['all'], stdout=out)
+        self.assertIn("собрано заново: 0", out.getvalue())
+
+
+class ItemStatisticsTestCase(TestCase):
+    """
+    Тестирует психометрические показатели вопросов и тестов (core/item_statistics.py).
+    """
+
+    def test_statistics_job_after_results_change(self):
+        generate_network(
+            schools=1, parallels=(5,), sections='АБ', students_per_section=10,
+            years=1, subjects=2, questions_per_subject=5, seed=5,
+        )
+        gat_test = GatTest.objects.order_by('id').first()
+        # Загрузка результатов ставит пересчет в очередь, страница ничего не считает
+        self.assertTrue(BackgroundJob.objects.filter(kind='item_statistics', params__test_id=gat_test.pk).exists())
+        self.assertFalse(ItemStatistic.objects.exists())
+        self.assertEqual(stale_tests().count(), 4)
+
+        run_pending_jobs()
+        self.assertFalse(BackgroundJob.objects.exclude(status=BackgroundJob.Status.DONE).exists())
+        self.assertEqual(stale_tests().count(), 0)
+
+        question = gat_test.questions.order_by('id').first()
+        answers = StudentAnswer.objects.filter(result__gat_test=gat_test, question=question)
+        item = ItemStatistic.objects.get(gat_test=gat_test, question=question)
+        self.assertEqual(item.n_students, answers.count())
+        self.assertEqual(item.n_correct, answers.filter(is_correct=True).count())
+        self.assertAlmostEqual(item.p_value, item.n_correct / item.n_students, places=4)
+        self.assertEqual(item.question_number, '1')
+        self.assertEqual(sum(counts['n'] for counts in item.distractors.values()), item.n_students)
+        if item.discrimination is not None:
+            self.assertTrue(-1 <= item.discrimination <= 1)
+
+        pooled = QuestionStatistic.objects.get(question=question)
+        items = ItemStatistic.objects.filter(question=question)
+        self.assertEqual(pooled.n_tests, items.count())
+        self.assertEqual(pooled.n_students, sum(i.n_students for i in items))
+
+        test_stat = TestStatistic.objects.get(gat_test=gat_test)
+        self.assertEqual((test_stat.n_students, test_stat.n_items), (20, 10))
+        self.assertEqual(len(test_stat.subject_kr20), 2)
+        self.assertTrue(test_stat.kr20 is None or test_stat.kr20 <= 1)
+
+        # Удаление результатов: пересчитывается только этот тест, сводка вопроса уменьшается
+        gat_test.results.all().delete()
+        refresh_results_derived_data(gat_test)
+        run_pending_jobs()
+        self.assertFalse(TestStatistic.objects.filter(gat_test=gat_test).exists())
+        self.assertFalse(ItemStatistic.objects.filter(gat_test=gat_test).exists())
+        self.assertEqual(QuestionStatistic.objects.get(question=question).n_tests, pooled.n_tests - 1)
+
+        admin, _ = ensure_bench_users()
+        self.client.force_login(admin)
+        other_test = GatTest.objects.exclude(pk=gat_test.pk).order_by('id').first()
+        response = self.client.get(reverse('core:gat_test_edit', args=[other_test.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f"Ответов: {QuestionStatistic.objects.get(question=question).n_students}")
+
+
+class SearchTestCase(TestCase):
+    """
+    Тестирует поиск по индексам PostgreSQL (core/search.py).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.school1 = School.objects.create(school_id="SCH-A", name="Школа А")
+        self.school2 = School.objects.create(school_id="SCH-B", name="Школа Б")
+        class1 = SchoolClass.objects.create(name="5А", school=self.school1)
+        class2 = SchoolClass.objects.create(name="5Б", school=self.school2)
+        self.student = Student.objects.create(
+            student_id="S-1001", school_class=class1, last_name_ru="Рахимов", first_name_ru="Фаррух",
+            last_name_tj="Раҳимов", first_name_tj="Фаррух", last_name_en="Rakhimov", first_name_en="Farrukh",
+        )
+        Student.objects.create(student_id="S-2001", school_class=class2, last_name_ru="Рахимова", first_name_ru="Мадина")
+
+        subject = Subject.objects.create(name="Математика", abbreviation="MATH")
+        parallel = SchoolClass.objects.create(name="5", school=self.school1)
+        topic = QuestionTopic.objects.create(name="Уравнения", subject=subject, school_class=parallel)
+        self.question = BankQuestion.objects.create(
+            topic=topic, subject=subject, school_class=parallel,
+            text="Решите квадратные уравнения. Муодилаҳои квадратиро ҳал кунед.", tags="алгебра",
+        )
+        BankQuestion.objects.create(topic=topic, subject=subject, school_class=parallel, text="Найдите площадь круга")
+
+        self.director = User.objects.create_user(username='director', password='pass12345')
+        self.director.profile.role = UserProfile.Role.DIRECTOR
+        self.director.profile.save()
+        self.director.profile.schools.add(self.school1)
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+
+    def test_students_prefix_search_in_all_languages(self):
+        director = User.objects.get(pk=self.director.pk)
+        for text in ("рахи", "Раҳимов", "rakh", "фаррух рах", "s-1001"):
+            self.assertEqual(list(search_students(director, text)), [self.student], text)
+        # Ученик чужой школы не попадает в выдачу, даже если совпадает лучше
+        self.assertEqual(search_students(User.objects.get(pk=self.admin.pk), "рахимов").count(), 2)
+        self.assertFalse(search_students(director, "р").exists())
+
+    def test_questions_ranked_search(self):
+        for text in ("уравнение", "квадратн", "муодила", "алгебр"):
+            found = list(search_questions(self.admin, text))
+            self.assertEqual(found, [self.question], text)
+        self.assertFalse(search_questions(self.admin, "геометрия").exists())
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('core:question_library'), {'q': 'уравнения'})
+        self.assertEqual(list(response.context['found_questions']), [self.question])
+        response = self.client.get(reverse('core:bank_question_list'), {'q': 'площадь'})
+        self.assertEqual([q.text for q in response.context['items']], ["Найдите площадь круга"])
+
+    def test_header_search_api(self):
+        self.client.force_login(self.director)
+        response = self.client.get(reverse('core:api_header_search'), {'q': 'Рахим'})
+        names = [item['name'] for item in response.json()['results']]
+        self.assertEqual(names, ["Фаррух Рахимов (5А)"])
+
+
+class StudentImportTestCase(TestCase):
+    """
+    Тестирует пакетную загрузку списков учеников (core/student_import_service.py).
+    """
+
+    def setUp(self):
+        self.school1 = School.objects.create(school_id="SCH-A", name="Школа А")
+        self.school2 = School.objects.create(school_id="SCH-B", name="Школа Б")
+        self.class_a1 = SchoolClass.objects.create(name="5А", school=self.school1)
+        self.class_a2 = SchoolClass.objects.create(name="5А", school=self.school2)
+        self.class_b1 = SchoolClass.objects.create(name="6Б", school=self.school1)
+        Student.objects.create(student_id="S-1", school_class=self.class_b1, last_name_ru="Старая", first_name_ru="Запись")
+
+    def roster(self):
+        return pd.DataFrame({
+            'student_id': ['S-1', 'S-2', None, 'S-3', 'S-2', 'S-4'],
+            'Класс': ['6Б', ' 6Б ', '6Б', '7В', '6Б', '6Б'],
+            'Фамилия_рус': [' Иванов ', 'Петров', 'Без', 'Нет', 'Петров', 'Сидоров'],
+            'Имя_рус': ['Иван', 'Петр', 'ID', 'Класса', 'Петр', 'Сидор'],
+            'Surname': ['Ivanov', None, None, None, None, 'Sidorov'],
+        })
+
+    def excel_upload(self, frame, name='roster.xlsx'):
+        output = io.BytesIO()
+        frame.to_excel(output, index=False)
+        return SimpleUploadedFile(name, output.getvalue())
+
+    def test_report_matches_legacy_upload(self):
+        legacy = process_student_upload(self.excel_upload(self.roster()))
+        legacy_students = {s.student_id: (s.school_class_id, s.last_name_ru) for s in Student.objects.all()}
+        Student.objects.exclude(student_id='S-1').delete()
+
+        report = bulk_process_student_upload(self.excel_upload(self.roster()), chunk_size=2, batch_size=2)
+        self.assertEqual(report, legacy)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['updated'], 2)
+        self.assertEqual(report['skipped'], 1)
+        self.assertEqual(report['errors'], ["Строка 5: Класс '7В' не найден."])
+        self.assertEqual({s.student_id: (s.school_class_id, s.last_name_ru) for s in Student.objects.all()}, legacy_students)
+        self.assertEqual(Student.objects.get(student_id='S-4').last_name_en, 'Sidorov')
+        self.assertEqual(Student.objects.get(student_id='S-2').last_name_en, '')
+
+    def test_csv_classes_resolved_by_school(self):
+        csv_data = (
+            "student_id;класс;фамилия_рус;имя_рус;школа\n"
+            "S-10;5А;Алиев;Али;SCH-B\n"
+            "S-11;5А;Каримов;Карим;Школа А\n"
+            "S-12;5А;Без;Школы;\n"
+            "S-13;5А;Чужая;Школа;SCH-X\n"
+        ).encode('utf-8-sig')
+        report = bulk_process_student_upload(SimpleUploadedFile('roster.csv', csv_data))
+        self.assertEqual((report['created'], report['updated'], report['skipped']), (2, 0, 0))
+        self.assertEqual(report['errors'], [
+            "Строка 4: Класс '5А' есть в нескольких школах, укажите школу.",
+            "Строка 5: Школа 'SCH-X' не найдена.",
+        ])
+        self.assertEqual(Student.objects.get(student_id='S-10').school_class, self.class_a2)
+        self.assertEqual(Student.objects.get(student_id='S-11').school_class, self.class_a1)
+
+        # Школа из формы загрузки
+        report = bulk_process_student_upload(
+            self.excel_upload(pd.DataFrame({'student_id': ['S-12'], 'класс': ['5А'], 'фамилия_рус': ['А'], 'имя_рус': ['Б']})),
+            school=self.school2,
+        )
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(Student.objects.get(student_id='S-12').school_class, self.class_a2)
+
+        report = bulk_process_student_upload(SimpleUploadedFile('bad.csv', "student_id,класс\nS-1,5А\n".encode()))
+        self.assertIn("Отсутствуют обязательные колонки", report['errors'][0])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StudentAccountProvisioningTestCase(TestCase):
+    """
+    Тестирует пакетное создание аккаунтов учеников (core/account_provisioning.py).
+    """
+
+    def setUp(self):
+        self.school = School.objects.create(school_id="SCH-ACC", name="Школа аккаунтов")
+        self.school_class = SchoolClass.objects.create(name="7А", school=self.school)
+        User.objects.create_user(username='ivanivanov', password='x')
+        User.objects.create_user(username='ivanivanov2', password='x')
+        for i, (first, last) in enumerate([('Ivan', 'Ivanov'), ('Ivan', 'Ivanov'), ('', ''), ('Petr', 'Petrov')]):
+            Student.objects.create(
+                student_id=f"ACC-{i}", school_class=self.school_class,
+                last_name_ru=f"Фамилия{i}", first_name_ru="Имя", first_name_en=first, last_name_en=last,
+            )
+
+    def test_usernames_allocated_in_one_query(self):
+        students = list(Student.objects.order_by('student_id'))
+        with self.assertNumQueries(1):
+            usernames = allocate_usernames(students)
+        self.assertEqual(usernames, ['ivanivanov1', 'ivanivanov3', 'acc2', 'petrpetrov'])
+
+    def test_provision_bulk_creates_users_and_profiles(self):
+        students = Student.objects.filter(school_class=self.school_class)
+        # Два SELECT учеников, логины, пользователи, профили (+ SAVEPOINT/RELEASE)
+        with self.assertNumQueries(7):
+            credentials, created, reset = provision_student_accounts(students, 'create')
+        self.assertEqual((created, reset), (4, 0))
+        self.assertEqual(len(credentials), 4)
+        for cred in credentials:
+            user = User.objects.get(username=cred['username'])
+            self.assertTrue(user.check_password(cred['password']))
+            self.assertEqual(user.profile.role, UserProfile.Role.STUDENT)
+            self.assertEqual(user.profile.student.full_name_ru, cred['full_name'])
+
+        # Повторный запуск: новых аккаунтов нет, пароли показываются только при сбросе
+        credentials, created, reset = provision_student_accounts(students, 'create')
+        self.assertEqual((created, reset), (0, 0))
+        self.assertEqual({cred['password'] for cred in credentials}, {'(пароль установлен)'})
+        credentials, created, reset = provision_student_accounts(students, 'reset_and_export')
+        self.assertEqual((created, reset), (0, 4))
+        for cred in credentials:
+            self.assertTrue(User.objects.get(username=cred['username']).check_password(cred['password']))
+
+    def test_hash_passwords_in_process_pool(self):
+        passwords = [f"pass{i}" for i in range(60)]
+        progress = []
+        hashes = hash_passwords(passwords, progress=lambda done, total: progress.append(done), workers=2)
+        self.assertEqual(progress[-1], 60)
+        self.assertTrue(all(check_password(p, h) for p, h in zip(passwords, hashes)))
+
+    def test_command_provisions_whole_school(self):
+        call_command('provision_student_accounts', school='SCH-ACC', no_pdf=True, stdout=io.StringIO())
+        self.assertEqual(UserProfile.objects.filter(student__school_class__school=self.school).count(), 4)
+
+
+class QuestionImportTestCase(TestCase):
+    """
+    Тестирует импорт вопросов из Word и Excel (core/import_service.py).
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        school = School.objects.create(school_id="SCH-IMP", name="Школа")
+        base_class = SchoolClass.objects.create(name="8", school=school)
+        subject = Subject.objects.create(name="Химия", abbreviation="ХИМ")
+        self.topic = QuestionTopic.objects.create(name="Атомы", subject=subject, school_class=base_class)
+        self.user = User.objects.create_user(username='importer', password='x')
+
+    def word_file(self):
+        from docx import Document
+        from PIL import Image
+
+        picture = io.BytesIO()
+        Image.new('RGB', (20, 20), 'red').save(picture, 'PNG')
+        doc = Document()
+        for i in range(3):
+            doc.add_paragraph(f"Вопрос {i}").add_run().add_picture(io.BytesIO(picture.getvalue()))
+            doc.add_paragraph("+ верно")
+            doc.add_paragraph("- неверно")
+        doc.add_paragraph("Вопрос без вариантов")
+        doc.add_paragraph("+ единственный")
+        output = io.BytesIO()
+        doc.save(output)
+        return SimpleUploadedFile('questions.docx', output.getvalue())
+
+    def test_word_dry_run_and_import(self):
+        expected_error = "Ошибка вопроса 'Вопрос без вари...': меньше двух вариантов ответа."
+        count, errors = process_import(self.word_file(), 'word', self.topic, self.user, dry_run=True)
+        self.assertEqual((count, errors), (3, [expected_error]))
+        self.assertFalse(BankQuestion.objects.exists())
+
+        with self.assertNumQueries(4):  # SAVEPOINT, вопросы, варианты, RELEASE
+            count, errors = process_import(self.word_file(), 'word', self.topic, self.user)
+        self.assertEqual((count, errors), (3, [expected_error]))
+
+        questions = list(BankQuestion.objects.order_by('text').prefetch_related('options'))
+        self.assertEqual([q.text for q in questions], ["Вопрос 0", "Вопрос 1", "Вопрос 2"])
+        # Одна и та же картинка сохранена один раз
+        self.assertEqual(len({q.question_image.name for q in questions}), 1)
+        self.assertTrue(questions[0].question_image.storage.exists(questions[0].question_image.name))
+        self.assertEqual([(o.text, o.is_correct, o.order) for o in questions[0].options.all()],
+                         [("верно", True, 0), ("неверно", False, 1)])
+        self.assertEqual(questions[0].subject, self.topic.subject)
+
+    def test_excel_import(self):
+        output = io.BytesIO()
+        pd.DataFrame({
+            'Вопрос': ['2+2?', None, '3+3?'],
+            'Правильный ответ': ['4', '1', '6'],
+            'Неверный 1': ['5', '2', '6'],
+            'Неверный 2': ['x' * 600, None, None],
+        }).to_excel(output, index=False)
+        count, errors = process_import(SimpleUploadedFile('q.xlsx', output.getvalue()), 'excel', self.topic, self.user)
+        self.assertEqual(count, 0)
+        self.assertEqual(errors, [
+            "Ошибка в строке 2: вариант ответа длиннее 500 символов.",
+            "Ошибка в строке 4: меньше двух вариантов ответа.",
+        ])
+
+
+class TestAssemblyTestCase(TestCase):
+    """
+    Тестирует сборку теста: сводку одним запросом, keyset-страницы доступных
+    вопросов с фильтрами и точечные ответы на добавление/удаление.
+    """
+
+    def setUp(self):
+        school = School.objects.create(school_id="SCH-T", name="Школа Т")
+        parallel = SchoolClass.objects.create(name="7", school=school)
+        self.math = Subject.objects.create(name="Математика", abbreviation="MATH")
+        self.phys = Subject.objects.create(name="Физика", abbreviation="PHYS")
+        math_topic = QuestionTopic.objects.create(name="Дроби", subject=self.math, school_class=parallel)
+        phys_topic = QuestionTopic.objects.create(name="Сила", subject=self.phys, school_class=parallel)
+        self.questions = [
+            BankQuestion.objects.create(
+                topic=math_topic if i % 2 else phys_topic, subject=self.math if i % 2 else self.phys,
+                school_class=parallel, text=f"Вопрос {i} про {'дроби' if i % 2 else 'силу'}",
+                difficulty='EASY' if i % 3 else 'HARD',
+            )
+            for i in range(25)
+        ]
+        self.test = GatTest.objects.create(
+            name="GAT-7", test_number=1, test_date=datetime.date.today(), school=school, school_class=parallel,
+        )
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+
+    def test_keyset_pages_cover_bank_without_duplicates(self):
+        self.test.questions.add(self.questions[0])
+        seen, cursor = [], None
+        while True:
+            page, next_cursor = available_questions_page(self.test, {}, after=parse_cursor(cursor), limit=7)
+            seen.extend(q.pk for q in page)
+            if not next_cursor:
+                break
+            cursor = next_cursor
+        self.assertEqual(sorted(seen), sorted(q.pk for q in self.questions[1:]))
+        self.assertEqual(len(seen), len(set(seen)))
+
+        page, _ = available_questions_page(self.test, {'subject': self.math.pk, 'difficulty': 'HARD'})
+        self.assertTrue(page and all(q.subject_id == self.math.pk and q.difficulty == 'HARD' for q in page))
+        page, _ = available_questions_page(self.test, {'q': 'дроби'})
+        self.assertTrue(page and all(q.subject_id == self.math.pk for q in page))
+
+    def test_stats_in_one_aggregate_query(self):
+        self.test.questions.add(*self.questions[:6])
+        with self.assertNumQueries(2):
+            stats = assembly_stats(self.test)
+        self.assertEqual(stats['total'], 6)
+        self.assertEqual(stats['subject_counts'], {"Математика": 3, "Физика": 3})
+        self.assertEqual(stats['difficulty_stats']['hard']['count'], 2)
+        self.assertEqual(stats['difficulty_stats']['easy']['target'], 40)
+
+    def test_add_and_remove_return_only_changed_fragments(self):
+        self.client.force_login(self.admin)
+        question = self.questions[3]
+        response = self.client.post(reverse('core:gat_test_add_question', args=[self.test.pk, question.pk]))
+        self.assertTrue(self.test.questions.filter(pk=question.pk).exists())
+        content = response.content.decode()
+        self.assertIn('id="added-q-%d"' % question.pk, content)
+        self.assertIn('hx-swap-oob', content)
+
+        response = self.client.get(reverse('core:gat_test_available_questions', args=[self.test.pk]))
+        self.assertNotIn('id="available-q-%d"' % question.pk, response.content.decode())
+
+        response = self.client.post(reverse('core:gat_test_remove_question', args=[self.test.pk, question.pk]))
+        self.assertFalse(self.test.questions.exists())
+        self.assertEqual(response['HX-Trigger'], 'assembly-questions-changed')
+
+
+class GatGeneratorTestCase(TestCase):
+    """
+    Тестирует автосборку тестов (core/gat_generator.py): квоты QuestionCount,
+    проценты DifficultyRule, равномерность по темам и исключение недавних вопросов.
+    """
+
+    def setUp(self):
+        self.school = School.objects.create(school_id="SCH-G", name="Школа Г")
+        self.parallel = SchoolClass.objects.create(name="8", school=self.school)
+        self.math = Subject.objects.create(name="Математика", abbreviation="MATH")
+        self.topics = [
+            QuestionTopic.objects.create(name=f"Тема {n}", subject=self.math, school_class=self.parallel) for n in range(3)
+        ]
+        BankQuestion.objects.bulk_create([
+            BankQuestion(
+                topic=topic, subject=self.math, school_class=self.parallel,
+                text=f"{topic.name}: вопрос {difficulty} {n}", difficulty=difficulty,
+            )
+            for topic in self.topics for difficulty in ('EASY', 'MEDIUM', 'HARD') for n in range(6)
+        ])
+        QuestionCount.objects.create(school_class=self.parallel, subject=self.math, number_of_questions=12)
+        DifficultyRule.objects.create(
+            school_class=self.parallel, subject=self.math, easy_percent=50, medium_percent=25, hard_percent=25
+        )
+
+    def test_split_by_percent_sums_exactly(self):
+        self.assertEqual(split_by_percent(10, {'EASY': 40, 'MEDIUM': 40, 'HARD': 20}), {'EASY': 4, 'MEDIUM': 4, 'HARD': 2})
+        self.assertEqual(sum(split_by_percent(7, {'EASY': 33, 'MEDIUM': 33, 'HARD': 34}).values()), 7)
+
+    def test_plan_honors_rules_topics_and_recent_tests(self):
+        recent = GatTest.objects.create(
+            name="GAT-1", test_number=1, test_date=datetime.date.today(), school=self.school, school_class=self.parallel,
+        )
+        recent_ids = set(BankQuestion.objects.filter(difficulty='EASY').values_list('id', flat=True)[:9])
+        recent.questions.add(*recent_ids)
+
+        with self.assertNumQueries(5):
+            plan = plan_tests([self.parallel.pk], seed=1)[self.parallel.pk]
+        self.assertEqual(len(plan.question_ids), 12)
+        self.assertEqual(plan.warnings, [])
+        self.assertFalse(recent_ids & set(plan.question_ids))
+
+        chosen = BankQuestion.objects.filter(id__in=plan.question_ids)
+        by_difficulty = {d: chosen.filter(difficulty=d).count() for d in ('EASY', 'MEDIUM', 'HARD')}
+        self.assertEqual(by_difficulty, {'EASY': 6, 'MEDIUM': 3, 'HARD': 3})
+        self.assertEqual(sorted(chosen.filter(topic=t).count() for t in self.topics), [4, 4, 4])
+
+    def test_bulk_create_for_all_parallels(self):
+        other = SchoolClass.objects.create(name="9", school=self.school)
+        created = create_generated_tests(
+            [self.parallel, other], "GAT-2 {parallel} кл.", 2, datetime.date.today(), seed=1,
+        )
+        tests = {test.school_class_id: test for test, _ in created}
+        self.assertEqual(tests[self.parallel.pk].questions.count(), 12)
+        self.assertEqual(tests[self.parallel.pk].question_order, created[0][1].question_ids)
+        self.assertFalse(tests[other.pk].questions.exists())
+        self.assertTrue(dict(created)[tests[other.pk]].warnings)
+
+
+class ImageDerivativesTestCase(TestCase):
+    """
+    Тестирует уменьшенные копии картинок вопросов (core/image_derivatives.py).
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        school = School.objects.create(school_id="SCH-IMG", name="Школа")
+        base_class = SchoolClass.objects.create(name="10", school=school)
+        subject = Subject.objects.create(name="Геометрия", abbreviation="ГЕО")
+        self.topic = QuestionTopic.objects.create(name="Фигуры", subject=subject, school_class=base_class)
+
+    def photo(self, size=(3000, 2000)):
+        from PIL import Image
+
+        picture = io.BytesIO()
+        Image.new('RGB', size, 'blue').save(picture, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', picture.getvalue(), content_type='image/jpeg')
+
+    def test_upload_schedules_job_and_job_builds_bounded_copies(self):
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question = BankQuestion.objects.create(topic=self.topic, text="Площадь?", image_width="50%", question_image=self.photo())
+        job = BackgroundJob.objects.get(kind='image_derivatives')
+        self.assertEqual(job.params['question_ids'], [question.pk])
+        # Пока копий нет, страница показывает оригинал
+        self.assertEqual(derivative_url(question.question_image, 'web'), question.question_image.url)
+
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.Status.DONE, job.error)
+        self.assertFalse(has_missing_derivatives(question))
+
+        storage = question.question_image.storage
+        web_name = derivative_name(question.question_image, 'web')
+        self.assertEqual(derivative_url(question.question_image, 'web'), storage.url(web_name))
+        with storage.open(web_name) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (1280, 853)))
+        # Печатная копия: 300 dpi на половину колонки буклета
+        with Image.open(print_image_path(question.question_image, question.image_width)) as image:
+            self.assertEqual((image.format, image.width), ('JPEG', 508))
+
+        # Новая ширина — нужна новая печатная копия
+        question.image_width = "100%"
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertTrue(has_missing_derivatives(question))
+        self.assertEqual(BackgroundJob.objects.filter(kind='image_derivatives').count(), 2)
+
+    def test_backfill_command_skips_existing_copies(self):
+        from PIL import Image
+
+        question = BankQuestion.objects.create(topic=self.topic, text="Угол?", question_image=self.photo((200, 100)))
+        BankAnswerOption.objects.create(question=question, text="90", is_correct=True, option_image=self.photo((100, 100)))
+
+        out = io.StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn("Построено копий: 6", out.getvalue())
+        # Маленькие картинки не увеличиваются
+        with question.question_image.storage.open(derivative_name(question.question_image, 'web')) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (200, 100))
+
+        out = io.StringIO()
+        call_command('build_image_derivatives', question_ids=[question.pk], stdout=out)
+        self.assertIn("Построено копий: 0", out.getvalue())
+
+
+class ArchiveSummaryTestCase(TestCase):
+    """
+    Тестирует сводку архива результатов (core/archive_summary.py).
+    """
+
+    def setUp(self):
+        generate_network(
+            schools=1, parallels=(5,), sections='А', students_per_section=4,
+            years=1, subjects=2, questions_per_subject=3, seed=13,
+        )
+        self.admin, _ = ensure_bench_users()
+
+    def summary(self):
+        # Порядок — в SQL: у годовых строк quarter_id = None, sorted() их не сравнит
+        return list(ArchiveSummary.objects.order_by('year_id', 'quarter_id', 'school_id', 'school_class_id').values_list(
+            'year_id', 'quarter_id', 'school_id', 'school_class_id', 'test_count', 'student_count', 'result_count'
+        ))
+
+    def assert_matches_rebuild(self):
+        incremental = self.summary()
+        rebuild_archive_summary()
+        self.assertEqual(self.summary(), incremental)
+
+    def test_summary_follows_results_and_tests(self):
+        # 4 четверти по тесту + итог года; ученики за год без повторов
+        self.assertEqual(ArchiveSummary.objects.count(), 5)
+        year_row = ArchiveSummary.objects.get(quarter__isnull=True)
+        self.assertEqual((year_row.test_count, year_row.student_count, year_row.result_count), (4, 4, 16))
+        self.assert_matches_rebuild()
+
+        # Тест перенесен в другую четверть
+        gat_test = GatTest.objects.order_by('test_date').first()
+        gat_test.quarter = Quarter.objects.filter(year=gat_test.quarter.year).exclude(pk=gat_test.quarter_id).last()
+        gat_test.save()
+        self.assertEqual(ArchiveSummary.objects.count(), 4)
+        self.assert_matches_rebuild()
+
+        gat_test.delete()
+        self.assertEqual(ArchiveSummary.objects.get(quarter__isnull=True).result_count, 12)
+        self.assert_matches_rebuild()
+
+    def test_summary_follows_student_deletion(self):
+        # Результаты удаляются каскадом вместе с учеником
+        self.client.force_login(self.admin)
+        student = Student.objects.order_by('pk').first()
+        self.client.post(reverse('core:student_delete', args=[student.pk]))
+        year_row = ArchiveSummary.objects.get(quarter__isnull=True)
+        self.assertEqual((year_row.test_count, year_row.student_count, year_row.result_count), (4, 3, 12))
+        self.assert_matches_rebuild()
+
+        self.client.post(reverse('core:data_cleanup'), {'clear_results_all': '1'})
+        self.assertFalse(StudentResult.objects.exists())
+        self.assertFalse(ArchiveSummary.objects.exists())
+
+    def test_archive_views_read_summary(self):
+        self.client.force_login(self.admin)
+        years = self.client.get(reverse('core:results_archive')).context['years']
+        self.assertEqual([(y.test_count, y.student_count) for y in years], [(4, 4)])
+
+        quarter_id = ArchiveSummary.objects.filter(quarter__isnull=False).values_list('quarter_id', flat=True).first()
+        school = School.objects.get()
+        schools = self.client.get(reverse('core:archive_schools', args=[quarter_id])).context['schools']
+        self.assertEqual([(s.class_count, s.student_count) for s in schools], [(1, 4)])
+
+        response = self.client.get(reverse('core:archive_classes', args=[quarter_id, school.pk]))
+        self.assertEqual([c.name for c in response.context['parent_classes']], ['5'])
+
+
+class KeysetPaginationTestCase(TestCase):
+    """
+    Тестирует keyset-пагинацию списков (core/pagination.py).
+    """
+
+    def setUp(self):
+        school = School.objects.create(school_id="SCH-K", name="Школа К")
+        self.school_class = SchoolClass.objects.create(name="7А", school=school)
+        # Одинаковые фамилии и пустые last_login: порядок решают следующие поля и pk
+        for i in range(7):
+            student = Student.objects.create(
+                student_id=f"K-{i}", school_class=self.school_class,
+                last_name_ru="Каримов" if i % 2 else "Алиев", first_name_ru=f"Имя {i % 3}",
+            )
+            if i % 3 == 0:
+                user = User.objects.create_user(username=f'k{i}', password='pass12345')
+                user.last_login = datetime.datetime(2026, 9, 1, 8, 0, 0, 123456 + i, tzinfo=datetime.timezone.utc)
+                user.save()
+                user.profile.student = student
+                user.profile.role = UserProfile.Role.STUDENT
+                user.profile.save()
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+
+    def walk(self, queryset, page_size):
+        rows, cursor, starts = [], None, []
+        while True:
+            page = keyset_paginate(queryset, cursor, page_size)
+            starts.append(page.start_index)
+            rows += page.object_list
+            if not page.has_next:
+                return rows, starts
+            cursor = page.next_cursor
+
+    def test_pages_follow_ordering_with_nulls(self):
+        orderings = [
+            ('last_name_ru', 'first_name_ru'),
+            ('-last_name_ru', 'first_name_ru', '-pk'),
+            ('-user_profile__user__last_login', 'last_name_ru'),
+            ('user_profile__user__last_login',),
+        ]
+        for ordering in orderings:
+            expected = list(Student.objects.order_by(*ordering, 'pk'))
+            rows, starts = self.walk(Student.objects.order_by(*ordering), 2)
+            self.assertEqual(rows, expected, ordering)
+            self.assertEqual(starts, [0, 2, 4, 6])
+
+        # Курсор повторяет последнюю строку страницы; испорченный курсор — первая страница
+        page = keyset_paginate(Student.objects.all(), None, 3)
+        self.assertEqual(decode_cursor(page.next_cursor)[1], 3)
+        self.assertEqual(keyset_paginate(Student.objects.all(), 'испорчен', 3).object_list, page.object_list)
+        self.assertEqual(estimate_count(Student.objects.all()).value, 7)
+
+    def test_student_list_loads_next_page_fragment(self):
+        self.client.force_login(self.admin)
+        url = reverse('core:student_list', args=[self.school_class.pk])
+        with mock.patch('core.views.students_views.STUDENT_PAGE_SIZE', 5):
+            response = self.client.get(url)
+            self.assertEqual(len(response.context['students']), 5)
+            self.assertEqual(response.context['total_count'].value, 7)
+            cursor = response.context['keyset_page'].next_cursor
+
+            response = self.client.get(url, {'after': cursor}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'students/partials/_student_rows.html')
+        self.assertEqual(len(response.context['students']), 2)
+        self.assertFalse(response.context['keyset_page'].has_next)
+
+
+class ReportDatasetTestCase(TestCase):
+    """
+    Тестирует закэшированные данные отчетов по тесту (core/report_datasets.py).
+    """
+
+    def setUp(self):
+        cache.clear()
+        generate_network(
+            schools=1, parallels=(6,), sections='АБ', students_per_section=3,
+            years=1, subjects=2, questions_per_subject=3, seed=17,
+        )
+        self.admin, _ = ensure_bench_users()
+        self.test1, self.test2 = GatTest.objects.order_by('test_date')[:2]
+
+    def test_dataset_is_cached_until_test_changes(self):
+        with mock.patch('core.report_datasets.build_report_dataset', wraps=build_report_dataset) as build:
+            students_data, table_header = report_data_for_test(self.test1)
+            report_data_for_test(self.test1)
+            self.assertEqual(build.call_count, 1)
+
+            refresh_results_derived_data(self.test1)
+            report_data_for_test(self.test1)
+            self.assertEqual(build.call_count, 2)
+
+            QuestionCount.objects.filter(school_class=self.test1.school_class).update(number_of_questions=2)
+            QuestionCount.objects.filter(school_class=self.test1.school_class).first().save()
+            _, short_header = report_data_for_test(self.test1)
+            self.assertEqual(build.call_count, 3)
+        self.assertEqual([h['questions_count'] for h in short_header], [2, 2])
+
+        # Те же баллы, ответы и порядок, что и в «сырых» результатах
+        self.assertEqual([h['questions_count'] for h in table_header], [3, 3])
+        results = {r.pk: r for r in StudentResult.objects.filter(gat_test=self.test1)}
+        self.assertEqual(len(students_data), len(results))
+        self.assertEqual([d['position'] for d in students_data], list(range(1, len(results) + 1)))
+        self.assertEqual(
+            [d['total_score'] for d in students_data],
+            sorted((r.total_score for r in results.values()), reverse=True),
+        )
+        for data in students_data:
+            result = results[data['result'].pk]
+            self.assertEqual(data['student'].pk, result.student_id)
+            self.assertEqual(data['result'].scores_by_subject, result.scores_by_subject)
+            for subject_id_str, answers in result.scores_by_subject.items():
+                score = data['subject_scores'][int(subject_id_str)]['score']
+                self.assertEqual(score, sum(1 for v in answers.values() if v is True))
+
+    def test_dataset_follows_results_cleanup(self):
+        self.client.force_login(self.admin)
+        section = SchoolClass.objects.filter(parent=self.test1.school_class).order_by('name').first()
+        self.assertEqual(len(report_data_for_test(self.test1)[0]), 6)
+
+        # Очистка результатов класса идет мимо загрузчика
+        self.client.post(reverse('core:data_cleanup'), {'clear_results_class': '1', 'class_id': section.pk})
+        students_data, _ = report_data_for_test(self.test1)
+        results = set(StudentResult.objects.filter(gat_test=self.test1).values_list('pk', flat=True))
+        self.assertEqual(len(results), 3)
+        self.assertEqual({data['result'].pk for data in students_data}, results)
+        self.assertEqual([data['position'] for data in students_data], [1, 2, 3])
+
+    def test_comparison_views_use_dataset(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('core:compare_class_tests', args=[self.test1.pk, self.test2.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['results']), 6)
+
+        section = SchoolClass.objects.filter(parent=self.test1.school_class).order_by('name').first()
+        response = self.client.get(reverse('core:class_results_dashboard', args=[self.test1.quarter_id, section.pk]))
+        self.assertEqual(len(response.context['students_data_gat1']), 3)
+
+        response = self.client.get(reverse('core:combined_class_report', args=[self.test1.quarter_id, self.test1.school_class_id]))
+        self.assertEqual(len(response.context['students_data_gat1']), 6)
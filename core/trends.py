@@ -0,0 +1,102 @@
+# D:\GAT\core\trends.py
+
+"""
+Динамика успеваемости по четвертям: верные / всего ответов по (четверть, предмет).
+
+Суммы считаются в БД одним запросом, сколько бы ни было результатов:
+- по выборке классов/школ — из агрегатов SubjectResultRollup (углубленный анализ, дашборд);
+- по выборке результатов (прогресс ученика) — разворотом scores_by_subject
+  функциями jsonb_each прямо в PostgreSQL.
+Обе функции возвращают данные для линейного графика Chart.js:
+{'labels': [четверти по дате начала], 'datasets': [{'label': предмет, 'data': [% или None]}]}
+или None, если четвертей меньше двух.
+"""
+
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Sum
+
+from .models import AcademicYear, GatTest, Quarter, StudentResult, Subject
+
+
+def _chart(rows, subject_id_to_name_map=None):
+    """
+    rows: (начало четверти, id четверти, четверть, учебный год, id предмета, предмет, верных, всего).
+    subject_id_to_name_map ограничивает предметы и задает их названия.
+    """
+    quarters = {}
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for start_date, quarter_id, quarter_name, year_name, subject_id, subject_name, correct, total in rows:
+        if subject_id_to_name_map is not None:
+            subject_name = subject_id_to_name_map.get(subject_id)
+        if not subject_name:
+            continue
+        quarters[quarter_id] = (start_date, quarter_name, year_name)
+        cell = totals[subject_name][quarter_id]
+        cell[0] += correct or 0
+        cell[1] += total or 0
+    if len(quarters) < 2:
+        return None
+
+    ordered = sorted(quarters, key=lambda qid: (quarters[qid][0], qid))
+    names = [quarters[qid][1] for qid in ordered]
+    # Одноименные четверти разных учебных лет различаем по году
+    labels = [
+        f"{name} ({quarters[qid][2]})" if names.count(name) > 1 else name
+        for qid, name in zip(ordered, names)
+    ]
+    datasets = []
+    for subject_name, by_quarter in totals.items():
+        data = []
+        for qid in ordered:
+            correct, total = by_quarter.get(qid, (0, 0))
+            data.append(round(correct / total * 100, 1) if total > 0 else None)
+        datasets.append({'label': subject_name, 'data': data, 'tension': 0.4, 'fill': True})
+    return {'labels': labels, 'datasets': datasets}
+
+
+def rollup_trend_chart(subject_rollups_qs, subject_id_to_name_map=None):
+    """График динамики по отфильтрованным SubjectResultRollup (один GROUP BY)."""
+    rows = (
+        subject_rollups_qs.filter(gat_test__quarter__isnull=False).order_by()
+        .values_list(
+            'gat_test__quarter__start_date', 'gat_test__quarter', 'gat_test__quarter__name',
+            'gat_test__quarter__year__name', 'subject_id', 'subject__name',
+        )
+        .annotate(correct_sum=Sum('correct'), answered_sum=Sum('answered'))
+    )
+    return _chart(rows, subject_id_to_name_map)
+
+
+def result_trend_rows(results_qs):
+    """
+    Суммы по (четверть, предмет) для выборки StudentResult: JSON ответов
+    разворачивается в БД, ключи-не-числа и не-объекты пропускаются.
+    """
+    ids_sql, params = results_qs.order_by().values('pk').query.sql_with_params()
+    sql = f"""
+        SELECT q.start_date, q.id, q.name, y.name, sub.id, sub.name,
+               SUM(CASE WHEN a.value = 'true'::jsonb THEN 1 ELSE 0 END), COUNT(*)
+        FROM {StudentResult._meta.db_table} r
+        JOIN {GatTest._meta.db_table} t ON t.id = r.gat_test_id
+        JOIN {Quarter._meta.db_table} q ON q.id = t.quarter_id
+        JOIN {AcademicYear._meta.db_table} y ON y.id = q.year_id
+        CROSS JOIN LATERAL jsonb_each(
+            CASE WHEN jsonb_typeof(r.scores_by_subject) = 'object' THEN r.scores_by_subject ELSE '{{}}'::jsonb END
+        ) AS s
+        CROSS JOIN LATERAL jsonb_each(
+            CASE WHEN jsonb_typeof(s.value) = 'object' THEN s.value ELSE '{{}}'::jsonb END
+        ) AS a
+        JOIN {Subject._meta.db_table} sub ON sub.id::text = s.key
+        WHERE r.id IN ({ids_sql})
+        GROUP BY q.start_date, q.id, q.name, y.name, sub.id, sub.name
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def result_trend_chart(results_qs, subject_id_to_name_map=None):
+    """График динамики по выборке StudentResult (например, результатам одного ученика)."""
+    return _chart(result_trend_rows(results_qs), subject_id_to_name_map)
@@ -12,7 +12,9 @@ from core.views import (
     dashboard,
     deep_analysis,
     grading,
+    jobs,
     monitoring,
+    performance,
     permissions,
     statistics,
     student_dashboard,
@@ -68,6 +70,8 @@ urlpatterns = [
     # =============================================================================
     path('dashboard/management/', crud_management.management_dashboard_view, name='management'),
     path('management/data-cleanup/', students_views.data_cleanup_view, name='data_cleanup'),
+    path('dashboard/management/performance/', performance.performance_view, name='performance'),
+    path('dashboard/management/performance/reset/', performance.performance_reset_view, name='performance_reset'),
 
     # Учебные годы
     path('dashboard/years/', crud_management.AcademicYearListView.as_view(), name='year_list'),
@@ -138,6 +142,8 @@ urlpatterns = [
     path('dashboard/gat-tests/<int:pk>/delete-results/', crud_tests.gat_test_delete_results_view, name='gat_test_delete_results'),
     
     # Управление вопросами в тесте
+    path('dashboard/gat-tests/<int:test_pk>/available-questions/', crud_tests.assembly_available_questions, name='gat_test_available_questions'),
+    path('dashboard/gat-tests/<int:test_pk>/auto-assemble/', crud_tests.auto_assemble_test, name='gat_test_auto_assemble'),
     path('dashboard/gat-tests/<int:test_pk>/add-question/<int:question_pk>/', crud_tests.add_question_to_test, name='gat_test_add_question'),
     path('dashboard/gat-tests/<int:test_pk>/remove-question/<int:question_pk>/', crud_tests.remove_question_from_test, name='gat_test_remove_question'),
     
@@ -196,6 +202,11 @@ urlpatterns = [
     path('dashboard/grading/export/excel/', grading.export_grading_excel, name='export_grading_excel'),
     path('dashboard/grading/export/pdf/', grading.export_grading_pdf, name='export_grading_pdf'),
 
+    # Фоновые задачи (PDF и тяжелые экспорты)
+    path('dashboard/jobs/<int:pk>/', jobs.job_detail_view, name='job_detail'),
+    path('dashboard/jobs/<int:pk>/status/', jobs.job_status_view, name='job_status'),
+    path('dashboard/jobs/<int:pk>/download/', jobs.job_download_view, name='job_download'),
+
     # =============================================================================
     # --- ОБЩИЙ API (ДЛЯ HTMX И JAVASCRIPT) ---
     # =============================================================================
@@ -63,6 +63,19 @@ from .grading import (
     export_grading_excel,
 )
 
+# --- Импорты из jobs.py ---
+from .jobs import (
+    job_detail_view,
+    job_status_view,
+    job_download_view,
+)
+
+# --- Импорты из performance.py ---
+from .performance import (
+    performance_view,
+    performance_reset_view,
+)
+
 # --- Импорты из monitoring.py ---
 from .monitoring import (
     monitoring_view,
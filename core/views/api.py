@@ -2,7 +2,6 @@
 
 import json
 import pytz
-from django.db.models import Q
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
@@ -11,7 +10,7 @@ from collections import defaultdict
 from accounts.forms import UserProfileForm
 # --- Импорты моделей ---
 from ..models import (
-    Notification, School, SchoolClass, Subject, Quarter, GatTest, Student,
+    Notification, School, SchoolClass, Subject, Quarter, GatTest,
     QuestionTopic, BankQuestion # Убедимся, что все импорты здесь
 )
 from accounts.models import UserProfile
@@ -20,6 +19,7 @@ from ..forms import GatTestForm, QuestionCountForm
 
 # --- Импорты из permissions ---
 from .permissions import get_accessible_schools
+from ..search import search_students, search_gat_tests
 
 # =============================================================================
 # --- API ДЛЯ ЗАГРУЗКИ ДАННЫХ В ФИЛЬТРЫ И ФОРМЫ (HTMX И JAVASCRIPT) ---
@@ -268,24 +268,15 @@ def header_search_api(request):
     user = request.user
 
     if query:
-        accessible_schools = get_accessible_schools(user)
-        students_qs = Student.objects.filter(school_class__school__in=accessible_schools)
-        students = students_qs.filter(
-            Q(first_name_ru__icontains=query) | Q(last_name_ru__icontains=query) |
-            Q(student_id__icontains=query)
-        ).select_related('school_class').distinct()[:5]
-
-        for s in students:
+        # Ранжированный поиск по индексам, права — в том же запросе (core/search.py)
+        for s in search_students(user, query)[:5]:
             results.append({
                 'type': 'Студент',
                 'name': f"{s.first_name_ru} {s.last_name_ru} ({s.school_class.name})",
                 'url': reverse('core:student_progress', args=[s.id])
             })
 
-        tests_qs = GatTest.objects.filter(school__in=accessible_schools)
-        tests = tests_qs.filter(name__icontains=query).select_related('school')[:5]
-
-        for t in tests:
+        for t in search_gat_tests(user, query)[:5]:
             results.append({
                 'type': 'Тест',
                 'name': f"{t.name} ({t.school.name})",
@@ -9,6 +9,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.template.loader import render_to_string
 from .permissions import get_accessible_schools
+from ..pagination import estimate_count, keyset_paginate
 
 # =============================================================================
 # --- БАЗОВЫЕ КЛАССЫ С ЛОГИКОЙ HTMX ---
@@ -16,6 +17,11 @@ from .permissions import get_accessible_schools
 
 class HtmxListView(LoginRequiredMixin, ListView):
     template_name_prefix = None
+    # Keyset-пагинация (core/pagination.py): размер страницы или None — весь список.
+    # Списку нужен шаблон {prefix}/_rows.html — строки + components/load_more.html
+    keyset_page_size = None
+    # True — следующая страница грузится при прокрутке, False — кнопкой «Показать еще»
+    keyset_infinite_scroll = True
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -36,11 +42,21 @@ class HtmxListView(LoginRequiredMixin, ListView):
             # Обновляем всю страницу, если пришел сигнал 'force-refresh'
             if self.request.headers.get('HX-Trigger') == 'force-refresh':
                 return [f'{self.template_name_prefix}/list.html']
+            # Следующая страница keyset-списка — только строки
+            if self.keyset_page_size and self.request.GET.get('after'):
+                return [f'{self.template_name_prefix}/_rows.html']
             # В остальных случаях (фильтрация, пагинация) обновляем только таблицу
             return [f'{self.template_name_prefix}/_table.html']
         return [f'{self.template_name_prefix}/list.html']
 
     def get_context_data(self, **kwargs):
+        if self.keyset_page_size:
+            page = keyset_paginate(self.object_list, self.request.GET.get('after'), self.keyset_page_size)
+            kwargs.setdefault('object_list', page.object_list)
+            kwargs['keyset_page'] = page
+            kwargs['keyset_infinite'] = self.keyset_infinite_scroll
+            if page.is_first:
+                kwargs['total_count'] = estimate_count(self.object_list)
         context = super().get_context_data(**kwargs)
         if 'object_list' in context:
             context['items'] = context.pop('object_list')
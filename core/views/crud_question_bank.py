@@ -32,10 +32,14 @@ from core.forms import (
     BankAnswerOptionForm
 )
 from core.views.permissions import get_accessible_schools, get_accessible_subjects
+from core.search import search_questions
 from .crud_base import (
     HtmxListView, HtmxCreateView, HtmxUpdateView, HtmxDeleteView, HtmxFormView
 )
 
+# Сколько найденных вопросов показывать в библиотеке
+LIBRARY_SEARCH_LIMIT = 50
+
 # =============================================================================
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 # =============================================================================
@@ -472,7 +476,7 @@ class BankQuestionListView(HtmxListView):
     model = BankQuestion
     template_name_prefix = 'bank_questions'
     context_object_name = 'items'
-    paginate_by = 20
+    keyset_page_size = 30
     extra_context = {
         'title': 'Банк Вопросов',
         'add_url': 'core:bank_question_add',
@@ -492,9 +496,11 @@ class BankQuestionListView(HtmxListView):
         if topic_id:
             qs = qs.filter(topic_id=topic_id)
 
-        return qs.select_related(
-            'subject', 'school_class', 'topic', 'author'
-        ).order_by('topic__subject__name', 'topic__name', '-created_at')
+        qs = qs.select_related('subject', 'school_class', 'topic', 'author', 'statistic')
+        # Поиск по тексту и тегам: полнотекстовый индекс, сортировка по релевантности
+        if search_query := self.request.GET.get('q', '').strip():
+            return search_questions(user, search_query, qs)
+        return qs.order_by('topic__subject__name', 'topic__name', '-created_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1114,6 +1120,15 @@ class QuestionLibraryView(HtmxListView):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Библиотека вопросов'
         context['subjects'] = get_accessible_subjects(self.request.user)
+
+        # Поиск вопросов по всей библиотеке (с учетом фильтра по предмету)
+        search_query = self.request.GET.get('q', '').strip()
+        context['search_query'] = search_query
+        if search_query:
+            found = BankQuestion.objects.select_related('subject', 'school_class', 'topic')
+            if subject_id := self.request.GET.get('subject'):
+                found = found.filter(subject_id=subject_id)
+            context['found_questions'] = search_questions(self.request.user, search_query, found)[:LIBRARY_SEARCH_LIMIT]
         return context
 
 # 2. НОВЫЙ VIEW: ИМПОРТ (MODAL)
@@ -1139,11 +1154,18 @@ class BankQuestionImportView(HtmxFormView):
         
         file = form.cleaned_data['file']
         file_type = form.cleaned_data['file_type']
+        dry_run = form.cleaned_data['dry_run']
         
         # Запускаем сервис импорта
-        count, errors = process_import(file, file_type, topic, self.request.user)
+        count, errors = process_import(file, file_type, topic, self.request.user, dry_run=dry_run)
         
-        if count > 0:
+        if dry_run:
+            msg = f"Проверка: {count} вопросов готовы к загрузке."
+            msg_type = "success"
+            if errors:
+                msg += f" Ошибок: {len(errors)}. Первая: {errors[0]}"
+                msg_type = "warning"
+        elif count > 0:
             msg = f"Успешно загружено {count} вопросов!"
             msg_type = "success"
             if errors:
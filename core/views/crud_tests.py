@@ -2,17 +2,16 @@
 
 import json
 from collections import defaultdict
+from urllib.parse import urlencode
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-import random
 from django.contrib.auth.decorators import login_required
 from django.db.models import Prefetch
 from django.urls import reverse_lazy
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_POST
 from django.db.models import Count, Q
-from core.models import DifficultyRule
 
 # АБСОЛЮТНЫЕ ИМПОРТЫ
 from core.models import (
@@ -22,6 +21,11 @@ from core.forms import (
     GatTestForm, TeacherNoteForm
 )
 from core.views.permissions import get_accessible_schools
+from core.services import refresh_results_derived_data
+from core.gat_generator import fill_test
+from core.question_assembly import (
+    assembly_stats, available_questions_page, clean_filters, filter_choices, parse_cursor
+)
 # --- 👇 Убедись, что импорты из crud_base правильные 👇 ---
 from .crud_base import HtmxCreateView, HtmxUpdateView, HtmxDeleteView
 # --- КОНЕЦ ---
@@ -157,21 +161,7 @@ class GatTestUpdateView(HtmxUpdateView):
         context = super().get_context_data(**kwargs)
         context['title'] = f'Сборка теста: {self.object.name}'
 
-        test_object = self.object
-        test_parallel = test_object.school_class
-
-        added_question_ids = set(test_object.questions.values_list('id', flat=True))
-        context['added_question_ids'] = added_question_ids
-        context['added_questions'] = test_object.questions.select_related('subject', 'topic').order_by('subject__name', 'id')
-
-        available_questions = BankQuestion.objects.filter(
-            school_class=test_parallel
-        ).select_related(
-            'subject', 'topic'
-        ).order_by('subject__name', 'topic__name', 'id')
-
-        context['available_questions'] = available_questions
-        context['test_id'] = test_object.id
+        context.update(_assembly_panel_context(self.object, self.request.GET))
         return context
 
     def form_valid(self, form):
@@ -250,6 +240,7 @@ def gat_test_delete_results_view(request, pk):
 
     if request.method == 'POST':
         results.delete()
+        refresh_results_derived_data(gat_test)
         messages.success(request, f'Все {count} результатов для теста "{gat_test.name}" были успешно удалены.')
         return redirect('core:gat_test_list')
 
@@ -297,155 +288,97 @@ class TeacherNoteDeleteView(HtmxDeleteView):
 # --- ✨ НОВЫЙ БЛОК: СБОРКА ТЕСТА (HTMX) ✨ ---
 # =============================================================================
 
-def _get_assembly_context(test_pk):
-    test_object = get_object_or_404(GatTest.objects.prefetch_related(
-        'questions__subject', 'questions__topic'
-    ), pk=test_pk)
-    
-    test_parallel = test_object.school_class
-    
-    # 1. Получаем уже добавленные вопросы
-    added_questions = test_object.questions.select_related('subject', 'topic').order_by('subject__name', 'id')
-    added_question_ids = set(added_questions.values_list('id', flat=True))
-
-    # 2. --- ✨ НОВАЯ ЛОГИКА: СЧИТАЕМ СТАТИСТИКУ СЛОЖНОСТИ ✨ ---
-    total_count = added_questions.count()
-    stats = {
-        'easy': {'count': 0, 'percent': 0, 'target': 0},
-        'medium': {'count': 0, 'percent': 0, 'target': 0},
-        'hard': {'count': 0, 'percent': 0, 'target': 0},
-    }
-
-    if total_count > 0:
-        # Считаем факты
-        stats['easy']['count'] = added_questions.filter(difficulty='EASY').count()
-        stats['medium']['count'] = added_questions.filter(difficulty='MEDIUM').count()
-        stats['hard']['count'] = added_questions.filter(difficulty='HARD').count()
-
-        # Считаем проценты
-        stats['easy']['percent'] = round((stats['easy']['count'] / total_count) * 100)
-        stats['medium']['percent'] = round((stats['medium']['count'] / total_count) * 100)
-        stats['hard']['percent'] = round((stats['hard']['count'] / total_count) * 100)
-
-    # 3. --- Получаем целевые показатели (Rules) ---
-    # В GAT тесте много предметов, поэтому берем "усредненное правило" или правило для первого предмета.
-    # Для упрощения: покажем жесткий стандарт 40/40/20, если правил нет.
-    
-    # Пытаемся найти правила для предметов, которые есть в тесте
-    subjects_in_test = test_object.questions.values_list('subject', flat=True).distinct()
-    rules = DifficultyRule.objects.filter(
-        school_class=test_parallel, 
-        subject__in=subjects_in_test
-    )
-    
-    # Если правило найдено (берем первое попавшееся для примера, 
-    # в идеале нужно считать взвешенное среднее, но это сложно для начала)
-    if rules.exists():
-        rule = rules.first()
-        stats['easy']['target'] = rule.easy_percent
-        stats['medium']['target'] = rule.medium_percent
-        stats['hard']['target'] = rule.hard_percent
-    else:
-        # Дефолт, если правил нет
-        stats['easy']['target'] = 40
-        stats['medium']['target'] = 40
-        stats['hard']['target'] = 20
-
-    # 4. Остальная логика (доступные вопросы)
-    available_questions = BankQuestion.objects.filter(
-        school_class=test_parallel
-    ).select_related(
-        'subject', 'topic'
-    ).order_by('subject__name', 'topic__name', 'id')
-
-    subject_counts = defaultdict(int)
-    for q in added_questions:
-        subject_counts[q.subject.name] += 1
-
-    return {
+def _assembly_panel_context(test_object, params):
+    """Контекст правой колонки: выбранные вопросы, сводка и первая страница доступных."""
+    filters = clean_filters(params)
+    page, next_cursor = available_questions_page(test_object, filters)
+    context = {
         'object': test_object,
         'test_id': test_object.id,
-        'added_questions': added_questions,
-        'added_question_ids': added_question_ids,
-        'available_questions': available_questions,
-        'subject_counts': dict(subject_counts),
-        'difficulty_stats': stats, # ✨ Передаем статистику в шаблон
+        'added_questions': test_object.questions.select_related('subject', 'topic', 'statistic').order_by('subject__name', 'id'),
+        'available_questions': page,
+        'next_cursor': next_cursor,
+        'filters': filters,
+        'filter_query': urlencode(filters),
+    }
+    context.update(assembly_stats(test_object))
+    context.update(filter_choices(test_object))
+    return context
+
+
+@login_required
+def assembly_available_questions(request, test_pk):
+    """
+    HTMX View: страница доступных вопросов (фильтры и ?after=<курсор>).
+    Первая страница заменяет список, следующие подгружаются при прокрутке.
+    """
+    test = get_object_or_404(GatTest, pk=test_pk)
+    filters = clean_filters(request.GET)
+    page, next_cursor = available_questions_page(test, filters, after=parse_cursor(request.GET.get('after')))
+    context = {
+        'test_id': test.id,
+        'available_questions': page,
+        'next_cursor': next_cursor,
+        'filter_query': urlencode(filters),
+        'is_first_page': not request.GET.get('after'),
     }
+    return render(request, 'gat_tests/partials/_assembly_available_rows.html', context)
+
+
+def _assembly_change_response(request, test, context):
+    """Ответ на добавление/удаление: основной фрагмент + счетчики (hx-swap-oob)."""
+    context.update(assembly_stats(test))
+    context['test_id'] = test.id
+    return render(request, 'gat_tests/partials/_assembly_change.html', context)
+
 
 @login_required
 @require_POST # Принимаем только POST-запросы
 def add_question_to_test(request, test_pk, question_pk):
     """
     HTMX View: Добавляет вопрос (BankQuestion) в тест (GatTest).
+    Строка уходит из доступных, в выбранные дописывается одна строка,
+    сводка сложности и счетчики обновляются out-of-band.
     """
     test = get_object_or_404(GatTest, pk=test_pk)
-    question = get_object_or_404(BankQuestion, pk=question_pk)
-    
+    question = get_object_or_404(BankQuestion.objects.select_related('subject', 'topic', 'statistic'), pk=question_pk)
+
     # Добавляем вопрос в M2M-связь
     test.questions.add(question)
-    
-    # Получаем обновленный контекст
-    context = _get_assembly_context(test_pk)
-    
-    # Рендерим и возвращаем только правую колонку
-    return render(request, 'gat_tests/partials/_assembly_panel.html', context)
+
+    return _assembly_change_response(request, test, {'added_question': question})
 
 @login_required
 @require_POST # Принимаем только POST-запросы
 def remove_question_from_test(request, test_pk, question_pk):
     """
     HTMX View: Удаляет вопрос (BankQuestion) из теста (GatTest).
+    Строка уходит из выбранных, сводка обновляется out-of-band, а список
+    доступных перечитывает первую страницу (событие assembly-questions-changed).
     """
     test = get_object_or_404(GatTest, pk=test_pk)
     question = get_object_or_404(BankQuestion, pk=question_pk)
-    
+
     # Удаляем вопрос из M2M-связи
     test.questions.remove(question)
-    
-    # Получаем обновленный контекст
-    context = _get_assembly_context(test_pk)
-    
-    # Рендерим и возвращаем только правую колонку
-    return render(request, 'gat_tests/partials/_assembly_panel.html', context)
-
-def get_balanced_questions(subject, total_count):
+
+    response = _assembly_change_response(request, test, {})
+    response['HX-Trigger'] = 'assembly-questions-changed'
+    return response
+
+@login_required
+@require_POST
+def auto_assemble_test(request, test_pk):
     """
-    Возвращает список вопросов (QuerySet) по схеме:
-    40% Легкие, 40% Средние, 20% Сложные.
+    Заменяет вопросы теста подобранными автоматически (core/gat_generator.py):
+    QuestionCount, DifficultyRule, равномерно по темам, без вопросов недавних тестов.
     """
-    # 1. Считаем сколько нужно вопросов каждого типа
-    easy_needed = int(total_count * 0.4)
-    medium_needed = int(total_count * 0.4)
-    hard_needed = total_count - easy_needed - medium_needed # Остаток берем как сложные
-
-    # 2. Достаем ID вопросов из базы
-    # Используем values_list для оптимизации (получаем только ID)
-    qs = BankQuestion.objects.filter(subject=subject)
-    
-    easy_ids = list(qs.filter(difficulty='EASY').values_list('id', flat=True))
-    medium_ids = list(qs.filter(difficulty='MEDIUM').values_list('id', flat=True))
-    hard_ids = list(qs.filter(difficulty='HARD').values_list('id', flat=True))
-
-    selected_ids = []
-
-    # 3. Функция-помощник для безопасного выбора
-    def pick_ids(source_ids, count):
-        if len(source_ids) >= count:
-            return random.sample(source_ids, count)
-        return source_ids # Если вопросов не хватает, берем все, что есть
-
-    # 4. Набираем вопросы
-    selected_ids.extend(pick_ids(easy_ids, easy_needed))
-    selected_ids.extend(pick_ids(medium_ids, medium_needed))
-    selected_ids.extend(pick_ids(hard_ids, hard_needed))
-
-    # 5. Если вопросов не хватило до total_count (база маленькая), добираем любые
-    current_count = len(selected_ids)
-    if current_count < total_count:
-        all_ids = set(easy_ids + medium_ids + hard_ids)
-        used_ids = set(selected_ids)
-        remaining_ids = list(all_ids - used_ids)
-        needed = total_count - current_count
-        selected_ids.extend(pick_ids(remaining_ids, needed))
-
-    return BankQuestion.objects.filter(id__in=selected_ids)
\ No newline at end of file
+    test = get_object_or_404(GatTest, pk=test_pk)
+    plan = fill_test(test)
+    messages.success(request, f'Тест собран автоматически: {len(plan.question_ids)} вопросов.')
+    for warning in plan.warnings:
+        messages.warning(request, warning)
+
+    if request.htmx:
+        return HttpResponse(status=204, headers={'HX-Refresh': 'true'})
+    return redirect('core:gat_test_edit', pk=test.pk)
@@ -7,15 +7,20 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Avg, Sum, Count, Q
 from django.utils import timezone
 
-from ..models import Student, GatTest, StudentResult, Quarter, AcademicYear, Subject, QuestionCount
+from ..models import Student, GatTest, StudentResult, Quarter, AcademicYear, Subject, QuestionCount, SubjectResultRollup
 from .permissions import get_accessible_schools
 from .. import utils
+from ..trends import rollup_trend_chart
+from ..dashboard_cache import get_dashboard_snapshot, ranks_schools
 
 def _get_date_filters(request):
     """Определяет фильтр по дате на основе GET-параметров."""
+    return resolve_period(request.GET.get('period', 'year'), request.GET.get('year'))
+
+
+def resolve_period(period, selected_year_id=None):
+    """(период, начало, конец) для 'quarter', 'year', 'all' или архивного учебного года."""
     today = timezone.now().date()
-    period = request.GET.get('period', 'year')
-    selected_year_id = request.GET.get('year')
     start_date, end_date = None, None
 
     if selected_year_id:
@@ -50,9 +55,10 @@ def _calculate_kpis(results_qs, accessible_schools):
             'test_count': 0,
         }
 
-    # Считаем уникальные ID из queryset'а, чтобы избежать лишних запросов к БД
-    distinct_student_ids = results_qs.values_list('student_id', flat=True).distinct()
-    distinct_test_ids = results_qs.values_list('gat_test_id', flat=True).distinct()
+    # Считаем уникальные ID из queryset'а, чтобы избежать лишних запросов к БД.
+    # order_by() обязателен: поля сортировки StudentResult иначе попадают в DISTINCT
+    distinct_student_ids = results_qs.values_list('student_id', flat=True).order_by().distinct()
+    distinct_test_ids = results_qs.values_list('gat_test_id', flat=True).order_by().distinct()
 
     # Считаем все предметы, так как они глобальные
     subject_count = Subject.objects.count()
@@ -70,7 +76,7 @@ def _get_performance_chart_data(user, base_qs):
     if not base_qs.exists():
         return json.dumps([]), json.dumps([])
 
-    if user.is_staff or (hasattr(user, 'profile') and user.profile.role == 'EXPERT'):
+    if ranks_schools(user):
         # Для админов/экспертов - рейтинг школ
         performance = base_qs.values('student__school_class__school__name').annotate(avg_score=Avg('total_score')).order_by('-avg_score')[:10]
         labels = [item['student__school_class__school__name'] for item in performance]
@@ -82,22 +88,12 @@ def _get_performance_chart_data(user, base_qs):
     data = [round(item['avg_score'], 1) for item in performance]
     return json.dumps(labels, ensure_ascii=False), json.dumps(data)
 
-def _get_subject_chart_data(base_qs):
-    """Готовит данные для графика предметов из JSON-поля `scores_by_subject`."""
-    subject_performance = defaultdict(lambda: {'correct': 0, 'total': 0})
-
-    for result in base_qs:
-        if isinstance(result.scores_by_subject, dict):
-            for subject_id_str, answers in result.scores_by_subject.items():
-                if answers: # Проверяем, что словарь ответов не пуст (раньше была list)
-                    try:
-                        subject_id = int(subject_id_str)
-                        # answers - это словарь {'1': True, '2': False}
-                        correct_count = sum(1 for v in answers.values() if v is True)
-                        subject_performance[subject_id]['correct'] += correct_count
-                        subject_performance[subject_id]['total'] += len(answers)
-                    except (ValueError, TypeError):
-                        continue # Пропускаем некорректные ключи или значения
+def _get_subject_chart_data(rollups_qs):
+    """Готовит данные для графика предметов из агрегатов SubjectResultRollup."""
+    subject_performance = {
+        row['subject_id']: {'correct': row['correct_sum'], 'total': row['answered_sum']}
+        for row in rollups_qs.values('subject_id').annotate(correct_sum=Sum('correct'), answered_sum=Sum('answered'))
+    }
 
     if not subject_performance:
         return json.dumps([]), json.dumps([])
@@ -137,26 +133,28 @@ def _get_student_widgets_data(base_qs):
 
     return top_students, worst_students
 
-@login_required
-def dashboard_view(request):
-    user = request.user
-    period, start_date, end_date = _get_date_filters(request)
+def build_dashboard_snapshot(user, start_date, end_date):
+    """
+    Считает все блоки панели за период (кэшируется в core/dashboard_cache.py).
+    Возвращает часть контекста шаблона, не зависящую от запроса.
+    """
     accessible_schools = get_accessible_schools(user)
 
     # Сначала формируем базовый queryset для ВСЕХ расчетов
     base_results_qs = StudentResult.objects.filter(student__school_class__school__in=accessible_schools)
+    rollups_qs = SubjectResultRollup.objects.filter(school_class__school__in=accessible_schools)
     if start_date and end_date:
         base_results_qs = base_results_qs.filter(gat_test__test_date__range=(start_date, end_date))
+        rollups_qs = rollups_qs.filter(gat_test__test_date__range=(start_date, end_date))
 
     # ✨ ИЗМЕНЕНИЕ 2: Передаем готовый queryset в функцию расчета KPI
     kpis = _calculate_kpis(base_results_qs, accessible_schools)
 
     # --- Все остальные расчеты используют тот же самый base_results_qs ---
     school_chart_labels, school_chart_data = _get_performance_chart_data(user, base_results_qs)
-    subject_chart_labels, subject_chart_data = _get_subject_chart_data(base_results_qs)
+    subject_chart_labels, subject_chart_data = _get_subject_chart_data(rollups_qs)
+    trend_chart_data = rollup_trend_chart(rollups_qs)
     top_students, worst_students = _get_student_widgets_data(base_results_qs)
-    # Оптимизация: загружаем связанные объекты для недавних тестов
-    recent_tests = GatTest.objects.filter(school__in=accessible_schools).select_related('school', 'school_class').order_by('-test_date')[:5]
 
     # --- ИСПРАВЛЕННАЯ ЛОГИКА ДЛЯ ГРАФИКА РАСПРЕДЕЛЕНИЯ УСПЕВАЕМОСТИ ---
     grades = []
@@ -164,7 +162,7 @@ def dashboard_view(request):
 
     if base_results_qs.exists():
         # 1. Получаем уникальные ID тестов из результатов
-        test_ids = base_results_qs.values_list('gat_test_id', flat=True).distinct()
+        test_ids = base_results_qs.values_list('gat_test_id', flat=True).order_by().distinct()
 
         # 2. Загружаем объекты GatTest с их предметами и классами (параллелями)
         # ---
@@ -232,16 +230,33 @@ def dashboard_view(request):
     ]
     # --- КОНЕЦ ИСПРАВЛЕННОЙ ЛОГИКИ ---
 
-    context = {
-        'title': 'Панель управления',
-        'selected_period': period,
+    return {
         'school_chart_labels': school_chart_labels, 'school_chart_data': school_chart_data,
         'subject_chart_labels': subject_chart_labels, 'subject_chart_data': subject_chart_data,
+        'trend_chart_data': json.dumps(trend_chart_data, ensure_ascii=False) if trend_chart_data else None,
         'top_students': top_students, 'worst_students': worst_students,
-        'recent_tests': recent_tests,
         # Передаем обновленные данные для диаграммы распределения
         'distribution_chart_labels': json.dumps(distribution_labels, ensure_ascii=False),
         'distribution_chart_data': json.dumps(distribution_data),
         **kpis
     }
+
+
+@login_required
+def dashboard_view(request):
+    user = request.user
+    period, start_date, end_date = _get_date_filters(request)
+    # Тяжелые блоки — из снимка, общего для пользователей с одинаковой областью доступа
+    snapshot, _ = get_dashboard_snapshot(
+        user, start_date, end_date, lambda: build_dashboard_snapshot(user, start_date, end_date)
+    )
+    # Оптимизация: загружаем связанные объекты для недавних тестов
+    recent_tests = GatTest.objects.filter(school__in=get_accessible_schools(user)).select_related('school', 'school_class').order_by('-test_date')[:5]
+
+    context = {
+        'title': 'Панель управления',
+        'selected_period': period,
+        'recent_tests': recent_tests,
+        **snapshot
+    }
     return render(request, 'dashboard.html', context)
\ No newline at end of file
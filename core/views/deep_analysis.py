@@ -6,8 +6,16 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from accounts.models import UserProfile
 
-from ..models import SchoolClass, Subject, StudentResult, GatTest
+from django.db.models import Sum
+
+from ..models import SchoolClass, Subject, StudentResult, GatTest, SubjectResultRollup, QuestionResultRollup
 from ..forms import DeepAnalysisForm
+from ..analytics import (
+    load_result_frame, load_question_frame, summary_charts, heatmap_data_and_summary,
+    find_problematic_questions, find_at_risk_students,
+)
+from ..item_statistics import heatmap_item_statistics
+from ..trends import rollup_trend_chart
 from .permissions import get_accessible_schools
 
 @login_required
@@ -17,7 +25,6 @@ def deep_analysis_view(request):
     и учетом прав доступа Эксперта.
     """
     user = request.user
-    profile = getattr(user, 'profile', None)
     form = DeepAnalysisForm(request.GET or None, user=user)
 
     # --- Блок для подготовки контекста для нового фильтра ---
@@ -42,6 +49,7 @@ def deep_analysis_view(request):
         'trend_chart_data': None,
         'problematic_questions': {},
         'at_risk_students': [],
+        'heatmap_item_stats': {},
     }
 
     # --- Логика группировки классов для фильтра ---
@@ -71,110 +79,216 @@ def deep_analysis_view(request):
 
     # --- Основная логика получения и обработки данных ---
     if form.is_valid():
-        selected_quarters = form.cleaned_data['quarters']
-        selected_schools = form.cleaned_data['schools']
-        selected_classes_qs = form.cleaned_data['school_classes']
-        selected_subjects_qs = form.cleaned_data['subjects']
-        selected_test_numbers = form.cleaned_data['test_numbers']
-        selected_days = form.cleaned_data['days']
-
-        selected_class_ids_list = list(selected_classes_qs.values_list('id', flat=True))
-        parent_class_ids = selected_classes_qs.filter(parent__isnull=True).values_list('id', flat=True)
-        if parent_class_ids:
-            child_class_ids = list(SchoolClass.objects.filter(parent_id__in=parent_class_ids).values_list('id', flat=True))
-            selected_class_ids_list.extend(child_class_ids)
-        final_class_ids = set(selected_class_ids_list)
-
-        accessible_schools = get_accessible_schools(user)
-        base_qs = StudentResult.objects.filter(student__school_class__school__in=accessible_schools)
-
-        results_qs = base_qs.filter(
-            gat_test__quarter__in=selected_quarters,
-            gat_test__test_number__in=selected_test_numbers,
-        ).select_related('student__school_class__school', 'gat_test__quarter')
-
-        if selected_schools:
-            results_qs = results_qs.filter(student__school_class__school__in=selected_schools)
-        if final_class_ids:
-            results_qs = results_qs.filter(student__school_class_id__in=final_class_ids)
-        if selected_days:
-            results_qs = results_qs.filter(gat_test__day__in=selected_days)
-
-        accessible_subjects_qs = Subject.objects.none()
-        is_expert = profile and profile.role == UserProfile.Role.EXPERT
-        expert_subject_ids_int = set()
-
-        if is_expert:
-            expert_subjects = profile.subjects.all()
-            expert_subject_ids_int = set(expert_subjects.values_list('id', flat=True))
-            if selected_subjects_qs.exists():
-                accessible_subjects_qs = selected_subjects_qs.filter(id__in=expert_subject_ids_int)
-            elif expert_subjects.exists():
-                accessible_subjects_qs = expert_subjects
-        else:
-            accessible_subjects_qs = selected_subjects_qs
-
-        if accessible_subjects_qs.exists():
-            subject_id_keys_to_filter = [str(s.id) for s in accessible_subjects_qs]
-            results_qs = results_qs.filter(scores_by_subject__has_any_keys=subject_id_keys_to_filter)
-        elif is_expert:
-             results_qs = results_qs.none()
-
-        if not accessible_subjects_qs.exists() and not is_expert and results_qs.exists():
-             all_subject_ids_in_results = set()
-             for r in results_qs:
-                 if isinstance(r.scores_by_subject, dict):
-                     all_subject_ids_in_results.update(int(sid) for sid in r.scores_by_subject.keys())
-             accessible_subjects_qs = Subject.objects.filter(id__in=all_subject_ids_in_results)
-
-        if results_qs.exists() and accessible_subjects_qs.exists():
-            compare_by = 'school'
-            if (selected_schools.count() == 1 and
-                selected_classes_qs.exists() and
-                selected_classes_qs.filter(parent__isnull=False).count() > 1):
-                compare_by = 'class'
-            elif not selected_schools and accessible_schools.count() > 1:
-                compare_by = 'school'
-
-            unique_subject_names = sorted(list(set(accessible_subjects_qs.values_list('name', flat=True))))
-            subject_id_to_name_map = {s.id: s.name for s in accessible_subjects_qs}
-            allowed_subject_ids_int = set(subject_id_to_name_map.keys())
-
-            analysis_data, student_performance = _process_results_for_deep_analysis(
-                results_qs, unique_subject_names, subject_id_to_name_map, allowed_subject_ids_int, compare_by
+        scope = _resolve_analysis_scope(form, user)
+        if scope is not None:
+            context.update(_run_analysis(scope))
+            # Показатели вопросов считает фоновая задача; здесь только чтение ItemStatistic
+            context['heatmap_item_stats'] = heatmap_item_statistics(
+                GatTest.objects.filter(pk__in=scope['results_qs'].values('gat_test_id')),
+                scope['subject_id_to_name_map'],
             )
 
-            # ✨ ИЗМЕНЕНИЕ: Функция теперь возвращает 2 набора данных для 2-х графиков
-            summary_chart_data, comparison_chart_data = _prepare_summary_charts(
-                analysis_data, unique_subject_names
-            )
+    return render(request, 'deep_analysis.html', context)
 
-            heatmap_data, heatmap_summary = _prepare_heatmap_data_and_summary(analysis_data, allowed_subject_ids_int)
-            trend_chart_data = _prepare_trend_chart_data(results_qs, allowed_subject_ids_int, subject_id_to_name_map)
-            problematic_questions = _find_problematic_questions(analysis_data, allowed_subject_ids_int)
-            at_risk_students = _find_at_risk_students(student_performance, allowed_subject_ids_int)
-
-            context.update({
-                'has_results': True,
-                'summary_chart_data': json.dumps(summary_chart_data, ensure_ascii=False),
-                'comparison_chart_data': json.dumps(comparison_chart_data, ensure_ascii=False), # ✨ ИЗМЕНЕНИЕ: Передаем новые данные
-                'heatmap_data': heatmap_data,
-                'heatmap_summary': heatmap_summary,
-                'trend_chart_data': json.dumps(trend_chart_data, ensure_ascii=False) if trend_chart_data else None,
-                'problematic_questions': problematic_questions,
-                'at_risk_students': at_risk_students,
-            })
 
-    return render(request, 'deep_analysis.html', context)
+def _resolve_analysis_scope(form, user):
+    """
+    По валидной форме фильтров определяет выборку: результаты, фильтры агрегатов,
+    доступные предметы и режим сравнения (по школам или классам).
+    Возвращает словарь или None, если анализировать нечего.
+    """
+    profile = getattr(user, 'profile', None)
+    selected_quarters = form.cleaned_data['quarters']
+    selected_schools = form.cleaned_data['schools']
+    selected_classes_qs = form.cleaned_data['school_classes']
+    selected_subjects_qs = form.cleaned_data['subjects']
+    selected_test_numbers = form.cleaned_data['test_numbers']
+    selected_days = form.cleaned_data['days']
+
+    selected_class_ids_list = list(selected_classes_qs.values_list('id', flat=True))
+    parent_class_ids = selected_classes_qs.filter(parent__isnull=True).values_list('id', flat=True)
+    if parent_class_ids:
+        child_class_ids = list(SchoolClass.objects.filter(parent_id__in=parent_class_ids).values_list('id', flat=True))
+        selected_class_ids_list.extend(child_class_ids)
+    final_class_ids = set(selected_class_ids_list)
+
+    accessible_schools = get_accessible_schools(user)
+    base_qs = StudentResult.objects.filter(student__school_class__school__in=accessible_schools)
+
+    results_qs = base_qs.filter(
+        gat_test__quarter__in=selected_quarters,
+        gat_test__test_number__in=selected_test_numbers,
+    )
+
+    if selected_schools:
+        results_qs = results_qs.filter(student__school_class__school__in=selected_schools)
+    if final_class_ids:
+        results_qs = results_qs.filter(student__school_class_id__in=final_class_ids)
+    if selected_days:
+        results_qs = results_qs.filter(gat_test__day__in=selected_days)
+
+    accessible_subjects_qs = Subject.objects.none()
+    is_expert = profile and profile.role == UserProfile.Role.EXPERT
+    expert_subject_ids_int = set()
+
+    if is_expert:
+        expert_subjects = profile.subjects.all()
+        expert_subject_ids_int = set(expert_subjects.values_list('id', flat=True))
+        if selected_subjects_qs.exists():
+            accessible_subjects_qs = selected_subjects_qs.filter(id__in=expert_subject_ids_int)
+        elif expert_subjects.exists():
+            accessible_subjects_qs = expert_subjects
+    else:
+        accessible_subjects_qs = selected_subjects_qs
+
+    if accessible_subjects_qs.exists():
+        subject_id_keys_to_filter = [str(s.id) for s in accessible_subjects_qs]
+        results_qs = results_qs.filter(scores_by_subject__has_any_keys=subject_id_keys_to_filter)
+    elif is_expert:
+         results_qs = results_qs.none()
+
+    # Результаты × предметы загружаются один раз (core/analytics.py)
+    result_frame = load_result_frame(results_qs)
+
+    if not accessible_subjects_qs.exists() and not is_expert and not result_frame.empty:
+         accessible_subjects_qs = Subject.objects.filter(id__in=result_frame['subject_id'].unique().tolist())
+
+    if not results_qs.exists() or not accessible_subjects_qs.exists():
+        return None
+
+    compare_by = 'school'
+    if (selected_schools.count() == 1 and
+        selected_classes_qs.exists() and
+        selected_classes_qs.filter(parent__isnull=False).count() > 1):
+        compare_by = 'class'
+    elif not selected_schools and accessible_schools.count() > 1:
+        compare_by = 'school'
+
+    subject_id_to_name_map = {s.id: s.name for s in accessible_subjects_qs}
+
+    # Фильтры те же, что и для results_qs, но по агрегатам (тест, класс, предмет[, вопрос])
+    rollup_filters = {
+        'school_class__school__in': accessible_schools,
+        'gat_test__quarter__in': selected_quarters,
+        'gat_test__test_number__in': selected_test_numbers,
+        'subject_id__in': set(subject_id_to_name_map.keys()),
+    }
+    if selected_schools:
+        rollup_filters['school_class__school_id__in'] = selected_schools
+    if final_class_ids:
+        rollup_filters['school_class_id__in'] = final_class_ids
+    if selected_days:
+        rollup_filters['gat_test__day__in'] = selected_days
+
+    return {
+        'results_qs': results_qs,
+        'result_frame': result_frame,
+        'rollup_filters': rollup_filters,
+        'unique_subject_names': sorted(set(subject_id_to_name_map.values())),
+        'subject_id_to_name_map': subject_id_to_name_map,
+        'compare_by': compare_by,
+    }
+
+
+def _run_analysis(scope):
+    """ Считает все блоки страницы по выборке scope (векторизованно, core/analytics.py). """
+    subject_id_to_name_map = scope['subject_id_to_name_map']
+    question_frame = load_question_frame(
+        QuestionResultRollup.objects.filter(**scope['rollup_filters']), scope['compare_by']
+    )
+
+    summary_chart_data, comparison_chart_data = summary_charts(
+        question_frame, scope['unique_subject_names'], subject_id_to_name_map
+    )
+    heatmap_data, heatmap_summary = heatmap_data_and_summary(question_frame, subject_id_to_name_map)
+    trend_chart_data = rollup_trend_chart(
+        SubjectResultRollup.objects.filter(**scope['rollup_filters']), subject_id_to_name_map
+    )
+
+    return {
+        'has_results': True,
+        'summary_chart_data': json.dumps(summary_chart_data, ensure_ascii=False),
+        'comparison_chart_data': json.dumps(comparison_chart_data, ensure_ascii=False),
+        'heatmap_data': heatmap_data,
+        'heatmap_summary': heatmap_summary,
+        'trend_chart_data': json.dumps(trend_chart_data, ensure_ascii=False) if trend_chart_data else None,
+        'problematic_questions': find_problematic_questions(question_frame, subject_id_to_name_map),
+        'at_risk_students': find_at_risk_students(scope['result_frame'], subject_id_to_name_map),
+    }
+
+
+def _run_analysis_legacy(scope):
+    """ Те же блоки прежними функциями на словарях (эталон для benchmark_deep_analysis и тестов). """
+    subject_id_to_name_map = scope['subject_id_to_name_map']
+    allowed_subject_ids_int = set(subject_id_to_name_map.keys())
+    analysis_data = _build_analysis_data(
+        QuestionResultRollup.objects.filter(**scope['rollup_filters']), scope['unique_subject_names'],
+        subject_id_to_name_map, scope['compare_by']
+    )
+    student_performance = _collect_student_performance(scope['results_qs'], subject_id_to_name_map, allowed_subject_ids_int)
+    summary_chart_data, comparison_chart_data = _prepare_summary_charts(analysis_data, scope['unique_subject_names'])
+    heatmap_data, heatmap_summary = _prepare_heatmap_data_and_summary(analysis_data, allowed_subject_ids_int)
+    trend_chart_data = rollup_trend_chart(
+        SubjectResultRollup.objects.filter(**scope['rollup_filters']), subject_id_to_name_map
+    )
+
+    return {
+        'has_results': True,
+        'summary_chart_data': json.dumps(summary_chart_data, ensure_ascii=False),
+        'comparison_chart_data': json.dumps(comparison_chart_data, ensure_ascii=False),
+        'heatmap_data': heatmap_data,
+        'heatmap_summary': heatmap_summary,
+        'trend_chart_data': json.dumps(trend_chart_data, ensure_ascii=False) if trend_chart_data else None,
+        'problematic_questions': _find_problematic_questions(analysis_data, allowed_subject_ids_int),
+        'at_risk_students': _find_at_risk_students(student_performance, allowed_subject_ids_int),
+    }
 
 
 # ==========================================================
-# --- Вспомогательные функции (с изменениями) ---
+# --- Прежние функции на словарях (эталон для _run_analysis_legacy) ---
 # ==========================================================
 
-def _process_results_for_deep_analysis(results_qs, unique_subject_names, subject_id_to_name_map, allowed_subject_ids_int, compare_by='school'):
-    """ Обрабатывает результаты для построения analysis_data и student_performance. """
+def _build_analysis_data(question_rollups_qs, unique_subject_names, subject_id_to_name_map, compare_by='school'):
+    """ Строит analysis_data (по школам или классам) из агрегатов QuestionResultRollup. """
     temp_analysis_data = {}
+    if compare_by == 'class':
+        entity_fields = ('school_class_id', 'school_class__name')
+    else:
+        entity_fields = ('school_class__school_id', 'school_class__school__name')
+
+    rows = question_rollups_qs.values(*entity_fields, 'subject_id', 'question_number').annotate(
+        correct_sum=Sum('correct'), answered_sum=Sum('answered')
+    ).order_by(entity_fields[1], 'subject_id', 'question_number')
+
+    for row in rows:
+        entity_id, entity_name = row[entity_fields[0]], row[entity_fields[1]]
+        if entity_id not in temp_analysis_data:
+            temp_analysis_data[entity_id] = {
+                'name': entity_name,
+                'subjects': {name: {'question_details': defaultdict(lambda: {'correct': 0, 'total': 0})} for name in unique_subject_names}
+            }
+        subject_name = subject_id_to_name_map.get(row['subject_id'])
+        if not subject_name:
+            continue
+        q_data = temp_analysis_data[entity_id]['subjects'][subject_name]['question_details'][row['question_number']]
+        q_data['correct'] += row['correct_sum']
+        q_data['total'] += row['answered_sum']
+
+    for entity_data in temp_analysis_data.values():
+        for subject_name, subject_data in entity_data['subjects'].items():
+            total_correct, total_q = 0, 0
+            for q_data in subject_data['question_details'].values():
+                if q_data['total'] > 0:
+                    q_data['percentage'] = round((q_data['correct'] / q_data['total']) * 100, 1)
+                    total_correct += q_data['correct']
+                    total_q += q_data['total']
+            subject_data['overall_percentage'] = round((total_correct / total_q) * 100, 1) if total_q > 0 else 0
+
+    return temp_analysis_data
+
+
+def _collect_student_performance(results_qs, subject_id_to_name_map, allowed_subject_ids_int):
+    """ Собирает проценты учеников по предметам (нужны для списка учеников в зоне риска). """
     student_performance = defaultdict(lambda: {
         'subject_scores': defaultdict(list),
         'name': '', 'class_name': '', 'school_name': ''
@@ -185,21 +299,10 @@ def _process_results_for_deep_analysis(results_qs, unique_subject_names, subject
     for result in results_qs:
         student = result.student
         school_class = student.school_class
-        school = school_class.school
-        entity_id = school_class.id if compare_by == 'class' else school.id
-        entity_name = school_class.name if compare_by == 'class' else school.name
-
-        if entity_id not in temp_analysis_data:
-            temp_analysis_data[entity_id] = {
-                'name': entity_name,
-                'subjects': {name: {'question_details': defaultdict(lambda: {'correct': 0, 'total': 0})} for name in unique_subject_names}
-            }
-
-        student_id = student.id
-        student_performance[student_id].update({
+        student_performance[student.id].update({
             'name': str(student),
             'class_name': school_class.name,
-            'school_name': school.name
+            'school_name': school_class.school.name
         })
 
         if not isinstance(result.scores_by_subject, dict):
@@ -208,40 +311,16 @@ def _process_results_for_deep_analysis(results_qs, unique_subject_names, subject
         for subject_id_str, answers in result.scores_by_subject.items():
             try:
                 subject_id = int(subject_id_str)
-                if subject_id in allowed_subject_ids_int:
-                    subject_name = subject_id_to_name_map.get(subject_id)
-                    if not subject_name or not isinstance(answers, dict): continue
-
-                    # --- ✨ ИСПРАВЛЕНИЕ: Правильная обработка словаря ответов ---
-                    # Старая логика `enumerate(answers)` была неверной для словаря.
-                    data_ref = temp_analysis_data[entity_id]['subjects'][subject_name]
-                    correct_count = 0
-                    for q_num, was_correct in answers.items():
-                        if was_correct:
-                            data_ref['question_details'][q_num]['correct'] += 1
-                            correct_count += 1
-                        data_ref['question_details'][q_num]['total'] += 1
-                    
-                    total_questions = len(answers)
-                    if total_questions > 0:
-                        percentage = (correct_count / total_questions) * 100
-                        student_performance[student_id]['subject_scores'][subject_name].append(percentage)
-                    # --- КОНЕЦ ИСПРАВЛЕНИЯ ---
-
             except (ValueError, TypeError):
                 continue
+            subject_name = subject_id_to_name_map.get(subject_id)
+            if subject_id not in allowed_subject_ids_int or not subject_name or not isinstance(answers, dict):
+                continue
+            if answers:
+                correct_count = sum(1 for was_correct in answers.values() if was_correct)
+                student_performance[student.id]['subject_scores'][subject_name].append((correct_count / len(answers)) * 100)
 
-    for entity_data in temp_analysis_data.values():
-        for subject_name, subject_data in entity_data['subjects'].items():
-            total_correct, total_q = 0, 0
-            for q_data in subject_data['question_details'].values():
-                if q_data['total'] > 0:
-                    q_data['percentage'] = round((q_data['correct'] / q_data['total']) * 100, 1)
-                    total_correct += q_data['correct']
-                    total_q += q_data['total']
-            subject_data['overall_percentage'] = round((total_correct / total_q) * 100, 1) if total_q > 0 else 0
-
-    return temp_analysis_data, student_performance
+    return student_performance
 
 
 # ✨ ИЗМЕНЕНИЕ: Функция переименована и теперь готовит данные для 2-х разных графиков
@@ -284,7 +363,7 @@ def _prepare_summary_charts(analysis_data, unique_subject_names):
     
     return summary_chart, comparison_chart
 
-# ... (остальные вспомогательные функции _prepare_heatmap_data_and_summary, _prepare_trend_chart_data и т.д. остаются без изменений) ...
+# ... (остальные вспомогательные функции _prepare_heatmap_data_and_summary и т.д. остаются без изменений) ...
 
 def _prepare_heatmap_data_and_summary(analysis_data, allowed_subject_ids_int):
     """ Готовит данные для тепловой карты и сводки по ней. """
@@ -358,46 +437,6 @@ def _prepare_heatmap_data_and_summary(analysis_data, allowed_subject_ids_int):
     return heatmap_data, heatmap_summary
 
 
-def _prepare_trend_chart_data(results_qs, allowed_subject_ids_int, subject_id_to_name_map):
-    """ Готовит данные для графика динамики по четвертям. """
-    quarters_with_results = results_qs.values_list('gat_test__quarter', flat=True).distinct()
-    if quarters_with_results.count() < 2: return None
-
-    trend_data = defaultdict(lambda: defaultdict(lambda: {'correct': 0, 'total': 0}))
-    all_quarters = set()
-
-    for r in results_qs.select_related('gat_test__quarter'):
-        quarter = r.gat_test.quarter
-        all_quarters.add((quarter.start_date, quarter.name))
-
-        if not isinstance(r.scores_by_subject, dict): continue
-
-        for sid_str, answers in r.scores_by_subject.items():
-            try:
-                sid = int(sid_str)
-                if sid in allowed_subject_ids_int:
-                    s_name = subject_id_to_name_map.get(sid)
-                    if s_name and isinstance(answers, dict):
-                        trend_data[s_name][quarter.name]['correct'] += sum(1 for v in answers.values() if v)
-                        trend_data[s_name][quarter.name]['total'] += len(answers)
-            except (ValueError, TypeError):
-                 continue
-
-    sorted_quarters = [name for date, name in sorted(list(all_quarters))]
-
-    trend_datasets = []
-    for subject, quarters_data in trend_data.items():
-        data_points = []
-        for q_name in sorted_quarters:
-            data = quarters_data.get(q_name)
-            if data and data['total'] > 0:
-                data_points.append(round((data['correct'] / data['total']) * 100, 1))
-            else:
-                data_points.append(None)
-        trend_datasets.append({'label': subject, 'data': data_points, 'tension': 0.4, 'fill': True})
-
-    return {'labels': sorted_quarters, 'datasets': trend_datasets}
-
 
 def _find_problematic_questions(analysis_data, allowed_subject_ids_int, top_n=3):
     """ Находит топ N самых сложных вопросов по каждому предмету. """
@@ -2,17 +2,13 @@
 
 import json
 from collections import defaultdict
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from weasyprint import HTML
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
 
-from .utils_reports import get_report_context
+from .utils_reports import get_report_context, build_report_query, iter_report_rows
+from ..xlsx_export import streaming_xlsx_response
 from ..models import SchoolClass
+from ..jobs import enqueue_job
 
 @login_required
 def grading_view(request):
@@ -60,74 +56,45 @@ def grading_view(request):
 
 @login_required
 def export_grading_pdf(request):
-    """Экспортирует отчет по оценкам в PDF."""
-    context = get_report_context(request.GET, request.user, mode='grading')
-    context['title'] = 'Отчет по оценкам'
-    html_string = render_to_string('grading/grading_pdf.html', context) 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="grading_report.pdf"'
-    HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(response)
-    return response
+    """Ставит экспорт отчета по оценкам в PDF в очередь фоновых задач."""
+    job = enqueue_job(
+        'grading_pdf', request.user,
+        params={'query': request.GET.urlencode(), 'base_url': request.build_absolute_uri('/')},
+        title='Отчет по оценкам (PDF)',
+    )
+    return redirect('core:job_detail', pk=job.pk)
 
 @login_required
 def export_grading_excel(request):
-    """Экспортирует отчет по оценкам в Excel."""
-    context = get_report_context(request.GET, request.user, mode='grading')
-    table_headers = context['table_headers']
-    table_rows = context['table_rows']
-    
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="grading_report.xlsx"'
-    
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = 'Таблица оценок'
-    
+    """Экспортирует отчет по оценкам в Excel (потоково, без сборки книги в памяти)."""
+    report = build_report_query(request.GET, request.user)
+    table_headers = report['table_headers']
+
     header1 = ["№", "ФИО Студента", "Класс", "Тест"]
-    for header_data in table_headers: 
+    for header_data in table_headers:
         header1.append(header_data['subject'].abbreviation or header_data['subject'].name)
     header1.append("Общий балл (из оценок)")
-    sheet.append(header1)
-    
+
     header2 = ["", "", "", ""]
-    for header_data in table_headers: 
+    for header_data in table_headers:
         header2.append("(10 баллов)")
     header2.append("")
-    sheet.append(header2)
-    
-    for col in range(1, 5):
-        sheet.merge_cells(start_row=1, start_column=col, end_row=2, end_column=col)
-        sheet.cell(row=1, column=col).alignment = Alignment(vertical='center')
-    
-    total_score_col = len(header1)
-    sheet.merge_cells(start_row=1, start_column=total_score_col, end_row=2, end_column=total_score_col)
-    sheet.cell(row=1, column=total_score_col).alignment = Alignment(vertical='center')
-    
-    for i, row_data in enumerate(table_rows, 1):
-        total_grade_score = sum(filter(lambda v: isinstance(v, (int, float)), row_data['grades_by_subject'].values()))
-        row = [
-            i, 
-            row_data['student'].full_name_ru,
-            str(row_data['student'].school_class),
-            "GAT Total" if row_data.get('is_total') else (row_data.get('result_obj').gat_test.name if row_data.get('result_obj') else '')
-        ]
-        for header_data in table_headers:
-            grade = row_data['grades_by_subject'].get(header_data['subject'].id, "—")
-            row.append(grade)
-        row.append(total_grade_score)
-        sheet.append(row)
-        
-    for col_idx, column_cells in enumerate(sheet.columns, 1):
-        max_length = 0
-        column = get_column_letter(col_idx)
-        for cell in column_cells:
-            try:
-                if len(str(cell.value)) > max_length: 
-                    max_length = len(str(cell.value))
-            except: 
-                pass
-        adjusted_width = (max_length + 2)
-        sheet.column_dimensions[column].width = adjusted_width
-        
-    workbook.save(response)
-    return response
\ No newline at end of file
+
+    def rows():
+        for i, row_data in enumerate(iter_report_rows(report, mode='grading'), 1):
+            total_grade_score = sum(filter(lambda v: isinstance(v, (int, float)), row_data['grades_by_subject'].values()))
+            row = [
+                i,
+                row_data['student'].full_name_ru,
+                str(row_data['student'].school_class),
+                "GAT Total" if row_data.get('is_total') else (row_data.get('result_obj').gat_test.name if row_data.get('result_obj') else '')
+            ]
+            for header_data in table_headers:
+                row.append(row_data['grades_by_subject'].get(header_data['subject'].id, "—"))
+            row.append(total_grade_score)
+            yield row
+
+    return streaming_xlsx_response(
+        'grading_report.xlsx', 'Таблица оценок', [header1, header2], rows(),
+        merge_header_columns=[1, 2, 3, 4, len(header1)]
+    )
@@ -0,0 +1,48 @@
+# D:\GAT\core\views\jobs.py
+
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+
+from ..models import BackgroundJob
+
+
+def _get_user_job(user, pk):
+    """Задачу видит только ее автор (и суперпользователь)."""
+    job = get_object_or_404(BackgroundJob, pk=pk)
+    if not user.is_superuser and job.created_by_id != user.pk:
+        raise Http404
+    return job
+
+
+@login_required
+def job_detail_view(request, pk):
+    """Страница фоновой задачи: статус с HTMX-опросом и ссылка на файл, когда он готов."""
+    job = _get_user_job(request.user, pk)
+    return render(request, 'jobs/job_detail.html', {'title': job.title or 'Фоновая задача', 'job': job})
+
+
+@login_required
+def job_status_view(request, pk):
+    """Статус задачи: HTML-фрагмент для HTMX или JSON для остальных клиентов."""
+    job = _get_user_job(request.user, pk)
+    if request.htmx:
+        return render(request, 'jobs/_job_status.html', {'job': job})
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'download_url': reverse('core:job_download', args=[job.pk]) if job.status == BackgroundJob.Status.DONE else None,
+    })
+
+
+@login_required
+def job_download_view(request, pk):
+    """Отдает файл готовой задачи."""
+    job = _get_user_job(request.user, pk)
+    if job.status != BackgroundJob.Status.DONE or not job.result_file:
+        raise Http404
+    return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=job.result_filename)
@@ -2,17 +2,13 @@
 
 import json
 from collections import defaultdict
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
-from weasyprint import HTML
-from django.template.loader import render_to_string
 
-from .utils_reports import get_report_context
+from .utils_reports import get_report_context, build_report_query, iter_report_rows
+from ..xlsx_export import streaming_xlsx_response
 from ..models import SchoolClass
+from ..jobs import enqueue_job
 
 @login_required
 def monitoring_view(request):
@@ -56,79 +52,52 @@ def monitoring_view(request):
 
 @login_required
 def export_monitoring_pdf(request):
-    """Экспортирует отчет по мониторингу в PDF."""
-    context = get_report_context(request.GET, request.user, mode='monitoring')
-    context['title'] = 'Отчет по мониторингу'
-    html_string = render_to_string('monitoring/monitoring_pdf.html', context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="monitoring_report.pdf"'
-    HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(response)
-    return response
+    """Ставит экспорт отчета по мониторингу в PDF в очередь фоновых задач."""
+    job = enqueue_job(
+        'monitoring_pdf', request.user,
+        params={'query': request.GET.urlencode(), 'base_url': request.build_absolute_uri('/')},
+        title='Отчет по мониторингу (PDF)',
+    )
+    return redirect('core:job_detail', pk=job.pk)
 
 @login_required
 def export_monitoring_excel(request):
-    """Экспортирует отчет по мониторингу в Excel."""
-    context = get_report_context(request.GET, request.user, mode='monitoring')
-    table_headers = context.get('table_headers', [])
-    table_rows = context.get('table_rows', [])
-    
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="monitoring_report.xlsx"'
-    
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = 'Мониторинг'
-    
+    """Экспортирует отчет по мониторингу в Excel (потоково, без сборки книги в памяти)."""
+    report = build_report_query(request.GET, request.user)
+    table_headers = report['table_headers']
+
     header1 = ["№", "ФИО Студента", "Класс", "Тест"]
-    for header_data in table_headers: 
+    for header_data in table_headers:
         header1.append(header_data['subject'].abbreviation or header_data['subject'].name)
     header1.append("Общий балл")
-    sheet.append(header1)
-    
+
     header2 = ["", "", "", ""]
     for header_data in table_headers:
-        # ✨ ИЗМЕНЕНИЕ: Отображаем общее количество вопросов во второй строке заголовка
+        # Отображаем общее количество вопросов во второй строке заголовка
         q_count = header_data.get('q_count', 0)
-        header2.append(f"(из {q_count})" if q_count > 0 else "") 
+        header2.append(f"(из {q_count})" if q_count > 0 else "")
     header2.append("")
-    sheet.append(header2)
-    
-    for col in range(1, 5):
-        sheet.merge_cells(start_row=1, start_column=col, end_row=2, end_column=col)
-        sheet.cell(row=1, column=col).alignment = Alignment(vertical='center')
-    
-    total_score_col = len(header1)
-    sheet.merge_cells(start_row=1, start_column=total_score_col, end_row=2, end_column=total_score_col)
-    sheet.cell(row=1, column=total_score_col).alignment = Alignment(vertical='center')
-    
-    for i, row_data in enumerate(table_rows, 1):
-        row = [
-            i, 
-            row_data['student'].full_name_ru, 
-            str(row_data['student'].school_class), 
-            row_data['result_obj'].gat_test.name if row_data.get('result_obj') else "Total"
-        ]
-        for header_data in table_headers:
-            # ✨ ИЗМЕНЕНИЕ: Форматируем ячейку как "балл/всего"
-            score_data = row_data.get('scores_by_subject', {}).get(header_data['subject'].id)
-            if score_data and score_data.get('score') != '—':
-                cell_value = f"{score_data.get('score', 0)}/{score_data.get('total', 0)}"
-            else:
-                cell_value = "—"
-            row.append(cell_value)
-        row.append(row_data['total_score'])
-        sheet.append(row)
-    
-    for col_idx, column_cells in enumerate(sheet.columns, 1):
-        max_length = 0
-        column = get_column_letter(col_idx)
-        for cell in column_cells:
-            try:
-                if len(str(cell.value)) > max_length: 
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        sheet.column_dimensions[column].width = adjusted_width
-        
-    workbook.save(response)
-    return response
\ No newline at end of file
+
+    def rows():
+        for i, row_data in enumerate(iter_report_rows(report, mode='monitoring'), 1):
+            row = [
+                i,
+                row_data['student'].full_name_ru,
+                str(row_data['student'].school_class),
+                row_data['result_obj'].gat_test.name if row_data.get('result_obj') else "Total"
+            ]
+            for header_data in table_headers:
+                # Форматируем ячейку как "балл/всего"
+                score_data = row_data.get('scores_by_subject', {}).get(header_data['subject'].id)
+                if score_data and score_data.get('score') != '—':
+                    cell_value = f"{score_data.get('score', 0)}/{score_data.get('total', 0)}"
+                else:
+                    cell_value = "—"
+                row.append(cell_value)
+            row.append(row_data['total_score'])
+            yield row
+
+    return streaming_xlsx_response(
+        'monitoring_report.xlsx', 'Мониторинг', [header1, header2], rows(),
+        merge_header_columns=[1, 2, 3, 4, len(header1)]
+    )
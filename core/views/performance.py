@@ -0,0 +1,30 @@
+# D:\GAT\core\views\performance.py
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
+
+from ..performance import get_view_stats, reset_view_stats
+
+
+@staff_member_required
+def performance_view(request):
+    """Перцентили времени ответа по view (скользящее окно последних запросов)."""
+    context = {
+        'title': 'Производительность',
+        'rows': get_view_stats(),
+        'window': settings.PERF_WINDOW,
+        'slow_ms': settings.PERF_SLOW_REQUEST_MS,
+        'enabled': settings.PERF_MONITORING_ENABLED,
+    }
+    return render(request, 'performance/performance.html', context)
+
+
+@staff_member_required
+@require_POST
+def performance_reset_view(request):
+    reset_view_stats()
+    messages.success(request, "Статистика производительности сброшена.")
+    return redirect('core:performance')
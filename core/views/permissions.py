@@ -3,10 +3,10 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.db import models # <<<--- ДОБАВЛЕНО: Импорт 'models' для Q-объектов
 from accounts.models import UserProfile
 # Убедись, что все нужные модели импортированы
 from ..models import School, Subject, SchoolClass, Student, QuestionCount, GatTest
+from ..permission_scope import get_permission_scope
 
 # =============================================================================
 # --- VIEW ДЛЯ СТРАНИЦЫ УПРАВЛЕНИЯ ПРАВАМИ ---
@@ -55,133 +55,34 @@ def manage_permissions_view(request):
 def get_accessible_schools(user):
     """
     Возвращает queryset школ, доступных пользователю в зависимости от его роли.
-    (Логика здесь была в порядке)
+    ID берутся из закэшированной области доступа (core/permission_scope.py).
     """
-    # Проверяем аутентификацию и наличие профиля
-    if not user.is_authenticated:
-        return School.objects.none()
-    profile = getattr(user, 'profile', None)
-    if not profile:
-        # Если профиля нет (маловероятно из-за сигналов, но для безопасности)
-        # Суперпользователь все равно видит все
-        return School.objects.all() if user.is_superuser else School.objects.none()
-
-    # Суперпользователь, Ген. директор и Эксперт видят ВСЕ школы
-    if user.is_superuser or profile.role in [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.EXPERT]:
-        return School.objects.all()
-
-    # Директор видит только школы, к которым у него есть прямой доступ через M2M
-    if profile.role == UserProfile.Role.DIRECTOR:
-        return profile.schools.all()
-
-    # Учитель и Кл. руководитель видят только свою основную школу (ForeignKey 'school')
-    if profile.role in [UserProfile.Role.TEACHER, UserProfile.Role.HOMEROOM_TEACHER] and profile.school:
-        return School.objects.filter(pk=profile.school.pk)
-
-    # Ученик видит только школу своего класса
-    if profile.role == UserProfile.Role.STUDENT and profile.student and profile.student.school_class:
-        # Добавлена проверка profile.student.school_class
-        return School.objects.filter(pk=profile.student.school_class.school_id) # Оптимизация: используем school_id
-
-    # Во всех остальных случаях возвращаем пустой queryset
-    return School.objects.none()
+    return School.objects.filter(id__in=get_permission_scope(user).school_ids)
 
 def get_accessible_subjects(user):
     """
     Возвращает queryset предметов, доступных пользователю.
-    (ИСПРАВЛЕНА ЛОГИКА ДЛЯ ДИРЕКТОРА И СТУДЕНТА)
+    Суперпользователь, Ген. директор, Директор и Ученик видят все предметы,
+    Эксперт, Учитель и Кл. руководитель — только назначенные.
     """
-    if not user.is_authenticated:
-        return Subject.objects.none()
-    profile = getattr(user, 'profile', None)
-    if not profile:
-        return Subject.objects.all() if user.is_superuser else Subject.objects.none()
-
-    # --- ✨ ИСПРАВЛЕНИЕ: Суперпользователь, Ген. директор, Директор видят ВСЕ предметы ---
-    # Так как предметы глобальны, Директор тоже должен видеть все, чтобы назначать их учителям/экспертам
-    if user.is_superuser or profile.role in [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.DIRECTOR]:
-        return Subject.objects.all()
-
-    # Эксперт, Учитель и Кл. руководитель видят только свои назначенные предметы (M2M 'subjects')
-    if profile.role in [UserProfile.Role.EXPERT, UserProfile.Role.TEACHER, UserProfile.Role.HOMEROOM_TEACHER]:
-        return profile.subjects.all()
-
-    # --- ✨ УПРОЩЕНИЕ: Студент видит все предметы ---
-    # Логика показа предметов студенту сложна (зависит от тестов, QuestionCount).
-    # Проще разрешить видеть все предметы, а фильтровать уже при показе РЕЗУЛЬТАТОВ.
-    if profile.role == UserProfile.Role.STUDENT:
-        return Subject.objects.all() # Студент видит все предметы
-
-    # Остальные роли (если есть) не видят предметы
-    return Subject.objects.none()
+    return Subject.objects.filter(id__in=get_permission_scope(user).subject_ids)
 
 def get_accessible_classes(user):
     """
     Возвращает queryset классов, доступных пользователю.
-    (Добавлен импорт models)
+    Кл. руководитель видит свой класс и его параллель, Учитель — классы своей школы,
+    Ученик — свой класс, остальные роли — все классы доступных школ.
     """
-    if not user.is_authenticated:
-        return SchoolClass.objects.none()
-    profile = getattr(user, 'profile', None)
-    if not profile:
-        # Суперюзер видит все классы, остальные - ничего
-        return SchoolClass.objects.all() if user.is_superuser else SchoolClass.objects.none()
-
-    # Суперпользователь, Ген. директор, Директор, Эксперт видят все классы в доступных им школах
-    if user.is_superuser or profile.role in [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.DIRECTOR, UserProfile.Role.EXPERT]:
-        # Получаем школы, доступные этим ролям
-        schools = get_accessible_schools(user)
-        # Возвращаем все классы из этих школ
-        return SchoolClass.objects.filter(school__in=schools)
-
-    # Кл. руководитель видит только свой класс и его параллель (если есть)
-    if profile.role == UserProfile.Role.HOMEROOM_TEACHER and profile.homeroom_class:
-        # Используем Q-объекты для объединения условий (класс ИЛИ его родитель)
-        # Добавлена проверка на parent_id для оптимизации
-        query = models.Q(pk=profile.homeroom_class.pk)
-        if profile.homeroom_class.parent_id:
-             query |= models.Q(pk=profile.homeroom_class.parent_id)
-        return SchoolClass.objects.filter(query)
-
-    # Учитель видит все классы в своей основной школе
-    if profile.role == UserProfile.Role.TEACHER and profile.school:
-        return SchoolClass.objects.filter(school=profile.school)
-
-    # Ученик видит только свой класс
-    if profile.role == UserProfile.Role.STUDENT and profile.student and profile.student.school_class:
-        return SchoolClass.objects.filter(pk=profile.student.school_class.pk)
-
-    return SchoolClass.objects.none()
+    return SchoolClass.objects.filter(id__in=get_permission_scope(user).class_ids)
 
 def get_accessible_students(user):
     """
     Возвращает queryset учеников, доступных пользователю.
-    (УПРОЩЕНА ЛОГИКА ДЛЯ УЧИТЕЛЯ)
+    Ученик видит только себя, остальные — учеников доступных классов.
     """
-    if not user.is_authenticated:
-        return Student.objects.none()
-    profile = getattr(user, 'profile', None)
-    if not profile:
-        return Student.objects.all() if user.is_superuser else Student.objects.none()
-
-    # Суперпользователь, Ген. директор, Директор, Эксперт видят всех учеников в доступных им классах
-    if user.is_superuser or profile.role in [UserProfile.Role.GENERAL_DIRECTOR, UserProfile.Role.DIRECTOR, UserProfile.Role.EXPERT]:
-        # Получаем классы, доступные этим ролям
-        classes = get_accessible_classes(user)
-        # Возвращаем всех студентов из этих классов
-        return Student.objects.filter(school_class__in=classes)
-
-    # Кл. руководитель видит всех учеников своего класса
-    if profile.role == UserProfile.Role.HOMEROOM_TEACHER and profile.homeroom_class:
-        return Student.objects.filter(school_class=profile.homeroom_class)
-
-    # --- ✨ УПРОЩЕНИЕ: Учитель видит ВСЕХ учеников своей школы ---
-    # Логика с QuestionCount была сложной. Проще дать доступ ко всем в школе.
-    if profile.role == UserProfile.Role.TEACHER and profile.school:
-        return Student.objects.filter(school_class__school=profile.school)
-
-    # Ученик видит только себя
-    if profile.role == UserProfile.Role.STUDENT and profile.student:
-        return Student.objects.filter(pk=profile.student.pk)
-
-    return Student.objects.none()
\ No newline at end of file
+    scope = get_permission_scope(user)
+    if scope.student_class_ids is not None:
+        return Student.objects.filter(school_class_id__in=scope.student_class_ids)
+    if scope.own_student_id:
+        return Student.objects.filter(pk=scope.own_student_id)
+    return Student.objects.none()
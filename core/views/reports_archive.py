@@ -3,45 +3,28 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count, Sum
 
 from core.models import (
     AcademicYear, Quarter, School, SchoolClass
 )
 from core.views.permissions import get_accessible_schools
-from core.models import StudentResult
 
 # --- ARCHIVE AND COMPARISON ---
+# Счетчики берутся из готовой сводки ArchiveSummary (core/archive_summary.py)
 
 @login_required
 def archive_years_view(request):
-    """Архив по годам с улучшенной и исправленной статистикой"""
+    """Архив по годам: итоговые строки сводки за год (quarter=NULL)"""
     user = request.user
     accessible_schools = get_accessible_schools(user)
 
-    results_qs = StudentResult.objects.filter(
-        student__school_class__school__in=accessible_schools
-    )
-    year_ids_with_results = results_qs.values_list('gat_test__quarter__year_id', flat=True).distinct()
-
     years = AcademicYear.objects.filter(
-        id__in=year_ids_with_results
+        archive_summaries__quarter__isnull=True,
+        archive_summaries__school__in=accessible_schools
     ).annotate(
-        test_count=Count(
-            'quarters__gat_tests',
-            filter=Q(
-                quarters__gat_tests__results__isnull=False,
-                quarters__gat_tests__school__in=accessible_schools
-            ),
-            distinct=True
-        ),
-        student_count=Count(
-            'quarters__gat_tests__results__student',
-            filter=Q(
-                quarters__gat_tests__school__in=accessible_schools
-            ),
-            distinct=True
-        )
+        test_count=Sum('archive_summaries__test_count'),
+        student_count=Sum('archive_summaries__student_count')
     ).order_by('-start_date')
 
     context = {
@@ -52,27 +35,18 @@ def archive_years_view(request):
 
 @login_required
 def archive_quarters_view(request, year_id):
-    """Архив по четвертям с исправленной статистикой"""
+    """Архив по четвертям года"""
     year = get_object_or_404(AcademicYear, id=year_id)
     user = request.user
     accessible_schools = get_accessible_schools(user)
 
     quarters = Quarter.objects.filter(
         year=year,
-        gat_tests__results__isnull=False,
-        gat_tests__school__in=accessible_schools
+        archive_summaries__school__in=accessible_schools
     ).annotate(
-        test_count=Count(
-            'gat_tests',
-            filter=Q(gat_tests__school__in=accessible_schools),
-            distinct=True
-        ),
-        school_count=Count(
-            'gat_tests__school',
-            filter=Q(gat_tests__school__in=accessible_schools),
-            distinct=True
-        )
-    ).distinct().order_by('start_date')
+        test_count=Sum('archive_summaries__test_count'),
+        school_count=Count('archive_summaries__school', distinct=True)
+    ).order_by('start_date')
 
     context = {
         'year': year,
@@ -83,27 +57,18 @@ def archive_quarters_view(request, year_id):
 
 @login_required
 def archive_schools_view(request, quarter_id):
-    """Архив по школам с исправленной статистикой"""
+    """Архив по школам четверти"""
     quarter = get_object_or_404(Quarter, id=quarter_id)
     user = request.user
     accessible_schools = get_accessible_schools(user)
 
     schools = School.objects.filter(
-        classes__gat_tests__quarter=quarter,
-        classes__gat_tests__results__isnull=False,
+        archive_summaries__quarter=quarter,
         id__in=accessible_schools.values_list('id', flat=True)
     ).annotate(
-        class_count=Count(
-            'classes',
-            filter=Q(classes__gat_tests__quarter=quarter),
-            distinct=True
-        ),
-        student_count=Count(
-            'classes__students__results',
-            filter=Q(classes__students__results__gat_test__quarter=quarter),
-            distinct=True
-        )
-    ).distinct().order_by('name')
+        class_count=Count('archive_summaries'),
+        student_count=Sum('archive_summaries__student_count')
+    ).order_by('name')
 
     context = {
         'quarter': quarter,
@@ -127,13 +92,10 @@ def archive_classes_view(request, quarter_id, school_id):
             messages.error(request, "У вас нет доступа к архиву этой школы.")
             return redirect('core:results_archive')
 
-    parent_class_ids = SchoolClass.objects.filter(
-        school=school,
-        students__results__gat_test__quarter=quarter,
-        parent__isnull=False
-    ).values_list('parent_id', flat=True).distinct()
-
-    parent_classes = SchoolClass.objects.filter(id__in=parent_class_ids).order_by('name')
+    parent_classes = SchoolClass.objects.filter(
+        archive_summaries__quarter=quarter,
+        archive_summaries__school=school
+    ).order_by('name')
 
     context = {
         'quarter': quarter,
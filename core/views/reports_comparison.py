@@ -5,83 +5,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 from core.models import (
-    GatTest, Quarter, QuestionCount, SchoolClass, StudentResult
+    GatTest, Quarter, SchoolClass, Student
 )
 from core.views.permissions import get_accessible_schools
-
-# --- Вспомогательная функция (перенесена из reports.py) ---
-
-def _get_data_for_test(gat_test):
-    """
-    Вспомогательная функция для class_results_dashboard_view и compare_class_tests_view.
-    Получает данные по ОДНОМУ тесту.
-    """
-    if not gat_test:
-        return [], []
-
-    table_header = []
-
-    # ИСПРАВЛЕНИЕ: Логика получения заголовков должна использовать
-    # предметы из BankQuestion, связанных с тестом, а не все QuestionCount
-    
-    # 1. Получаем предметы ТОЛЬКО из этого теста
-    subjects_in_test = gat_test.subjects.all().order_by('name')
-    
-    # 2. Получаем родительский класс (параллель)
-    parent_class = gat_test.school_class
-    if parent_class and parent_class.parent:
-        parent_class = parent_class.parent
-        
-    if parent_class:
-        # 3. Получаем QuestionCounts для этой параллели
-        q_counts_map = {
-            qc.subject_id: qc.number_of_questions
-            for qc in QuestionCount.objects.filter(school_class=parent_class)
-        }
-        
-        # 4. Создаем заголовки, используя только предметы из теста
-        for subject in subjects_in_test:
-            q_count = q_counts_map.get(subject.id, 0)
-            table_header.append({
-                'subject': subject,
-                'questions': range(1, q_count + 1),
-                'questions_count': q_count,
-                'school_class': parent_class
-            })
-
-    student_results = StudentResult.objects.filter(
-        gat_test=gat_test
-    ).select_related('student__school_class__school')
-
-    students_data = []
-    for result in student_results:
-        # ИСПРАВЛЕНИЕ: Обрабатываем словарь ответов, а не список
-        subject_scores = {}
-        if isinstance(result.scores_by_subject, dict):
-            for subject_id_str, answers_dict in result.scores_by_subject.items():
-                try:
-                    subject_id = int(subject_id_str)
-                    correct = sum(1 for v in answers_dict.values() if v is True)
-                    subject_scores[subject_id] = {
-                        'score': correct
-                        # (Остальные данные можно добавить при необходимости)
-                    }
-                except (ValueError, TypeError):
-                    continue
-
-        students_data.append({
-            'student': result.student,
-            'result': result,
-            'total_score': result.total_score,
-            'subject_scores': subject_scores,
-            'position': 0
-        })
-
-    students_data.sort(key=lambda x: x['total_score'], reverse=True)
-    for idx, student_data in enumerate(students_data, 1):
-        student_data['position'] = idx
-
-    return students_data, table_header
+from core.report_datasets import report_data_for_test
 
 # --- Основные Views ---
 
@@ -113,29 +40,19 @@ def class_results_dashboard_view(request, quarter_id, class_id):
         quarter=quarter,
         test_number=gat_number,
         day=1
-    ).prefetch_related('questions__subject').first() # Используем prefetch для subjects
+    ).select_related('school_class__parent').first()
 
     test_day2 = GatTest.objects.filter(
         school_class=parent_class,
         quarter=quarter,
         test_number=gat_number,
         day=2
-    ).prefetch_related('questions__subject').first()
-
-    # Получаем данные, используя _get_data_for_test, которая ТЕПЕРЬ
-    # правильно фильтрует заголовки таблицы.
-    all_students_data_day1, table_header_day1 = _get_data_for_test(test_day1)
-    all_students_data_day2, table_header_day2 = _get_data_for_test(test_day2)
-
-    # (Фильтруем данные по студентам текущего класса)
-    students_data_day1 = [
-        data for data in all_students_data_day1
-        if data['student'].school_class == school_class
-    ]
-    students_data_day2 = [
-        data for data in all_students_data_day2
-        if data['student'].school_class == school_class
-    ]
+    ).select_related('school_class__parent').first()
+
+    # Данные тестов из кэша (core/report_datasets.py), только ученики текущего класса
+    class_students = Student.objects.filter(school_class=school_class)
+    students_data_day1, table_header_day1 = report_data_for_test(test_day1, class_students)
+    students_data_day2, table_header_day2 = report_data_for_test(test_day2, class_students)
 
     # (Собираем карту для итогового рейтинга)
     all_students_map = {}
@@ -209,34 +126,30 @@ def compare_class_tests_view(request, test1_id, test2_id):
             messages.error(request, "У вас нет доступа для сравнения этих тестов.")
             return redirect('core:dashboard')
 
-    student_ids_test1 = StudentResult.objects.filter(gat_test=test1).values_list('student_id', flat=True)
-    student_ids_test2 = StudentResult.objects.filter(gat_test=test2).values_list('student_id', flat=True)
-    all_student_ids = set(student_ids_test1) | set(student_ids_test2)
-
-    all_students = Student.objects.filter(id__in=all_student_ids).select_related('school_class__school').order_by('last_name_ru', 'first_name_ru')
+    # Данные обоих тестов из кэша (core/report_datasets.py)
+    students_data_1, table_header_1 = report_data_for_test(test1)
+    students_data_2, table_header_2 = report_data_for_test(test2)
+    scores1 = {data['student'].id: data['total_score'] for data in students_data_1}
+    scores2 = {data['student'].id: data['total_score'] for data in students_data_2}
 
-    results1_map = {res.student_id: res for res in StudentResult.objects.filter(gat_test=test1)}
-    results2_map = {res.student_id: res for res in StudentResult.objects.filter(gat_test=test2)}
+    students_by_id = {data['student'].id: data['student'] for data in students_data_1 + students_data_2}
+    all_students = sorted(students_by_id.values(), key=lambda student: (student.last_name_ru, student.first_name_ru))
 
-    # Используем total_score, который уже посчитан
-    full_scores1 = [{'student': student, 'score': results1_map[student.id].total_score, 'present': True} for student in all_students if student.id in results1_map]
-    full_scores2 = [{'student': student, 'score': results2_map[student.id].total_score, 'present': True} for student in all_students if student.id in results2_map]
-    
-    sorted_scores1 = sorted(full_scores1, key=lambda x: x['score'], reverse=True)
-    sorted_scores2 = sorted(full_scores2, key=lambda x: x['score'], reverse=True)
+    sorted_scores1 = sorted((s for s in all_students if s.id in scores1), key=lambda s: scores1[s.id], reverse=True)
+    sorted_scores2 = sorted((s for s in all_students if s.id in scores2), key=lambda s: scores2[s.id], reverse=True)
 
-    rank_map1 = {item['student'].id: rank + 1 for rank, item in enumerate(sorted_scores1)}
-    rank_map2 = {item['student'].id: rank + 1 for rank, item in enumerate(sorted_scores2)}
+    rank_map1 = {student.id: rank + 1 for rank, student in enumerate(sorted_scores1)}
+    rank_map2 = {student.id: rank + 1 for rank, student in enumerate(sorted_scores2)}
 
     comparison_results = []
     for student in all_students:
-        is_present1 = student.id in results1_map
-        is_present2 = student.id in results2_map
+        is_present1 = student.id in scores1
+        is_present2 = student.id in scores2
 
         rank1 = rank_map1.get(student.id)
         rank2 = rank_map2.get(student.id)
-        score1 = results1_map[student.id].total_score if is_present1 else None
-        score2 = results2_map[student.id].total_score if is_present2 else None
+        score1 = scores1.get(student.id)
+        score2 = scores2.get(student.id)
 
         avg_rank = (rank1 + rank2) / 2 if is_present1 and is_present2 else float('inf')
         progress = score2 - score1 if is_present1 and is_present2 else None
@@ -257,9 +170,6 @@ def compare_class_tests_view(request, test1_id, test2_id):
         x['avg_rank'] if x['avg_rank'] != '—' else float('inf')
     ))
 
-    students_data_1, table_header_1 = _get_data_for_test(test1)
-    students_data_2, table_header_2 = _get_data_for_test(test2)
-
     context = {
         'results': comparison_results,
         'test1': test1,
@@ -300,15 +210,10 @@ def combined_class_report_view(request, quarter_id, parent_class_id):
     test_gat1 = GatTest.objects.filter(school_class=parent_class, quarter=quarter, test_number=1).first()
     test_gat2 = GatTest.objects.filter(school_class=parent_class, quarter=quarter, test_number=2).first()
 
-    student_ids_in_parallel = set(Student.objects.filter(
-        school_class__parent=parent_class
-    ).values_list('id', flat=True))
-
-    all_data_gat1, table_header_gat1 = _get_data_for_test(test_gat1)
-    students_data_gat1 = [data for data in all_data_gat1 if data['student'].id in student_ids_in_parallel]
-
-    all_data_gat2, table_header_gat2 = _get_data_for_test(test_gat2)
-    students_data_gat2 = [data for data in all_data_gat2 if data['student'].id in student_ids_in_parallel]
+    # Данные тестов из кэша (core/report_datasets.py), только ученики параллели
+    parallel_students = Student.objects.filter(school_class__parent=parent_class)
+    students_data_gat1, table_header_gat1 = report_data_for_test(test_gat1, parallel_students)
+    students_data_gat2, table_header_gat2 = report_data_for_test(test_gat2, parallel_students)
 
     all_students_map = {}
     for data in students_data_gat1:
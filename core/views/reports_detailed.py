@@ -3,27 +3,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from django.template.loader import render_to_string
 from django.urls import reverse
 from django.db.models import Q
-from openpyxl import Workbook
-from weasyprint import HTML
 
 from core.models import (
-    AcademicYear, GatTest, QuestionCount, School,
-    SchoolClass, Student, StudentResult, Subject
+    AcademicYear, GatTest, School,
+    SchoolClass, StudentResult, Subject
 )
 from core.views.permissions import get_accessible_schools
-from core import utils
+from core.services import refresh_results_derived_data
+from core.jobs import enqueue_job
+from core.xlsx_export import streaming_xlsx_response
+from core.report_datasets import report_data_for_test, report_table_header
 
 # --- DETAILED RESULTS ---
 
-def get_detailed_results_data(test_number, request_get, request_user):
-    """
-    Готовит данные для детального рейтинга с улучшенной логикой фильтрации
-    и ИСПРАВЛЕННЫМ расчетом заголовков таблицы.
-    """
+def resolve_detailed_results_test(test_number, request_get, request_user):
+    """Тест, по которому строится детальный рейтинг (с учетом фильтров и прав), или None."""
     year_id = request_get.get('year')
     quarter_id = request_get.get('quarter')
     school_id = request_get.get('school')
@@ -42,7 +38,7 @@ def get_detailed_results_data(test_number, request_get, request_user):
                 if not request_user.is_superuser:
                     accessible_schools = get_accessible_schools(request_user)
                     if specific_test.school not in accessible_schools:
-                        return [], [], None
+                        return None
                 latest_test = specific_test
         except (ValueError, GatTest.DoesNotExist):
             pass
@@ -67,84 +63,19 @@ def get_detailed_results_data(test_number, request_get, request_user):
 
         latest_test = tests_qs.order_by('-test_date').first()
 
-    if not latest_test:
-        return [], [], None
+    return latest_test
 
-    student_results = StudentResult.objects.filter(
-        gat_test=latest_test
-    ).select_related('student__school_class', 'gat_test')
-
-    # --- ✨✨✨ ИСПРАВЛЕНИЕ ЗАГОЛОВКОВ ТАБЛИЦЫ ✨✨✨ ---
-    table_header = []
-    
-    if latest_test and latest_test.school_class:
-        # 1. Получаем родительский класс (параллель), e.g., '10'
-        parent_class = latest_test.school_class
-        if parent_class.parent:
-            parent_class = parent_class.parent # Убедимся, что это точно параллель
-
-        # 2. Получаем предметы ТОЛЬКО ИЗ САМОГО ТЕСТА (через M2M к BankQuestion)
-        subjects_for_this_test = latest_test.subjects.all().order_by('name')
-
-        # 3. Получаем ВСЕ QuestionCounts для этой параллели ОДНИМ запросом
-        question_counts_map = {
-            qc.subject_id: qc.number_of_questions
-            for qc in QuestionCount.objects.filter(school_class=parent_class)
-        }
-
-        # 4. Cоздаем 'table_header' ТОЛЬКО для предметов из шага 2
-        for subject in subjects_for_this_test:
-            # 5. Берем кол-во вопросов из карты (map)
-            q_count = question_counts_map.get(subject.id, 0) # 0, если не найдено
-
-            table_header.append({
-                'subject': subject,
-                'questions': range(1, q_count + 1),
-                'questions_count': q_count,
-                'school_class': parent_class
-            })
-    # --- ✨✨✨ КОНЕЦ ИСПРАВЛЕНИЯ ✨✨✨ ---
-
-    results_map = {res.student_id: res for res in student_results}
-    
-    students = Student.objects.filter(
-        id__in=results_map.keys()
-    ).select_related('school_class', 'school_class__school')
-
-    students_data = []
-    for student in students:
-        result = results_map.get(student.id)
-        total_score = result.total_score if result else 0
-        subject_scores = {}
-
-        if result and isinstance(result.scores_by_subject, dict):
-            for subject_id_str, answers_dict in result.scores_by_subject.items():
-                try:
-                    subject_id = int(subject_id_str)
-                    # ИСПРАВЛЕНИЕ: Обрабатываем словарь, а не список
-                    correct_answers = sum(1 for v in answers_dict.values() if v is True)
-                    total_questions = len(answers_dict)
-                    
-                    subject_scores[subject_id] = {
-                        'score': correct_answers,
-                        'total_questions': total_questions, # Это кол-во ответов (может не совпадать с QuestionCount)
-                        'correct_answers': correct_answers
-                    }
-                except (ValueError, TypeError):
-                    continue
 
-        students_data.append({
-            'student': student,
-            'result': result,
-            'total_score': total_score,
-            'subject_scores': subject_scores,
-            'position': 0
-        })
-
-    students_data.sort(key=lambda x: x['total_score'], reverse=True)
-    for idx, student_data in enumerate(students_data, 1):
-        student_data['position'] = idx
+def get_detailed_results_data(test_number, request_get, request_user):
+    """
+    Готовит данные для детального рейтинга: тест по фильтрам и его
+    закэшированные данные отчета (core/report_datasets.py).
+    """
+    latest_test = resolve_detailed_results_test(test_number, request_get, request_user)
+    if not latest_test:
+        return [], [], None
 
+    students_data, table_header = report_data_for_test(latest_test)
     return students_data, table_header, latest_test
 
 
@@ -240,7 +171,9 @@ def student_result_delete_view(request, pk):
         student_name = str(result.student)
         test_info = f"GAT-{test_number}"
         try:
+            gat_test = result.gat_test
             result.delete()
+            refresh_results_derived_data(gat_test)
             messages.success(request, f'Результат для "{student_name}" (тест {test_info}) был успешно удален.')
             
             # Редирект обратно на страницу теста
@@ -263,25 +196,24 @@ def student_result_delete_view(request, pk):
 
 @login_required
 def export_detailed_results_excel(request, test_number):
-    """Экспорт результатов в Excel с улучшенным форматированием"""
-    students_data, table_header, test_info = get_detailed_results_data(
-        test_number, request.GET, request.user
-    )
+    """
+    Экспорт результатов в Excel. Результаты читаются курсором в порядке рейтинга
+    и пишутся в книгу построчно, поэтому память не растет с числом учеников.
+    """
+    latest_test = resolve_detailed_results_test(test_number, request.GET, request.user)
+    student_results = StudentResult.objects.none()
+    if latest_test:
+        student_results = (
+            StudentResult.objects.filter(gat_test=latest_test)
+            .select_related('student__school_class__school')
+            .order_by('-total_score', 'student__school_class', 'student__last_name_ru', 'student__first_name_ru')
+        )
 
-    if not students_data:
+    if not student_results.exists():
         messages.warning(request, "Нет данных для экспорта.")
         return redirect('core:detailed_results_list', test_number=test_number)
 
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f"GAT-{test_number}_results_{test_info.test_date if test_info else ''}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = f'GAT-{test_number} Результаты'
-
+    table_header = report_table_header(latest_test)
     headers = ["№", "ID", "ФИО Студента", "Класс", "Школа"]
     for header in table_header:
         subject_name = header['subject'].abbreviation or header['subject'].name[:3].upper()
@@ -290,71 +222,44 @@ def export_detailed_results_excel(request, test_number):
             headers.append(f"{subject_name}_{i}")
     headers.extend(["Общий балл", "Позиция в рейтинге"])
 
-    sheet.append(headers)
-
-    for idx, data in enumerate(students_data, 1):
-        row = [
-            idx,
-            data['student'].student_id,
-            str(data['student']),
-            data['student'].school_class.name,
-            data['student'].school_class.school.name
-        ]
-
-        result = data.get('result')
-        if result and isinstance(result.scores_by_subject, dict):
+    def rows():
+        for idx, result in enumerate(student_results.iterator(chunk_size=2000), 1):
+            student = result.student
+            row = [
+                idx,
+                student.student_id,
+                str(student),
+                student.school_class.name,
+                student.school_class.school.name
+            ]
+            scores = result.scores_by_subject if isinstance(result.scores_by_subject, dict) else {}
             for header in table_header:
-                subject_id = str(header['subject'].id)
-                answers_dict = result.scores_by_subject.get(subject_id, {})
-                q_count = header['questions_count']
-                
+                answers_dict = scores.get(str(header['subject'].id), {})
                 # Заполняем по номерам вопросов от 1 до q_count
-                for i in range(1, q_count + 1):
-                    answer = answers_dict.get(str(i)) # Ищем '1', '2' и т.д.
+                for i in range(1, header['questions_count'] + 1):
+                    answer = answers_dict.get(str(i))  # Ищем '1', '2' и т.д.
                     if answer is True:
                         row.append(1)
                     elif answer is False:
                         row.append(0)
                     else:
-                        row.append('') # Пусто, если ответа нет
-        else:
-            for header in table_header:
-                row.extend([''] * header['questions_count'])
+                        row.append('')  # Пусто, если ответа нет
+            row.extend([result.total_score, idx])
+            yield row
 
-        row.extend([data['total_score'], data['position']])
-        sheet.append(row)
-
-    workbook.save(response)
-    return response
+    filename = f"GAT-{test_number}_results_{latest_test.test_date}.xlsx"
+    return streaming_xlsx_response(filename, f'GAT-{test_number} Результаты', [headers], rows())
 
 @login_required
 def export_detailed_results_pdf(request, test_number):
-    """Экспорт результатов в PDF с улучшенным оформлением"""
-    students_data, table_header, test_info = get_detailed_results_data(
-        test_number, request.GET, request.user
+    """Ставит экспорт детального рейтинга в PDF в очередь фоновых задач."""
+    job = enqueue_job(
+        'detailed_results_pdf', request.user,
+        params={
+            'test_number': test_number,
+            'query': request.GET.urlencode(),
+            'base_url': request.build_absolute_uri('/'),
+        },
+        title=f'Детальный рейтинг GAT-{test_number} (PDF)',
     )
-
-    if not students_data:
-        messages.warning(request, "Нет данных для экспорта.")
-        return redirect('core:detailed_results_list', test_number=test_number)
-
-    context = {
-        'title': f'Детальный рейтинг GAT-{test_number}',
-        'students_data': students_data,
-        'table_header': table_header,
-        'test_info': test_info,
-        'export_date': utils.get_current_date(), # Предполагая, что у вас есть 'utils'
-        'total_students': len(students_data)
-    }
-
-    html_string = render_to_string('results/detailed_results_pdf.html', context)
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"GAT-{test_number}_results_{test_info.test_date if test_info else ''}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    try:
-        HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(response)
-        return response
-    except Exception as e:
-        messages.error(request, f"Ошибка при создании PDF: {str(e)}")
-        return redirect('core:detailed_results_list', test_number=test_number)
\ No newline at end of file
+    return redirect('core:job_detail', pk=job.pk)
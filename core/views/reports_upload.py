@@ -11,6 +11,7 @@ from accounts.models import UserProfile
 
 from core.forms import UploadFileForm
 from core import services
+from core.results_import_service import bulk_process_student_results_upload
 from core.models import Notification, SchoolClass
 
 @login_required
@@ -30,7 +31,7 @@ def upload_results_view(request):
             excel_file = request.FILES['file']
 
             try:
-                success, report_data = services.process_student_results_upload(gat_test, excel_file)
+                success, report_data = bulk_process_student_results_upload(gat_test, excel_file)
                 print(f"--- GAT UPLOAD REPORT: {report_data}")
 
                 if success:
@@ -8,9 +8,9 @@ from django.http import JsonResponse
 from django.db.models import Avg, Sum, Count, Q
 
 # Импорты из вашего проекта
-from ..models import StudentResult, Subject, SchoolClass, GatTest, QuestionCount # Добавлен QuestionCount
+from ..models import StudentResult, Subject, SchoolClass, GatTest, SubjectResultRollup
+from ..rollups import grade_counts, overall_grade_distribution
 from ..forms import StatisticsFilterForm
-from .. import utils
 from .permissions import get_accessible_schools
 from accounts.models import UserProfile
 
@@ -97,7 +97,7 @@ def statistics_view(request):
         accessible_schools = get_accessible_schools(user)
         results_qs = StudentResult.objects.filter(
             student__school_class__school__in=accessible_schools
-        ).select_related('student__school_class__school', 'student__school_class__parent', 'gat_test__quarter__year', 'gat_test__school_class') # Добавили prefetch
+        )
 
         if selected_quarters: results_qs = results_qs.filter(gat_test__quarter__in=selected_quarters)
         if selected_schools: results_qs = results_qs.filter(student__school_class__school__in=selected_schools)
@@ -130,18 +130,20 @@ def statistics_view(request):
             context['has_results'] = True
             context['total_tests_taken'] = results_qs.count()
 
+            # Суммы берем из агрегатов (тест, класс, предмет), а не из JSON каждого ученика
+            rollups_qs = SubjectResultRollup.objects.filter(school_class__school__in=accessible_schools)
+            if selected_quarters: rollups_qs = rollups_qs.filter(gat_test__quarter__in=selected_quarters)
+            if selected_schools: rollups_qs = rollups_qs.filter(school_class__school__in=selected_schools)
+            if final_class_ids: rollups_qs = rollups_qs.filter(school_class_id__in=final_class_ids)
+            if selected_test_numbers: rollups_qs = rollups_qs.filter(gat_test__test_number__in=selected_test_numbers)
+            if selected_days: rollups_qs = rollups_qs.filter(gat_test__day__in=selected_days)
+
             # 1. Определяем финальный список предметов для анализа
             final_subjects_for_analysis = Subject.objects.none()
             if accessible_subjects_qs.exists():
                 final_subjects_for_analysis = accessible_subjects_qs # Используем результат фильтрации
             elif not is_expert: # Если Админ/Директор и предметы не выбраны, берем все из результатов
-                all_subject_ids_in_results = set()
-                # Оптимизация: используем values_list для получения словарей
-                scores_list = results_qs.values_list('scores_by_subject', flat=True)
-                for scores_dict in scores_list:
-                    if isinstance(scores_dict, dict):
-                        all_subject_ids_in_results.update(int(sid) for sid in scores_dict.keys())
-                final_subjects_for_analysis = Subject.objects.filter(id__in=all_subject_ids_in_results)
+                final_subjects_for_analysis = Subject.objects.filter(id__in=rollups_qs.values('subject_id'))
             # Если is_expert и accessible_subjects_qs пуст, то final_subjects_for_analysis останется .none()
 
             # Если предметов для анализа нет, выходим
@@ -150,86 +152,34 @@ def statistics_view(request):
             else:
                 subject_map = {s.id: s.name for s in final_subjects_for_analysis}
                 allowed_subject_ids_int = set(subject_map.keys())
-
-                # 2. Загружаем QuestionCounts эффективно
-                # Находим все уникальные ID параллелей из результатов
-                parallel_ids_in_results = set()
-                class_ids_in_results = results_qs.values_list('student__school_class_id', flat=True).distinct()
-                classes_info = SchoolClass.objects.filter(id__in=class_ids_in_results).select_related('parent')
-                class_to_parallel_map = {}
-                for cls in classes_info:
-                    p_id = cls.parent_id if cls.parent_id else cls.id
-                    parallel_ids_in_results.add(p_id)
-                    class_to_parallel_map[cls.id] = p_id
-
-                # Загружаем QuestionCounts для этих параллелей и нужных предметов
-                q_counts_qs = QuestionCount.objects.filter(
-                    school_class_id__in=parallel_ids_in_results,
-                    subject_id__in=allowed_subject_ids_int # Только нужные предметы
+                rollups_qs = rollups_qs.filter(subject_id__in=allowed_subject_ids_int)
+
+                # 2. Успеваемость по предметам и распределение оценок по классам (O(групп))
+                subject_performance = defaultdict(lambda: {'correct': 0, 'total_possible': 0})
+                grade_distribution_report = defaultdict(lambda: defaultdict(lambda: {'grades': defaultdict(int), 'correct_total': 0, 'possible_total': 0}))
+                for row in rollups_qs.values('subject_id', 'school_class__name', 'students', 'correct', 'question_count', 'grade_histogram'):
+                    possible = row['question_count'] * row['students']
+                    subject_performance[row['subject_id']]['correct'] += row['correct']
+                    subject_performance[row['subject_id']]['total_possible'] += possible
+                    if row['question_count'] > 0:
+                        class_data = grade_distribution_report[subject_map[row['subject_id']]][row['school_class__name']]
+                        for grade, count in grade_counts(row['grade_histogram']).items():
+                            class_data['grades'][grade] += count
+                        class_data['correct_total'] += row['correct']
+                        class_data['possible_total'] += possible
+
+                # 3. Итоговая оценка ученика по всем выбранным предметам (по матрицам ответов)
+                school_summary_grades, total_overall_correct, total_overall_possible = overall_grade_distribution(
+                    (
+                        (gat_test_id, student_id, parent_id or class_id)
+                        for gat_test_id, student_id, class_id, parent_id in results_qs.values_list(
+                            'gat_test_id', 'student_id', 'student__school_class_id', 'student__school_class__parent_id'
+                        )
+                    ),
+                    allowed_subject_ids_int
                 )
-                # Создаем карту: {parallel_id: {subject_id: count}}
-                q_counts_map = defaultdict(dict)
-                for qc in q_counts_qs:
-                    q_counts_map[qc.school_class_id][qc.subject_id] = qc.number_of_questions
-
-                # 3. Инициализация словарей для расчетов
-                subject_performance = defaultdict(lambda: {'correct': 0, 'total_possible': 0}) # total -> total_possible
-                school_summary_grades = defaultdict(int)
-                grade_distribution_report = defaultdict(lambda: defaultdict(lambda: {'grades_list': [], 'percentage_list': [], 'correct_total': 0, 'possible_total': 0}))
-                total_overall_correct, total_overall_possible = 0, 0
-
-                # 4. Основной цикл обработки результатов
-                for result in results_qs:
-                    class_name = result.student.school_class.name
-                    # Находим ID параллели для текущего ученика
-                    current_parallel_id = class_to_parallel_map.get(result.student.school_class_id)
-                    total_correct_student, total_possible_student_test = 0, 0 # Макс. балл для ЭТОГО теста
-
-                    if not isinstance(result.scores_by_subject, dict) or not current_parallel_id: continue
-
-                    # Итерация по предметам, которые ДОЛЖНЫ БЫТЬ в анализе
-                    for subject_id in allowed_subject_ids_int:
-                        subject_id_str = str(subject_id)
-                        subject_name = subject_map[subject_id]
-                        # Получаем кол-во вопросов для этого предмета и параллели
-                        q_count_for_subject = q_counts_map.get(current_parallel_id, {}).get(subject_id, 0)
-
-                        # Получаем ответы ученика (может быть None)
-                        answers = result.scores_by_subject.get(subject_id_str) # answers is {'1': True, ...} or None
-
-                        correct = 0
-                        if isinstance(answers, dict):
-                            correct = sum(1 for answer in answers.values() if answer is True)
-
-                        # Обновляем общую статистику по предмету
-                        subject_performance[subject_id]['correct'] += correct
-                        subject_performance[subject_id]['total_possible'] += q_count_for_subject # Суммируем макс. балл
-
-                        # Обновляем балл ученика для этого теста
-                        total_correct_student += correct
-                        total_possible_student_test += q_count_for_subject # Суммируем макс. балл для теста
-
-                        # Расчеты для таблицы распределения оценок
-                        if q_count_for_subject > 0:
-                            # Процент считаем от МАКСИМАЛЬНО возможного балла
-                            percentage = (correct / q_count_for_subject) * 100
-                            grade = utils.calculate_grade_from_percentage(percentage)
-                            grade_distribution_report[subject_name][class_name]['grades_list'].append(grade)
-                            grade_distribution_report[subject_name][class_name]['percentage_list'].append(percentage)
-                            # Накапливаем для расчета среднего балла в таблице
-                            grade_distribution_report[subject_name][class_name]['correct_total'] += correct
-                            grade_distribution_report[subject_name][class_name]['possible_total'] += q_count_for_subject
-
-
-                    # Расчет общей оценки ученика за тест (относительно макс. балла теста)
-                    if total_possible_student_test > 0:
-                        overall_percentage = (total_correct_student / total_possible_student_test) * 100
-                        overall_grade = utils.calculate_grade_from_percentage(overall_percentage)
-                        school_summary_grades[overall_grade] += 1
-                        total_overall_correct += total_correct_student
-                        total_overall_possible += total_possible_student_test
 
-                # 5. Обработка данных для KPI и графика успеваемости по предметам
+                # 4. Обработка данных для KPI и графика успеваемости по предметам
                 subject_averages = []
                 for subject_id in allowed_subject_ids_int:
                     data = subject_performance[subject_id]
@@ -251,26 +201,26 @@ def statistics_view(request):
                 context['average_score'] = round((total_overall_correct / total_overall_possible) * 100, 1) if total_overall_possible > 0 else 0
                 context['school_summary_report'] = {'grades': school_summary_grades, 'average_score': context['average_score']}
 
-                # 6. Обработка данных для "Отчета по успеваемости"
+                # 5. Обработка данных для "Отчета по успеваемости"
                 processed_grade_dist_report = {}
                 for subject_name, class_data in grade_distribution_report.items():
                     processed_grade_dist_report[subject_name] = {}
-                    total_grades_list, total_correct_subj, total_possible_subj = [], 0, 0
+                    total_grades, total_correct_subj, total_possible_subj = defaultdict(int), 0, 0
 
                     for class_name, data in class_data.items():
-                        grades_list = data['grades_list']
                         correct_class, possible_class = data['correct_total'], data['possible_total']
                         processed_grade_dist_report[subject_name][class_name] = {
-                            'grades': {grade: grades_list.count(grade) for grade in context['grade_range']},
+                            'grades': {grade: data['grades'].get(grade, 0) for grade in context['grade_range']},
                             # Средний балл считаем от МАКСИМАЛЬНОГО
                             'average_score': round((correct_class / possible_class) * 100, 1) if possible_class > 0 else 0
                         }
-                        total_grades_list.extend(grades_list)
+                        for grade, count in data['grades'].items():
+                            total_grades[grade] += count
                         total_correct_subj += correct_class
                         total_possible_subj += possible_class
 
                     processed_grade_dist_report[subject_name]['Итог'] = {
-                        'grades': {grade: total_grades_list.count(grade) for grade in context['grade_range']},
+                        'grades': {grade: total_grades.get(grade, 0) for grade in context['grade_range']},
                         # Средний балл считаем от МАКСИМАЛЬНОГО
                         'average_score': round((total_correct_subj / total_possible_subj) * 100, 1) if total_possible_subj > 0 else 0
                     }
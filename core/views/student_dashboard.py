@@ -3,10 +3,10 @@
 import json
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from collections import defaultdict
 
-from ..models import StudentResult, Subject
+from ..models import Subject
 from .. import utils
+from ..ranks import ensure_result_ranks
 
 @login_required
 def student_dashboard_view(request):
@@ -30,60 +30,23 @@ def student_dashboard_view(request):
             'has_results': False,
         })
     
-    test_ids = [r.gat_test_id for r in student_results_qs]
-    
-    # Загружаем все результаты по нужным тестам для расчёта рангов
-    all_results_for_tests = StudentResult.objects.filter(gat_test_id__in=test_ids).select_related('student__school_class__school')
-    
-    # Группируем баллы по тесту, классу и школе для эффективности
-    scores_by_test = defaultdict(list)
-    scores_by_class = defaultdict(lambda: defaultdict(list))
-    scores_by_school = defaultdict(lambda: defaultdict(list))
-
-    for res in all_results_for_tests:
-        test_id = res.gat_test_id
-        class_id = res.student.school_class_id
-        school_id = res.student.school_class.school_id
-        score = res.total_score
-        
-        scores_by_test[test_id].append(score)
-        scores_by_class[test_id][class_id].append(score)
-        scores_by_school[test_id][school_id].append(score)
-    
-    # Сортируем все списки один раз для быстрого нахождения ранга
-    for test_id in scores_by_test:
-        scores_by_test[test_id].sort(reverse=True)
-        for class_id in scores_by_class[test_id]:
-            scores_by_class[test_id][class_id].sort(reverse=True)
-        for school_id in scores_by_school[test_id]:
-            scores_by_school[test_id][school_id].sort(reverse=True)
+    # Ранги хранятся в самих результатах (см. core/ranks.py)
+    if ensure_result_ranks(student_results_qs):
+        student_results_qs = student_results_qs.all()
 
     detailed_results_data = []
     subject_map = {s.id: s.name for s in Subject.objects.all()}
 
     for result in student_results_qs:
-        gat_test = result.gat_test
-        student_score = result.total_score
-        
-        # Получаем нужные списки для этого теста
-        class_scores = scores_by_class.get(gat_test.id, {}).get(student.school_class_id, [])
-        school_scores = scores_by_school.get(gat_test.id, {}).get(student.school_class.school_id, [])
-        parallel_scores = scores_by_test.get(gat_test.id, [])
-        
-        # Находим ранг по каждому списку с помощью index()
-        try: class_rank = class_scores.index(student_score) + 1
-        except ValueError: class_rank = None
-        try: school_rank = school_scores.index(student_score) + 1
-        except ValueError: school_rank = None
-        try: parallel_rank = parallel_scores.index(student_score) + 1
-        except ValueError: parallel_rank = None
-            
         best_subject, worst_subject = None, None
         subject_performance, processed_scores = [], []
 
         if isinstance(result.scores_by_subject, dict):
             for subj_id_str, answers in result.scores_by_subject.items():
                 if not answers: continue
+                if isinstance(answers, dict):
+                    # Формат загрузчика: {"номер вопроса": true/false}
+                    answers = [answers[k] for k in sorted(answers, key=lambda k: int(k) if str(k).isdigit() else 0)]
                 total_q, correct_q = len(answers), sum(answers)
                 
                 try:
@@ -105,9 +68,9 @@ def student_dashboard_view(request):
         # Добавляем все новые ранги в словарь
         detailed_results_data.append({
             'result': result,
-            'class_rank': class_rank, 'class_total': len(class_scores),
-            'school_rank': school_rank, 'school_total': len(school_scores),
-            'parallel_rank': parallel_rank, 'parallel_total': len(parallel_scores),
+            'class_rank': result.class_rank, 'class_total': result.class_total,
+            'school_rank': result.school_rank, 'school_total': result.school_total,
+            'parallel_rank': result.parallel_rank, 'parallel_total': result.parallel_total,
             'best_subject': best_subject, 'worst_subject': worst_subject,
             'processed_scores': sorted(processed_scores, key=lambda x: x['percentage'], reverse=True),
         })
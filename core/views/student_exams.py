@@ -1,15 +1,16 @@
 # D:\GAT\core\views\student_exams.py (ПОЛНАЯ ИСПРАВЛЕННАЯ ВЕРСИЯ)
 
+import io
 import random
 import json
 from collections import defaultdict
+from itertools import groupby
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, FileResponse
 from django.views.decorators.http import require_POST
 from django.template.loader import render_to_string
-from django.http import HttpResponse
 import weasyprint
 from django.conf import settings
 
@@ -22,7 +23,11 @@ from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 
 # --- Импортируем модели ---
-from ..models import StudentResult, BankQuestion, Subject, GatTest
+from ..models import StudentResult, BankQuestion, BookletVariant, Subject, GatTest
+from ..jobs import enqueue_job
+from ..booklet_cache import get_cached_booklet, get_or_build_booklet, storage as booklet_storage
+from ..image_derivatives import print_image_path, width_fraction
+from ..booklet_variants import apply_variant, booklet_questions
 
 
 # =============================================================================
@@ -165,14 +170,12 @@ def save_booklet_order(request, test_pk):
 # --- EXPORT TO WORD (DOCX) ---
 # =============================================================================
 
-@login_required
-def export_booklet_docx(request, test_pk):
+def build_booklet_docx(test, variant=None):
     """
-    Экспорт теста в MS Word с использованием секционных разрывов.
-    Создает структуру: Шапка (1 колонка) -> Разрыв -> Вопросы (2 колонки).
+    Собирает буклет теста в MS Word с использованием секционных разрывов.
+    Создает структуру: Шапка (1 колонка) -> Разрыв -> Вопросы (2 колонки). Возвращает bytes.
+    variant (BookletVariant) — порядок вопросов и вариантов ответа этого варианта.
     """
-    test = get_object_or_404(GatTest, pk=test_pk)
-    
     doc = Document()
     
     # --- НАСТРОЙКА СТИЛЕЙ ---
@@ -191,6 +194,8 @@ def export_booklet_docx(request, test_pk):
     
     # Текст шапки
     header_text = f"СИНФИ {test.school_class.name}   |   ТЕСТИ УМУМӢ {test.test_number}   |   {test.test_date.year}"
+    if variant is not None:
+        header_text += f"   |   ВАРИАНТИ {variant.name}"
     header_para = doc.add_paragraph()
     header_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
     run = header_para.add_run(header_text)
@@ -208,32 +213,15 @@ def export_booklet_docx(request, test_pk):
     # Применяем магию XML для включения 2-х колонок в этой секции
     set_columns(new_section, 2)
 
-    # --- ПОДГОТОВКА ДАННЫХ (СОРТИРОВКА) ---
-    raw_questions = list(test.questions.all())
-    order_map = {qid: idx for idx, qid in enumerate(test.question_order or [])}
-    
-    from collections import defaultdict
-    questions_by_subject = defaultdict(list)
-    for q in raw_questions:
-        questions_by_subject[q.subject].append(q)
-
-    subject_order_map = {}
-    for subject, q_list in questions_by_subject.items():
-        if q_list:
-            min_index = min([order_map.get(q.id, 999999) for q in q_list])
-        else:
-            min_index = 999999
-        subject_order_map[subject] = min_index
-
-    sorted_subjects = sorted(
-        questions_by_subject.keys(),
-        key=lambda s: (subject_order_map.get(s, 999999), s.name)
-    )
+    # --- ПОДГОТОВКА ДАННЫХ (ПОРЯДОК БУКЛЕТА ИЛИ ВАРИАНТА) ---
+    questions = booklet_questions(test)
+    if variant is not None:
+        questions = apply_variant(questions, variant)
 
     q_counter = 1
 
     # --- ГЕНЕРАЦИЯ КОНТЕНТА ВОПРОСОВ ---
-    for subject in sorted_subjects:
+    for subject, subject_questions in groupby(questions, key=lambda q: q.subject):
         # 1. Заголовок предмета
         p_subj = doc.add_paragraph()
         p_subj.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -244,9 +232,6 @@ def export_booklet_docx(request, test_pk):
         p_subj.paragraph_format.space_after = Pt(6)
         p_subj.paragraph_format.keep_with_next = True # Приклеить к следующему
 
-        subject_questions = questions_by_subject[subject]
-        subject_questions.sort(key=lambda q: order_map.get(q.id, 999999))
-
         for q in subject_questions:
             # 2. Текст вопроса
             p_q = doc.add_paragraph()
@@ -257,20 +242,20 @@ def export_booklet_docx(request, test_pk):
             run_num.bold = True
             p_q.add_run(q.text)
             
-            # 3. Картинка (если есть)
+            # 3. Картинка (если есть): печатная копия, ширина — доля колонки из image_width
             if q.question_image:
                 try:
-                    doc.add_picture(q.question_image.path, width=Mm(80)) # Ширина под колонку
+                    doc.add_picture(print_image_path(q.question_image, q.image_width), width=Mm(80 * width_fraction(q.image_width)))
                     last_p = doc.paragraphs[-1]
                     last_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
                     last_p.paragraph_format.keep_with_next = True
                 except Exception:
                     pass
 
-            # 4. Варианты ответов
-            options = q.options.all().order_by('order', 'id')
-            
-            if options.count() == 4:
+            # 4. Варианты ответов (в порядке варианта буклета)
+            options = q.fixed_options
+
+            if len(options) == 4:
                 # Таблица 2x2 для аккуратности
                 table = doc.add_table(rows=2, cols=2)
                 table.autofit = False 
@@ -301,73 +286,88 @@ def export_booklet_docx(request, test_pk):
             spacer = doc.add_paragraph()
             spacer.paragraph_format.space_after = Pt(6)
 
-    # --- ОТПРАВКА ФАЙЛА ---
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-    response['Content-Disposition'] = f'attachment; filename=booklet_{test.pk}.docx'
-    doc.save(response)
-    return response
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
 
-@login_required
-def download_booklet_pdf(request, test_pk):
-    """
-    Генерирует PDF на сервере и отдает его пользователю.
-    """
-    # 1. Получаем данные (точно так же, как в preview)
-    test = get_object_or_404(
-        GatTest.objects.prefetch_related('questions__options', 'questions__subject'), 
-        pk=test_pk
-    )
-    
-    raw_questions = list(test.questions.all())
-    order_map = {qid: idx for idx, qid in enumerate(test.question_order or [])}
 
-    from collections import defaultdict
-    questions_by_subject = defaultdict(list)
-    for q in raw_questions:
-        questions_by_subject[q.subject].append(q)
+def _requested_variant(request, test):
+    """Вариант буклета из ?variant=B или None (исходный порядок)."""
+    name = (request.GET.get('variant') or '').strip().upper()
+    if not name:
+        return None
+    return get_object_or_404(BookletVariant, gat_test=test, name=name)
 
-    subject_order_map = {}
-    for subject, q_list in questions_by_subject.items():
-        if q_list:
-            min_index = min([order_map.get(q.id, 999999) for q in q_list])
-        else:
-            min_index = 999999
-        subject_order_map[subject] = min_index
 
-    sorted_subjects = sorted(
-        questions_by_subject.keys(),
-        key=lambda s: (subject_order_map.get(s, 999999), s.name)
+def booklet_filename(test, fmt, variant=None):
+    suffix = f'_{variant.name}' if variant is not None else ''
+    return f'booklet_{test.pk}{suffix}.{fmt}'
+
+
+@login_required
+def export_booklet_docx(request, test_pk):
+    """
+    Отдает буклет в MS Word: из кэша буклетов, а при промахе собирает и кладет в кэш.
+    ?variant=B — вариант буклета (перестановки BookletVariant).
+    """
+    test = get_object_or_404(GatTest, pk=test_pk)
+    variant = _requested_variant(request, test)
+    name, _ = get_or_build_booklet(test, 'docx', lambda: build_booklet_docx(test, variant), variant)
+    return FileResponse(
+        booklet_storage.open(name, 'rb'), as_attachment=True, filename=booklet_filename(test, 'docx', variant),
+        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
     )
 
-    final_questions_list = []
-    for subject in sorted_subjects:
-        subject_questions = questions_by_subject[subject]
-        subject_questions.sort(key=lambda q: order_map.get(q.id, 999999))
-        final_questions_list.extend(subject_questions)
+def build_booklet_pdf_context(test, variant=None):
+    """
+    Контекст шаблона booklet/booklet_pdf.html: вопросы в порядке буклета (по предметам)
+    или в порядке варианта буклета variant.
+    """
+    final_questions_list = booklet_questions(test)
+    if variant is not None:
+        final_questions_list = apply_variant(final_questions_list, variant)
 
+    # WeasyPrint берет печатные копии картинок, а не оригиналы
     for q in final_questions_list:
-        q.fixed_options = q.options.all().order_by('order', 'id')
+        if q.question_image:
+            q.print_image_path = print_image_path(q.question_image, q.image_width)
+        for option in q.fixed_options:
+            if option.option_image:
+                option.print_image_path = print_image_path(option.option_image, is_option=True)
 
-    # 2. Готовим контекст
-    context = {
+    return {
         'test': test,
-        'all_questions': final_questions_list, 
+        'all_questions': final_questions_list,
         'header_left': f'СИНФИ {test.school_class.name}',
-        'header_center': f'ТЕСТИ УМУМӢ {test.test_number}',
+        'header_center': f'ТЕСТИ УМУМӢ {test.test_number}' + (f' · ВАРИАНТИ {variant.name}' if variant else ''),
         'header_right': str(test.test_date.year),
         # Флаг для шаблона, что мы в режиме PDF (чтобы скрыть лишнее)
-        'is_pdf_mode': True 
+        'is_pdf_mode': True
     }
 
-    # 3. Рендерим HTML в строку
-    # Важно: создайте отдельный чистый шаблон для PDF или используйте существующий с условиями
-    html_string = render_to_string('booklet/booklet_pdf.html', context, request=request)
 
-    # 4. Превращаем HTML в PDF с помощью WeasyPrint
-    # base_url нужен, чтобы WeasyPrint нашел картинки и стили на диске
-    pdf_file = weasyprint.HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
+def render_booklet_pdf(test, variant=None):
+    """Собирает PDF буклета (или варианта буклета) через WeasyPrint. Возвращает bytes."""
+    html_string = render_to_string('booklet/booklet_pdf.html', build_booklet_pdf_context(test, variant))
+    # Картинки в шаблоне указаны абсолютными путями на диске, base_url не нужен
+    return weasyprint.HTML(string=html_string).write_pdf()
+
 
-    # 5. Отдаем файл
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="booklet_{test.pk}.pdf"'
-    return response
\ No newline at end of file
+@login_required
+def download_booklet_pdf(request, test_pk):
+    """
+    Отдает PDF буклета из кэша буклетов. При промахе ставит сборку в очередь
+    фоновых задач (core.export_jobs.booklet_pdf_job) и открывает страницу статуса.
+    """
+    test = get_object_or_404(GatTest, pk=test_pk)
+    variant = _requested_variant(request, test)
+    name = get_cached_booklet(test, 'pdf', variant)
+    if name:
+        return FileResponse(booklet_storage.open(name, 'rb'), as_attachment=True, filename=booklet_filename(test, 'pdf', variant))
+
+    job = enqueue_job(
+        'booklet_pdf', request.user,
+        params={'test_pk': test.pk, 'variant': variant.name if variant else None},
+        title=f'PDF буклета: {test.name}' + (f', вариант {variant.name}' if variant else ''),
+    )
+    return redirect('core:job_detail', pk=job.pk)
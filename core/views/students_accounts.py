@@ -10,10 +10,11 @@ from django.shortcuts import get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils.crypto import get_random_string
-from weasyprint import HTML
 
 from accounts.models import UserProfile
+from ..account_provisioning import allocate_usernames
 from ..models import SchoolClass, Student
+from ..jobs import enqueue_job
 from .permissions import get_accessible_schools
 
 # =============================================================================
@@ -61,17 +62,8 @@ def create_student_user_account(request, student_id):
             return redirect(redirect_url)
 
         try:
-            first_name = student.first_name_en or ''
-            last_name = student.last_name_en or ''
-            base_username = f"{first_name}{last_name}" if first_name or last_name else student.student_id
-            base_username = ''.join(e for e in base_username if e.isalnum()).lower()
-            
-            username = base_username or 'student'
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-            
+            username = allocate_usernames([student])[0]
+
             password = get_random_string(length=8)
             
             user = User.objects.create_user(
@@ -164,177 +156,50 @@ def delete_student_user_account(request, user_id):
 # --- МАССОВЫЕ ОПЕРАЦИИ С АККАУНТАМИ ---
 # =============================================================================
 
+def _enqueue_accounts_export(request, school_class, is_parallel, redirect_url):
+    """Ставит создание/сброс аккаунтов и PDF с логинами в очередь фоновых задач."""
+    if request.method != 'POST':
+        return redirect(redirect_url)
+    job = enqueue_job(
+        'accounts_pdf', request.user,
+        params={
+            'class_id': school_class.pk,
+            'is_parallel': is_parallel,
+            'action': request.POST.get('action'),
+        },
+        title=f"Логины: {'параллель ' if is_parallel else ''}{school_class.name}",
+    )
+    return redirect('core:job_detail', pk=job.pk)
+
+
 @login_required
-@transaction.atomic
 def class_create_export_accounts(request, class_id):
-    """Массовое создание/сброс и экспорт аккаунтов для КЛАССА."""
+    """Массовое создание/сброс и экспорт аккаунтов для КЛАССА (выполняется фоновой задачей)."""
     school_class = get_object_or_404(SchoolClass.objects.select_related('school'), id=class_id)
     redirect_url = reverse_lazy('core:student_list', kwargs={'class_id': class_id})
 
     if not _check_class_or_parallel_permission(request.user, school_class):
         messages.error(request, "У вас нет прав для выполнения этого действия.")
         return redirect(redirect_url)
-    
-    action = request.POST.get('action')
-    credentials_list = []
-    
-    students_with_accounts = Student.objects.filter(
-        school_class=school_class, 
-        user_profile__isnull=False
-    ).select_related('user_profile__user')
 
-    reset_count = 0
-    for student in students_with_accounts:
-        user = student.user_profile.user
-        password_to_show = '(пароль установлен)'
-        if action == 'reset_and_export':
-            new_password = get_random_string(length=8)
-            user.set_password(new_password)
-            user.save()
-            password_to_show = new_password
-            reset_count += 1
-        credentials_list.append({
-            'full_name': student.full_name_ru, 
-            'username': user.username, 
-            'password': password_to_show
-        })
-
-    students_to_create = Student.objects.filter(
-        school_class=school_class, 
-        user_profile__isnull=True
-    )
-    
-    created_count = 0
-    for student in students_to_create:
-        first_name = student.first_name_en or ''
-        last_name = student.last_name_en or ''
-        base_username = f"{first_name}{last_name}" if first_name or last_name else student.student_id
-        base_username = ''.join(e for e in base_username if e.isalnum()).lower()
-        username = base_username or 'student'
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        password = get_random_string(length=8)
-        user = User.objects.create_user(
-            username=username, password=password, 
-            first_name=student.first_name_ru, last_name=student.last_name_ru
-        )
-        profile = user.profile
-        profile.role = UserProfile.Role.STUDENT
-        profile.student = student
-        profile.save()
-        credentials_list.append({
-            'full_name': student.full_name_ru, 
-            'username': username, 
-            'password': password
-        })
-        created_count += 1
-
-    if not credentials_list:
+    if not Student.objects.filter(school_class=school_class).exists():
         messages.warning(request, "В этом классе нет учеников для экспорта.")
         return redirect(redirect_url)
-        
-    credentials_list.sort(key=lambda x: x['full_name'])
-    
-    context = {'credentials': credentials_list, 'school_class': school_class}
-    html_string = render_to_string('students/logins_pdf.html', context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="logins_{school_class.name}.pdf"'
-    HTML(string=html_string).write_pdf(response)
-    
-    message_parts = []
-    if created_count > 0: message_parts.append(f"Создано {created_count} новых аккаунтов")
-    if reset_count > 0: message_parts.append(f"сброшен пароль для {reset_count} существующих")
-    
-    final_message = ", ".join(message_parts).capitalize() + ". PDF-файл с актуальными данными сгенерирован."
-    messages.success(request, final_message)
-        
-    return response
+
+    return _enqueue_accounts_export(request, school_class, False, redirect_url)
 
 @login_required
-@transaction.atomic
 def parallel_create_export_accounts(request, parallel_id):
-    """Массовое создание/сброс и экспорт аккаунтов для ВСЕЙ ПАРАЛЛЕЛИ."""
+    """Массовое создание/сброс и экспорт аккаунтов для ВСЕЙ ПАРАЛЛЕЛИ (выполняется фоновой задачей)."""
     parallel = get_object_or_404(SchoolClass.objects.select_related('school'), id=parallel_id, parent__isnull=True)
     redirect_url = reverse_lazy('core:student_list_combined', kwargs={'parallel_id': parallel_id})
 
     if not _check_class_or_parallel_permission(request.user, parallel):
         messages.error(request, "У вас нет прав для выполнения этого действия.")
         return redirect(redirect_url)
-    
-    action = request.POST.get('action')
-    students_in_parallel = Student.objects.filter(school_class__parent=parallel)
-    
-    credentials_list = []
-    reset_count = 0
-    created_count = 0
-
-    students_with_accounts = students_in_parallel.filter(
-        user_profile__isnull=False
-    ).select_related('user_profile__user')
 
-    for student in students_with_accounts:
-        user = student.user_profile.user
-        password_to_show = '(пароль установлен)'
-        if action == 'reset_and_export':
-            new_password = get_random_string(length=8)
-            user.set_password(new_password)
-            user.save()
-            password_to_show = new_password
-            reset_count += 1
-        credentials_list.append({
-            'full_name': student.full_name_ru, 
-            'username': user.username, 
-            'password': password_to_show
-        })
-
-    students_to_create = students_in_parallel.filter(user_profile__isnull=True)
-    
-    for student in students_to_create:
-        first_name = student.first_name_en or ''
-        last_name = student.last_name_en or ''
-        base_username = f"{first_name}{last_name}" if first_name or last_name else student.student_id
-        base_username = ''.join(e for e in base_username if e.isalnum()).lower()
-        username = base_username or 'student'
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        password = get_random_string(length=8)
-        user = User.objects.create_user(
-            username=username, password=password, 
-            first_name=student.first_name_ru, last_name=student.last_name_ru
-        )
-        profile, _ = UserProfile.objects.get_or_create(user=user)
-        profile.role = UserProfile.Role.STUDENT
-        profile.student = student
-        profile.save()
-        credentials_list.append({
-            'full_name': student.full_name_ru, 
-            'username': username, 
-            'password': password
-        })
-        created_count += 1
-
-    if not credentials_list:
+    if not Student.objects.filter(school_class__parent=parallel).exists():
         messages.warning(request, "В этой параллели нет учеников для экспорта.")
         return redirect(redirect_url)
-        
-    credentials_list.sort(key=lambda x: x['full_name'])
-    
-    context = {'credentials': credentials_list, 'school_class': parallel}
-    html_string = render_to_string('students/logins_pdf.html', context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="logins_parallel_{parallel.name}.pdf"'
-    HTML(string=html_string).write_pdf(response)
-    
-    message_parts = []
-    if created_count > 0: message_parts.append(f"Создано {created_count} новых аккаунтов")
-    if reset_count > 0: message_parts.append(f"сброшен пароль для {reset_count} существующих")
-    
-    final_message = ", ".join(message_parts).capitalize() + ". PDF-файл с актуальными данными сгенерирован."
-    if message_parts:
-        messages.success(request, final_message)
-        
-    return response
\ No newline at end of file
+
+    return _enqueue_accounts_export(request, parallel, True, redirect_url)
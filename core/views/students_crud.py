@@ -12,8 +12,9 @@ from django.contrib.auth.decorators import login_required
 
 from accounts.models import UserProfile
 from ..forms import StudentForm, StudentUploadForm
-from ..models import School, SchoolClass, Student
-from ..services import process_student_upload
+from ..models import School, SchoolClass, Student, StudentResult
+from ..services import refresh_tests_after_results_delete, result_test_ids
+from ..student_import_service import bulk_process_student_upload
 from .permissions import get_accessible_schools
 
 # =============================================================================
@@ -132,7 +133,9 @@ class StudentDeleteView(LoginRequiredMixin, StudentAccessMixin, DeleteView):
     def form_valid(self, form):
         student_name = str(self.object)
         success_url = self.get_success_url()
+        test_ids = result_test_ids(self.object.results.all())
         self.object.delete()
+        refresh_tests_after_results_delete(test_ids)
 
         if self.request.htmx:
             trigger = {
@@ -183,7 +186,9 @@ def student_delete_multiple_view(request):
             messages.warning(request, "Вы не выбрали ни одного ученика для удаления.")
         else:
             students_query = Student.objects.filter(pk__in=student_ids_to_delete, school_class__school=target_school)
+            test_ids = result_test_ids(StudentResult.objects.filter(student__in=students_query))
             deleted_count, _ = students_query.delete()
+            refresh_tests_after_results_delete(test_ids)
             messages.success(request, f"Успешно удалено учеников: {deleted_count}.")
 
         if class_id:
@@ -197,7 +202,7 @@ def student_delete_multiple_view(request):
 
 @login_required
 def student_upload_view(request):
-    """Обрабатывает загрузку учеников из Excel файла."""
+    """Обрабатывает загрузку учеников из Excel/CSV файла (пакетный импорт)."""
     if not request.user.is_superuser:
         messages.error(request, "У вас нет прав для выполнения этого действия.")
         return redirect('core:student_school_list')
@@ -207,7 +212,7 @@ def student_upload_view(request):
         if form.is_valid():
             file = request.FILES['file']
             try:
-                report = process_student_upload(file)
+                report = bulk_process_student_upload(file, school=form.cleaned_data['school'])
                 row_errors = report.get('errors', [])
                 if row_errors:
                     for error_message in row_errors:
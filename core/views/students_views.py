@@ -1,7 +1,7 @@
 # D:\GAT\core\views\students_views.py (НОВЫЙ ФАЙЛ)
 
+import json
 import logging
-from collections import defaultdict
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -17,10 +17,16 @@ from ..models import (
     StudentResult,
     Subject,
 )
+from ..pagination import estimate_count, keyset_paginate
+from ..services import refresh_tests_after_results_delete, result_test_ids
+from ..ranks import ensure_result_ranks
+from ..trends import result_trend_chart
 from .permissions import get_accessible_schools
 
 logger = logging.getLogger('cleanup_logger')
 
+STUDENT_PAGE_SIZE = 100
+
 # =============================================================================
 # --- ИЕРАРХИЧЕСКИЙ СПИСОК УЧЕНИКОВ ---
 # =============================================================================
@@ -90,6 +96,18 @@ def student_class_list_view(request, parent_id):
         
     return render(request, 'students/student_class_list.html', context)
 
+def _render_student_list(request, students, context):
+    """
+    Список учеников по страницам (core/pagination.py): первый запрос — вся
+    страница с количеством, следующие (?after=курсор) — только строки.
+    """
+    page = keyset_paginate(students, request.GET.get('after'), STUDENT_PAGE_SIZE)
+    context.update(students=page.object_list, keyset_page=page, keyset_infinite=True)
+    if request.htmx and request.GET.get('after'):
+        return render(request, 'students/partials/_student_rows.html', context)
+    context['total_count'] = estimate_count(students)
+    return render(request, 'students/student_list_final.html', context)
+
 @login_required
 def student_list_view(request, class_id):
     """Шаг 4: Отображает список учеников в конкретном классе."""
@@ -106,9 +124,8 @@ def student_list_view(request, class_id):
     context = {
         'title': f'Ученики класса {school_class.name}',
         'school_class': school_class,
-        'students': student_list,
     }
-    return render(request, 'students/student_list_final.html', context)
+    return _render_student_list(request, student_list, context)
 
 @login_required
 def student_list_combined_view(request, parallel_id):
@@ -126,10 +143,9 @@ def student_list_combined_view(request, parallel_id):
     context = {
         'title': f'Все ученики параллели «{parallel.name}»',
         'school_class': parallel,
-        'students': student_list,
         'is_combined_view': True,
     }
-    return render(request, 'students/student_list_final.html', context)
+    return _render_student_list(request, student_list, context)
 
 # =============================================================================
 # --- АНАЛИТИКА ПРОГРЕССА СТУДЕНТА ---
@@ -205,48 +221,21 @@ def student_progress_view(request, student_id):
             'has_results': False
         })
 
-    test_ids = student_results_qs.values_list('gat_test_id', flat=True)
-    all_results_for_tests = StudentResult.objects.filter(
-        gat_test_id__in=test_ids
-    ).select_related('student__school_class__school')
-    
-    scores_by_test, scores_by_class, scores_by_school = defaultdict(list), defaultdict(lambda: defaultdict(list)), defaultdict(lambda: defaultdict(list))
-    
-    for res in all_results_for_tests:
-        scores_by_test[res.gat_test_id].append(res.total_score)
-        scores_by_class[res.gat_test_id][res.student.school_class_id].append(res.total_score)
-        scores_by_school[res.gat_test_id][res.student.school_class.school_id].append(res.total_score)
-    
-    for test_id in scores_by_test:
-        scores_by_test[test_id].sort(reverse=True)
-        for class_id in scores_by_class[test_id]: 
-            scores_by_class[test_id][class_id].sort(reverse=True)
-        for school_id in scores_by_school[test_id]: 
-            scores_by_school[test_id][school_id].sort(reverse=True)
-    
+    # Ранги хранятся в самих результатах (см. core/ranks.py)
+    if ensure_result_ranks(student_results_qs):
+        student_results_qs = student_results_qs.all()
+
     subject_map = {s.id: s.name for s in Subject.objects.all()}
     detailed_results_data = []
     
     for result in student_results_qs:
-        student_score = result.total_score
-        class_scores = scores_by_class.get(result.gat_test_id, {}).get(student.school_class_id, [])
-        school_scores = scores_by_school.get(result.gat_test_id, {}).get(student.school_class.school_id, [])
-        parallel_scores = scores_by_test.get(result.gat_test_id, [])
-
-        try: class_rank = class_scores.index(student_score) + 1
-        except ValueError: class_rank = None
-        try: school_rank = school_scores.index(student_score) + 1
-        except ValueError: school_rank = None
-        try: parallel_rank = parallel_scores.index(student_score) + 1
-        except ValueError: parallel_rank = None
-
         grade, best_s, worst_s, processed_scores = _get_grade_and_subjects_performance(result, subject_map)
         
         detailed_results_data.append({
             'result': result, 
-            'class_rank': class_rank, 'class_total': len(class_scores),
-            'parallel_rank': parallel_rank, 'parallel_total': len(parallel_scores),
-            'school_rank': school_rank, 'school_total': len(school_scores),
+            'class_rank': result.class_rank, 'class_total': result.class_total,
+            'parallel_rank': result.parallel_rank, 'parallel_total': result.parallel_total,
+            'school_rank': result.school_rank, 'school_total': result.school_total,
             'grade': grade, 'best_subject': best_s, 'worst_subject': worst_s, 
             'processed_scores': processed_scores
         })
@@ -261,11 +250,14 @@ def student_progress_view(request, student_id):
             'grade_diff': grade_diff, 'rank_diff': rank_diff
         }
     
+    trend_chart_data = result_trend_chart(student_results_qs)
+
     context = {
         'title': f'Аналитика: {student}', 
         'student': student, 
         'detailed_results_data': detailed_results_data, 
         'comparison_data': comparison_data, 
+        'trend_chart_data': json.dumps(trend_chart_data, ensure_ascii=False) if trend_chart_data else None, 
         'notes': student.notes.all(), 
         'has_results': True
     }
@@ -289,7 +281,9 @@ def data_cleanup_view(request):
             if parallel_id:
                 parallel = get_object_or_404(SchoolClass, pk=parallel_id)
                 students_to_delete = Student.objects.filter(school_class__parent_id=parallel_id)
+                test_ids = result_test_ids(StudentResult.objects.filter(student__in=students_to_delete))
                 deleted_count, _ = students_to_delete.delete()
+                refresh_tests_after_results_delete(test_ids)
                 logger.critical(f"USER: '{user.username}' удалил {deleted_count} УЧЕНИКОВ из параллели '{parallel.name}'.")
                 messages.warning(request, f'ВНИМАНИЕ: Удалено {deleted_count} учеников из параллели "{parallel.name}".')
             else:
@@ -300,14 +294,19 @@ def data_cleanup_view(request):
             if class_id:
                 school_class = SchoolClass.objects.get(pk=class_id)
                 class_name = school_class.name
-                deleted_count, _ = StudentResult.objects.filter(student__school_class_id=class_id).delete()
+                results = StudentResult.objects.filter(student__school_class_id=class_id)
+                test_ids = result_test_ids(results)
+                deleted_count, _ = results.delete()
+                refresh_tests_after_results_delete(test_ids)
                 logger.warning(f"USER: '{user.username}' удалил {deleted_count} РЕЗУЛЬТАТОВ ТЕСТОВ для класса '{class_name}'.")
                 messages.success(request, f'Успешно удалено {deleted_count} записей для класса "{class_name}".')
             else:
                 messages.error(request, 'Вы не выбрали класс для очистки результатов.')
 
         elif 'clear_results_all' in request.POST:
+            test_ids = result_test_ids(StudentResult.objects.all())
             deleted_count, _ = StudentResult.objects.all().delete()
+            refresh_tests_after_results_delete(test_ids)
             logger.warning(f"USER: '{user.username}' удалил ВСЕ ({deleted_count}) РЕЗУЛЬТАТЫ ТЕСТОВ в системе.")
             messages.success(request, f'ПОЛНАЯ ОЧИСТКА РЕЗУЛЬТАТОВ ЗАВЕРШЕНА. Удалено {deleted_count} записей.')
 
@@ -316,14 +315,18 @@ def data_cleanup_view(request):
             if class_id:
                 school_class = SchoolClass.objects.get(pk=class_id)
                 class_name = school_class.name
+                test_ids = result_test_ids(StudentResult.objects.filter(student__school_class_id=class_id))
                 deleted_count, _ = Student.objects.filter(school_class_id=class_id).delete()
+                refresh_tests_after_results_delete(test_ids)
                 logger.critical(f"USER: '{user.username}' удалил {deleted_count} УЧЕНИКОВ из класса '{class_name}'.")
                 messages.warning(request, f'ВНИМАНИЕ: Удалено {deleted_count} учеников из класса "{class_name}".')
             else:
                 messages.error(request, 'Вы не выбрали класс для удаления учеников.')
 
         elif 'delete_students_all' in request.POST:
+            test_ids = result_test_ids(StudentResult.objects.all())
             deleted_count, _ = Student.objects.all().delete()
+            refresh_tests_after_results_delete(test_ids)
             logger.critical(f"USER: '{user.username}' удалил ВСЕХ ({deleted_count}) УЧЕНИКОВ в системе.")
             messages.warning(request, f'ВНИМАНИЕ: ВСЕ УЧЕНИКИ В СИСТЕМЕ ({deleted_count}) БЫЛИ УДАЛЕНЫ.')
 
@@ -7,17 +7,18 @@ from core.models import StudentResult, SchoolClass, Subject, QuestionCount
 from core.views.permissions import get_accessible_schools
 from core import utils as grade_utils
 
-def get_report_context(get_params, request_user, mode='monitoring'):
+def build_report_query(get_params, request_user):
     """
-    Единая функция для получения данных для Мониторинга и Таблицы Оценок.
-    Учитывает права доступа и предоставляет полные данные по баллам (балл/всего).
+    Фильтры и права доступа отчетов Мониторинга и Таблицы Оценок без построения строк.
+    Возвращает словарь: form, results_qs, table_headers, q_counts, title_details,
+    accessible_subjects_for_user, is_valid. Строки строятся build_report_row().
     """
     user = request_user
     profile = getattr(user, 'profile', None)
     form = MonitoringFilterForm(get_params or None, user=user)
 
     table_headers = []
-    table_rows = []
+    q_counts = {}
     title_details = {}
     accessible_subjects_for_user = None
 
@@ -97,14 +98,15 @@ def get_report_context(get_params, request_user, mode='monitoring'):
             header_subjects = sorted(list(subjects_filter_from_form), key=lambda s: s.name)
         else:
             all_subject_ids_in_results = set()
-            for r in results_qs:
-                if isinstance(r.scores_by_subject, dict):
-                    all_subject_ids_in_results.update(int(sid) for sid in r.scores_by_subject.keys())
+            # Курсором по одному JSON-полю, без загрузки всех результатов в память
+            for scores in results_qs.values_list('scores_by_subject', flat=True).iterator(chunk_size=2000):
+                if isinstance(scores, dict):
+                    all_subject_ids_in_results.update(int(sid) for sid in scores.keys())
             header_subjects = sorted([subject_map[sid] for sid in all_subject_ids_in_results if sid in subject_map], 
                                    key=lambda s: s.name)
 
         # Расчет количества вопросов
-        q_counts = {}
+        ref_classes_qs = SchoolClass.objects.none()
         if results_qs.exists() and header_subjects:
             ref_classes_qs = SchoolClass.objects.filter(
                 id__in=results_qs.values_list('student__school_class_id', flat=True).distinct()
@@ -137,62 +139,124 @@ def get_report_context(get_params, request_user, mode='monitoring'):
             )
             table_headers.append({'subject': subj, 'q_count': representative_q_count})
 
-        # Формирование строк таблицы
-        for result in results_qs.distinct():
-            if not (result.student and isinstance(result.scores_by_subject, dict)): 
-                continue
-                
-            row_data = {
-                'student': result.student,
-                'result_obj': result,
-                'scores_by_subject': {},
-                'grades_by_subject': {},
-                'total_score': 0
-            }
-            total_grade_points, subjects_in_row = 0, 0
-
-            for header in table_headers:
-                header_subject = header['subject']
-                subject_id, subject_id_str = header_subject.id, str(header_subject.id)
-                answers = result.scores_by_subject.get(subject_id_str)
-                q_count = q_counts.get((subject_id, result.student.school_class_id), 0)
-
-                if answers is not None and isinstance(answers, dict):
-                    score = sum(1 for v in answers.values() if v is True)
-                    row_data['total_score'] += score
-                    subjects_in_row += 1
-                    
-                    if mode == 'grading':
-                        percentage = (score / q_count) * 100 if q_count > 0 else 0
-                        grade = grade_utils.calculate_grade_from_percentage(percentage)
-                        row_data['grades_by_subject'][subject_id] = grade
-                        total_grade_points += grade
-                    else:
-                        row_data['scores_by_subject'][subject_id] = {'score': score, 'total': q_count}
-                else:
-                    if mode == 'grading':
-                         row_data['grades_by_subject'][subject_id] = "—"
-                    else:
-                         row_data['scores_by_subject'][subject_id] = {'score': '—', 'total': q_count}
+    return {
+        'form': form,
+        'results_qs': results_qs,
+        'table_headers': table_headers,
+        'q_counts': q_counts,
+        'title_details': title_details,
+        'accessible_subjects_for_user': accessible_subjects_for_user,
+        'is_valid': form.is_valid(),
+    }
+
+
+def _score_row(scores_by_subject, class_id, table_headers, q_counts, mode):
+    """Баллы/оценки одной строки по предметам заголовка. Возвращает (scores, grades, total_score)."""
+    scores, grades = {}, {}
+    total_score, total_grade_points, subjects_in_row = 0, 0, 0
 
+    for header in table_headers:
+        header_subject = header['subject']
+        subject_id, subject_id_str = header_subject.id, str(header_subject.id)
+        answers = scores_by_subject.get(subject_id_str)
+        q_count = q_counts.get((subject_id, class_id), 0)
+
+        if answers is not None and isinstance(answers, dict):
+            score = sum(1 for v in answers.values() if v is True)
+            total_score += score
+            subjects_in_row += 1
+
+            if mode == 'grading':
+                percentage = (score / q_count) * 100 if q_count > 0 else 0
+                grade = grade_utils.calculate_grade_from_percentage(percentage)
+                grades[subject_id] = grade
+                total_grade_points += grade
+            else:
+                scores[subject_id] = {'score': score, 'total': q_count}
+        else:
             if mode == 'grading':
-                 row_data['total_score'] = total_grade_points if subjects_in_row > 0 else 0
-            table_rows.append(row_data)
-
-        # Сортировка результатов
-        table_rows.sort(
-            key=lambda x: (
-                isinstance(x.get('total_score'), str),
-                -x.get('total_score', 0) if not isinstance(x.get('total_score'), str) else 0
-            ), 
-            reverse=False
-        )
+                grades[subject_id] = "—"
+            else:
+                scores[subject_id] = {'score': '—', 'total': q_count}
+
+    if mode == 'grading':
+        total_score = total_grade_points if subjects_in_row > 0 else 0
+    return scores, grades, total_score
+
 
+def build_report_row(result, table_headers, q_counts, mode):
+    """Строка отчета для одного StudentResult (None, если строку нужно пропустить)."""
+    if not (result.student and isinstance(result.scores_by_subject, dict)):
+        return None
+    scores, grades, total_score = _score_row(
+        result.scores_by_subject, result.student.school_class_id, table_headers, q_counts, mode
+    )
     return {
-        'form': form,
+        'student': result.student,
+        'result_obj': result,
+        'scores_by_subject': scores,
+        'grades_by_subject': grades,
+        'total_score': total_score
+    }
+
+
+def _row_sort_key(total_score):
+    # Сортировка результатов: сначала числовые баллы по убыванию
+    return (isinstance(total_score, str), -total_score if not isinstance(total_score, str) else 0)
+
+
+def get_report_context(get_params, request_user, mode='monitoring'):
+    """
+    Единая функция для получения данных для Мониторинга и Таблицы Оценок.
+    Учитывает права доступа и предоставляет полные данные по баллам (балл/всего).
+    """
+    report = build_report_query(get_params, request_user)
+    table_headers, q_counts = report['table_headers'], report['q_counts']
+
+    table_rows = []
+    if report['is_valid']:
+        for result in report['results_qs'].distinct():
+            row_data = build_report_row(result, table_headers, q_counts, mode)
+            if row_data is not None:
+                table_rows.append(row_data)
+        table_rows.sort(key=lambda x: _row_sort_key(x.get('total_score', 0)))
+
+    return {
+        'form': report['form'],
         'table_headers': table_headers,
         'table_rows': table_rows,
-        'has_results': bool(get_params) and form.is_valid(),
-        'title_details': title_details,
-        'accessible_subjects_for_user': accessible_subjects_for_user,
-    }
\ No newline at end of file
+        'has_results': bool(get_params) and report['is_valid'],
+        'title_details': report['title_details'],
+        'accessible_subjects_for_user': report['accessible_subjects_for_user'],
+    }
+
+
+def iter_report_rows(report, mode, chunk_size=2000):
+    """
+    Строки отчета в том же порядке, что и в get_report_context, но без загрузки всех
+    результатов в память: первый проход курсором считает только ключ сортировки
+    (ID + итоговый балл), второй подгружает результаты пачками по chunk_size.
+    """
+    if not report['is_valid']:
+        return
+    table_headers, q_counts = report['table_headers'], report['q_counts']
+    results_qs = report['results_qs'].distinct()
+
+    ordered = []
+    rows = results_qs.values_list('id', 'student__school_class_id', 'scores_by_subject').iterator(chunk_size=chunk_size)
+    for result_id, class_id, scores in rows:
+        if not isinstance(scores, dict):
+            continue
+        _, _, total_score = _score_row(scores, class_id, table_headers, q_counts, mode)
+        ordered.append((_row_sort_key(total_score), result_id))
+    ordered.sort(key=lambda item: item[0])
+
+    loader = StudentResult.objects.select_related('student__school_class__school', 'gat_test')
+    for start in range(0, len(ordered), chunk_size):
+        chunk_ids = [result_id for _, result_id in ordered[start:start + chunk_size]]
+        results = loader.in_bulk(chunk_ids)
+        for result_id in chunk_ids:
+            result = results.get(result_id)
+            row_data = build_report_row(result, table_headers, q_counts, mode) if result else None
+            if row_data is not None:
+                yield row_data
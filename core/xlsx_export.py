@@ -0,0 +1,95 @@
+# D:\GAT\core\xlsx_export.py
+
+"""
+Потоковая выгрузка XLSX с постоянным расходом памяти.
+
+Строки пишутся в write-only книгу openpyxl (она сбрасывает их во временный
+файл, а не держит ячейки в памяти), ширина колонок оценивается по заголовкам
+и первым SAMPLE_ROWS строкам, готовый файл отдается кусками через
+StreamingHttpResponse.
+"""
+
+import tempfile
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+SAMPLE_ROWS = 200
+STREAM_CHUNK = 64 * 1024
+MAX_COLUMN_WIDTH = 60
+
+
+def estimate_column_widths(rows):
+    """Ширина колонок (в символах + 2) по уже известным строкам."""
+    widths = {}
+    for row in rows:
+        for col_idx, value in enumerate(row, 1):
+            length = len(str(value)) if value is not None else 0
+            if length > widths.get(col_idx, 0):
+                widths[col_idx] = length
+    return {col_idx: min(length + 2, MAX_COLUMN_WIDTH) for col_idx, length in widths.items()}
+
+
+def write_xlsx(file_obj, sheet_title, header_rows, rows, merge_header_columns=()):
+    """
+    Пишет лист в file_obj. header_rows — список строк заголовка,
+    rows — итерируемое строк данных (читается один раз),
+    merge_header_columns — номера колонок, ячейки которых объединяются по всем строкам заголовка.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, SAMPLE_ROWS))
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    for col_idx, width in estimate_column_widths(header_rows + sample).items():
+        sheet.column_dimensions[get_column_letter(col_idx)].width = width
+
+    if len(header_rows) > 1:
+        for col_idx in merge_header_columns:
+            letter = get_column_letter(col_idx)
+            sheet.merged_cells.add(f"{letter}1:{letter}{len(header_rows)}")
+
+    centered = Alignment(vertical='center')
+    for row_idx, header in enumerate(header_rows):
+        cells = []
+        for col_idx, value in enumerate(header, 1):
+            cell = WriteOnlyCell(sheet, value=value)
+            if row_idx == 0 and col_idx in merge_header_columns:
+                cell.alignment = centered
+            cells.append(cell)
+        sheet.append(cells)
+
+    for row in sample:
+        sheet.append(row)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file_obj)
+
+
+def _iter_file(file_obj):
+    try:
+        file_obj.seek(0)
+        while chunk := file_obj.read(STREAM_CHUNK):
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def streaming_xlsx_response(filename, sheet_title, header_rows, rows, merge_header_columns=()):
+    """Собирает XLSX во временный файл на диске и отдает его потоком."""
+    file_obj = tempfile.TemporaryFile()
+    try:
+        write_xlsx(file_obj, sheet_title, header_rows, rows, merge_header_columns)
+    except Exception:
+        file_obj.close()
+        raise
+    size = file_obj.seek(0, 2)
+    response = StreamingHttpResponse(_iter_file(file_obj), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Length'] = size
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -272,7 +272,8 @@ window.openCropper = function(container, questionId) {
     const modal = document.getElementById('cropper-modal');
     const imageToCrop = document.getElementById('image-to-crop');
     modal.style.display = 'block';
-    imageToCrop.src = currentImageElement.src;
+    // Обрезаем оригинал, а не уменьшенную копию со страницы
+    imageToCrop.src = currentImageElement.dataset.original || currentImageElement.src;
 
     if (cropper) { cropper.destroy(); }
     imageToCrop.onload = function() {
@@ -305,6 +306,7 @@ document.getElementById('btn-save-crop').addEventListener('click', () => {
         .then(data => {
             if (data.status === 'success') {
                 currentImageElement.src = data.url + '?t=' + new Date().getTime();
+                currentImageElement.dataset.original = data.url;
                 document.getElementById('cropper-modal').style.display = 'none';
                 cropper.destroy();
                 showStatus('Фото обновлено', 'success');